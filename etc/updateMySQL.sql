@@ -1,2 +1,43 @@
 --https://github.com/dmwm/CRABServer/issues/4154
 ALTER TABLE TASKS ADD (tm_maxjobruntime BIGINT, tm_numcores BIGINT, tm_maxmemory BIGINT, tm_priority BIGINT);
+
+--Warnings of the tasks, one row per warning
+CREATE TABLE task_warnings(tm_warning_id BIGINT NOT NULL AUTO_INCREMENT, tm_taskname VARCHAR(255) NOT NULL, tm_warning LONGTEXT NOT NULL,
+    CONSTRAINT warning_taskname_fk FOREIGN KEY(tm_taskname) references tasks(tm_taskname) ON DELETE CASCADE,
+    CONSTRAINT warning_id_pk PRIMARY KEY(tm_warning_id)) ENGINE=InnoDB;
+
+--Number of tasks per user and status, and indexes of the summary and search APIs.
+--The triggers are created before the table is filled, and the tasks are locked while it is filled,
+--so that no change of the tasks is lost or counted twice.
+CREATE TABLE task_counts(tm_username VARCHAR(255) NOT NULL, tm_task_status VARCHAR(255) NOT NULL, tm_count BIGINT NOT NULL,
+    CONSTRAINT task_counts_pk PRIMARY KEY(tm_username, tm_task_status)) ENGINE=InnoDB;
+CREATE TRIGGER task_counts_ins_trg AFTER INSERT ON tasks FOR EACH ROW
+    INSERT INTO task_counts (tm_username, tm_task_status, tm_count) VALUES (NEW.tm_username, NEW.tm_task_status, 1)
+        ON DUPLICATE KEY UPDATE tm_count = tm_count + 1;
+CREATE TRIGGER task_counts_del_trg AFTER DELETE ON tasks FOR EACH ROW
+    UPDATE task_counts SET tm_count = tm_count - 1 WHERE tm_username = OLD.tm_username AND tm_task_status = OLD.tm_task_status;
+DELIMITER //
+CREATE TRIGGER task_counts_upd_trg AFTER UPDATE ON tasks FOR EACH ROW
+BEGIN
+    IF NEW.tm_username <> OLD.tm_username OR NEW.tm_task_status <> OLD.tm_task_status THEN
+        UPDATE task_counts SET tm_count = tm_count - 1
+            WHERE tm_username = OLD.tm_username AND tm_task_status = OLD.tm_task_status;
+        INSERT INTO task_counts (tm_username, tm_task_status, tm_count) VALUES (NEW.tm_username, NEW.tm_task_status, 1)
+            ON DUPLICATE KEY UPDATE tm_count = tm_count + 1;
+    END IF;
+END//
+DELIMITER ;
+LOCK TABLES tasks READ, task_counts WRITE;
+DELETE FROM task_counts;
+INSERT INTO task_counts (tm_username, tm_task_status, tm_count)
+    SELECT tm_username, tm_task_status, count(*) FROM tasks GROUP BY tm_username, tm_task_status;
+UNLOCK TABLES;
+CREATE INDEX tasks_user_status_idx ON tasks(tm_username, tm_task_status, tm_taskname);
+CREATE INDEX tasks_status_start_idx ON tasks(tm_task_status, tm_start_time);
+CREATE INDEX tasks_start_status_idx ON tasks(tm_start_time, tm_task_status);
+
+--Index of the files of some types and jobs of a task
+CREATE INDEX filemetadata_type_job_idx ON filemetadata(tm_taskname, fmd_type, panda_job_id);
+
+--Index of the deletion of the old files in batches
+CREATE INDEX filemetadata_creation_time_idx ON filemetadata(fmd_creation_time);
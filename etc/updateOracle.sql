@@ -59,3 +59,59 @@ alter table tasks add (tm_publish_groupname VARCHAR(1) DEFAULT 'F');
 alter table tasks add constraint check_tm_publish_groupname check (tm_publish_groupname IN ('T', 'F')) ENABLE;
 alter table tasks add (tm_nonvalid_input_dataset VARCHAR(1) DEFAULT 'T');
 alter table tasks add constraint ck_tm_nonvalid_input_dataset check (tm_nonvalid_input_dataset IN ('T', 'F')) ENABLE;
+
+--Warnings of the tasks, one row per warning
+CREATE TABLE task_warnings(tm_warning_id NUMBER(38) NOT NULL, tm_taskname VARCHAR(255) NOT NULL, tm_warning CLOB NOT NULL,
+    CONSTRAINT warning_taskname_fk FOREIGN KEY(tm_taskname) references tasks(tm_taskname) ON DELETE CASCADE,
+    CONSTRAINT warning_id_pk PRIMARY KEY(tm_warning_id));
+CREATE INDEX task_warnings_taskname_idx ON task_warnings(tm_taskname);
+CREATE SEQUENCE task_warnings_id_seq START WITH 1 INCREMENT BY 1 NOMAXVALUE;
+CREATE TRIGGER task_warnings_id_trg BEFORE INSERT ON task_warnings FOR EACH ROW
+BEGIN
+SELECT task_warnings_id_seq.nextval INTO :new.tm_warning_id FROM dual;
+END;
+/
+
+--Number of tasks per user and status, and indexes of the summary and search APIs.
+--The trigger is created before the table is filled, and the tasks are locked while it is filled,
+--so that no change of the tasks is lost or counted twice.
+CREATE TABLE task_counts(tm_username VARCHAR(255) NOT NULL, tm_task_status VARCHAR(255) NOT NULL, tm_count NUMBER(38) NOT NULL,
+    CONSTRAINT task_counts_pk PRIMARY KEY(tm_username, tm_task_status));
+CREATE TRIGGER task_counts_trg AFTER INSERT OR DELETE OR UPDATE OF tm_username, tm_task_status ON tasks FOR EACH ROW
+BEGIN
+IF UPDATING AND :new.tm_username = :old.tm_username AND :new.tm_task_status = :old.tm_task_status THEN
+    RETURN;
+END IF;
+IF INSERTING OR UPDATING THEN
+    UPDATE task_counts SET tm_count = tm_count + 1
+        WHERE tm_username = :new.tm_username AND tm_task_status = :new.tm_task_status;
+    IF SQL%ROWCOUNT = 0 THEN
+        BEGIN
+            INSERT INTO task_counts (tm_username, tm_task_status, tm_count)
+                VALUES (:new.tm_username, :new.tm_task_status, 1);
+        EXCEPTION WHEN DUP_VAL_ON_INDEX THEN
+            UPDATE task_counts SET tm_count = tm_count + 1
+                WHERE tm_username = :new.tm_username AND tm_task_status = :new.tm_task_status;
+        END;
+    END IF;
+END IF;
+IF DELETING OR UPDATING THEN
+    UPDATE task_counts SET tm_count = tm_count - 1
+        WHERE tm_username = :old.tm_username AND tm_task_status = :old.tm_task_status;
+END IF;
+END;
+/
+LOCK TABLE tasks IN EXCLUSIVE MODE;
+DELETE FROM task_counts;
+INSERT INTO task_counts (tm_username, tm_task_status, tm_count)
+    SELECT tm_username, tm_task_status, count(*) FROM tasks GROUP BY tm_username, tm_task_status;
+COMMIT;
+CREATE INDEX tasks_user_status_idx ON tasks(tm_username, tm_task_status, tm_taskname);
+CREATE INDEX tasks_status_start_idx ON tasks(tm_task_status, tm_start_time);
+CREATE INDEX tasks_start_status_idx ON tasks(tm_start_time, tm_task_status);
+
+--Index of the files of some types and jobs of a task
+CREATE INDEX filemetadata_type_job_idx ON filemetadata(tm_taskname, fmd_type, panda_job_id);
+
+--Index of the deletion of the old files in batches
+CREATE INDEX filemetadata_creation_time_idx ON filemetadata(fmd_creation_time);
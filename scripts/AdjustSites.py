@@ -3,6 +3,7 @@ import re
 import sys
 import time
 import shutil
+import tempfile
 import traceback
 import glob
 import classad
@@ -47,77 +48,53 @@ def adjustPostScriptExitStatus(resubmitJobIds):
     if not resubmitJobIds:
         return []
     resubmitAllFailed = (resubmitJobIds == True)
+    if not resubmitAllFailed:
+        resubmitJobIds = set(resubmitJobIds)
     terminator_re = re.compile(r"^\.\.\.$")
     event_re = re.compile(r"016 \(-?\d+\.\d+\.\d+\) \d+/\d+ \d+:\d+:\d+ POST Script terminated.")
     if resubmitAllFailed:
-        retvalue_re = re.compile(r"Normal termination \(return value 2\)")
+        retvalue_re = re.compile(r"Normal termination \(return value (2)\)")
     else:
-        retvalue_re = re.compile(r"Normal termination \(return value [0|2]\)")
+        retvalue_re = re.compile(r"Normal termination \(return value ([0|2])\)")
     node_re = re.compile(r"DAG Node: Job(\d+)")
-    ra_buffer = []
-    alt = None
-    output = ''
+    ## The file is read only once, line by line, keeping track of the byte offset
+    ## of the return value of each POST script event that has to be adjusted.
+    ## Since '0' and '2' have to be replaced by '1', the file can then be patched
+    ## in place one byte at a time. We can not write a new file and rename it,
+    ## because the running shadows keep their event log file descriptors open;
+    ## patching in place also never needs more disk space, so running out of
+    ## quota can not leave a half-written file behind.
     adjustedJobIds = []
-    for line in open("RunJobs.dag.nodes.log").readlines():
-        if len(ra_buffer) == 0:
-            m = terminator_re.search(line)
-            if m:
-                ra_buffer.append(line)
+    patchOffsets = []
+    matched = 0 # number of lines of the current POST script event matched so far
+    retvalueOffset = None
+    offset = 0
+    with open("RunJobs.dag.nodes.log", 'rb') as fd:
+        for line in fd:
+            if matched == 0:
+                if terminator_re.search(line):
+                    matched = 1
+            elif matched == 1:
+                matched = 2 if event_re.search(line) else 0
+            elif matched == 2:
+                m = retvalue_re.search(line)
+                if m:
+                    retvalueOffset = offset + m.start(1)
+                    matched = 3
+                else:
+                    matched = 0
             else:
-                output += line
-        elif len(ra_buffer) == 1:
-            m = event_re.search(line)
-            if m:
-                ra_buffer.append(line)
-            else:
-                for l in ra_buffer:
-                    output += l
-                output += line
-                ra_buffer = []
-        elif len(ra_buffer) == 2:
-            m = retvalue_re.search(line)
-            if m:
-                ra_buffer.append("        (1) Normal termination (return value 1)\n")
-                alt = line
-            else:
-                for l in ra_buffer:
-                    output += l
-                output += line
-                ra_buffer = []
-        elif len(ra_buffer) == 3:
-            m = node_re.search(line)
-            print line, m, m.groups(), resubmitJobIds
-            if m and (resubmitAllFailed or (m.groups()[0] in resubmitJobIds)):
-                print m.groups()[0], resubmitJobIds
-                adjustedJobIds.append(m.groups()[0])
-                for l in ra_buffer:
-                    output += l
-            else:
-                for l in ra_buffer[:-1]:
-                    output += l
-                output += alt
-            output += line
-            ra_buffer = []
-        else:
-            output += line
-    if ra_buffer:
-        for l in ra_buffer:
-            output += l
-    # This is a curious dance!  If the user is out of quota, we don't want
-    # to fail halfway into writing the file.  OTOH, we can't write into a temp
-    # file and an atomic rename because the running shadows keep their event log
-    # file descriptors open.  Accordingly, we write the file once (to see if we)
-    # have enough quota space, then rewrite "the real file" after deleting the
-    # temporary one.  There's a huge race condition here, but it seems to be the
-    # best we can do given the constraints.  Note that we don't race with the
-    # shadow as we have a write lock on the file itself.
-    output_fd = open("RunJobs.dag.nodes.log.tmp", "w")
-    output_fd.write(output)
-    output_fd.close()
-    os.unlink("RunJobs.dag.nodes.log.tmp")
-    output_fd = open("RunJobs.dag.nodes.log", "w")
-    output_fd.write(output)
-    output_fd.close()
+                m = node_re.search(line)
+                if m and (resubmitAllFailed or (m.groups()[0] in resubmitJobIds)):
+                    adjustedJobIds.append(m.groups()[0])
+                    patchOffsets.append(retvalueOffset)
+                matched = 0
+            offset += len(line)
+    if patchOffsets:
+        with open("RunJobs.dag.nodes.log", 'r+b') as fd:
+            for patchOffset in patchOffsets:
+                fd.seek(patchOffset)
+                fd.write('1')
     return adjustedJobIds
 
 
@@ -148,29 +125,39 @@ def adjustMaxRetries(adjustJobIds, ad):
     ## resubmitJobIds argument and change the maximum retries to the current retry
     ## count + CRAB_NumAutomJobRetries.
     retry_re = re.compile(r'RETRY Job([0-9]+) ([0-9]+) ')
-    output = ""
     adjustAll = (adjustJobIds == True)
+    if not adjustAll:
+        adjustJobIds = set(adjustJobIds)
     numAutomJobRetries = int(ad.get('CRAB_NumAutomJobRetries', 2))
-    with open("RunJobs.dag", 'r') as fd:
-        for line in fd.readlines():
-            match_retry_re = retry_re.search(line)
-            if match_retry_re:
-                jobId = match_retry_re.groups()[0]
-                if adjustAll or (jobId in adjustJobIds):
-                    if jobId in retriesDict and retriesDict[jobId] != -1:
-                        lastRetry = retriesDict[jobId]
-                        ## The 1 is to account for the resubmission itself; then, if the job fails, we
-                        ## allow up to numAutomJobRetries automatic retries from DAGMan.
-                        maxRetries = lastRetry + (1 + numAutomJobRetries)
-                    else:
-                        try:
-                            maxRetries = int(match_retry_re.groups()[1]) + (1 + numAutomJobRetries)
-                        except ValueError:
-                            maxRetries = numAutomJobRetries
-                    line = retry_re.sub(r'RETRY Job%s %d ' % (jobId, maxRetries), line)
-            output += line
-    with open("RunJobs.dag", 'w') as fd:
-        fd.write(output)
+    ## Stream the DAG file line by line into a temporary file in the same directory
+    ## and atomically replace the original one (DAGMan is not running at this point).
+    tmpfd, tmpname = tempfile.mkstemp(prefix="RunJobs.dag.", dir=".")
+    try:
+        with os.fdopen(tmpfd, 'w') as output:
+            with open("RunJobs.dag", 'r') as fd:
+                for line in fd:
+                    match_retry_re = retry_re.search(line)
+                    if match_retry_re:
+                        jobId = match_retry_re.groups()[0]
+                        if adjustAll or (jobId in adjustJobIds):
+                            if jobId in retriesDict and retriesDict[jobId] != -1:
+                                lastRetry = retriesDict[jobId]
+                                ## The 1 is to account for the resubmission itself; then, if the job fails, we
+                                ## allow up to numAutomJobRetries automatic retries from DAGMan.
+                                maxRetries = lastRetry + (1 + numAutomJobRetries)
+                            else:
+                                try:
+                                    maxRetries = int(match_retry_re.groups()[1]) + (1 + numAutomJobRetries)
+                                except ValueError:
+                                    maxRetries = numAutomJobRetries
+                            line = retry_re.sub(r'RETRY Job%s %d ' % (jobId, maxRetries), line)
+                    output.write(line)
+        shutil.copymode("RunJobs.dag", tmpname)
+        os.rename(tmpname, "RunJobs.dag")
+    except Exception:
+        if os.path.exists(tmpname):
+            os.unlink(tmpname)
+        raise
 
 
 def makeWebDir(ad):
@@ -22,7 +22,7 @@ from ast import literal_eval
 from optparse import OptionParser, BadOptionError, AmbiguousOptionError
 
 import DashboardAPI
-from ServerUtilities import setDashboardLogs
+from ServerUtilities import setDashboardLogs, calculateChecksums
 import WMCore.Storage.SiteLocalConfig as SiteLocalConfig
 
 logCMSSWSaved = False
@@ -689,6 +689,7 @@ def AddChecksums(report):
     if 'output' not in report['steps']['cmsRun']:
         return
 
+    fileInfos = []
     for outputMod in report['steps']['cmsRun']['output'].values():
         for fileInfo in outputMod:
             if 'checksums' in fileInfo:
@@ -698,12 +699,20 @@ def AddChecksums(report):
                     fileInfo['pfn'] = fileInfo['fileName']
                 else:
                     continue
-            print "==== Checksum STARTING at %s ====" % time.asctime(time.gmtime())
-            print "== Filename: %s" % fileInfo['pfn']
-            (adler32, cksum) = calculateChecksums(fileInfo['pfn'])
-            print "==== Checksum FINISHING at %s ====" % time.asctime(time.gmtime())
-            fileInfo['checksums'] = {'adler32': adler32, 'cksum': cksum}
-            fileInfo['size'] = os.stat(fileInfo['pfn']).st_size
+            fileInfos.append(fileInfo)
+    if not fileInfos:
+        return
+
+    ## All the output files are checksummed concurrently, each of them read only once.
+    print "==== Checksum STARTING at %s ====" % time.asctime(time.gmtime())
+    for fileInfo in fileInfos:
+        print "== Filename: %s" % fileInfo['pfn']
+    checksums = calculateChecksums([fileInfo['pfn'] for fileInfo in fileInfos])
+    print "==== Checksum FINISHING at %s ====" % time.asctime(time.gmtime())
+    for fileInfo in fileInfos:
+        adler32, cksum, size = checksums[fileInfo['pfn']]
+        fileInfo['checksums'] = {'adler32': adler32, 'cksum': cksum}
+        fileInfo['size'] = size
 
 
 def AddPsetHash(report, scram):
@@ -822,7 +831,6 @@ if __name__ == "__main__":
         from WMCore.FwkJobReport.Report import Report
         from WMCore.FwkJobReport.Report import FwkJobReportException
         from WMCore.WMSpec.Steps.WMExecutionFailure import WMExecutionFailure
-        from WMCore.Algorithms.BasicAlgos import calculateChecksums
         from WMCore.WMSpec.Steps.Executors.CMSSW import CMSSW
         from WMCore.Configuration import Configuration
         from WMCore.WMSpec.WMStep import WMStep
@@ -1,19 +1,30 @@
 #!/usr/bin/python
 
 import re
+import time
 import pprint
 import optparse
+import threading
 
 import classad
 import htcondor
 
+JOB_ATTRS = ['CRAB_UserHN', 'AccountingGroup', 'JobPrio', 'BLTaskID', 'CRAB_ReqName', 'DESIRED_SEs', 'DESIRED_SITES', 'JobStatus', 'MATCH_GLIDEIN_CMSSite']
+
 class PoolStatus(object):
 
-    def __init__(self, pool):
+    def __init__(self, pool, timeout=60, job_attrs=JOB_ATTRS):
         self.pool = pool
         self.se_to_site = {}
         self.coll = htcondor.Collector(pool)
         self.neg_ad = None
+        ## Maximum time to wait for the schedds to answer, in seconds, and the
+        ## attributes the schedds are asked to return for each job.
+        self.timeout = timeout
+        self.job_attrs = job_attrs
+        ## Names of the schedds which failed or did not answer within the timeout.
+        self.failed_schedds = []
+        self.timedout_schedds = []
 
 
     split_re = re.compile(r",\s*")
@@ -56,13 +67,11 @@ class PoolStatus(object):
             cur = site_info.setdefault("IdleGlideins", 0)
             site_info["IdleGlideins"] = cur + int(idle)
 
-    def get_jobs(self, schedd_ad):
+    def query_schedd(self, schedd_ad):
         schedd = htcondor.Schedd(schedd_ad)
-        try:
-            jobs = schedd.query('true', ['CRAB_UserHN', 'AccountingGroup', 'JobPrio', 'BLTaskID', 'CRAB_ReqName', 'DESIRED_SEs', 'DESIRED_SITES', 'JobStatus', 'MATCH_GLIDEIN_CMSSite'])
-        except IOError:
-            print "Unable to retrieve tasks from schedd %s" % schedd_ad['Name']
-            return
+        return schedd.query('true', self.job_attrs)
+
+    def get_jobs(self, jobs):
         for job in jobs:
             if 'CRAB_ReqName' in job:
                 task_name = job['CRAB_ReqName']
@@ -96,6 +105,42 @@ class PoolStatus(object):
                 elif job['JobStatus'] == 2 and job.get('MATCH_GLIDEIN_CMSSite', None) == site:
                     task_info['RunningJobs'] += 1
 
+
+    def get_all_jobs(self):
+        """
+        Query all the schedds of the pool at the same time, one thread each, and
+        merge the jobs of the schedds that answer within self.timeout seconds.
+        Schedds that fail or are too slow are recorded in self.failed_schedds and
+        self.timedout_schedds, and the result only contains the other ones.
+        """
+        schedds = self.coll.locateAll(htcondor.DaemonTypes.Schedd)
+        results = {}
+        failures = {}
+        def query(schedd_ad):
+            try:
+                results[schedd_ad['Name']] = list(self.query_schedd(schedd_ad))
+            except Exception as ex:
+                failures[schedd_ad['Name']] = ex
+        threads = []
+        for schedd_ad in schedds:
+            ## Daemon threads: a schedd that never answers must not prevent us from exiting.
+            thread = threading.Thread(target=query, args=(schedd_ad,))
+            thread.setDaemon(True)
+            thread.start()
+            threads.append((schedd_ad['Name'], thread))
+        deadline = time.time() + self.timeout
+        for name, thread in threads:
+            thread.join(max(0, deadline - time.time()))
+            if thread.isAlive():
+                self.timedout_schedds.append(name)
+            elif name in failures:
+                print "Unable to retrieve tasks from schedd %s: %s" % (name, str(failures[name]))
+                self.failed_schedds.append(name)
+            else:
+                self.get_jobs(results[name])
+        if self.timedout_schedds:
+            print "Schedds %s did not answer within %d seconds" % (", ".join(self.timedout_schedds), self.timeout)
+
         for site, site_info in self.pool_status.items():
             for grp, grp_info in site_info.items():
                 if grp == "IdleGlideins": continue
@@ -104,14 +149,11 @@ class PoolStatus(object):
                         del grp_info["tasks"][task]
                 if not grp_info.get("tasks", {}) and not grp_info.get("Resources", 0):
                     del site_info[grp]
+        return results
 
 
-    def get_all_jobs(self):
-        schedds = self.coll.locateAll(htcondor.DaemonTypes.Schedd)
-        results = {}
-        for schedd_ad in schedds:
-            self.get_jobs(schedd_ad)
-        return results
+    def is_partial(self):
+        return bool(self.failed_schedds or self.timedout_schedds)
 
 
     def execute(self):
@@ -127,10 +169,13 @@ class PoolStatus(object):
 if __name__ == '__main__':
     parser = optparse.OptionParser()
     parser.add_option("-p", "--pool", dest="pool", help="Location of the HTCondor pool")
+    parser.add_option("-t", "--timeout", dest="timeout", type="int", default=60, help="Seconds to wait for the schedds to answer")
     opts, args = parser.parse_args()
 
-    p = PoolStatus(opts.pool)
+    p = PoolStatus(opts.pool, opts.timeout)
     p.execute()
 
+    if p.is_partial():
+        print "Partial result, missing schedds: %s" % ", ".join(p.failed_schedds + p.timedout_schedds)
     pprint.pprint(p.pool_status)
 
@@ -1,14 +1,26 @@
 
-from DashboardAPI import apmonSend, apmonFree
+from DashboardAPI import apmonSend, apmonFree, apmonEnableBatchSend
+
+# Seconds waited at exit for the params still queued in batch mode
+BATCH_FLUSH_TIMEOUT = 10
     
 class ApmonIf:
     """
     Provides an interface to the Monalisa Apmon python module
     """
-    def __init__(self, taskid=None, jobid=None) :
+    def __init__(self, taskid=None, jobid=None, batch=False, batchSize=10000) :
         self.taskId = taskid
         self.jobId = jobid
         self.fName = 'mlCommonInfo'
+        # With batch=True sendToML does not wait for the network: the params are
+        # queued, with room for batchSize more params, and sent from a background
+        # thread shared by the process. Each job is a different node, so each one
+        # still takes a datagram, sent at the ApMon maximum rate (100 per second):
+        # free() does not wait for them, the thread keeps sending after the action
+        # and is freed at exit, waiting at most BATCH_FLUSH_TIMEOUT seconds.
+        self.batch = batch
+        if batch :
+            apmonEnableBatchSend(queueSize=batchSize, flushTimeout=BATCH_FLUSH_TIMEOUT)
 
     #def fillDict(self, parr):
     #    """
@@ -38,5 +50,6 @@ class ApmonIf:
         apmonSend(taskId, jobId, params)
             
     def free(self):
-        apmonFree()
+        if not self.batch :
+            apmonFree()
 
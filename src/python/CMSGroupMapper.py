@@ -1,18 +1,106 @@
 
 import os
 import re
+import mmap
+import stat
 import time
+import errno
+import fcntl
+import atexit
+import shutil
+import tempfile
+
+base_dir = '/cvmfs/cms.cern.ch/SITECONF'
+
+## The user -> groups map is kept in an index file shared by all the processes
+## of the same user on this host, so that the short lived processes (one PreJob
+## per job) do not have to scan the SITECONF directories each time. The index
+## has one "user group1,group2" line per user, sorted by user, and is replaced
+## atomically by the (single) process which rebuilds it when it is stale.
+## The default path is predictable, so another user may have created the index
+## or its lock first: they are used only if they belong to this user and nobody
+## else can write them, otherwise a private index is used (see use_private_index).
+index_file = os.environ.get('CMS_GROUP_MAPPER_INDEX',
+                            os.path.join(tempfile.gettempdir(), 'cms-group-mapper.%d.idx' % os.getuid()))
+## The directory of the private index, reused by all the processes of this user
+## which can not trust the shared index.
+private_index_dir = os.path.join(tempfile.gettempdir(), 'cms-group-mapper.%d' % os.getuid())
+index_lifetime = 15*60
 
 g_cache = {}
 g_expire_time = 0
+g_index = None
+g_index_id = None
 
-def cache_users():
-    global g_expire_time
-    global g_cache
 
-    base_dir = '/cvmfs/cms.cern.ch/SITECONF'
+class UntrustedIndex(Exception):
+    """
+    The index or its lock is not a regular file of this user that only this user can write.
+    """
+    pass
+
+
+def open_private(path, flags):
+    """
+    Open the index or its lock without following symbolic links and check that it
+    belongs to this user and that nobody else can write it. Files of this user with
+    a looser mode (e.g. the 0644 of previous versions) are restricted to 0600.
+    Return the file descriptor.
+    """
+    try:
+        fd = os.open(path, flags | os.O_NOFOLLOW, 0600)
+    except OSError as ex:
+        if ex.errno == errno.ELOOP:
+            raise UntrustedIndex("%s is a symbolic link" % path)
+        raise
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise UntrustedIndex("%s is not a private file of uid %d" % (path, os.getuid()))
+        if stat.S_IMODE(st.st_mode) != 0600:
+            os.fchmod(fd, 0600)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+def use_private_index():
+    """
+    Move the index to a directory only this user can access; it is not shared
+    with the processes using the default index, but it can not be tampered with.
+    The directory is the same for all the processes of this user, unless its
+    path is taken by something else: then a new directory is used and removed
+    at the exit of this process.
+    """
+    global index_file
+    global g_index_id
+
+    index_dir = None
+    try:
+        try:
+            os.mkdir(private_index_dir, 0700)
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+        st = os.lstat(private_index_dir)
+        if stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            index_dir = private_index_dir
+    except OSError:
+        pass
+    if index_dir is None:
+        index_dir = tempfile.mkdtemp(prefix='cms-group-mapper.')
+        atexit.register(shutil.rmtree, index_dir, True)
+    index_file = os.path.join(index_dir, 'index')
+    g_index_id = None
+
+def scan_sites():
+    """
+    Read the local-users.txt of all the sites; return a dictionary
+    {user: "group1,group2"} or None if SITECONF is not available.
+    """
     cache = {}
-    user_re = re.compile(r'[-_A-Za-z0-9.]+')
+    user_re = re.compile(r'[-_A-Za-z0-9.]+$')
     sites = None
     try:
         if os.path.isdir(base_dir):
@@ -20,35 +108,158 @@ def cache_users():
     except:
         pass
     if not sites:
-        g_expire_time = time.time() + 60
-        return
+        return None
     for entry in sites:
         full_path = os.path.join(base_dir, entry, 'GlideinConfig', 'local-users.txt')
         if (entry == 'local') or (not os.path.isfile(full_path)):
-        #if not os.path.isfile(full_path):
             continue
+        fd = open(full_path)
         try:
-            fd = open(full_path)
             for line in fd:
                 line = line.strip()
                 if user_re.match(line):
                     group_set = cache.setdefault(line, set())
                     group_set.add(entry)
-        except:
-            raise
-            pass
+        finally:
+            fd.close()
     for key, val in cache.items():
-        cache[key] = ",".join(val)
+        cache[key] = ",".join(sorted(val))
+    return cache
+
+
+def cache_users():
+    """
+    Fill the in-memory cache of this process; used when the index file can not be used.
+    """
+    global g_expire_time
+    global g_cache
 
+    cache = scan_sites()
+    if cache is None:
+        g_expire_time = time.time() + 60
+        return
     g_cache = cache
     g_expire_time = time.time() + 15*60
 
 
+def write_index(cache):
+    """
+    Write the sorted index to a temporary file and rename it over the old one,
+    so that the readers see either the old or the new index.
+    """
+    index_dir = os.path.dirname(index_file) or '.'
+    fd, tmp_name = tempfile.mkstemp(prefix=os.path.basename(index_file) + '.', dir=index_dir)
+    try:
+        os.fchmod(fd, 0600)
+        fh = os.fdopen(fd, 'w')
+        for user in sorted(cache):
+            fh.write("%s %s\n" % (user, cache[user]))
+        fh.close()
+        os.rename(tmp_name, index_file)
+    except:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def index_is_fresh():
+    try:
+        return time.time() - os.stat(index_file).st_mtime < index_lifetime
+    except OSError:
+        return False
+
+
+def rebuild_index():
+    """
+    Rebuild the index if it is stale. Only the process holding the lock rebuilds it;
+    the others keep using the stale index meanwhile or, if there is none yet, wait
+    for the rebuild to finish. Return False if there is no index to read.
+    """
+    lock_fd = open_private(index_file + '.lock', os.O_RDWR | os.O_CREAT)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            if os.path.exists(index_file):
+                return True
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        ## Another process may have rebuilt the index while we were checking.
+        if not index_is_fresh():
+            ## A stale index of somebody else can not be replaced.
+            if os.path.lexists(index_file):
+                os.close(open_private(index_file, os.O_RDONLY))
+            cache = scan_sites()
+            if cache is None:
+                return os.path.exists(index_file)
+            write_index(cache)
+        return True
+    finally:
+        os.close(lock_fd)
+
+
+def open_index():
+    """
+    Map the current index in memory, unless it is already mapped.
+    """
+    global g_index
+    global g_index_id
+
+    fd = open_private(index_file, os.O_RDONLY)
+    try:
+        st = os.fstat(fd)
+        if g_index_id == (st.st_ino, st.st_mtime):
+            return
+        if st.st_size:
+            g_index = mmap.mmap(fd, st.st_size, access=mmap.ACCESS_READ)
+        else:
+            g_index = ''
+    finally:
+        os.close(fd)
+    g_index_id = (st.st_ino, st.st_mtime)
+
+
+def lookup_index(user):
+    """
+    Binary search of the user line in the mapped index.
+    """
+    index = g_index
+    lo, hi = 0, len(index)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = index.rfind('\n', 0, mid) + 1
+        end = index.find('\n', start)
+        key = index[start:index.find(' ', start, end)]
+        if key < user:
+            lo = end + 1
+        else:
+            hi = start
+    end = index.find('\n', lo)
+    if end < 0:
+        return ""
+    key, groups = index[lo:end].split(' ', 1)
+    if key == user:
+        return groups
+    return ""
+
+
 def map_user_to_groups(user):
+    global g_expire_time
+
+    ## Fall back to the in-memory cache if the index can not be used.
+    if g_expire_time == 0:
+        for dummyAttempt in range(2):
+            try:
+                if index_is_fresh() or rebuild_index():
+                    open_index()
+                    return lookup_index(user)
+                break
+            except UntrustedIndex:
+                use_private_index()
+            except (IOError, OSError):
+                break
     if time.time() > g_expire_time:
         cache_users()
     return g_cache.setdefault(user, "")
 
 if __name__ == '__main__':
    print map_user_to_groups("bbockelm")
-
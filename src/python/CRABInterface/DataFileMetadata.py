@@ -21,8 +21,8 @@ class DataFileMetadata(object):
 
     def getFiles(self, taskname, filetype):
         self.logger.debug("Calling jobmetadata for task %s and filetype %s" % (taskname, filetype))
-        binds = {'taskname': taskname, 'filetype': filetype}
-        rows = self.api.query(None, None, self.FileMetaData.GetFromTaskAndType_sql, **binds)
+        sql, binds = self.FileMetaData.getFromTaskAndType(taskname, filetype.split(','))
+        rows = self.api.query(None, None, sql, **binds)
         for row in rows:
             yield {'taskname': taskname,
                    'filetype': filetype,
@@ -82,10 +82,19 @@ class DataFileMetadata(object):
 
         self.api.modify(self.FileMetaData.ChangeFileState_sql, **dict((k, [v]) for k,v in kwargs.iteritems()))
 
-    def delete(self, taskname, hours):
+    def delete(self, taskname, hours, limit=None):
+        """Deletes the files of a task, or the files older than a number of hours.
+
+           :arg str taskname: the task of the files to delete;
+           :arg str hours: the age of the files to delete;
+           :arg int limit: if not None, delete at most limit files older than hours, in their own transaction;
+           :return: the number of files deleted, if limit is not None."""
         if taskname:
             self.logger.debug("Deleting all the files associated to task: %s" % taskname)
             self.api.modifynocheck(self.FileMetaData.DeleteTaskFiles_sql, taskname=[taskname])
         if hours:
+            if limit:
+                self.logger.debug("Deleting at most %s files older than %s hours" % (limit, hours))
+                return self.api.modifynocheck(self.FileMetaData.DeleteFilesByTimeBatch_sql, hours=[hours], limit=[limit])
             self.logger.debug("Deleting all the files older than %s hours" % hours)
             self.api.modifynocheck(self.FileMetaData.DeleteFilesByTime_sql, hours=[hours])
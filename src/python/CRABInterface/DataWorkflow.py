@@ -4,13 +4,14 @@ import random
 import logging
 import cherrypy
 from datetime import datetime
-from ast import literal_eval
+from itertools import islice
 
 ## WMCore dependecies
 from WMCore.REST.Error import ExecutionError
 
 ## CRAB dependencies
-from CRABInterface.Utils import CMSSitesCache, conn_handler, getDBinstance
+from CRABInterface.Utils import CMSSitesCache, conn_handler, getDBinstance, dbSerializer, dbDeserializer
+from Databases.FileMetaDataDB.Oracle.FileMetaData.FileMetaData import GetFromTaskAndType
 
 
 class DataWorkflow(object):
@@ -67,6 +68,26 @@ class DataWorkflow(object):
         #raise NotImplementedError
         return self.api.query(None, None, self.Task.GetTasksFromUser_sql, username=username, timestamp=timestamp)
 
+    def filesOfJobs(self, workflow, filetypes, jobids, limit=None):
+        """Retrieves from the filemetadata the files of some types produced by some jobs, the latest first.
+
+           The jobs and the limit are selected by the query, unless there are more jobs than
+           the values accepted in a query: then all the files of these types are read and
+           filtered here.
+
+           :arg str workflow: a workflow name
+           :arg list filetypes: the file types
+           :arg list jobids: the job ids
+           :arg int limit: the maximum number of files, or None for all of them
+           :return: an iterable of the rows of the files, with the columns of GetFromTaskAndType"""
+        if len(jobids) <= self.FileMetaData.MAX_BIND_LIST:
+            sql, binds = self.FileMetaData.getFromTaskAndType(workflow, filetypes, jobids, limit)
+            return self.api.query(None, None, sql, **binds)
+        sql, binds = self.FileMetaData.getFromTaskAndType(workflow, filetypes)
+        jobids = set(jobids)
+        rows = (row for row in self.api.query(None, None, sql, **binds) if row[GetFromTaskAndType.PANDAID] in jobids)
+        return islice(rows, limit)
+
     def errors(self, workflow, shortformat):
         """Retrieves the sets of errors for a specific workflow
 
@@ -184,7 +205,6 @@ class DataWorkflow(object):
             raise ExecutionError("Failed to communicate with crabserver components. If problem persist, please report it.")
         splitArgName = self.splitArgMap[splitalgo]
         username = cherrypy.request.user['login']
-        dbSerializer = str
 
         ## If these parameters were not set in the submission request, give them
         ## predefined default values.
@@ -323,9 +343,9 @@ class DataWorkflow(object):
             ## origValues = [orig_siteblacklist, orig_sitewhitelist, orig_maxjobruntime, orig_maxmemory, orig_numcores, orig_priority]
             origValues = self.api.query(None, None, self.Task.GetResubmitParams_sql, taskname = workflow).next()
             if siteblacklist is None:
-                siteblacklist = literal_eval(origValues[0])
+                siteblacklist = dbDeserializer(origValues[0])
             if sitewhitelist is None:
-                sitewhitelist = literal_eval(origValues[1])
+                sitewhitelist = dbDeserializer(origValues[1])
             if maxjobruntime is None:
                 maxjobruntime = origValues[2]
             if maxmemory is None:
@@ -347,7 +367,7 @@ class DataWorkflow(object):
                     }
         ## Change the 'tm_arguments' column of the Tasks DB for this task to contain the
         ## above parameters.
-        self.api.modify(self.Task.SetArgumentsTask_sql, taskname = [workflow], arguments = [str(arguments)])
+        self.api.modify(self.Task.SetArgumentsTask_sql, taskname = [workflow], arguments = [dbSerializer(arguments)])
         ## Change the status of the task in the Tasks DB to RESUBMIT.
         self.api.modify(self.Task.SetStatusTask_sql, status = ["RESUBMIT"], taskname = [workflow])
         return [{'result': retmsg}]
@@ -391,8 +411,6 @@ class DataWorkflow(object):
         statusRes = self.status(workflow, userdn, userproxy)[0]
 
         args = {'ASOURL' : statusRes.get("ASOURL", "")}
-        # Hm...
-        dbSerializer = str
 
         if statusRes['status'] in ['SUBMITTED', 'KILLFAILED', 'FAILED']:
             killList = [jobid for jobstatus, jobid in statusRes['jobList'] if jobstatus not in self.successList]
@@ -19,7 +19,7 @@ from WMCore.Services.DBS.DBSReader import DBSReader
 from CRABInterface.DataWorkflow import DataWorkflow
 from WMCore.Services.pycurl_manager import ResponseHeader
 from WMCore.REST.Error import ExecutionError, InvalidParameter
-from CRABInterface.Utils import conn_handler, global_user_throttle
+from CRABInterface.Utils import conn_handler, global_user_throttle, dbDeserializer
 from Databases.FileMetaDataDB.Oracle.FileMetaData.FileMetaData import GetFromTaskAndType
 
 import HTCondorUtils
@@ -60,6 +60,7 @@ class HTCondorDataWorkflow(DataWorkflow):
         return results
 
 
+    @global_user_throttle.make_rate_limited(cost='expensive')
     def logs(self, workflow, howmany, exitcode, jobids, userdn, userproxy=None):
         self.logger.info("About to get log of workflow: %s. Getting status first." % workflow)
 
@@ -75,6 +76,7 @@ class HTCondorDataWorkflow(DataWorkflow):
                              row.user_dn, row.username, row.user_role, row.user_group, userproxy)
 
 
+    @global_user_throttle.make_rate_limited(cost='expensive')
     def output(self, workflow, howmany, jobids, userdn, userproxy=None):
         self.logger.info("About to get output of workflow: %s. Getting status first." % workflow)
 
@@ -118,11 +120,7 @@ class HTCondorDataWorkflow(DataWorkflow):
             return
 
         self.logger.debug("Retrieving the %s files of the following jobs: %s" % (file_type, jobids))
-        rows = self.api.query(None, None, self.FileMetaData.GetFromTaskAndType_sql, filetype = ','.join(filetype), taskname = workflow)
-        rows = filter(lambda row: row[GetFromTaskAndType.PANDAID] in jobids, rows)
-        if howmany != -1:
-            rows = rows[:howmany]
-        #jobids=','.join(map(str,jobids)), limit=str(howmany) if howmany!=-1 else str(len(jobids)*100))
+        rows = self.filesOfJobs(workflow, filetype, jobids, howmany if howmany != -1 else None)
         for row in rows:
             try:
                 jobid = row[GetFromTaskAndType.PANDAID]
@@ -156,6 +154,7 @@ class HTCondorDataWorkflow(DataWorkflow):
                   }
 
 
+    @global_user_throttle.make_rate_limited(cost='expensive')
     def report(self, workflow, userdn, usedbs):
         """
         Computes the report for workflow. If usedbs is used also query DBS and return information about the input and output datasets
@@ -183,25 +182,24 @@ class HTCondorDataWorkflow(DataWorkflow):
         dbsUrl = row.dbs_url
 
         #load the lumimask
-        splitArgs = literal_eval(row.split_args.read())
+        splitArgs = dbDeserializer(row.split_args)
         res['lumiMask'] = buildLumiMask(splitArgs['runs'], splitArgs['lumis'])
         self.logger.info("Lumi mask was: %s" % res['lumiMask'])
 
         #extract the finished jobs from filemetadata
         jobids = [x[1] for x in statusRes['jobList'] if x[0] in ['finished']]
-        rows = self.api.query(None, None, self.FileMetaData.GetFromTaskAndType_sql, filetype='EDM,TFILE,POOLIN', taskname=workflow)
+        rows = self.filesOfJobs(workflow, ['EDM', 'TFILE', 'POOLIN'], jobids) if jobids else []
 
         res['runsAndLumis'] = {}
         for row in rows:
-            if row[GetFromTaskAndType.PANDAID] in jobids:
-                if str(row[GetFromTaskAndType.PANDAID]) not in res['runsAndLumis']:
-                    res['runsAndLumis'][str(row[GetFromTaskAndType.PANDAID])] = []
-                res['runsAndLumis'][str(row[GetFromTaskAndType.PANDAID])].append( { 'parents' : row[GetFromTaskAndType.PARENTS].read(),
-                        'runlumi' : row[GetFromTaskAndType.RUNLUMI].read(),
-                        'events'  : row[GetFromTaskAndType.INEVENTS],
-                        'type'    : row[GetFromTaskAndType.TYPE],
-                        'lfn'     : row[GetFromTaskAndType.LFN],
-                })
+            if str(row[GetFromTaskAndType.PANDAID]) not in res['runsAndLumis']:
+                res['runsAndLumis'][str(row[GetFromTaskAndType.PANDAID])] = []
+            res['runsAndLumis'][str(row[GetFromTaskAndType.PANDAID])].append( { 'parents' : row[GetFromTaskAndType.PARENTS].read(),
+                    'runlumi' : row[GetFromTaskAndType.RUNLUMI].read(),
+                    'events'  : row[GetFromTaskAndType.INEVENTS],
+                    'type'    : row[GetFromTaskAndType.TYPE],
+                    'lfn'     : row[GetFromTaskAndType.LFN],
+            })
         self.logger.info("Got %s edm files for workflow %s" % (len(res['runsAndLumis']), workflow))
 
         if usedbs:
@@ -278,7 +276,10 @@ class HTCondorDataWorkflow(DataWorkflow):
             verbose = 0
         self.logger.info("Status result for workflow %s: %s (detail level %d)" % (workflow, row.task_status, verbose))
         #Apply taskWarning and savelogs flags to output
+        #the warnings added before they were stored in the task_warnings table are in the tm_task_warnings column
         taskWarnings = literal_eval(row.task_warnings if isinstance(row.task_warnings, str) else row.task_warnings.read())
+        for warning, in self.api.query(None, None, self.Task.GetWarnings_sql, workflow=workflow):
+            taskWarnings.append(warning if isinstance(warning, str) else warning.read())
         result["taskWarningMsg"] = taskWarnings
         result["saveLogs"] = row.save_logs
 
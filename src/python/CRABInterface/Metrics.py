@@ -0,0 +1,265 @@
+"""
+In-process runtime metrics of the CRAB REST interface.
+
+The metrics are plain counters, gauges and histograms kept in memory by each
+server process and exposed by the RESTMetrics entity in the Prometheus text
+exposition format (version 0.0.4). Recording a value takes a lock and a few
+dictionary operations, so it can be done on every request.
+
+The module defines the metrics of the REST interface and the decorators used by
+RESTBaseAPI to record them:
+ - timeRequest wraps MiniRESTApi._call and measures every request, per API,
+   HTTP method and status, until the response has been streamed out;
+ - timeStatement wraps DatabaseRESTApi.execute/executemany and measures the
+   execution time of the SQL statements per API. The rows of a query are
+   fetched later, while the response is streamed, and are not included.
+"""
+
+import time
+import threading
+
+import cherrypy
+from cherrypy import request, response
+
+from WMCore.REST.Error import RESTError
+
+## Default upper bounds of the buckets of the histograms, in seconds.
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formatLabels(names, values, extra=None):
+    pairs = zip(names, values) + (extra or [])
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, escape(value)) for name, value in pairs)
+
+
+def formatValue(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    """Base class of the metrics: a set of values indexed by the label values."""
+
+    mtype = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError("Metric %s requires the labels %s" % (self.name, self.labels))
+        return tuple(labels)
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+    def samples(self):
+        """Return the list of (suffix, labels, extra labels, value) of the metric."""
+        with self.lock:
+            return [('', key, None, value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation.replace('\\', '\\\\').replace('\n', '\\n')),
+                 '# TYPE %s %s' % (self.name, self.mtype)]
+        for suffix, key, extra, value in self.samples():
+            lines.append('%s%s%s %s' % (self.name, suffix, formatLabels(self.labels, key, extra), formatValue(value)))
+        return lines
+
+
+class Counter(Metric):
+
+    mtype = 'counter'
+
+    def inc(self, *labels, **kwargs):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + kwargs.get('amount', 1)
+
+    def get(self, *labels):
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+
+class Gauge(Counter):
+
+    mtype = 'gauge'
+
+    def dec(self, *labels):
+        self.inc(*labels, amount=-1)
+
+
+class Histogram(Metric):
+
+    mtype = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=None):
+        Metric.__init__(self, name, documentation, labels)
+        self.buckets = sorted(buckets or DEFAULT_BUCKETS)
+
+    def observe(self, value, *labels):
+        key = self.key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                ## One counter per bucket (not cumulative), then the sum.
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            counts[index] += 1
+            counts[-1] += value
+
+    def get(self, *labels):
+        """Return the (count, sum) of the observations with the given labels."""
+        with self.lock:
+            counts = self.values.get(self.key(labels))
+            return (sum(counts[:-1]), counts[-1]) if counts else (0, 0.0)
+
+    def samples(self):
+        with self.lock:
+            values = [(key, list(counts)) for key, counts in sorted(self.values.items())]
+        result = []
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float('inf')], counts[:-1]):
+                cumulative += count
+                result.append(('_bucket', key, [('le', formatValue(bound))], cumulative))
+            result.append(('_sum', key, None, counts[-1]))
+            result.append(('_count', key, None, cumulative))
+        return result
+
+
+class Registry(object):
+    """The set of the metrics exposed by the server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def register(self, metric):
+        with self.lock:
+            if any(m.name == metric.name for m in self.metrics):
+                raise ValueError("Metric %s already registered" % metric.name)
+            self.metrics.append(metric)
+        return metric
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+requestDuration = registry.register(Histogram('crab_rest_request_duration_seconds',
+    "Time spent serving the REST requests, until the response is streamed out.", ('api', 'method', 'status')))
+requestsInProgress = registry.register(Gauge('crab_rest_requests_in_progress',
+    "Number of REST requests being served.", ('api', 'method')))
+statementDuration = registry.register(Histogram('crab_rest_db_statement_duration_seconds',
+    "Execution time of the SQL statements, without the fetch of the rows of the queries.", ('api', 'method')))
+throttleRejections = registry.register(Counter('crab_rest_throttle_rejections_total',
+    "Number of requests rejected because the user exceeded the limit of active operations."))
+rateLimitRejections = registry.register(Counter('crab_rest_rate_limit_rejections_total',
+    "Number of requests rejected because the user exceeded the rate of requests of the API.", ('api', 'cost')))
+cacheRequests = registry.register(Counter('crab_rest_cache_requests_total',
+    "Number of lookups in the caches of the REST interface, by result (hit or miss).", ('cache', 'result')))
+
+
+def apiLabel(api, param):
+    """Return the label of the API called with param, 'unknown' if the API does not exist.
+
+    The URL path starts with the API name, preceded by the instance name for a
+    DatabaseRESTApi; only registered API names are used so that invalid URLs
+    do not create new labels."""
+    known = api.methods.get(request.method, {})
+    for arg in param.args[:2]:
+        if arg in known:
+            return arg
+    return 'unknown'
+
+
+def errorStatus(ex):
+    if isinstance(ex, RESTError):
+        return ex.http_code
+    if isinstance(ex, cherrypy.HTTPError):
+        return ex.status
+    return 500
+
+
+def timeRequest(call):
+    """Decorator for MiniRESTApi._call which records the duration and status of the request.
+
+    The API usually returns a generator, so the request ends only when the
+    response has been streamed out: the reply is wrapped in a generator which
+    records the request once exhausted or closed. Errors raised while streaming
+    are reported in the X-Error-HTTP header."""
+    def timedCall(self, param):
+        start = time.time()
+        method = request.method
+        api = apiLabel(self, param)
+        request.crab_metrics_api = api
+        requestsInProgress.inc(api, method)
+        try:
+            reply = call(self, param)
+        except Exception as ex:
+            requestsInProgress.dec(api, method)
+            requestDuration.observe(time.time() - start, api, method, errorStatus(ex))
+            raise
+        if isinstance(reply, basestring):
+            requestsInProgress.dec(api, method)
+            requestDuration.observe(time.time() - start, api, method, response.headers.get('X-Error-HTTP', 200))
+            return reply
+        return streamReply(reply, start, api, method)
+    return timedCall
+
+
+def streamReply(reply, start, api, method):
+    status = 500
+    try:
+        for chunk in reply:
+            yield chunk
+        status = response.headers.get('X-Error-HTTP', 200)
+    except GeneratorExit:
+        ## The client went away before the end of the response.
+        status = 499
+        raise
+    finally:
+        requestsInProgress.dec(api, method)
+        requestDuration.observe(time.time() - start, api, method, status)
+
+
+def timeStatement(execute):
+    """Decorator for DatabaseRESTApi.execute and executemany which records the execution time of the statement.
+
+    The cursor is returned before its rows are fetched, so the fetch is not included."""
+    def timedExecute(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return execute(self, *args, **kwargs)
+        finally:
+            statementDuration.observe(time.time() - start, getattr(request, 'crab_metrics_api', 'unknown'), request.method)
+    return timedExecute
+
+
+def recordCache(cache, hit):
+    cacheRequests.inc(cache, 'hit' if hit else 'miss')
@@ -1,10 +1,9 @@
 import re
-from ast import literal_eval
 import PandaServerInterface as pserver
 from WMCore.REST.Error import ExecutionError, InvalidParameter
 from WMCore.WMSpec.WMTask import buildLumiMask
 from CRABInterface.DataWorkflow import DataWorkflow
-from CRABInterface.Utils import conn_handler
+from CRABInterface.Utils import conn_handler, dbDeserializer
 
 class PandaDataWorkflow(DataWorkflow):
     """ Panda implementation of the status command.
@@ -23,7 +22,7 @@ class PandaDataWorkflow(DataWorkflow):
         self.logger.debug("Getting status for workflow %s" % workflow)
         row = self.api.query(None, None, self.Task.ID_sql, taskname = workflow)
         _, jobsetid, status, vogroup, vorole, taskFailure, splitArgs, resJobs, saveLogs, _ = row.next() #just one row is picked up by the previous query
-        resJobs = literal_eval(resJobs.read())
+        resJobs = dbDeserializer(resJobs)
         self.logger.info("Status result for workflow %s: %s. JobsetID: %s" % (workflow, status, jobsetid))
         self.logger.debug("User vogroup=%s and user vorole=%s" % (vogroup, vorole))
 
@@ -117,11 +116,7 @@ class PandaDataWorkflow(DataWorkflow):
             return
 
         self.logger.debug("Retrieving output of jobs: %s" % jobids)
-        rows = self.api.query(None, None, self.FileMetaData.GetFromTaskAndType_sql, filetype=','.join(filetype), taskname=workflow)
-        rows = filter(lambda row: row[GetFromTaskAndType.PANDAID] in jobids, rows)
-        if howmany!=-1:
-            rows=rows[:howmany]
-        #jobids=','.join(map(str,jobids)), limit=str(howmany) if howmany!=-1 else str(len(jobids)*100))
+        rows = self.filesOfJobs(workflow, filetype, jobids, howmany if howmany != -1 else None)
 
         for row in rows:
             if filetype == ['LOG'] and saveLogs == 'F':
@@ -147,21 +142,20 @@ class PandaDataWorkflow(DataWorkflow):
 
         #load the lumimask
         rows = self.api.query(None, None, self.Task.ID_sql, taskname = workflow)
-        splitArgs = literal_eval(rows.next()[6].read())
+        splitArgs = dbDeserializer(rows.next()[6])
         res['lumiMask'] = buildLumiMask(splitArgs['runs'], splitArgs['lumis'])
         self.logger.info("Lumi mask was: %s" % res['lumiMask'])
 
         #extract the finished jobs from filemetadata
         jobids = [x[1] for x in statusRes['jobList'] if x[0] in ['finished', 'transferring']]
-        rows = self.api.query(None, None, self.FileMetaData.GetFromTaskAndType_sql, filetype='EDM', taskname=workflow)
+        rows = self.filesOfJobs(workflow, ['EDM'], jobids) if jobids else []
 
         res['runsAndLumis'] = {}
         for row in rows:
-            if row[GetFromTaskAndType.PANDAID] in jobids:
-                res['runsAndLumis'][str(row[GetFromTaskAndType.PANDAID])] = { 'parents' : row[GetFromTaskAndType.PARENTS].read(),
-                        'runlumi' : row[GetFromTaskAndType.RUNLUMI].read(),
-                        'events'  : row[GetFromTaskAndType.INEVENTS],
-                }
+            res['runsAndLumis'][str(row[GetFromTaskAndType.PANDAID])] = { 'parents' : row[GetFromTaskAndType.PARENTS].read(),
+                    'runlumi' : row[GetFromTaskAndType.RUNLUMI].read(),
+                    'events'  : row[GetFromTaskAndType.INEVENTS],
+            }
         self.logger.info("Got %s edm files for workflow %s" % (len(res), workflow))
 
         yield res
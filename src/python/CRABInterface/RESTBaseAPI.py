@@ -1,21 +1,22 @@
 import logging
 import cherrypy
 from commands import getstatusoutput
-from time import mktime, gmtime
 
 # WMCore dependecies here
-from WMCore.REST.Server import DatabaseRESTApi, rows
+from WMCore.REST.Server import RESTApi, DatabaseRESTApi, rows
 from WMCore.REST.Format import JSONFormat
 from WMCore.REST.Error import ExecutionError
 
 # CRABServer dependecies here
 import Utils
+from CRABInterface import Metrics
 from CRABInterface.RESTUserWorkflow import RESTUserWorkflow
 from CRABInterface.RESTTask import RESTTask
 from CRABInterface.RESTCampaign import RESTCampaign
 from CRABInterface.RESTServerInfo import RESTServerInfo
 from CRABInterface.RESTFileMetadata import RESTFileMetadata
 from CRABInterface.RESTWorkerWorkflow import RESTWorkerWorkflow
+from CRABInterface.RESTMetrics import RESTMetrics
 from CRABInterface.DataFileMetadata import DataFileMetadata
 from CRABInterface.DataWorkflow import DataWorkflow
 from CRABInterface.DataUserWorkflow import DataUserWorkflow
@@ -39,15 +40,15 @@ class RESTBaseAPI(DatabaseRESTApi):
         if status is not 0:
             raise ExecutionError("Internal issue when retrieving crabserver service DN.")
 
-        extconfig = Utils.ConfigCache(centralconfig=Utils.getCentralConfig(extconfigurl=config.extconfigurl, mode=config.mode),
-                                      cachetime=mktime(gmtime()))
+        ## The first retrieval of the central configuration, then it is refreshed in the background (see Utils.conn_handler)
+        extconfig = Utils.centralConfigCache(config.extconfigurl, config.mode).get()
 
         #Global initialization of Data objects. Parameters coming from the config should go here
         DataUserWorkflow.globalinit(config)
         DataWorkflow.globalinit(dbapi=self, phedexargs={'endpoint': config.phedexurl},\
                                 credpath=config.credpath, centralcfg=extconfig, config=config)
         DataFileMetadata.globalinit(dbapi=self, config=config)
-        Utils.globalinit(config.serverhostkey, config.serverhostcert, serverdn, config.credpath)
+        Utils.globalinit(config.serverhostkey, config.serverhostcert, serverdn, config.credpath, getattr(config, 'rateLimits', None))
 
         ## TODO need a check to verify the format depending on the resource
         ##      the RESTFileMetadata has the specifc requirement of getting xml reports
@@ -58,9 +59,16 @@ class RESTBaseAPI(DatabaseRESTApi):
                     'workflowdb': RESTWorkerWorkflow(app, self, config, mount),
                     'task': RESTTask(app, self, config, mount),
                    } )
+        ## The metrics do not need a database connection, so they are not added with the DB wrapper
+        RESTApi._add(self, {'metrics': RESTMetrics(app, self, config, mount)})
 
         self._initLogger( getattr(config, 'loggingFile', None), getattr(config, 'loggingLevel', None) )
 
+    ## Record the duration of the requests and the execution time of the SQL statements (see CRABInterface.Metrics)
+    _call = Metrics.timeRequest(DatabaseRESTApi._call)
+    execute = Metrics.timeStatement(DatabaseRESTApi.execute)
+    executemany = Metrics.timeStatement(DatabaseRESTApi.executemany)
+
     def modifynocheck(self, sql, *binds, **kwbinds):
         """This is the same as `WMCore.REST.Server`:modify method but
            not implementing any kind of checks on the number of modified
@@ -62,6 +62,7 @@ class RESTFileMetadata(RESTEntity):
             authz_operator()
             validate_str("taskname", param, safe, RX_WORKFLOW, optional=True)
             validate_str("hours", param, safe, RX_HOURS, optional=True)
+            validate_num("limit", param, safe, optional=True, minval=1)
             if bool(safe.kwargs["taskname"]) == bool(safe.kwargs["hours"]):
                raise InvalidParameter("You have to specify a taskname or a number of hours. Files of this task or created before the number of hours"+\
                                         " will be deleted. Only one of the two parameters can be specified.")
@@ -101,7 +102,11 @@ class RESTFileMetadata(RESTEntity):
         return self.jobmetadata.getFiles(taskname, filetype)
 
     @restcall
-    def delete(self, taskname, hours):
-        """Deletes an existing job metadata information"""
+    def delete(self, taskname, hours, limit):
+        """Deletes an existing job metadata information
 
-        return self.jobmetadata.delete(taskname, hours)
+           :arg str taskname: delete the files of this task;
+           :arg str hours: delete the files older than this number of hours;
+           :arg int limit: with hours, delete at most this number of files and return the number of files deleted."""
+
+        return self.jobmetadata.delete(taskname, hours, limit)
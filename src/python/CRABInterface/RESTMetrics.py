@@ -0,0 +1,25 @@
+# WMCore dependecies here
+from WMCore.REST.Server import RESTEntity, restcall
+from WMCore.REST.Format import RawFormat
+
+# CRABServer dependecies here
+from CRABInterface.RESTExtensions import authz_login_valid
+from CRABInterface import Metrics
+
+
+class RESTMetrics(RESTEntity):
+    """Read-only REST entity exposing the runtime metrics of this server process
+       in the Prometheus text exposition format"""
+
+    def __init__(self, app, api, config, mount):
+        RESTEntity.__init__(self, app, api, config, mount)
+
+    def validate(self, apiobj, method, api, param, safe):
+        """Validating all the input parameter as enforced by the WMCore.REST module"""
+        authz_login_valid()
+
+    @restcall(formats=[('text/plain', RawFormat())], expires=0)
+    def get(self):
+        """Retrieves the metrics of the server: request latency per API, method and status,
+           database time, throttled requests and cache hits."""
+        return Metrics.registry.render()
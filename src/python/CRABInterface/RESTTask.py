@@ -1,7 +1,7 @@
 # WMCore dependecies here
 from WMCore.REST.Server import RESTEntity, restcall
 from WMCore.REST.Validation import validate_str, validate_strlist, validate_num, validate_numlist
-from WMCore.REST.Error import InvalidParameter,ExecutionError
+from WMCore.REST.Error import InvalidParameter, ExecutionError, MissingObject
 
 from CRABInterface.Utils import getDBinstance
 from CRABInterface.RESTExtensions import authz_login_valid, authz_owner_match
@@ -12,6 +12,9 @@ import cherrypy
 from ast import literal_eval
 from base64 import b64decode
 
+## The maximum number of warnings of a task, both in task_warnings and in the old tm_task_warnings column.
+MAX_WARNINGS = 10
+
 
 class RESTTask(RESTEntity):
     """REST entity to handle interactions between CAFTaskWorker and TaskManager database"""
@@ -155,19 +158,21 @@ class RESTTask(RESTEntity):
         except TypeError:
             raise InvalidParameter("Failure message is not in the accepted format")
 
-#        rows = self.api.query(None, None, "SELECT tm_task_warnings FROM tasks WHERE tm_taskname = :workflow", workflow=workflow)#self.Task.TASKSUMMARY_sql)
-        rows = self.api.query(None, None, self.Task.ID_sql, taskname=workflow)#self.Task.TASKSUMMARY_sql)
-        rows = list(rows) #from generator to list
-        if len(rows)==0:
+        #the warnings added before the task_warnings table are in the tm_task_warnings column and count in the limit;
+        #the task row stays locked until the insert is committed (or rolled back at the end of the request),
+        #so two writers cannot both see the task below the limit
+        rows = list(self.api.query(None, None, self.Task.GetLegacyWarnings_sql, workflow=workflow))
+        if len(rows) == 0:
             raise InvalidParameter("Task %s not found in the task database" % workflow)
+        legacyWarnings = rows[0][0]
+        legacyWarnings = literal_eval((legacyWarnings if isinstance(legacyWarnings, basestring) else legacyWarnings.read()) if legacyWarnings else '[]')
 
-        row = self.Task.ID_tuple(*rows[0])
-        warnings = literal_eval(row.task_warnings.read() if row.task_warnings else '[]')
-        if len(warnings)>10:
-            raise ExecutionError("You cannot add more than 10 warnings to a task")
-        warnings.append(warning)
-
-        self.api.modify(self.Task.SetWarnings_sql, warnings=[str(warnings)], workflow=[workflow])
+        #the warning is appended only if the task has less than MAX_WARNINGS, in the same statement,
+        #so that the warnings sent at the same time by the TaskWorker do not overwrite each other
+        try:
+            self.api.modify(self.Task.AddWarning_sql, warning=[warning], workflow=[workflow], maxwarnings=[MAX_WARNINGS - len(legacyWarnings)])
+        except MissingObject:
+            raise ExecutionError("You cannot add more than %d warnings to a task" % MAX_WARNINGS)
 
         return []
 
@@ -3,16 +3,44 @@ from WMCore.REST.Server import RESTEntity, restcall
 from WMCore.REST.Validation import validate_str, validate_strlist, validate_num, validate_numlist
 from WMCore.REST.Error import InvalidParameter
 
-from CRABInterface.Utils import getDBinstance
+from CRABInterface.Utils import getDBinstance, dbSerializer, dbDeserializer
 from CRABInterface.RESTExtensions import authz_login_valid
 from CRABInterface.Regexps import RX_WORKFLOW, RX_BLOCK, RX_WORKER_NAME, RX_STATUS, RX_TEXT_FAIL, RX_DN, RX_SUBPOSTWORKER, \
-                                  RX_SUBGETWORKER, RX_RUNS, RX_LUMIRANGE
+                                  RX_SUBGETWORKER, RX_RUNS, RX_LUMIRANGE, RX_TASKPROJECTION
 
 # external dependecies here
 import cherrypy
 from ast import literal_eval
 from base64 import b64decode
 
+## The columns of the tasks table sent to the TaskWorker, in the order of GetReadyTasks_sql.
+TASK_COLUMNS = ['tm_taskname', 'panda_jobset_id', 'tm_task_status', 'tm_start_time', 'tm_start_injection', 'tm_end_injection',
+                'tm_task_failure', 'tm_job_sw', 'tm_job_arch', 'tm_input_dataset', 'tm_site_whitelist', 'tm_site_blacklist',
+                'tm_split_algo', 'tm_split_args', 'tm_totalunits', 'tm_user_sandbox', 'tm_cache_url', 'tm_username',
+                'tm_user_dn', 'tm_user_vo', 'tm_user_role', 'tm_user_group', 'tm_publish_name', 'tm_asyncdest',
+                'tm_dbs_url', 'tm_publish_dbs_url', 'tm_publication', 'tm_outfiles', 'tm_tfile_outfiles',
+                'tm_edm_outfiles', 'tm_job_type', 'tm_arguments', 'panda_resubmitted_jobs', 'tm_save_logs',
+                'tm_user_infiles', 'tw_name', 'tm_maxjobruntime', 'tm_numcores', 'tm_maxmemory', 'tm_priority',
+                'tm_activity', 'tm_scriptexe', 'tm_scriptargs', 'tm_extrajdl', 'tm_generator', 'tm_asourl',
+                'tm_events_per_lumi', 'tm_use_parent', 'tm_collector', 'tm_schedd', 'tm_dry_run', 'tm_user_files',
+                'tm_transfer_outputs', 'tm_output_lfn', 'tm_ignore_locality', 'tm_fail_limit', 'tm_one_event_mode',
+                'tm_publish_groupname', 'tm_nonvalid_input_dataset']
+
+## The columns needed by the TaskWorker (with the HTCondor backend) for each kind of work: a new task does not
+## need the arguments of the kill/resubmit requests nor the PanDA columns, a kill or a resubmission needs only
+## to identify the user, the task and where it runs.
+CONTROL_COLUMNS = ['tm_taskname', 'tm_task_status', 'tm_job_type', 'tm_cache_url', 'tm_username', 'tm_user_dn',
+                   'tm_user_vo', 'tm_user_role', 'tm_user_group', 'tm_arguments', 'tw_name', 'tm_asourl',
+                   'tm_collector', 'tm_schedd', 'tm_dry_run']
+PROJECTIONS = {'new': [column for column in TASK_COLUMNS if column not in ['panda_jobset_id', 'tm_task_failure',
+                                                                          'tm_arguments', 'panda_resubmitted_jobs']],
+               'kill': CONTROL_COLUMNS,
+               'resubmit': CONTROL_COLUMNS}
+
+## The columns containing a list or a dictionary encoded by dbSerializer.
+STRUCTURED_COLUMNS = set(['tm_site_whitelist', 'tm_site_blacklist', 'tm_split_args', 'tm_outfiles', 'tm_tfile_outfiles',
+                          'tm_edm_outfiles', 'panda_resubmitted_jobs', 'tm_user_infiles', 'tm_scriptargs', 'tm_user_files'])
+
 
 class RESTWorkerWorkflow(RESTEntity):
     """REST entity to handle interactions between CAFTaskWorker and TaskManager database"""
@@ -60,8 +88,9 @@ class RESTWorkerWorkflow(RESTEntity):
             validate_str("subresource", param, safe, RX_SUBGETWORKER, optional=True)
             validate_num("subjobdef", param, safe, optional=True)
             validate_str("subuser", param, safe, RX_DN, optional=True)
+            validate_str("projection", param, safe, RX_TASKPROJECTION, optional=True)
             # possible combinations to check
-            # 1) workername + getstatus + limit
+            # 1) workername + getstatus + limit (+ projection)
             # 2) subresource + subjobdef + subuser
         elif method in ['DELETE']:
             pass
@@ -97,7 +126,7 @@ class RESTWorkerWorkflow(RESTEntity):
                   "success": {"args": (self.Task.SetInjectedTasks_sql,), "method": self.api.modify, "kwargs": {"tm_task_status": [status],
                                                                                             "panda_jobset_id": [jobset],
                                                                                             "tm_taskname": [workflow],
-                                                                                            "resubmitted_jobs": [str(resubmittedjobs)]}},
+                                                                                            "resubmitted_jobs": [dbSerializer(resubmittedjobs)]}},
                   "process": {"args": (self.Task.UpdateWorker_sql,), "method": self.api.modifynocheck, "kwargs": {"tw_name": [workername],
                                                                                                    "get_status": [getstatus],
                                                                                                    "limit": [limit],
@@ -114,10 +143,11 @@ class RESTWorkerWorkflow(RESTEntity):
         return []
 
     @restcall
-    def get(self, workername, getstatus, limit, subresource, subjobdef, subuser):
+    def get(self, workername, getstatus, limit, subresource, subjobdef, subuser, projection):
         """ Retrieve all columns for a specified task or
             tasks which are in a particular status with
-            particular conditions """
+            particular conditions; with projection, only
+            the columns needed for that kind of work """
 
         if subresource is not None and subresource == 'jobgroup':
             binds = {'jobdef_id': subjobdef, 'user_dn': subuser}
@@ -132,10 +162,15 @@ class RESTWorkerWorkflow(RESTEntity):
                        'tm_user_dn': row[5]}
         else:
             binds = {"limit": limit, "tw_name": workername, "get_status": getstatus}
-            rows = self.api.query(None, None, self.Task.GetReadyTasks_sql, **binds)
+            if projection is None:
+                columns = TASK_COLUMNS
+                rows = self.api.query(None, None, self.Task.GetReadyTasks_sql, **binds)
+            else:
+                columns = PROJECTIONS[projection]
+                rows = self.api.query(None, None, self.Task.GetReadyTasksColumns_sql % ', '.join(columns), **binds)
             for row in rows:
                 newtask = Task()
-                newtask.deserialize(row)
+                newtask.deserialize(row, columns)
                 yield dict(newtask)
 
     @restcall
@@ -150,11 +185,11 @@ class RESTWorkerWorkflow(RESTEntity):
         #load the task
         task = self.api.query(None, None, self.Task.ID_sql, taskname=binds['taskname'][0]).next()
         task = self.Task.ID_tuple(*task)
-        splitargs = literal_eval(task.split_args.read())
+        splitargs = dbDeserializer(task.split_args)
         #update the tm_splitargs
         splitargs['runs'] = runs
         splitargs['lumis'] = lumis
-        binds['splitargs'] = [str(splitargs)]
+        binds['splitargs'] = [dbSerializer(splitargs)]
         self.api.modify(self.Task.SetSplitargsTask_sql, **binds)
 
 
@@ -172,43 +207,29 @@ class Task(dict):
            :arg *args/**kwargs: key/value pairs to update the dictionary."""
         self.update(*args, **kwargs)
 
-    def deserialize(self, task):
+    def deserialize(self, task, columns=TASK_COLUMNS):
         """Deserialize a task from a list format to the self Task dictionary.
            It depends on the order of elements, as they are returned from the DB.
 
-           :arg list object task: the list of task attributes retrieved from the db."""
-        self['tm_taskname'] = task[0]
-        self['panda_jobset_id'] = task[1]
-        self['tm_task_status'] = task[2]
-        self['tm_start_time'] = str(task[3])
-        self['tm_start_injection'] = str(task[4])
-        self['tm_end_injection'] = str(task[5])
-        self['tm_task_failure'] = task[6] if ( task[6] is None or isinstance(task[6], str) ) else task[6].read() 
-        self['tm_job_sw'] = task[7]
-        self['tm_job_arch'] = task[8]
-        self['tm_input_dataset'] = task[9]
-        self['tm_site_whitelist'] = literal_eval(task[10])
-        self['tm_site_blacklist'] = literal_eval(task[11])
-        self['tm_split_algo'] = task[12]
-        self['tm_split_args'] = literal_eval(task[13] if ( task[13] is None or isinstance(task[13], str) ) else task[13].read()) 
-        self['tm_totalunits'] = task[14]
-        self['tm_user_sandbox'] = task[15]
-        self['tm_cache_url'] = task[16]
-        self['tm_username'] = task[17]
-        self['tm_user_dn'] = task[18]
-        self['tm_user_vo'] = task[19]
-        self['tm_user_role'] = task[20]
-        self['tm_user_group'] = task[21]
-        self['tm_publish_name'] = task[22]
-        self['tm_asyncdest'] = task[23]
-        self['tm_dbs_url'] = task[24]
-        self['tm_publish_dbs_url'] = task[25]
-        self['tm_publication'] = task[26]
-        self['tm_outfiles'] = literal_eval(task[27] if ( task[27] is None or isinstance(task[27], str) ) else task[27].read())
-        self['tm_tfile_outfiles'] = literal_eval(task[28] if ( task[28] is None or isinstance(task[28], str) ) else task[28].read())
-        self['tm_edm_outfiles'] = literal_eval(task[29] if ( task[29] is None or isinstance(task[29], str) ) else task[29].read())
-        self['tm_job_type'] = task[30]
-        extraargs = literal_eval(task[31] if ( task[31] is None or isinstance(task[31],str) ) else task[31].read())
+           :arg list object task: the list of task attributes retrieved from the db.
+           :arg list columns: the columns of the task attributes, by default the ones of GetReadyTasks_sql."""
+        for column, value in zip(columns, task):
+            if column in STRUCTURED_COLUMNS:
+                self[column] = dbDeserializer(value)
+            elif column in ['tm_start_time', 'tm_start_injection', 'tm_end_injection']:
+                self[column] = str(value)
+            elif column == 'tm_task_failure':
+                self[column] = value if (value is None or isinstance(value, basestring)) else value.read()
+            elif column == 'tw_name':
+                self['worker_name'] = value
+            elif column == 'tm_arguments':
+                self.deserializeArguments(dbDeserializer(value))
+            else:
+                self[column] = value
+
+    def deserializeArguments(self, extraargs):
+        """Set the parameters of the last kill or resubmission request, stored in tm_arguments."""
+        self['tm_arguments'] = extraargs
         self['resubmit_jobids'] = extraargs['resubmit_jobids'] if 'resubmit_jobids' in extraargs else None
         if self['resubmit_jobids'] is None and 'resubmitList' in extraargs: ## For backward compatibility only.
             self['resubmit_jobids'] = extraargs['resubmitList']
@@ -224,31 +245,3 @@ class Task(dict):
         self['resubmit_maxjobruntime'] = extraargs['maxjobruntime'] if 'maxjobruntime' in extraargs else None
         self['kill_ids'] = extraargs['killList'] if 'killList' in extraargs else []
         self['kill_all'] = extraargs['killAll'] if 'killAll' in extraargs else False
-        self['panda_resubmitted_jobs'] = literal_eval(task[32] if ( task[32] is None or isinstance(task[32],str)) else task[32].read())
-        self['tm_save_logs'] = task[33]
-        self['tm_user_infiles'] = literal_eval(task[34])
-        self['worker_name'] = task[35]
-        self['tm_arguments'] = literal_eval(task[31] if ( task[31] is None or isinstance(task[31],str) ) else task[31].read())
-        self['tm_maxjobruntime'] = task[36]
-        self['tm_numcores'] = task[37]
-        self['tm_maxmemory'] = task[38]
-        self['tm_priority'] = task[39]
-        self['tm_activity'] = task[40]
-        self['tm_scriptexe'] = task[41]
-        self['tm_scriptargs'] = literal_eval(task[42] if ( task[42] is None or isinstance(task[42],str) ) else task[42].read())
-        self['tm_extrajdl'] = task[43]
-        self['tm_generator'] = task[44]
-        self['tm_asourl'] = task[45]
-        self['tm_events_per_lumi'] = task[46]
-        self['tm_use_parent'] = task[47]
-        self['tm_collector'] = task[48]
-        self['tm_schedd'] = task[49]
-        self['tm_dry_run'] = task[50]
-        self['tm_user_files'] = literal_eval(task[51] if ( task[51] is None or isinstance(task[51],str) ) else task[51].read())
-        self['tm_transfer_outputs'] = task[52]
-        self['tm_output_lfn'] = task[53]
-        self['tm_ignore_locality'] = task[54]
-        self['tm_fail_limit'] = task[55]
-        self['tm_one_event_mode'] = task[56]
-        self['tm_publish_groupname'] = task[57]
-        self['tm_nonvalid_input_dataset'] = task[58]
@@ -85,6 +85,8 @@ RX_DN = re.compile(r"^/(?:C|O|DC)=.*/CN=.")
 ## worker subresources
 RX_SUBPOSTWORKER = re.compile(r"^state|start|failure|success|process|lumimask$")
 RX_SUBGETWORKER = re.compile(r"jobgroup")
+## columns of the tasks sent to the worker, by kind of work
+RX_TASKPROJECTION = re.compile(r"^(new|kill|resubmit)$")
 
 # Schedulers
 RX_SCHEDULER = re.compile(r"^panda|condor$")
@@ -1,6 +1,10 @@
 import logging
 import os
+import math
+import time
+import types
 from collections import namedtuple
+from functools import wraps
 from time import mktime, gmtime
 import re
 from hashlib import sha1
@@ -9,9 +13,10 @@ import pycurl
 import StringIO
 import cjson as json
 import threading
+from ast import literal_eval
 
 from WMCore.WMFactory import WMFactory
-from WMCore.REST.Error import ExecutionError, InvalidParameter
+from WMCore.REST.Error import RESTError, ExecutionError, InvalidParameter
 from WMCore.Services.SiteDB.SiteDB import SiteDBJSON
 from WMCore.Services.PhEDEx.PhEDEx import PhEDEx
 from WMCore.Credential.SimpleMyProxy import SimpleMyProxy, MyProxyException
@@ -19,6 +24,7 @@ from WMCore.Credential.Proxy import Proxy
 from WMCore.Services.pycurl_manager import ResponseHeader
 
 from CRABInterface.Regexps import RX_CERT
+from CRABInterface import Metrics
 """
 The module contains some utility functions used by the various modules of the CRAB REST interface
 """
@@ -43,9 +49,28 @@ def getDBinstance(config, namespace, name):
 
     return factory.loadObject( name )
 
-def globalinit(serverkey, servercert, serverdn, credpath):
+def dbSerializer(value):
+    """Encode a list or a dictionary to be stored in a column of the tasks table"""
+    return json.encode(value)
+
+def dbDeserializer(value):
+    """Decode a list or a dictionary stored by dbSerializer in a column of the tasks table,
+       reading it first if the column is a CLOB.
+
+       The rows written before the columns were encoded in JSON contain the Python
+       representation of the value, which is evaluated as such."""
+    if value is not None and not isinstance(value, basestring):
+        value = value.read()
+    try:
+        return json.decode(value)
+    except (json.DecodeError, TypeError):
+        return literal_eval(value)
+
+def globalinit(serverkey, servercert, serverdn, credpath, ratelimits=None):
     global serverCert, serverKey, serverDN, credServerPath
     serverCert, serverKey, serverDN, credServerPath = servercert, serverkey, serverdn, credpath
+    if ratelimits:
+        global_user_throttle.rateLimiter.setLimits(ratelimits)
 
 def execute_command(command, logger, timeout):
     """
@@ -84,11 +109,13 @@ def execute_command(command, logger, timeout):
 
 #This is used in case git is down for more than 30 minutes
 centralCfgFallback = None
-def getCentralConfig(extconfigurl, mode):
+def getCentralConfig(extconfigurl, mode, timeout=None, fallback=True):
     """Utility to retrieve the central configuration to be used for dynamic variables
 
     arg str extconfigurl: the url pointing to the exteranl configuration parameter
     arg str mode: also known as the variant of the rest (prod, preprod, dev, private)
+    arg int timeout: the maximum seconds of the transfer, None for no limit
+    arg bool fallback: return the last configuration retrieved if the url cannot be read
     return: the dictionary containing the external configuration for the selected mode."""
 
     global centralCfgFallback
@@ -100,13 +127,16 @@ def getCentralConfig(extconfigurl, mode):
     curl.setopt(pycurl.WRITEFUNCTION, bbuf.write)
     curl.setopt(pycurl.HEADERFUNCTION, hbuf.write)
     curl.setopt(pycurl.FOLLOWLOCATION, 1)
+    if timeout:
+        curl.setopt(pycurl.CONNECTTIMEOUT, timeout)
+        curl.setopt(pycurl.TIMEOUT, timeout)
     curl.perform()
     curl.close()
 
     header = ResponseHeader(hbuf.getvalue())
     if (header.status < 200 or header.status >= 300):
         msg = "Reading %s returned %s." % (extconfigurl, header.status)
-        if centralCfgFallback:
+        if centralCfgFallback and fallback:
             msg += "\nUsing cached values for external configuration."
             cherrypy.log(msg)
             return centralCfgFallback
@@ -118,6 +148,111 @@ def getCentralConfig(extconfigurl, mode):
     return centralCfgFallback
 
 
+class _Fetch(object):
+    """A fetch of a BackgroundCache, running in its own thread."""
+
+    def __init__(self, started):
+        self.started = started
+        self.done = threading.Event()
+        self.error = None
+
+class BackgroundCache(object):
+    """A value retrieved from an external service, refreshed in the background.
+
+    The first get waits for the value. Then get returns the cached value at once,
+    and if it is older than refresh seconds it starts a fetch of the new value in a
+    background thread: the requests do not wait for the service, and only one fetch
+    runs at a time however many requests find the value old. Bounds:
+     - a fetch running for more than timeout seconds is abandoned, and a new one can start;
+     - after a failed fetch, no other fetch starts for retry seconds;
+     - a value older than maxAge seconds is not returned: get waits for the fetch,
+       and raises ExecutionError if there is no newer value.
+
+    The clock can be replaced, e.g. by the tests."""
+
+    def __init__(self, name, fetch, refresh=1800, maxAge=12*3600, timeout=300, retry=60, clock=time.time):
+        self.name = name
+        self.fetch = fetch
+        self.refresh = refresh
+        self.maxAge = maxAge
+        self.timeout = timeout
+        self.retry = retry
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.value = None
+        self.fetched = None #start time of the fetch of the value
+        self.running = None
+        self.failed = None
+        self.logger = logging.getLogger("CRABLogger.Utils.BackgroundCache")
+
+    def get(self):
+        now = self.clock()
+        with self.lock:
+            if self.fetched is not None and now - self.fetched <= self.maxAge:
+                if now - self.fetched > self.refresh:
+                    self._start(now)
+                Metrics.recordCache(self.name, True)
+                return self.value
+            fetch = self._start(now)
+        Metrics.recordCache(self.name, False)
+        if fetch:
+            fetch.done.wait(self.timeout)
+        with self.lock:
+            if self.fetched is not None and self.clock() - self.fetched <= self.maxAge:
+                return self.value
+        raise ExecutionError("Internal issue when retrieving the %s information" % self.name)
+
+    def _start(self, now):
+        """Return the running fetch, starting one if needed. Called with the lock held."""
+        if self.running and now - self.running.started < self.timeout:
+            return self.running
+        if self.failed is not None and now - self.failed < self.retry:
+            return None
+        fetch = self.running = _Fetch(now)
+        thread = threading.Thread(target=self._run, args=(fetch,), name="BackgroundCache-%s" % self.name)
+        thread.daemon = True
+        thread.start()
+        return fetch
+
+    def _run(self, fetch):
+        try:
+            value = self.fetch()
+        except Exception as ex:
+            self.logger.exception("Failed to retrieve the %s information" % self.name)
+            fetch.error = ex
+            with self.lock:
+                self.failed = self.clock()
+        else:
+            with self.lock:
+                ## An abandoned fetch does not replace the value of a later one.
+                if self.fetched is None or fetch.started > self.fetched:
+                    self.value, self.fetched, self.failed = value, fetch.started, None
+        finally:
+            with self.lock:
+                if self.running is fetch:
+                    self.running = None
+            fetch.done.set()
+
+def fetchCMSSites():
+    """Return the CMSSitesCache of the CMS site names and of the PhEDEx node names."""
+    sitedb = SiteDBJSON(config={'cert': serverCert, 'key': serverKey})
+    cachetime = mktime(gmtime())
+    return CMSSitesCache(sites=sitedb.getAllCMSNames(), cachetime=cachetime), \
+           CMSSitesCache(sites=sitedb.getAllPhEDExNodeNames(), cachetime=cachetime)
+
+## The caches shared by the REST entities, see conn_handler.
+cmsSitesCache = BackgroundCache('sitedb', fetchCMSSites)
+centralConfigCaches = {}
+centralConfigLock = threading.Lock()
+
+def centralConfigCache(extconfigurl, mode):
+    """Return the BackgroundCache of the ConfigCache of the central configuration."""
+    with centralConfigLock:
+        if (extconfigurl, mode) not in centralConfigCaches:
+            fetch = lambda: ConfigCache(centralconfig=getCentralConfig(extconfigurl, mode, timeout=60, fallback=False), cachetime=mktime(gmtime()))
+            centralConfigCaches[(extconfigurl, mode)] = BackgroundCache('centralconfig', fetch)
+        return centralConfigCaches[(extconfigurl, mode)]
+
 def conn_handler(services):
     """
     Decorator to be used among REST resources to optimize connections to other services
@@ -128,16 +263,16 @@ def conn_handler(services):
                            'monitor' and 'asomonitor'.
     """
     def wrap(func):
+        @wraps(func)
         def wrapped_func(*args, **kwargs):
-            if 'sitedb' in services and (not args[0].allCMSNames.sites or (args[0].allCMSNames.cachetime+1800 < mktime(gmtime()))):
-                args[0].allCMSNames = CMSSitesCache(sites=SiteDBJSON(config={'cert': serverCert, 'key': serverKey}).getAllCMSNames(), cachetime=mktime(gmtime()))
-                args[0].allPNNNames = CMSSitesCache(sites=SiteDBJSON(config={'cert': serverCert, 'key': serverKey}).getAllPhEDExNodeNames(), cachetime=mktime(gmtime()))
+            if 'sitedb' in services:
+                args[0].allCMSNames, args[0].allPNNNames = cmsSitesCache.get()
             if 'phedex' in services and not args[0].phedex:
                 phdict = args[0].phedexargs
                 phdict.update({'cert': serverCert, 'key': serverKey})
                 args[0].phedex = PhEDEx(responseType='xml', dict=phdict)
-            if 'centralconfig' in services and (not args[0].centralcfg.centralconfig or (args[0].centralcfg.cachetime+1800 < mktime(gmtime()))):
-                args[0].centralcfg = ConfigCache(centralconfig=getCentralConfig(extconfigurl=args[0].config.extconfigurl, mode=args[0].config.mode), cachetime=mktime(gmtime()))
+            if 'centralconfig' in services:
+                args[0].centralcfg = centralConfigCache(args[0].config.extconfigurl, args[0].config.mode).get()
             if 'servercert' in services:
                 args[0].serverCert = serverCert
                 args[0].serverKey = serverKey
@@ -145,6 +280,89 @@ def conn_handler(services):
         return wrapped_func
     return wrap
 
+class TooManyRequests(RESTError):
+    "The user exceeded the rate of requests allowed for an API."
+    http_code = 429
+    ## After the client errors (3xx) of WMCore.REST.Error
+    app_code = 307
+    message = "Too many requests"
+
+    def __init__(self, retryafter, info=None):
+        RESTError.__init__(self, info=info)
+        self.retryafter = retryafter
+
+class TokenBucket(object):
+    """A bucket of burst tokens, refilled with rate tokens per second; a request takes a token."""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = now
+
+    def refill(self, now):
+        if now > self.last:
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def take(self, now):
+        """Take a token, returning 0, or return the seconds until a token is available."""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+## The (tokens per second, burst) of each class of APIs: the cheap ones (status) and the expensive ones
+## (logs, output, report), which read the files of all the jobs of the task. A rate of 0 disables the limit.
+DEFAULT_RATE_LIMITS = {'cheap': (2.0, 30), 'expensive': (0.2, 10)}
+
+class RateLimiter(object):
+    """Limit the rate of the requests of each user to each API with a token bucket per user and API.
+
+       The clock can be replaced, e.g. by the tests."""
+
+    ## The buckets refilled to the burst are forgotten when there are more than these.
+    maxBuckets = 10000
+
+    def __init__(self, limits=None, clock=time.time):
+        self.lock = threading.Lock()
+        self.clock = clock
+        self.buckets = {}
+        self.limits = dict(DEFAULT_RATE_LIMITS)
+        self.setLimits(limits or {})
+
+    def setLimits(self, limits):
+        """Change the (tokens per second, burst) of some classes of APIs, e.g. {'expensive': (0.1, 5)}"""
+        with self.lock:
+            for cost, (rate, burst) in limits.items():
+                self.limits[cost] = (float(rate), int(burst))
+            self.buckets = {}
+
+    def take(self, user, api, cost='cheap'):
+        """Take a token for a request of the user to the api, returning 0 if the request is allowed
+           or the seconds to wait before the next request otherwise."""
+        rate, burst = self.limits[cost]
+        if not rate:
+            return 0
+        now = self.clock()
+        with self.lock:
+            bucket = self.buckets.get((user, api))
+            if bucket is None:
+                if len(self.buckets) >= self.maxBuckets:
+                    self._prune(now)
+                bucket = self.buckets[(user, api)] = TokenBucket(rate, burst, now)
+            return bucket.take(now)
+
+    def _prune(self, now):
+        for key, bucket in self.buckets.items():
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self.buckets[key]
+
+def _setRetryAfter(retryafter):
+    cherrypy.response.headers['Retry-After'] = str(retryafter)
+
 class _ThrottleCounter(object):
 
     def __init__(self, throttle, user):
@@ -156,19 +374,77 @@ class _ThrottleCounter(object):
         #self.throttle.logger.debug("Entering throttled function with counter %d for user %s" % (ctr, self.user))
         if ctr >= self.throttle.getLimit():
             self.throttle._decUser(self.user)
+            Metrics.throttleRejections.inc()
             raise ExecutionError("The current number of active operations for this resource exceeds the limit of %d for user %s" % (self.throttle.getLimit(), self.user))
 
     def __exit__(self, type, value, traceback):
         ctr = self.throttle._decUser(self.user)
         #self.throttle.logger.debug("Exiting throttled function with counter %d for user %s" % (ctr, self.user))
 
+class _NestedCalls(object):
+    """The throttled functions called by the thread meanwhile are nested calls: they take no token
+       and, if operation is True, no active operation."""
+
+    def __init__(self, throttle, operation):
+        self.tls = throttle.tls
+        self.operation = operation
+
+    def __enter__(self):
+        self.tls.rated = getattr(self.tls, 'rated', 0) + 1
+        if self.operation:
+            self.tls.count = (getattr(self.tls, 'count', None) or 0) + 1
+
+    def __exit__(self, type, value, traceback):
+        self.tls.rated -= 1
+        if self.operation:
+            self.tls.count -= 1
+
+class _ThrottledReply(object):
+    """The reply of a throttled function returning a generator, whose body runs while the response
+       is streamed out: the throttled functions it calls are nested calls of the throttled one.
+
+       release, if any, is called once when the iteration ends, when the reply is closed or when it
+       is garbage collected, also if the iteration never started."""
+
+    def __init__(self, throttle, gen, operation, release=None):
+        self.throttle = throttle
+        self.gen = gen
+        self.operation = operation
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            with _NestedCalls(self.throttle, self.operation):
+                return self.gen.next()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        release, self.release = self.release, None
+        try:
+            self.gen.close()
+        finally:
+            if release:
+                release()
+
+    def __del__(self):
+        self.close()
+
 class UserThrottle(object):
+    """Limit the number of active operations of each user and, with a RateLimiter, the rate of their requests.
 
-    def __init__(self, limit=3):
+       The throttled functions can call each other: only the outermost call counts."""
+
+    def __init__(self, limit=3, rateLimiter=None):
         self.lock = threading.Lock()
         self.tls = threading.local()
         self.users = {}
         self.limit = limit
+        self.rateLimiter = rateLimiter
         self.logger = logging.getLogger("CRABLogger.Utils.UserThrottle")
 
     def getLimit(self):
@@ -178,16 +454,64 @@ class UserThrottle(object):
         self.users.setdefault(user, 0)
         return _ThrottleCounter(self, user)
 
-    def make_throttled(self):
+    def checkRate(self, user, api, cost='cheap'):
+        """Raise TooManyRequests, with the Retry-After header, if the user exceeded the rate of requests to the api."""
+        if self.rateLimiter is None or getattr(self.tls, 'rated', 0):
+            return
+        wait = self.rateLimiter.take(user, api, cost)
+        if wait:
+            retryafter = int(math.ceil(wait))
+            Metrics.rateLimitRejections.inc(api, cost)
+            ## cherrypy removes Retry-After from the error responses: the hook sets it back, after the error page is built.
+            cherrypy.request.hooks.attach('before_finalize', _setRetryAfter, retryafter=retryafter)
+            raise TooManyRequests(retryafter, "The rate of %s requests exceeds the limit for user %s, retry after %d seconds" % (api, user, retryafter))
+
+    def make_throttled(self, api=None, cost='cheap'):
+        """Decorator limiting the active operations and the rate of the requests of the user.
+
+           :arg str api: the name of the rate limited API, by default the name of the function;
+           :arg str cost: the class of the API in the limits of the RateLimiter, 'cheap' or 'expensive'."""
         def throttled_decorator(fn):
+            @wraps(fn)
             def throttled_wrapped_function(*args, **kw):
                 username = cherrypy.request.user['login']
+                self.checkRate(username, api or fn.__name__, cost)
                 with self.throttleContext(username):
-                    return fn(*args, **kw)
+                    with _NestedCalls(self, operation=False):
+                        result = fn(*args, **kw)
+                    if not isinstance(result, types.GeneratorType) or self.tls.count > 1:
+                        return result
+                    ## The operation stays active until the end of the iteration.
+                    with self.lock:
+                        self.users[username] += 1
+                return _ThrottledReply(self, result, operation=True, release=lambda: self._releaseUser(username))
             return throttled_wrapped_function
         return throttled_decorator
 
+    def make_rate_limited(self, api=None, cost='cheap'):
+        """Decorator limiting only the rate of the requests of the user, not its active operations.
+
+           :arg str api: the name of the rate limited API, by default the name of the function;
+           :arg str cost: the class of the API in the limits of the RateLimiter, 'cheap' or 'expensive'."""
+        def rate_limited_decorator(fn):
+            @wraps(fn)
+            def rate_limited_function(*args, **kw):
+                self.checkRate(cherrypy.request.user['login'], api or fn.__name__, cost)
+                nested = getattr(self.tls, 'rated', 0)
+                with _NestedCalls(self, operation=False):
+                    result = fn(*args, **kw)
+                if not isinstance(result, types.GeneratorType) or nested:
+                    return result
+                return _ThrottledReply(self, result, operation=False)
+            return rate_limited_function
+        return rate_limited_decorator
+
+    def _releaseUser(self, user):
+        with self.lock:
+            self.users[user] -= 1
+
     def _incUser(self, user):
+        """Count an operation of the user, returning the number of the other operations of the user."""
         retval = 0
         with self.lock:
             retval = self.users[user]
@@ -196,6 +520,9 @@ class UserThrottle(object):
             self.tls.count += 1
             if self.tls.count == 1:
                 self.users[user] = retval + 1
+            else:
+                ## A nested operation: the thread already holds one of the operations of the user.
+                retval -= 1
         return retval
 
     def _decUser(self, user):
@@ -207,7 +534,7 @@ class UserThrottle(object):
                 self.users[user] = retval - 1
         return retval
 
-global_user_throttle = UserThrottle()
+global_user_throttle = UserThrottle(rateLimiter=RateLimiter())
 
 def retrieveUserCert(func):
     def wrapped_func(*args, **kwargs):
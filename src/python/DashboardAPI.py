@@ -6,6 +6,7 @@ This is the Dashboard API Module for the Worker Node
 
 import apmon
 import time, sys, os
+import atexit
 import traceback
 from types import DictType, StringType, ListType
 
@@ -19,6 +20,7 @@ apmonUseUrl = False
 # Internal attributes
 apmonInstance = None
 apmonInit = False
+apmonExitHandler = False
 
 # Monalisa configuration
 #apmonUrlList = ["http://lxgate35.cern.ch:40808/ApMonConf?app=dashboard", \
@@ -63,6 +65,25 @@ def getApmonInstance():
                 pass
     return apmonInstance 
 
+#
+# Method to send the params from a background thread, so that the callers do
+# not wait for the network (see ApMon.enableBatchSend). The queue has room for
+# queueSize parameter sets on top of those still queued. The thread is shared
+# by all the callers of the process and is freed at exit, waiting at most
+# flushTimeout seconds for the parameters still queued.
+#
+def apmonEnableBatchSend(queueSize=10000, maxDatagramSize=1400, flushTimeout=None) :
+    global apmonExitHandler
+    apm = getApmonInstance()
+    if apm is not None :
+        try :
+            apm.enableBatchSend(apm.getQueueDepth() + queueSize, maxDatagramSize, flushTimeout)
+        except Exception as e :
+            pass
+        if not apmonExitHandler :
+            apmonExitHandler = True
+            atexit.register(apmonFree)
+
 #
 # Method to free the apmon instance
 #
@@ -70,7 +91,9 @@ def apmonFree() :
     global apmonInstance
     global apmonInit
     if apmonInstance is not None :
-        time.sleep(1)
+        # In batch mode free() waits for the queued params to be sent, at most flushTimeout seconds
+        if not apmonInstance.batchSendEnabled() :
+            time.sleep(1)
         try :
             apmonInstance.free()
         except Exception as e :
@@ -2,6 +2,18 @@
 
 import logging
 
+def bindList(name, values, binds):
+    """Add the values to binds as name0, name1, ... and return their placeholders for an IN list,
+       padded with the last value to a power of two (or to MAX_BIND_LIST)."""
+    size = 1
+    while size < len(values):
+        size *= 2
+    size = min(size, FileMetaData.MAX_BIND_LIST)
+    values = list(values) + [values[-1]] * (size - len(values))
+    for num, value in enumerate(values):
+        binds['%s%d' % (name, num)] = value
+    return ', '.join(['%%(%s%d)s' % (name, num) for num in range(size)])
+
 class FileMetaData(object):
     """
     """
@@ -28,10 +40,13 @@ class FileMetaData(object):
                            fmd_filestate AS state,
                            fmd_tmplfn AS tmplfn
                     FROM filemetadata
-                    WHERE tm_taskname = %(taskname)s
-                    AND FIND_IN_SET(fmd_type, %(filetype)s)
-                    ORDER BY fmd_creation_time DESC
-             """
+                    WHERE tm_taskname = %(taskname)s"""
+    FilterTypes_sql = " AND fmd_type IN (%s)"
+    FilterJobs_sql = " AND panda_job_id IN (%s)"
+    OrderByTime_sql = " ORDER BY fmd_creation_time DESC"
+    LimitRows_sql = "%s LIMIT %%(limit)s"
+
+    MAX_BIND_LIST = 1000
 
     New_sql = "INSERT INTO filemetadata ( \
                tm_taskname, panda_job_id, fmd_outdataset, fmd_acq_era, fmd_sw_ver, fmd_in_events, fmd_global_tag,\
@@ -42,5 +57,20 @@ class FileMetaData(object):
                        %(checksummd5)s, %(outlfn)s, %(outsize)s,\
                        %(outtype)s, %(inparentlfns)s, UTC_TIMESTAMP(), %(filestate)s, %(outtmplfn)s)"
 
+    @classmethod
+    def getFromTaskAndType(cls, taskname, filetypes, jobids=None, limit=None):
+        """Return the statement and the binds selecting the files of the task with a type in filetypes,
+           produced by the jobs in jobids (if not None), the latest first and at most limit (if not None)."""
+        binds = {'taskname': taskname}
+        sql = cls.GetFromTaskAndType_sql + cls.FilterTypes_sql % bindList('filetype', filetypes, binds)
+        if jobids is not None:
+            sql += cls.FilterJobs_sql % bindList('jobid', jobids, binds)
+        sql += cls.OrderByTime_sql
+        if limit is not None:
+            sql = cls.LimitRows_sql % sql
+            binds['limit'] = limit
+        return sql, binds
+
     DeleteTaskFiles_sql = "DELETE FROM filemetadata WHERE tm_taskname = %(taskname)s"
     DeleteFilesByTime_sql = "DELETE FROM filemetadata WHERE fmd_creation_time < sysdate - (:hours/24)" #TODO need to check this
+    DeleteFilesByTimeBatch_sql = "DELETE FROM filemetadata WHERE fmd_creation_time < UTC_TIMESTAMP() - INTERVAL %(hours)s HOUR LIMIT %(limit)s"
@@ -52,3 +52,13 @@ class Create(DBCreator):
               CONSTRAINT fk_tm_taskname FOREIGN KEY (tm_taskname) REFERENCES tasks (tm_taskname)
             )
         """
+        #//
+        # // Index of the files of some types and jobs of a task (GetFromTaskAndType)
+        #//
+        self.indexes['filemetadata_type_job_idx'] = """
+        CREATE INDEX filemetadata_type_job_idx ON filemetadata(tm_taskname, fmd_type, panda_job_id)"""
+        #//
+        # // Index of the deletion of the old files (FMDCleaner)
+        #//
+        self.indexes['filemetadata_creation_time_idx'] = """
+        CREATE INDEX filemetadata_creation_time_idx ON filemetadata(fmd_creation_time)"""
@@ -9,6 +9,21 @@ class GetFromTaskAndType():
     PANDAID, OUTDS, ACQERA, SWVER, INEVENTS, GLOBALTAG, PUBLISHNAME, LOCATION, TMPLOCATION, RUNLUMI, ADLER32, CKSUM, MD5, LFN, SIZE, PARENTS, STATE,\
     CREATIONTIME, TMPLFN, TYPE, DIRECTSTAGEOUT = range(21)
 
+def bindList(name, values, binds):
+    """Add the values to binds as name0, name1, ... and return their placeholders for an IN list.
+
+    The list is padded with its last value to a power of two (or to MAX_BIND_LIST),
+    so that the statements for any number of values are only a few, and their
+    cursors are shared."""
+    size = 1
+    while size < len(values):
+        size *= 2
+    size = min(size, FileMetaData.MAX_BIND_LIST)
+    values = list(values) + [values[-1]] * (size - len(values))
+    for num, value in enumerate(values):
+        binds['%s%d' % (name, num)] = value
+    return ', '.join([':%s%d' % (name, num) for num in range(size)])
+
 class FileMetaData(object):
     """
     """
@@ -38,10 +53,15 @@ class FileMetaData(object):
                            fmd_type AS type, \
                            fmd_direct_stageout AS directstageout
                     FROM filemetadata \
-                    WHERE tm_taskname = :taskname \
-                    AND fmd_type IN (SELECT REGEXP_SUBSTR(:filetype, '[^,]+', 1, LEVEL) FROM DUAL CONNECT BY LEVEL <= REGEXP_COUNT(:filetype, ',') + 1) \
-                    ORDER BY fmd_creation_time DESC
-             """
+                    WHERE tm_taskname = :taskname"""
+    #the files of some types and jobs, see getFromTaskAndType
+    FilterTypes_sql = " AND fmd_type IN (%s)"
+    FilterJobs_sql = " AND panda_job_id IN (%s)"
+    OrderByTime_sql = " ORDER BY fmd_creation_time DESC"
+    LimitRows_sql = "SELECT * FROM (%s) WHERE ROWNUM <= :limit"
+
+    ## The maximum number of values of an IN list.
+    MAX_BIND_LIST = 1000
 
     New_sql = "INSERT INTO filemetadata ( \
                tm_taskname, panda_job_id, fmd_outdataset, fmd_acq_era, fmd_sw_ver, fmd_in_events, fmd_global_tag,\
@@ -56,5 +76,25 @@ class FileMetaData(object):
 
     GetCurrent_sql = "SELECT panda_job_id from filemetadata WHERE tm_taskname = :taskname AND fmd_lfn = :outlfn"
 
+    @classmethod
+    def getFromTaskAndType(cls, taskname, filetypes, jobids=None, limit=None):
+        """Return the statement and the binds selecting the files of the task with a type in filetypes,
+           produced by the jobs in jobids (if not None), the latest first and at most limit (if not None).
+
+           :arg list filetypes: the file types, e.g. ['EDM', 'TFILE']
+           :arg list jobids: the job ids, at most MAX_BIND_LIST
+           :return: (sql, binds) to be passed to the query of the REST api."""
+        binds = {'taskname': taskname}
+        sql = cls.GetFromTaskAndType_sql + cls.FilterTypes_sql % bindList('filetype', filetypes, binds)
+        if jobids is not None:
+            sql += cls.FilterJobs_sql % bindList('jobid', jobids, binds)
+        sql += cls.OrderByTime_sql
+        if limit is not None:
+            sql = cls.LimitRows_sql % sql
+            binds['limit'] = limit
+        return sql, binds
+
     DeleteTaskFiles_sql = "DELETE FROM filemetadata WHERE tm_taskname = :taskname"
     DeleteFilesByTime_sql = "DELETE FROM filemetadata WHERE fmd_creation_time < sysdate - (:hours/24)"
+    #at most :limit files, see FMDCleaner
+    DeleteFilesByTimeBatch_sql = "DELETE FROM filemetadata WHERE fmd_creation_time < sysdate - (:hours/24) AND ROWNUM <= :limit"
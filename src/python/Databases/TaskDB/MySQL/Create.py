@@ -13,7 +13,9 @@ class Create(DBCreator):
     Implementation of TaskMgr DB for MySQL
     """
     requiredTables = ['tasks',
-                      'jobgroups'
+                      'jobgroups',
+                      'task_warnings',
+                      'task_counts'
                       ]
 
     def __init__(self, logger=None, dbi=None, param=None):
@@ -117,3 +119,57 @@ class Create(DBCreator):
         CONSTRAINT jobgroup_id_pk PRIMARY KEY(tm_jobgroups_id)
         )  ENGINE=InnoDB
         """
+        self.create['d_task_warnings'] = """
+        CREATE TABLE task_warnings(
+        tm_warning_id BIGINT NOT NULL AUTO_INCREMENT,
+        tm_taskname VARCHAR(255) NOT NULL,
+        tm_warning LONGTEXT NOT NULL,
+        CONSTRAINT warning_taskname_fk FOREIGN KEY(tm_taskname) references
+            tasks(tm_taskname)
+            ON DELETE CASCADE,
+        CONSTRAINT warning_id_pk PRIMARY KEY(tm_warning_id)
+        )  ENGINE=InnoDB
+        """
+        self.create['e_task_counts'] = """
+        CREATE TABLE task_counts(
+        tm_username VARCHAR(255) NOT NULL,
+        tm_task_status VARCHAR(255) NOT NULL,
+        tm_count BIGINT NOT NULL,
+        CONSTRAINT task_counts_pk PRIMARY KEY(tm_username, tm_task_status)
+        )  ENGINE=InnoDB
+        """
+        #  //
+        # // Number of tasks per user and status, maintained at each insertion, deletion
+        #//  and change of status of a task, for the summary APIs
+        self.create['e_task_counts_ins_trg'] = """
+        CREATE TRIGGER task_counts_ins_trg AFTER INSERT ON tasks
+        FOR EACH ROW
+            INSERT INTO task_counts (tm_username, tm_task_status, tm_count)
+                VALUES (NEW.tm_username, NEW.tm_task_status, 1)
+                ON DUPLICATE KEY UPDATE tm_count = tm_count + 1"""
+        self.create['e_task_counts_del_trg'] = """
+        CREATE TRIGGER task_counts_del_trg AFTER DELETE ON tasks
+        FOR EACH ROW
+            UPDATE task_counts SET tm_count = tm_count - 1
+                WHERE tm_username = OLD.tm_username AND tm_task_status = OLD.tm_task_status"""
+        self.create['e_task_counts_upd_trg'] = """
+        CREATE TRIGGER task_counts_upd_trg AFTER UPDATE ON tasks
+        FOR EACH ROW
+        BEGIN
+            IF NEW.tm_username <> OLD.tm_username OR NEW.tm_task_status <> OLD.tm_task_status THEN
+                UPDATE task_counts SET tm_count = tm_count - 1
+                    WHERE tm_username = OLD.tm_username AND tm_task_status = OLD.tm_task_status;
+                INSERT INTO task_counts (tm_username, tm_task_status, tm_count)
+                    VALUES (NEW.tm_username, NEW.tm_task_status, 1)
+                    ON DUPLICATE KEY UPDATE tm_count = tm_count + 1;
+            END IF;
+        END"""
+        #  //
+        # // Indexes of the queries on the user and status of the tasks
+        #//
+        self.indexes['tasks_user_status_idx'] = """
+        CREATE INDEX tasks_user_status_idx ON tasks(tm_username, tm_task_status, tm_taskname)"""
+        self.indexes['tasks_status_start_idx'] = """
+        CREATE INDEX tasks_status_start_idx ON tasks(tm_task_status, tm_start_time)"""
+        self.indexes['tasks_start_status_idx'] = """
+        CREATE INDEX tasks_start_status_idx ON tasks(tm_start_time, tm_task_status)"""
@@ -5,6 +5,10 @@ import logging
 class Task(object):
     """
     """
+    ALLUSER_sql = "SELECT DISTINCT(tm_username) FROM task_counts WHERE tm_count > 0"
+
+    TASKSUMMARY_sql = "SELECT tm_username, tm_task_status, tm_count FROM task_counts WHERE tm_count > 0 ORDER BY tm_username"
+
     GetFailedTasks_sql = "SELECT tm_taskname, tm_task_status FROM tasks WHERE tm_task_status = 'FAILED'"
 
     GetInjectedTasks_sql = "SELECT tm_taskname, tm_task_status FROM tasks WHERE \
@@ -49,6 +53,8 @@ class Task(object):
                    tm_publish_groupname, tm_nonvalid_input_dataset \
                    FROM tasks WHERE tm_task_status = %(get_status)s AND tw_name = %(tw_name)s limit %(limit)s """
 
+    GetReadyTasksColumns_sql = "SELECT %s FROM tasks WHERE tm_task_status = %%(get_status)s AND tw_name = %%(tw_name)s limit %%(limit)s"
+
     GetUserFromID_sql = "SELECT tm_username FROM tasks WHERE tm_taskname=%(taskname)s"
 
     ID_sql = "SELECT tm_taskname, panda_jobset_id, tm_task_status, tm_user_role, \
@@ -113,6 +119,14 @@ class Task(object):
     SetUpdateOutDataset_sql = """UPDATE tasks SET tm_output_dataset = %(tm_output_dataset)s \
                                 WHERE tm_taskname = %(tm_taskname)s"""
 
+    AddWarning_sql = """INSERT INTO task_warnings (tm_taskname, tm_warning) \
+                        SELECT tm_taskname, %(warning)s FROM tasks WHERE tm_taskname = %(workflow)s \
+                        AND (SELECT COUNT(*) FROM task_warnings WHERE tm_taskname = %(workflow)s) < %(maxwarnings)s"""
+
+    GetLegacyWarnings_sql = """SELECT tm_task_warnings FROM tasks WHERE tm_taskname = %(workflow)s FOR UPDATE"""
+
+    GetWarnings_sql = """SELECT tm_warning FROM task_warnings WHERE tm_taskname = %(workflow)s ORDER BY tm_warning_id"""
+
     UpdateWebUrl_sql = """UPDATE tasks SET tm_user_webdir = %(webdirurl)s \
                               WHERE tm_taskname = %(workflow)s"""
 
@@ -14,7 +14,10 @@ class Create(DBCreator):
     """
     requiredTables = ['tasks',
                       'jobgroups',
-                      'jobgroups_id_seq'
+                      'jobgroups_id_seq',
+                      'task_warnings',
+                      'task_warnings_id_seq',
+                      'task_counts'
                       ]
 
     def __init__(self, logger=None, dbi=None, param=None):
@@ -132,3 +135,74 @@ class Create(DBCreator):
         BEGIN
         SELECT jobgroups_id_seq.nextval INTO :new.tm_jobgroups_id FROM dual;
         END;"""
+        self.create['d_task_warnings'] = """
+        CREATE TABLE task_warnings(
+        tm_warning_id NUMBER(38) NOT NULL,
+        tm_taskname VARCHAR(255) NOT NULL,
+        tm_warning CLOB NOT NULL,
+        CONSTRAINT warning_taskname_fk FOREIGN KEY(tm_taskname) references
+            tasks(tm_taskname)
+            ON DELETE CASCADE,
+        CONSTRAINT warning_id_pk PRIMARY KEY(tm_warning_id)
+        )
+        """
+        self.create['d_task_warnings_id_seq'] = """
+        CREATE SEQUENCE task_warnings_id_seq
+        START WITH 1
+        INCREMENT BY 1
+        NOMAXVALUE"""
+        self.create['d_task_warnings_id_trg'] =  """
+        CREATE TRIGGER task_warnings_id_trg
+        BEFORE INSERT ON task_warnings
+        FOR EACH ROW
+        BEGIN
+        SELECT task_warnings_id_seq.nextval INTO :new.tm_warning_id FROM dual;
+        END;"""
+        self.create['e_task_counts'] = """
+        CREATE TABLE task_counts(
+        tm_username VARCHAR(255) NOT NULL,
+        tm_task_status VARCHAR(255) NOT NULL,
+        tm_count NUMBER(38) NOT NULL,
+        CONSTRAINT task_counts_pk PRIMARY KEY(tm_username, tm_task_status)
+        )
+        """
+        #  //
+        # // Number of tasks per user and status, maintained at each insertion, deletion
+        #//  and change of status of a task, for the summary APIs
+        self.create['e_task_counts_trg'] = """
+        CREATE TRIGGER task_counts_trg
+        AFTER INSERT OR DELETE OR UPDATE OF tm_username, tm_task_status ON tasks
+        FOR EACH ROW
+        BEGIN
+        IF UPDATING AND :new.tm_username = :old.tm_username AND :new.tm_task_status = :old.tm_task_status THEN
+            RETURN;
+        END IF;
+        IF INSERTING OR UPDATING THEN
+            UPDATE task_counts SET tm_count = tm_count + 1
+                WHERE tm_username = :new.tm_username AND tm_task_status = :new.tm_task_status;
+            IF SQL%ROWCOUNT = 0 THEN
+                BEGIN
+                    INSERT INTO task_counts (tm_username, tm_task_status, tm_count)
+                        VALUES (:new.tm_username, :new.tm_task_status, 1);
+                EXCEPTION WHEN DUP_VAL_ON_INDEX THEN
+                    UPDATE task_counts SET tm_count = tm_count + 1
+                        WHERE tm_username = :new.tm_username AND tm_task_status = :new.tm_task_status;
+                END;
+            END IF;
+        END IF;
+        IF DELETING OR UPDATING THEN
+            UPDATE task_counts SET tm_count = tm_count - 1
+                WHERE tm_username = :old.tm_username AND tm_task_status = :old.tm_task_status;
+        END IF;
+        END;"""
+        #  //
+        # // Indexes of the queries on the user and status of the tasks
+        #//
+        self.indexes['tasks_user_status_idx'] = """
+        CREATE INDEX tasks_user_status_idx ON tasks(tm_username, tm_task_status, tm_taskname)"""
+        self.indexes['tasks_status_start_idx'] = """
+        CREATE INDEX tasks_status_start_idx ON tasks(tm_task_status, tm_start_time)"""
+        self.indexes['tasks_start_status_idx'] = """
+        CREATE INDEX tasks_start_status_idx ON tasks(tm_start_time, tm_task_status)"""
+        self.indexes['task_warnings_taskname_idx'] = """
+        CREATE INDEX task_warnings_taskname_idx ON task_warnings(tm_taskname)"""
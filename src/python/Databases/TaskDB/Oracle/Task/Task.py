@@ -22,8 +22,9 @@ class Task(object):
              FROM tasks WHERE tm_taskname = :taskname"
 
     #INSERTED BY ERIC SUMMER STUDENT
-    ALLUSER_sql = "SELECT DISTINCT(tm_username) FROM tasks"
-    TASKSUMMARY_sql = "select tm_username, tm_task_status, count(*) from tasks group by tm_username, tm_task_status order by tm_username"
+    #read the number of tasks per user and status maintained by task_counts_trg, not the whole tasks table
+    ALLUSER_sql = "SELECT DISTINCT(tm_username) FROM task_counts WHERE tm_count > 0"
+    TASKSUMMARY_sql = "SELECT tm_username, tm_task_status, tm_count FROM task_counts WHERE tm_count > 0 ORDER BY tm_username"
     #get taskname by user and status
     GetByUserAndStatus_sql = "select tm_taskname from tasks where tm_username=:username and tm_task_status=:status"
     #quick search
@@ -109,6 +110,9 @@ class Task(object):
                        tm_publish_groupname, tm_nonvalid_input_dataset \
                        FROM tasks WHERE tm_task_status = :get_status AND ROWNUM <= :limit AND tw_name = :tw_name"""
 
+    #GetReadyTasks with a subset of the columns, formatted with the comma separated list of the columns
+    GetReadyTasksColumns_sql = "SELECT %s FROM tasks WHERE tm_task_status = :get_status AND ROWNUM <= :limit AND tw_name = :tw_name"
+
     #GetUserFromID
     GetUserFromID_sql ="SELECT tm_username FROM tasks WHERE tm_taskname=:taskname"
 
@@ -167,8 +171,17 @@ class Task(object):
     SetUpdateOutDataset_sql = """UPDATE tasks SET tm_output_dataset = :tm_output_dataset \
                                 WHERE tm_taskname = :tm_taskname"""
 
-    #UpdateWarnings
-    SetWarnings_sql = """UPDATE tasks SET tm_task_warnings=:warnings WHERE tm_taskname=:workflow"""
+    #AddWarning: append a warning in one statement, only while the task has less than :maxwarnings
+    AddWarning_sql = """INSERT INTO task_warnings (tm_taskname, tm_warning) \
+                        SELECT tm_taskname, :warning FROM tasks WHERE tm_taskname = :workflow \
+                        AND (SELECT COUNT(*) FROM task_warnings WHERE tm_taskname = :workflow) < :maxwarnings"""
+
+    #GetLegacyWarnings: the warnings added before the task_warnings table, if the task exists,
+    #locking the task until the commit of AddWarning so that the writers of a task count one after the other
+    GetLegacyWarnings_sql = """SELECT tm_task_warnings FROM tasks WHERE tm_taskname = :workflow FOR UPDATE"""
+
+    #GetWarnings
+    GetWarnings_sql = """SELECT tm_warning FROM task_warnings WHERE tm_taskname = :workflow ORDER BY tm_warning_id"""
 
     #TaskUpdateWebDir
     UpdateWebUrl_sql = """UPDATE tasks SET tm_user_webdir = :webdirurl \
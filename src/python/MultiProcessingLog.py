@@ -1,60 +1,155 @@
 from logging.handlers import TimedRotatingFileHandler, RotatingFileHandler
-import multiprocessing, threading, logging, sys, traceback
+import multiprocessing, threading, logging, sys, traceback, time, os, Queue
 
 class MultiProcessingLog(logging.Handler):
-    def __init__(self, filename, when='h', interval=1, backupCount=0, encoding=None, delay=False, utc=False):
+    """
+    Log handler which can be shared by forked processes: the records are formatted
+    by the process logging them and sent through a bounded queue to a thread of the
+    process which created the handler, which writes them to the file in batches of
+    up to batchSize records, at least every flushInterval seconds.
+
+    When the queue is full, overflow decides what the sending processes do:
+     - 'block': wait for the queue to have room;
+     - 'drop-debug': drop the DEBUG records, wait for the others;
+     - 'count': drop the record.
+    The dropped records are counted and reported in the log file.
+    """
+
+    OVERFLOW_POLICIES = ['block', 'drop-debug', 'count']
+
+    def __init__(self, filename, when='h', interval=1, backupCount=0, encoding=None, delay=False, utc=False,
+                 queueSize=10000, overflow='block', batchSize=500, flushInterval=1.0):
         self.filename = filename
         logging.Handler.__init__(self)
 
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy %s, must be one of %s" % (overflow, self.OVERFLOW_POLICIES))
+        self.overflow = overflow
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
         self._handler = TimedRotatingFileHandler(filename, when, interval, backupCount, encoding, delay, utc)
-        self.queue = multiprocessing.Queue(-1)
+        self.queue = multiprocessing.Queue(queueSize)
+        ## Shared with the forked processes, which are the ones dropping records.
+        self._dropped = multiprocessing.Value('l', 0)
+        self._reported_dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._pid = os.getpid()
 
-        t = threading.Thread(target=self.receive)
-        t.daemon = True
-        t.start()
+        self._thread = threading.Thread(target=self.receive)
+        self._thread.daemon = True
+        self._thread.start()
 
     def setFormatter(self, fmt):
         logging.Handler.setFormatter(self, fmt)
         self._handler.setFormatter(fmt)
 
     def receive(self):
+        batch = []
+        first = None
         while True:
             try:
-                record = self.queue.get()
-                self._handler.emit(record)
+                timeout = self.flushInterval
+                if batch:
+                    timeout = max(0, first + self.flushInterval - time.time())
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except Queue.Empty:
+                    record = False
+                if record is None:
+                    break
+                if record:
+                    if not batch:
+                        first = time.time()
+                    batch.append(record)
+                    ## Take what is already in the queue without waiting.
+                    while len(batch) < self.batchSize and not self.queue.empty():
+                        record = self.queue.get()
+                        if record is None:
+                            break
+                        batch.append(record)
+                    if record is None:
+                        break
+                if batch and (len(batch) >= self.batchSize or time.time() >= first + self.flushInterval):
+                    self._write(batch)
+                    batch = []
             except (KeyboardInterrupt, SystemExit):
                 raise
             except EOFError:
                 break
             except:
                 traceback.print_exc(file=sys.stderr)
+                batch = []
+        if batch:
+            self._write(batch)
 
-    def send(self, s):
-        self.queue.put_nowait(s)
+    def _write(self, records):
+        """
+        Write the formatted records with a single write and flush,
+        doing the rollover of the file handler when needed.
+        """
+        written = len(records)
+        dropped = self._dropped.value
+        if dropped > self._reported_dropped:
+            msg = "%d log records dropped because the log queue was full" % (dropped - self._reported_dropped)
+            records.append(self.format(logging.LogRecord('MultiProcessingLog', logging.WARNING, __file__, 0, msg, None, None)))
+            self._reported_dropped = dropped
+        ## The time based rollover does not depend on the record.
+        if self._handler.shouldRollover(None):
+            self._handler.doRollover()
+        lines = []
+        for msg in records:
+            if isinstance(msg, unicode) and not self._handler.encoding:
+                msg = msg.encode('utf-8')
+            lines.append(msg)
+        if self._handler.stream is None:
+            self._handler.stream = self._handler._open()
+        self._handler.stream.write("\n".join(lines) + "\n")
+        self._handler.stream.flush()
+        self.written += written
+        self.batches += 1
 
-    def _format_record(self, record):
-        # ensure that exc_info and args
-        # have been stringified.  Removes any chance of
-        # unpickleable things inside and possibly reduces
-        # message size sent over the pipe
-        if record.args:
-            record.msg = record.msg % record.args
-            record.args = None
-        if record.exc_info:
-            dummy = self.format(record)
-            record.exc_info = None
+    def send(self, s, levelno=logging.INFO):
+        if self.overflow == 'block':
+            self.queue.put(s)
+            return
+        try:
+            self.queue.put_nowait(s)
+        except Queue.Full:
+            if self.overflow == 'drop-debug' and levelno > logging.DEBUG:
+                self.queue.put(s)
+                return
+            with self._dropped.get_lock():
+                self._dropped.value += 1
 
-        return record
+    def get_stats(self):
+        """
+        Return the number of records waiting in the queue, dropped, written to
+        the file and the number of writes; the last two are only known by the
+        process which created the handler.
+        """
+        try:
+            depth = self.queue.qsize()
+        except NotImplementedError:
+            depth = -1
+        return {'queue_depth': depth, 'dropped': self._dropped.value, 'written': self.written, 'batches': self.batches}
 
     def emit(self, record):
         try:
-            s = self._format_record(record)
-            self.send(s)
+            # sending the formatted string is much cheaper than
+            # pickling the record, and there is nothing unpickleable
+            s = self.format(record)
+            self.send(s, record.levelno)
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
             self.handleError(record)
 
     def close(self):
+        ## Only the process which created the handler writes the file: let its
+        ## thread write what is still in the queue before closing the file.
+        if os.getpid() == self._pid and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(10)
         self._handler.close()
         logging.Handler.close(self)
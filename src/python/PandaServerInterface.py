@@ -1,13 +1,18 @@
 import os
 import re
 import sys
+import ssl
 import time
 import stat
+import zlib
 import types
 import random
 import urllib
 import struct
+import httplib
+import urlparse
 import commands
+import threading
 import cPickle as pickle
 import xml.dom.minidom
 import socket
@@ -21,6 +26,11 @@ LOGGER = logging.getLogger(__name__)
 EC_Failed = 255
 
 globalTmpDir = ''
+
+# 'httplib' to talk to PanDA in process reusing the connections, 'curl' to run the curl command
+transport = 'httplib'
+# seconds to wait for the server with the httplib transport
+connectionTimeout = 600
 #PandaSites = {}
 #PandaClouds = {}
 
@@ -116,6 +126,7 @@ class _Curl:
         if self.verbose:
             LOGGER.debug(com)
             LOGGER.debug(strData[:-1])
+        start = time.time()
         s,o = commands.getstatusoutput(com)
         if o != '\x00':
             try:
@@ -127,6 +138,7 @@ class _Curl:
         # remove temporary file
         os.remove(tmpName)
         ret = self.convRet(ret)
+        _record(url, start, ret[0])
         if self.verbose:
             LOGGER.debug(ret)
         return ret
@@ -169,6 +181,7 @@ class _Curl:
         if self.verbose:
             LOGGER.debug(com)
             LOGGER.debug(strData[:-1])
+        start = time.time()
         s,o = commands.getstatusoutput(com)
         #print s,o
         if o != '\x00':
@@ -181,6 +194,7 @@ class _Curl:
         # remove temporary file
         os.remove(tmpName)
         ret = self.convRet(ret)
+        _record(url, start, ret[0])
         if self.verbose:
             LOGGER.debug(ret)
         return ret
@@ -205,8 +219,10 @@ class _Curl:
         if self.verbose:
             LOGGER.debug(com)
         # execute
+        start = time.time()
         ret = commands.getstatusoutput(com)
         ret = self.convRet(ret)
+        _record(url, start, ret[0])
         if self.verbose:
             LOGGER.debug(ret)
         return ret
@@ -228,10 +244,237 @@ class _Curl:
         return ret
 
 
+# requests made to PanDA: {api: {'requests': n, 'errors': n, 'time': seconds, 'maxTime': seconds}}
+# and the number of connections opened and reused by the httplib transport
+_stats = {}
+_connStats = {'opened': 0, 'reused': 0}
+_statsLock = threading.Lock()
+
+def _record(url, start, status):
+    api = url.rstrip('/').split('/')[-1]
+    elapsed = time.time() - start
+    _statsLock.acquire()
+    try:
+        apiStats = _stats.setdefault(api, {'requests': 0, 'errors': 0, 'time': 0.0, 'maxTime': 0.0})
+        apiStats['requests'] += 1
+        if status != 0:
+            apiStats['errors'] += 1
+        apiStats['time'] += elapsed
+        apiStats['maxTime'] = max(apiStats['maxTime'], elapsed)
+    finally:
+        _statsLock.release()
+
+def getTransportStats():
+    """
+    Return a copy of the request and latency counters, per PanDA API,
+    and the connection counters of the httplib transport.
+    """
+    _statsLock.acquire()
+    try:
+        apis = dict((api, dict(apiStats)) for api, apiStats in _stats.items())
+        return {'apis': apis, 'connections': dict(_connStats)}
+    finally:
+        _statsLock.release()
+
+def resetTransportStats():
+    _statsLock.acquire()
+    try:
+        _stats.clear()
+        _connStats['opened'] = 0
+        _connStats['reused'] = 0
+    finally:
+        _statsLock.release()
+
+
+# idle keep-alive connections of the httplib transport, by (scheme, host, port, cert, key, verifyHost)
+_connPool = {}
+_connPoolLock = threading.Lock()
+
+# HTTP transport running in process and keeping the connections open between requests,
+# with the same methods and return values of _Curl
+class _HTTPTransport(_Curl):
+
+    def _getConnection(self, key):
+        _connPoolLock.acquire()
+        try:
+            idle = _connPool.get(key)
+            if idle:
+                _connStats['reused'] += 1
+                return idle.pop(), True
+            _connStats['opened'] += 1
+        finally:
+            _connPoolLock.release()
+        scheme, host, port, sslCert, sslKey, verifyHost = key
+        if scheme == 'https':
+            kwargs = {'key_file': sslKey or None, 'cert_file': sslCert or None}
+            if verifyHost and hasattr(ssl, 'create_default_context'):
+                kwargs['context'] = ssl.create_default_context(capath=_x509_CApath())
+            elif hasattr(ssl, '_create_unverified_context'):
+                kwargs['context'] = ssl._create_unverified_context()
+            if 'context' in kwargs and (sslCert or sslKey):
+                kwargs['context'].load_cert_chain(sslCert, sslKey or None)
+            conn = httplib.HTTPSConnection(host, port, timeout=connectionTimeout, **kwargs)
+        else:
+            conn = httplib.HTTPConnection(host, port, timeout=connectionTimeout)
+        return conn, False
+
+    def _releaseConnection(self, key, conn):
+        _connPoolLock.acquire()
+        try:
+            _connPool.setdefault(key, []).append(conn)
+        finally:
+            _connPoolLock.release()
+
+    def _request(self, method, url, body=None, headers=None, bodyFile=None, bodyTail=''):
+        """
+        Send the request on a pooled connection and return (status, output) like the curl
+        command: status is 0 if an answer was received, whatever its HTTP status.
+        A reused connection which the server has closed meanwhile is replaced once.
+        """
+        parsed = urlparse.urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        key = (parsed.scheme, parsed.hostname, parsed.port, self.sslCert, self.sslKey, self.verifyHost)
+        headers = dict(headers or {})
+        headers['User-Agent'] = 'dqcurl'
+        if self.compress:
+            headers['Accept-Encoding'] = 'gzip, deflate'
+        while True:
+            try:
+                conn, reused = self._getConnection(key)
+            except (ssl.SSLError, IOError) as ex:
+                # e.g. the proxy can not be loaded
+                return 35, str(ex)
+            try:
+                if bodyFile is None:
+                    conn.request(method, path, body, headers)
+                else:
+                    # stream the file instead of reading it in memory
+                    conn.putrequest(method, path, skip_accept_encoding=True)
+                    for name, value in headers.items():
+                        conn.putheader(name, value)
+                    conn.endheaders()
+                    conn.send(body)
+                    bodyFile.seek(0)
+                    data = bodyFile.read(1024*1024)
+                    while data:
+                        conn.send(data)
+                        data = bodyFile.read(1024*1024)
+                    conn.send(bodyTail)
+            except ssl.SSLError as ex:
+                conn.close()
+                return 35, str(ex)
+            except (socket.error, httplib.HTTPException) as ex:
+                conn.close()
+                if reused:
+                    continue
+                if isinstance(ex, socket.error) and ex.errno in (111, 113, -2, -3):
+                    return 7, str(ex)
+                return 55, str(ex)
+            try:
+                response = conn.getresponse()
+                output = response.read()
+            except (socket.error, httplib.HTTPException) as ex:
+                conn.close()
+                if reused and bodyFile is None and isinstance(ex, httplib.BadStatusLine):
+                    continue
+                return 56, str(ex)
+            if response.will_close:
+                conn.close()
+            else:
+                self._releaseConnection(key, conn)
+            encoding = response.getheader('Content-Encoding', '')
+            if encoding == 'gzip':
+                output = zlib.decompress(output, 16 + zlib.MAX_WBITS)
+            elif encoding == 'deflate':
+                output = zlib.decompress(output)
+            # as commands.getstatusoutput does for the curl command
+            if output.endswith('\n'):
+                output = output[:-1]
+            return 0, output
+
+    def _encodeData(self, data, rucioAccount):
+        # add rucio account info
+        if rucioAccount:
+            if os.environ.has_key('RUCIO_ACCOUNT'):
+                data['account'] = os.environ['RUCIO_ACCOUNT']
+            if os.environ.has_key('RUCIO_APPID'):
+                data['appid'] = os.environ['RUCIO_APPID']
+        return '&'.join([urllib.urlencode({key: data[key]}) for key in data.keys()])
+
+    def _call(self, method, url, data, rucioAccount):
+        strData = self._encodeData(data, rucioAccount)
+        if self.verbose:
+            LOGGER.debug('%s %s' % (method, url))
+            LOGGER.debug(strData)
+        start = time.time()
+        if method == 'GET':
+            if strData:
+                url += ('&' if '?' in url else '?') + strData
+            ret = self._request('GET', url)
+        else:
+            ret = self._request('POST', url, strData, {'Content-Type': 'application/x-www-form-urlencoded'})
+        s, o = ret
+        if s == 0 and o != '\x00':
+            try:
+                tmpout = urllib.unquote_plus(o)
+                o = eval(tmpout)
+            except:
+                pass
+        ret = self.convRet((s, o))
+        _record(url.split('?')[0], start, ret[0])
+        if self.verbose:
+            LOGGER.debug(ret)
+        return ret
+
+    # GET method
+    def get(self,url,data,rucioAccount=False):
+        return self._call('GET', url, data, rucioAccount)
+
+    def post(self,url,data,rucioAccount=False):
+        return self._call('POST', url, data, rucioAccount)
+
+    # PUT method, sending the files as multipart/form-data like curl -F
+    def put(self,url,data):
+        if self.verbose:
+            LOGGER.debug('PUT %s %s' % (url, data))
+        start = time.time()
+        if not data:
+            ret = self._request('GET', url)
+        else:
+            # only one file is sent by the callers, streamed after the part header
+            if len(data) != 1:
+                raise PanDAException("Only one file can be sent, got %s" % data.keys())
+            key, filename = data.items()[0]
+            boundary = '----------------------------%s' % sha1(str(random.random())).hexdigest()[:24]
+            head = '--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n' \
+                   'Content-Type: application/octet-stream\r\n\r\n' % (boundary, key, os.path.basename(filename))
+            tail = '\r\n--%s--\r\n' % boundary
+            headers = {'Content-Type': 'multipart/form-data; boundary=%s' % boundary,
+                       'Content-Length': str(len(head) + os.path.getsize(filename) + len(tail))}
+            with open(filename, 'rb') as fd:
+                ret = self._request('POST', url, head, headers, fd, tail)
+        ret = self.convRet(ret)
+        _record(url, start, ret[0])
+        if self.verbose:
+            LOGGER.debug(ret)
+        return ret
+
+
+# the transport for the PanDA calls
+def _getCurl():
+    # before python 2.7.9 (e.g. in some CRABClient installations) httplib can not
+    # verify the server certificate: keep using the curl command there
+    if transport == 'curl' or not hasattr(ssl, 'create_default_context'):
+        return _Curl()
+    return _HTTPTransport()
+
+
 # get site specs
 def getSiteSpecs(baseURL, sslCert, sslKey, siteType=None):
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.sslCert = sslCert
     curl.sslKey = sslKey
     # execute
@@ -252,7 +495,7 @@ def getSiteSpecs(baseURL, sslCert, sslKey, siteType=None):
 # get cloud specs
 def getCloudSpecs(baseURL, sslCert, sslKey):
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.sslCert = sslCert
     curl.sslKey = sslKey
     # execute
@@ -297,7 +540,7 @@ def submitJobs(baseURLSSL, jobs, proxy, verbose=False):
     # serialize
     strJobs = pickle.dumps(jobs)
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.sslCert = proxy
     curl.sslKey  = proxy
     curl.verbose = True
@@ -347,7 +590,7 @@ def runBrokerage(baseURLSSL, sites, proxy,
     # serialize
     strSites = pickle.dumps(sites)
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.sslKey = proxy
     curl.sslCert = proxy
     curl.verbose = verbose
@@ -414,7 +657,7 @@ def runBrokerage(baseURLSSL, sites, proxy,
 # get PandaIDs for a JobID
 def getPandIDsWithJobID(baseURLSSL, jobID, dn=None, nJobs=0, verbose=False, userproxy=None, credpath=None):
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.verbose = verbose
     # execute
     url = baseURLSSL + '/getPandIDsWithJobID'
@@ -458,7 +701,7 @@ def killJobs(baseURLSSL, ids, proxy, code=None, verbose=True, useMailAsID=False)
     # serialize
     strIDs = pickle.dumps(ids)
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.sslCert = proxy
     curl.sslKey  = proxy
     curl.verbose = verbose
@@ -479,7 +722,7 @@ def getFullJobStatus(baseURLSSL, ids, proxy, verbose=False):
     # serialize
     strIDs = pickle.dumps(ids)
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.sslCert = proxy
     curl.sslKey  = proxy
     curl.verbose = verbose
@@ -507,7 +750,7 @@ def putFile(baseURL, baseURLCSRVSSL, file, checksum, verbose=False, reuseSandbox
             # get logger
             raise PanDAException(errStr)
     # instantiate curl
-    curl = _Curl()
+    curl = _getCurl()
     curl.sslCert = _x509()
     curl.sslKey  = _x509()
     curl.verbose = verbose
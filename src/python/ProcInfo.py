@@ -34,9 +34,12 @@
 
 import os
 import re
+import math
 import time
+import fcntl
 import string
 import socket
+import struct
 import Logger
 
 """
@@ -44,13 +47,32 @@ Class ProcInfo
 extracts information from the proc/ filesystem for system and job monitoring
 """
 class ProcInfo:
+	# tcp connection states in /proc/net/tcp, named as by netstat
+	TCP_STATES = {'01': 'ESTABLISHED', '02': 'SYN_SENT', '03': 'SYN_RECV', '04': 'FIN_WAIT1',
+		      '05': 'FIN_WAIT2', '06': 'TIME_WAIT', '07': 'CLOSED', '08': 'CLOSE_WAIT',
+		      '09': 'LAST_ACK', '0A': 'LISTEN', '0B': 'CLOSING'};
+
 	# ProcInfo constructor
-	def __init__ (this, logger):
+	# backend is 'proc' to sample /proc and statvfs directly or 'ps' to run ps, netstat,
+	# ifconfig, du and df; by default 'proc' is used where available
+	def __init__ (this, logger, backend = None):
 		this.DATA = {};             # monitored data that is going to be reported
 		this.LAST_UPDATE_TIME = 0;  # when the last measurement was done
 		this.JOBS = {};             # jobs that will be monitored
 		this.logger = logger	    # use the given logger
-		this.OS_TYPE = os.popen('uname -s').readline().replace('\n','');
+		this.OS_TYPE = os.uname()[0];
+		if backend == None:
+			if this.OS_TYPE == 'Linux' and os.path.isdir('/proc/self'):
+				backend = 'proc';
+			else:
+				backend = 'ps';
+		this.BACKEND = backend;
+		this.PPIDS = {};            # pid -> (start time, parent pid) of all the processes, for the 'proc' backend
+		this.PPIDS_TIME = 0;        # when this.PPIDS was read
+		this.DU_CACHE = {};         # work directory -> (time, size in KB) for the 'proc' backend
+		this.DU_CACHE_TIME = 300;   # seconds a work directory size is reused
+		this.CLK_TCK = os.sysconf('SC_CLK_TCK');
+		this.PAGE_SIZE = os.sysconf('SC_PAGE_SIZE');
 	
 	# This should be called from time to time to update the monitored data,
 	# but not more often than once a second because of the resolution of time()
@@ -64,13 +86,20 @@ class ProcInfo:
 			this.darwin_readLoadAvg();
 		else:
 			this.readLoadAvg();
-		this.countProcesses();
 		this.readGenericInfo();
 		this.readNetworkInfo();
-		this.readNetStat();
-		for pid in this.JOBS.keys():
-			this.readJobInfo(pid);
-			this.readJobDiskUsage(pid);
+		if this.BACKEND == 'proc':
+			this.proc_countProcesses();
+			this.proc_readNetStat();
+			for pid in this.JOBS.keys():
+				this.proc_readJobInfo(pid);
+				this.proc_readJobDiskUsage(pid);
+		else:
+			this.countProcesses();
+			this.readNetStat();
+			for pid in this.JOBS.keys():
+				this.readJobInfo(pid);
+				this.readJobDiskUsage(pid);
 		this.LAST_UPDATE_TIME = int(time.time());
 		this.DATA['TIME'] = int(time.time());
 		
@@ -207,7 +236,8 @@ class ProcInfo:
 		    output = os.popen('ps -A -o state');
 		    line = output.readline();
 		    while(line != ''):
-			states[line[0]] = states[line[0]] + 1;
+			if states.has_key(line[0]): # e.g. I (idle kernel threads) is not counted
+			    states[line[0]] = states[line[0]] + 1;
 			total = total + 1;
 			line = output.readline();
 		    output.close();
@@ -221,25 +251,10 @@ class ProcInfo:
 	# reads the IP, hostname, cpu_MHz, uptime
 	def readGenericInfo (this):
 		this.DATA['hostname'] = socket.getfqdn();
-		try:
-			output = os.popen('/sbin/ifconfig -a')
-			eth, ip = '', '';
-			line = output.readline();
-			while(line != ''):
-				line = line.strip();
-				if line.startswith("eth"):
-					elem = line.split();
-					eth = elem[0];
-					ip = '';
-				if len(eth) > 0 and line.startswith("inet addr:"):
-					ip = re.match("inet addr:(\d+\.\d+\.\d+\.\d+)", line).group(1);
-					this.DATA[eth + '_ip'] = ip;
-					eth = '';
-				line = output.readline();
-			output.close();
-		except IOError as ex:
-			this.logger.log(Logger.ERROR, "ProcInfo: cannot get output from /sbin/ifconfig -a");
-			return;
+		if this.BACKEND == 'proc':
+			this.proc_readInterfaceAddresses();
+		else:
+			this.readInterfaceAddresses();
 		try:
 			no_cpus = 0;
 			FCPU = open('/proc/cpuinfo');
@@ -280,6 +295,28 @@ class ProcInfo:
 			this.logger.log(Logger.ERROR, "ProcInfo: cannot open /proc/uptime");
 			return;
 	
+	# reads the IPs of the eth interfaces from the output of ifconfig
+	def readInterfaceAddresses (this):
+		try:
+			output = os.popen('/sbin/ifconfig -a')
+			eth, ip = '', '';
+			line = output.readline();
+			while(line != ''):
+				line = line.strip();
+				if line.startswith("eth"):
+					elem = line.split();
+					eth = elem[0];
+					ip = '';
+				if len(eth) > 0 and line.startswith("inet addr:"):
+					ip = re.match("inet addr:(\d+\.\d+\.\d+\.\d+)", line).group(1);
+					this.DATA[eth + '_ip'] = ip;
+					eth = '';
+				line = output.readline();
+			output.close();
+		except IOError as ex:
+			this.logger.log(Logger.ERROR, "ProcInfo: cannot get output from /sbin/ifconfig -a");
+			return;
+
 	# do a difference with overflow check and repair
 	# the counter is unsigned 32 or 64   bit
 	def diffWithOverflowCheck(this, new, old):
@@ -366,12 +403,12 @@ class ProcInfo:
 		except IOError as ex:
 			this.logger.log(Logger.ERROR, "ProcInfo: cannot execute ps -A -o \"pid ppid\"");
 
-		if pidmap.has_key(parent):
+		if not pidmap.has_key(str(parent)):
 			this.logger.log(Logger.INFO, 'ProcInfo: No job with pid='+str(parent));
 			this.removeJobToMonitor(parent);
 			return [];
 
-		children = [parent];				
+		children = [str(parent)];
 		i = 0;
 		while(i < len(children)):
 			prnt = children[i];
@@ -379,7 +416,7 @@ class ProcInfo:
 				if ppid == prnt:
 					children.append(pid);
         		i += 1;
-		return children;
+		return [int(child) for child in children];
 
 	# internal function that parses a time formatted like "days-hours:min:sec" and returns the corresponding
 	# number of seconds.
@@ -489,6 +526,248 @@ class ProcInfo:
 		except IOError as ex:
 			this.logger.log(Logger.ERROR, "ERROR", "ProcInfo: cannot run df to get job's disk usage for job "+`pid`);
 
+	##############################################################################################
+	# /proc and statvfs based sampling, used instead of ps, netstat, ifconfig, du and df
+	# when this.BACKEND == 'proc'. The parameters have the same names and meaning.
+	##############################################################################################
+
+	# read the state of all the processes from /proc/<pid>/stat
+	def proc_countProcesses (this):
+		total, states = this.proc_readProcessTable();
+		this.DATA['processes'] = total;
+		for key in states.keys():
+			this.DATA['processes_'+key] = states[key];
+
+	# read /proc/<pid>/stat of all the processes, returning their number and the number
+	# of processes in each state. The start time and parent pid of every process are
+	# kept in this.PPIDS, so that proc_getChildren can walk the process tree of the jobs
+	# in the same update without reading the stat files again.
+	def proc_readProcessTable (this):
+		total = 0;
+		states = {'D':0, 'R':0, 'S':0, 'T':0, 'Z':0};
+		ppids = {};
+		for pid in this.listPids():
+			stat = this.readPidStat(pid);
+			if stat == None:
+				continue;
+			total += 1;
+			if states.has_key(stat['state']):
+				states[stat['state']] += 1;
+			ppids[pid] = (stat['starttime'], stat['ppid']);
+		this.PPIDS = ppids;
+		this.PPIDS_TIME = time.time();
+		return total, states;
+
+	# reads the IPs of the eth interfaces with the SIOCGIFADDR ioctl
+	def proc_readInterfaceAddresses (this):
+		try:
+			FNET = open('/proc/net/dev');
+			lines = FNET.readlines();
+			FNET.close();
+		except IOError as ex:
+			this.logger.log(Logger.ERROR, "ProcInfo: cannot open /proc/net/dev");
+			return;
+		sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM);
+		try:
+			for line in lines:
+				m = re.match("\s*(eth\d+):", line);
+				if m == None:
+					continue;
+				eth = m.group(1);
+				try:
+					ifreq = fcntl.ioctl(sock.fileno(), 0x8915, struct.pack('256s', eth[:15])); # SIOCGIFADDR
+					this.DATA[eth + '_ip'] = socket.inet_ntoa(ifreq[20:24]);
+				except IOError:
+					pass; # interface without an IPv4 address
+		finally:
+			sock.close();
+
+	# count the sockets (tcp, udp, unix) and the tcp connection states from /proc/net
+	def proc_readNetStat (this):
+		sockets = { 'sockets_tcp':0, 'sockets_udp':0, 'sockets_unix':0, 'sockets_icm':0 };
+		tcp_details = { 'sockets_tcp_ESTABLISHED':0, 'sockets_tcp_SYN_SENT':0,
+			'sockets_tcp_SYN_RECV':0, 'sockets_tcp_FIN_WAIT1':0, 'sockets_tcp_FIN_WAIT2':0,
+			'sockets_tcp_TIME_WAIT':0, 'sockets_tcp_CLOSED':0, 'sockets_tcp_CLOSE_WAIT':0,
+			'sockets_tcp_LAST_ACK':0, 'sockets_tcp_LISTEN':0, 'sockets_tcp_CLOSING':0,
+			'sockets_tcp_UNKNOWN':0 };
+		for name in ['tcp', 'tcp6']:
+			for line in this.readProcNet(name):
+				sockets['sockets_tcp'] += 1;
+				key = 'sockets_tcp_' + this.TCP_STATES.get(line.split()[3], 'UNKNOWN');
+				tcp_details[key] += 1;
+		for name in ['udp', 'udp6']:
+			sockets['sockets_udp'] += len(this.readProcNet(name));
+		sockets['sockets_unix'] = len(this.readProcNet('unix'));
+		for key in sockets.keys():
+			this.DATA[key] = sockets[key];
+		for key in tcp_details.keys():
+			this.DATA[key] = tcp_details[key];
+
+	# the lines of a /proc/net table without the header
+	def readProcNet (this, name):
+		try:
+			FNET = open('/proc/net/' + name);
+			lines = FNET.readlines()[1:];
+			FNET.close();
+			return lines;
+		except IOError as ex:
+			return [];
+
+	# the pids of all the processes
+	def listPids (this):
+		try:
+			return [int(name) for name in os.listdir('/proc') if name.isdigit()];
+		except OSError as ex:
+			this.logger.log(Logger.ERROR, "ProcInfo: cannot list /proc");
+			return [];
+
+	# parse /proc/<pid>/stat; None if the process is gone
+	def readPidStat (this, pid):
+		try:
+			FSTAT = open('/proc/'+str(pid)+'/stat');
+			line = FSTAT.read();
+			FSTAT.close();
+		except IOError as ex:
+			return None;
+		# the command is between parenthesis and can contain spaces and parenthesis
+		lpar = line.find('(');
+		rpar = line.rfind(')');
+		elem = line[rpar+2:].split();
+		try:
+			return {'comm': line[lpar+1:rpar], 'state': elem[0], 'ppid': int(elem[1]),
+					'utime': int(elem[11]), 'stime': int(elem[12]), 'starttime': int(elem[19]),
+					'vsize': int(elem[20]), 'rss': int(elem[21])};
+		except (IndexError, ValueError):
+			return None;
+
+	# full list of children (pids) for a process (pid), walking the process tree kept in
+	# this.PPIDS; the tree is read again unless it was read in the last second (i.e. by
+	# proc_countProcesses in the same update). A process never starts before its parent,
+	# so a pid reused by a newer process does not adopt the children of the old one.
+	def proc_getChildren (this, parent):
+		parent = int(parent);
+		if time.time() - this.PPIDS_TIME > 1:
+			this.proc_readProcessTable();
+		ppids = this.PPIDS;
+		if not ppids.has_key(parent):
+			return [];
+		childrenOf = {};
+		for pid, (starttime, ppid) in ppids.items():
+			childrenOf.setdefault(ppid, []).append(pid);
+		children = [parent];
+		i = 0;
+		while(i < len(children)):
+			starttime = ppids[children[i]][0];
+			for child in childrenOf.get(children[i], []):
+				if ppids[child][0] >= starttime:
+					children.append(child);
+			i += 1;
+		return children;
+
+	# read information about this the JOB_PID process from /proc/<pid>/stat,
+	# with the same meaning of the ps based version; memory sizes are given in KB
+	def proc_readJobInfo (this, pid):
+		if (pid == '') or not this.JOBS.has_key(pid):
+			return;
+		children = this.proc_getChildren(pid);
+		if(len(children) == 0):
+			this.logger.log(Logger.INFO, "ProcInfo: Job with pid="+str(pid)+" terminated; removing it from monitored jobs.");
+			this.removeJobToMonitor(pid);
+			return;
+		try:
+			FUPT = open('/proc/uptime');
+			uptime = float(FUPT.readline().split()[0]);
+			FUPT.close();
+		except IOError as ex:
+			this.logger.log(Logger.ERROR, "ProcInfo: cannot open /proc/uptime");
+			return;
+		if not this.DATA.has_key('total_mem'):
+			this.readMemInfo();
+		totalMem = this.DATA.get('total_mem', 0) * 1024.0;
+		mem_cmd_map = {};
+		etime, cputime, pcpu, pmem, rsz, vsz, fd = 0, 0, 0, 0, 0, 0, 0;
+		for child in children:
+			stat = this.readPidStat(child);
+			if stat == None:
+				continue;
+			if this.PPIDS.has_key(child) and this.PPIDS[child][0] != stat['starttime']:
+				# the pid was reused by another process after the tree walk
+				continue;
+			sec = max(0, int(uptime - float(stat['starttime']) / this.CLK_TCK));
+			if sec > etime:	# the elapsed time is the maximum of all elapsed
+				etime = sec;
+			cpusec = float(stat['utime'] + stat['stime']) / this.CLK_TCK;
+			cputime += int(cpusec);	# total cputime is the sum of cputimes for all processes.
+			if sec > 0:
+				pcpu += round(100.0 * cpusec / sec, 1);	# total %cpu is the sum of all children %cpu.
+			rsz1 = stat['rss'] * this.PAGE_SIZE / 1024;
+			vsz1 = stat['vsize'] / 1024;
+			pmem1 = 0.0;
+			if totalMem > 0:
+				pmem1 = round(100.0 * rsz1 / totalMem, 1);
+			key = (pmem1, rsz1, vsz1, stat['comm']);
+			if not mem_cmd_map.has_key(key):
+				# it's the first thread/process with this memory footprint; add it.
+				mem_cmd_map[key] = 1;
+				pmem += pmem1; rsz += rsz1; vsz += vsz1;
+				fd += this.countOpenFD(child) or 0;
+		this.JOBS[pid]['DATA']['run_time'] = etime;
+		this.JOBS[pid]['DATA']['cpu_time'] = cputime;
+		this.JOBS[pid]['DATA']['cpu_usage'] = pcpu;
+		this.JOBS[pid]['DATA']['mem_usage'] = pmem;
+		this.JOBS[pid]['DATA']['rss'] = rsz;
+		this.JOBS[pid]['DATA']['virtualmem'] = vsz;
+		this.JOBS[pid]['DATA']['open_files'] = fd;
+
+	# space used in KB by a directory tree, like du -Lsk: symbolic links are followed
+	# and hard linked files are counted once
+	def diskUsage (this, workDir):
+		seen = {};
+		total = 0;
+		for dirpath, dirnames, filenames in os.walk(workDir, followlinks=True):
+			for name in [''] + dirnames + filenames:
+				try:
+					st = os.stat(os.path.join(dirpath, name));
+				except OSError:
+					continue;
+				if seen.has_key((st.st_dev, st.st_ino)):
+					continue;
+				seen[(st.st_dev, st.st_ino)] = 1;
+				total += st.st_blocks * 512;
+		return total / 1024;
+
+	# if there is an work directory defined, then compute the used space in that directory
+	# and the free disk space on the partition to which that directory belongs.
+	# The used space is computed at most once every this.DU_CACHE_TIME seconds.
+	# sizes are given in MB
+	def proc_readJobDiskUsage (this, pid):
+		if (pid == '') or not this.JOBS.has_key(pid):
+			return;
+		workDir = this.JOBS[pid]['WORKDIR'];
+		if workDir == '':
+			return;
+		now = time.time();
+		cached = this.DU_CACHE.get(workDir);
+		if cached == None or now - cached[0] >= this.DU_CACHE_TIME:
+			cached = (now, this.diskUsage(workDir));
+			this.DU_CACHE[workDir] = cached;
+		this.JOBS[pid]['DATA']['workdir_size'] = cached[1] / 1024.0;
+		try:
+			st = os.statvfs(workDir);
+		except OSError as ex:
+			this.logger.log(Logger.ERROR, "ProcInfo: cannot get the disk usage of "+workDir+" for job "+`pid`);
+			return;
+		total = st.f_blocks * st.f_frsize / 1024.0;
+		used = (st.f_blocks - st.f_bfree) * st.f_frsize / 1024.0;
+		free = st.f_bavail * st.f_frsize / 1024.0;
+		usage = 0;
+		if used + free > 0:
+			usage = math.ceil(100.0 * used / (used + free)); # as the Use% of df
+		this.JOBS[pid]['DATA']['disk_total'] = total / 1024.0;
+		this.JOBS[pid]['DATA']['disk_used']  = used / 1024.0;
+		this.JOBS[pid]['DATA']['disk_free']  = free / 1024.0;
+		this.JOBS[pid]['DATA']['disk_usage'] = usage / 1024.0; # same scaling as the df based version
+
 	# create cummulative parameters based on raw params like cpu_, pages_, swap_, or ethX_
 	def computeCummulativeParams(this, dataRef, prevDataRef):
 		if prevDataRef == {}:
@@ -4,6 +4,10 @@ This contains some utility methods to share between the server and the client, o
 
 import os
 import re
+import sys
+import zlib
+import Queue
+import threading
 import subprocess
 
 def checkOutLFN(lfn, username):
@@ -50,3 +54,79 @@ def cmd_exist(cmd):
         return True
     except OSError:
         return False
+
+
+def _checksumFile(filename, bufferSize):
+    """
+    Compute the adler32 and the POSIX cksum of a file reading it only once.
+    The file is streamed in chunks of bufferSize bytes: every chunk updates
+    the adler32 and is fed to a cksum subprocess (the CRC used by the UNIX
+    cksum tool is not available in zlib). The values and their formatting
+    are the same as the ones of WMCore.Algorithms.BasicAlgos.calculateChecksums.
+    Returns a tuple (adler32, cksum, size).
+    """
+    adler32Checksum = 1 # adler32 of an empty string
+    cksumProcess = subprocess.Popen("cksum", stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        with open(filename, 'rb') as fd:
+            size = os.fstat(fd.fileno()).st_size
+            while True:
+                chunk = fd.read(bufferSize)
+                if not chunk:
+                    break
+                adler32Checksum = zlib.adler32(chunk, adler32Checksum)
+                cksumProcess.stdin.write(chunk)
+    finally:
+        cksumProcess.stdin.close()
+        cksumStdout = cksumProcess.stdout.read().split()
+        cksumProcess.stdout.close()
+        cksumProcess.wait()
+
+    ## consistency check on the cksum output
+    if len(cksumStdout) != 2 or int(cksumStdout[1]) != size:
+        raise RuntimeError("Something went wrong with the cksum calculation of %s !" % filename)
+
+    return ("%08x" % (adler32Checksum & 0xffffffff), cksumStdout[0], size)
+
+
+def calculateChecksums(filenames, maxWorkers=4, bufferSize=4*1024*1024):
+    """
+    Checksum several files concurrently, one thread per file up to maxWorkers.
+    The file reads and the writes to the cksum pipes release the interpreter
+    lock and the CRCs are computed by the cksum processes, so the threads
+    overlap the I/O and the cksum work of the files; zlib.adler32 holds the
+    interpreter lock, so the adler32 computations still run one at a time.
+    Returns a dictionary {filename: (adler32, cksum, size)}. If the checksum
+    of any file fails the first exception is re-raised once all the threads
+    are done.
+    """
+    filenames = list(filenames)
+    results = {}
+    errors = []
+    work = Queue.Queue()
+    for filename in filenames:
+        work.put(filename)
+
+    def worker():
+        while True:
+            try:
+                filename = work.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[filename] = _checksumFile(filename, bufferSize)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    threads = []
+    for dummyCounter in range(max(1, min(maxWorkers, len(filenames)))):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        exc_type, exc_value, exc_tb = errors[0]
+        raise exc_type, exc_value, exc_tb
+
+    return results
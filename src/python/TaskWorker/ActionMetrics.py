@@ -0,0 +1,109 @@
+"""
+Timing and outcome of the actions run by the TaskHandler.
+
+Each slave records the actions it runs with recordAction(); the records are
+sent to the master together with the result of the work (see popRecords and
+Worker.processWorker), which aggregates them in an ActionMetrics object and
+writes them periodically to a JSON file.
+"""
+
+import os
+import json
+import time
+import tempfile
+
+## Upper bounds of the buckets of the duration histograms, in seconds.
+DURATION_BUCKETS = [1, 5, 10, 30, 60, 120, 300, 600, 1800]
+## Upper bounds of the buckets of the task sizes, in number of jobs.
+SIZE_BUCKETS = [100, 1000, 10000]
+OUTCOMES = ['success', 'failure', 'stop']
+
+## The records of this process not yet sent to the master.
+_records = []
+
+
+def recordAction(action, taskname, start, end, outcome, size=None):
+    """
+    Record the execution of an action.
+
+    :arg str action: the name of the action class
+    :arg str taskname: the task the action worked on
+    :arg float start, end: the timestamps of the start and end of the action
+    :arg str outcome: one of OUTCOMES
+    :arg int size: the number of jobs of the task, if known."""
+    _records.append({'action': action, 'task': taskname, 'start': start, 'end': end,
+                     'outcome': outcome, 'size': size})
+
+
+def popRecords():
+    """Return the records of this process and forget them."""
+    global _records
+    records = _records
+    _records = []
+    return records
+
+
+def bucket(value, bounds):
+    for bound in bounds:
+        if value <= bound:
+            return '<=%s' % bound
+    return '>%s' % bounds[-1]
+
+
+def sizeBucket(size):
+    if size is None:
+        return 'unknown'
+    return bucket(size, SIZE_BUCKETS)
+
+
+def emptyHistogram():
+    histogram = dict((bucket(bound, DURATION_BUCKETS), 0) for bound in DURATION_BUCKETS)
+    histogram['>%s' % DURATION_BUCKETS[-1]] = 0
+    return histogram
+
+
+class ActionMetrics(object):
+    """Aggregation of the action records of all the slaves."""
+
+    def __init__(self, keepRecent=100):
+        self.since = time.time()
+        self.keepRecent = keepRecent
+        self.actions = {}
+        self.recent = []
+
+    def add(self, records):
+        for record in records:
+            duration = max(0, record['end'] - record['start'])
+            stats = self.actions.get(record['action'])
+            if stats is None:
+                stats = dict((outcome, 0) for outcome in OUTCOMES)
+                stats.update({'count': 0, 'time': 0.0, 'max_time': 0.0, 'histogram': emptyHistogram(), 'by_size': {}})
+                self.actions[record['action']] = stats
+            stats[record['outcome']] += 1
+            stats['count'] += 1
+            stats['time'] += duration
+            stats['max_time'] = max(stats['max_time'], duration)
+            stats['histogram'][bucket(duration, DURATION_BUCKETS)] += 1
+            sizeStats = stats['by_size'].setdefault(sizeBucket(record['size']), {'count': 0, 'time': 0.0, 'histogram': emptyHistogram()})
+            sizeStats['count'] += 1
+            sizeStats['time'] += duration
+            sizeStats['histogram'][bucket(duration, DURATION_BUCKETS)] += 1
+        if records and self.keepRecent:
+            self.recent = (self.recent + list(records))[-self.keepRecent:]
+
+    def summary(self):
+        return {'since': self.since, 'updated': time.time(), 'duration_buckets': DURATION_BUCKETS,
+                'size_buckets': SIZE_BUCKETS, 'actions': self.actions, 'recent': self.recent}
+
+    def write(self, filename):
+        """Write the summary to filename, replacing it atomically."""
+        dirname = os.path.dirname(filename) or '.'
+        fd, tmpname = tempfile.mkstemp(prefix=os.path.basename(filename) + '.', dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(self.summary(), fh, indent=1, sort_keys=True)
+            os.rename(tmpname, filename)
+        except:
+            if os.path.exists(tmpname):
+                os.unlink(tmpname)
+            raise
@@ -426,7 +426,12 @@ class DagmanCreator(TaskAction.TaskAction):
         info['accounting_group'] = 'analysis.%s' % info['userhn']
         info = transform_strings(info)
         info['faillimit'] = task['tm_fail_limit']
-        info['extra_jdl'] = '\n'.join(literal_eval(task['tm_extrajdl']))
+        ## The REST stores the list in JSON, the tasks submitted before in its Python representation.
+        try:
+            extrajdl = json.loads(task['tm_extrajdl'])
+        except ValueError:
+            extrajdl = literal_eval(task['tm_extrajdl'])
+        info['extra_jdl'] = '\n'.join(extrajdl)
         if info['jobarch_flatten'].startswith("slc6_"):
             info['opsys_req'] = '&& (GLIDEIN_REQUIRED_OS=?="rhel6" || OpSysMajorVer =?= 6)'
         else:
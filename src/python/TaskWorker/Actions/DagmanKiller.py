@@ -195,7 +195,8 @@ class DagmanKiller(TaskAction):
 
     def execute(self, *args, **kw):
 
-        apmon = ApmonIf.ApmonIf()
+        ## A kill info for each job and for each of its transfers
+        apmon = ApmonIf.ApmonIf(batch=True, batchSize=max(10000, 2 * len(kw.get('task', {}).get('kill_ids') or [])))
         try:
             self.executeInternal(apmon, *args, **kw)
             #XXX what's the difference of outting this here or in the else?
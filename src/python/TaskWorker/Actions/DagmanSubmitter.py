@@ -413,7 +413,7 @@ class DagmanSubmitter(TaskAction.TaskAction):
 
 
     def sendDashboardJobs(self, params, info):
-        apmon = ApmonIf()
+        apmon = ApmonIf(batch=True, batchSize=len(info))
         for job in info:
             job.update(params)
             self.logger.debug("Dashboard job info: %s" % str(job))
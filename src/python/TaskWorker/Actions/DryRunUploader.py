@@ -6,12 +6,16 @@ import urllib
 import tarfile
 import hashlib
 import json
+import shutil
+import tempfile
 
 from WMCore.DataStructs.LumiList import LumiList
 from WMCore.Services.UserFileCache.UserFileCache import UserFileCache
 
 from TaskWorker.DataObjects.Result import Result
 from TaskWorker.Actions.TaskAction import TaskAction
+from TaskWorker.Actions.Splitter import splitParameters
+from TaskWorker.Actions.SplittingEstimator import estimateSplitting
 from TaskWorker.WorkerExceptions import TaskWorkerException
 
 class DryRunUploader(TaskAction):
@@ -43,24 +47,26 @@ class DryRunUploader(TaskAction):
             inputFiles.append('splitting-summary.json')
 
             self.packSandbox(inputFiles)
-
-            self.logger.info('Uploading dry run tarball to the user file cache')
-            ufc = UserFileCache(dict={'cert': kw['task']['user_proxy'], 'key': kw['task']['user_proxy'], 'endpoint': kw['task']['tm_cache_url']})
-            result = ufc.uploadLog('dry-run-sandbox.tar.gz')
-            os.remove('dry-run-sandbox.tar.gz')
-            if 'hashkey' not in result:
-                raise TaskWorkerException('Failed to upload dry-run-sandbox.tar.gz to the user file cache: ' + str(result))
-            else:
-                self.logger.info('Uploaded dry run tarball to the user file cache: ' + str(result))
-                update = {'workflow': kw['task']['tm_taskname'], 'subresource': 'state', 'status': 'UPLOADED'}
-                self.logger.debug('Updating task status: %s' % str(update))
-                self.server.post(self.resturi, data=urllib.urlencode(update))
-
+            self.uploadSandbox(kw['task'])
         finally:
             os.chdir(cwd)
 
         return Result(task=kw['task'], result=(-1))
 
+    def uploadSandbox(self, task):
+        """Upload dry-run-sandbox.tar.gz to the user file cache and set the task status to UPLOADED"""
+        self.logger.info('Uploading dry run tarball to the user file cache')
+        ufc = UserFileCache(dict={'cert': task['user_proxy'], 'key': task['user_proxy'], 'endpoint': task['tm_cache_url']})
+        result = ufc.uploadLog('dry-run-sandbox.tar.gz')
+        os.remove('dry-run-sandbox.tar.gz')
+        if 'hashkey' not in result:
+            raise TaskWorkerException('Failed to upload dry-run-sandbox.tar.gz to the user file cache: ' + str(result))
+        else:
+            self.logger.info('Uploaded dry run tarball to the user file cache: ' + str(result))
+            update = {'workflow': task['tm_taskname'], 'subresource': 'state', 'status': 'UPLOADED'}
+            self.logger.debug('Updating task status: %s' % str(update))
+            self.server.post(self.resturi, data=urllib.urlencode(update))
+
     def execute(self, *args, **kw):
         try:
             return self.executeInternal(*args, **kw)
@@ -68,6 +74,48 @@ class DryRunUploader(TaskAction):
             msg = "Failed to upload dry run tarball for %s; '%s'" % (kw['task']['tm_taskname'], str(e))
             raise TaskWorkerException(msg)
 
+class DryRunEstimator(DryRunUploader):
+    """
+    Upload to the UserFileCache a dry run tarball containing only the splitting summary, estimated
+    from the input files without splitting the task (see SplittingEstimator). It replaces the
+    Splitter, the DagmanCreator and the DryRunUploader when TaskWorker.estimateDryRunSplitting is set.
+    """
+
+    def executeInternal(self, *args, **kw):
+        task = kw['task']
+        splitparam = splitParameters(task)
+        lumisPerJob, eventsPerJob = estimateSplitting(args[0], splitparam)
+        maxJobs = getattr(self.config.TaskWorker, 'maxJobsPerTask', 10000)
+        if not lumisPerJob:
+            raise TaskWorkerException("The CRAB3 server backend could not submit any job to the Grid scheduler:\n"+\
+                        "splitting task %s on dataset %s with %s method does not generate any job" %
+                                        (task['tm_taskname'], task['tm_input_dataset'], task['tm_split_algo']))
+        elif len(lumisPerJob) > maxJobs:
+            raise TaskWorkerException("The splitting on your task generated %s jobs. The maximum number of jobs in each task is %s" %
+                                        (len(lumisPerJob), maxJobs))
+        splittingSummary = SplittingSummary(task['tm_split_algo'])
+        splittingSummary.lumisPerJob = lumisPerJob
+        splittingSummary.eventsPerJob = eventsPerJob
+
+        msg = "The splitting of this dry run task was estimated from the input files, without creating the jobs:" \
+              " the dry run tarball contains only the splitting summary and the test job can not be run locally."
+        self.logger.info(msg)
+        self.uploadWarning(msg, task['user_proxy'], task['tm_taskname'])
+
+        cwd = os.getcwd()
+        tempDir = tempfile.mkdtemp()
+        try:
+            os.chdir(tempDir)
+            splittingSummary.dump('splitting-summary.json')
+            self.packSandbox(['splitting-summary.json'])
+            self.uploadSandbox(task)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tempDir)
+
+        return Result(task=task, result=(-1))
+
+
 class SplittingSummary(object):
     """
     Class which calculates some summary data about the splitting results.
@@ -9,6 +9,7 @@ from WMCore.Services.UserFileCache.UserFileCache import UserFileCache
 
 from RESTInteractions import HTTPRequests
 
+from TaskWorker import ActionMetrics
 from TaskWorker.Actions.Splitter import Splitter
 from TaskWorker.DataObjects.Result import Result
 from TaskWorker.Actions.PanDAKill import PanDAKill
@@ -18,7 +19,8 @@ from TaskWorker.Actions.DagmanCreator import DagmanCreator
 from TaskWorker.Actions.PanDAgetSpecs import PanDAgetSpecs
 from TaskWorker.Actions.PanDABrokerage import PanDABrokerage
 from TaskWorker.Actions.PanDAInjection import PanDAInjection
-from TaskWorker.Actions.DryRunUploader import DryRunUploader
+from TaskWorker.Actions.DryRunUploader import DryRunUploader, DryRunEstimator
+from TaskWorker.Actions.SplittingEstimator import ALGORITHMS as ESTIMATED_ALGORITHMS
 from TaskWorker.Actions.PanDASpecs2Jobs import PanDASpecs2Jobs
 from TaskWorker.Actions.MakeFakeFileSet import MakeFakeFileSet
 from TaskWorker.Actions.DagmanSubmitter import DagmanSubmitter
@@ -39,6 +41,8 @@ class TaskHandler(object):
         self.logger = logging.getLogger(str(procnum))
         self._work = []
         self._task = task
+        self._actionRecords = []
+        self._taskSize = None
 
     def removeTaskLogHandler(self, taskhandler):
         taskhandler.flush()
@@ -59,6 +63,38 @@ class TaskHandler(object):
         for w in self._work:
             yield w
 
+    def recordAction(self, work, start, end, outcome, output=None):
+        """Keep the timing of an action until the end of the chain, when the size of the task is known."""
+        self._actionRecords.append((work.__class__.__name__, start, end, outcome))
+        if self._taskSize is None and outcome == 'success':
+            self._taskSize = countJobs(getattr(output, 'result', output))
+
+    def flushActionRecords(self):
+        """Send the timing of the actions run so far to the metrics of the worker."""
+        for action, start, end, outcome in self._actionRecords:
+            ActionMetrics.recordAction(action, self._task['tm_taskname'], start, end, outcome, self._taskSize)
+        self._actionRecords = []
+
+    def uploadTaskLog(self):
+        """Upload the log file of the task to the crabcache.
+
+        The crabcache replaces the whole file at each upload, so this is done once, when the chain
+        of actions ends or fails, and not after every action."""
+        logpath = 'logs/tasks/%s/%s.log' % (self._task['tm_username'], self._task['tm_taskname'])
+        if os.path.isfile(logpath) and 'user_proxy' in self._task: #the user proxy might not be there if myproxy retrieval failed
+            cacheurldict = {'endpoint': self._task['tm_cache_url'], 'cert' : self._task['user_proxy'], 'key' : self._task['user_proxy']}
+            try:
+                ufc = UserFileCache(cacheurldict)
+                logfilename = self._task['tm_taskname'] + '_TaskWorker.log'
+                ufc.uploadLog(logpath, logfilename)
+            except HTTPException as hte:
+                msg = ("Failed to upload the logfile to %s for task %s. More details in the http headers and body:\n%s\n%s" %
+                       (self._task['tm_cache_url'], self._task['tm_taskname'], hte.headers, hte.result))
+                self.logger.error(msg)
+            except Exception as e:
+                msg = "Unknown error while uploading the logfile for task %s" % self._task['tm_taskname']
+                self.logger.exception(msg)
+
     def actionWork(self, *args, **kwargs):
         """Performing the set of actions"""
         nextinput = args
@@ -75,9 +111,13 @@ class TaskHandler(object):
         for work in self.getWorks():
             self.logger.debug("Starting %s on %s" % (str(work), self._task['tm_taskname']))
             t0 = time.time()
+            output = None
+            outcome = 'failure'
             try:
                 output = work.execute(nextinput, task=self._task)
+                outcome = 'success'
             except StopHandler as sh:
+                outcome = 'stop'
                 msg = "Controlled stop of handler for %s on %s " % (self._task, str(sh))
                 self.logger.error(msg)
                 nextinput = Result(task=self._task, result='StopHandler exception received, controlled stop')
@@ -93,21 +133,10 @@ class TaskHandler(object):
                 self.removeTaskLogHandler(taskhandler)
                 raise WorkerHandlerException(msg) #Errors not foreseen. Print everything!
             finally:
-                #upload logfile of the task to the crabcache
-                logpath = 'logs/tasks/%s/%s.log' % (self._task['tm_username'], self._task['tm_taskname'])
-                if os.path.isfile(logpath) and 'user_proxy' in self._task: #the user proxy might not be there if myproxy retrieval failed
-                    cacheurldict = {'endpoint': self._task['tm_cache_url'], 'cert' : self._task['user_proxy'], 'key' : self._task['user_proxy']}
-                    try:
-                        ufc = UserFileCache(cacheurldict)
-                        logfilename = self._task['tm_taskname'] + '_TaskWorker.log'
-                        ufc.uploadLog(logpath, logfilename)
-                    except HTTPException as hte:
-                        msg = ("Failed to upload the logfile to %s for task %s. More details in the http headers and body:\n%s\n%s" %
-                               (self._task['tm_cache_url'], self._task['tm_taskname'], hte.headers, hte.result))
-                        self.logger.error(msg)
-                    except Exception as e:
-                        msg = "Unknown error while uploading the logfile for task %s" % self._task['tm_taskname']
-                        self.logger.exception(msg)
+                self.recordAction(work, t0, time.time(), outcome, output)
+                if outcome == 'failure':
+                    self.flushActionRecords()
+                    self.uploadTaskLog()
             t1 = time.time()
             self.logger.info("Finished %s on %s in %d seconds" % (str(work), self._task['tm_taskname'], t1-t0))
             try:
@@ -115,10 +144,21 @@ class TaskHandler(object):
             except AttributeError:
                 nextinput = output
 
+        self.flushActionRecords()
         self.removeTaskLogHandler(taskhandler)
+        self.uploadTaskLog()
 
         return nextinput
 
+def countJobs(result):
+    """The number of jobs of a splitting result (a list of job groups), None for any other result"""
+    if not result:
+        return None
+    try:
+        return sum([len(jobgroup.getJobs()) for jobgroup in result])
+    except (TypeError, AttributeError):
+        return None
+
 def handleNewTask(resthost, resturi, config, task, procnum, *args, **kwargs):
     """Performs the injection of a new task
 
@@ -139,6 +179,11 @@ def handleNewTask(resthost, resturi, config, task, procnum, *args, **kwargs):
             handler.addWork( DBSDataDiscovery(config=config, server=server, resturi=resturi, procnum=procnum) )
     elif task['tm_job_type'] == 'PrivateMC':
         handler.addWork( MakeFakeFileSet(config=config, server=server, resturi=resturi, procnum=procnum) )
+    if task['tm_dry_run'] == 'T' and getattr(config.TaskWorker, 'estimateDryRunSplitting', False) and \
+       task['tm_job_type'] == 'Analysis' and task['tm_split_algo'] in ESTIMATED_ALGORITHMS:
+        ## Only the splitting summary is uploaded, without splitting the task.
+        handler.addWork( DryRunEstimator(config=config, server=server, resturi=resturi, procnum=procnum) )
+        return handler.actionWork(args)
     handler.addWork( Splitter(config=config, server=server, resturi=resturi, procnum=procnum) )
 
     def glidein(config):
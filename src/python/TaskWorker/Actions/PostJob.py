@@ -59,7 +59,6 @@ import re
 import sys
 import time
 import json
-import uuid
 import glob
 import fcntl
 import errno
@@ -78,14 +77,13 @@ import tempfile
 import traceback
 from httplib import HTTPException
 
-import DashboardAPI
-import WMCore.Database.CMSCouch as CMSCouch
-
 from ServerUtilities import setDashboardLogs
-from RESTInteractions import HTTPRequests ## Why not to use from WMCore.Services.Requests import Requests
 from TaskWorker.Actions.RetryJob import RetryJob
 from TaskWorker.Actions.RetryJob import JOB_RETURN_CODES
 
+## The post-job runs in a new process for every job and retry, so the heavy modules
+## (CMSCouch, DashboardAPI, RESTInteractions) are imported only where they are used.
+
 
 ASO_JOB = None
 config = None
@@ -269,6 +267,7 @@ class ASOServerJob(object):
         self.job_ad = job_ad
         self.failures = {}
         self.aso_start_timestamp = None
+        import WMCore.Database.CMSCouch as CMSCouch
         proxy = os.environ.get('X509_USER_PROXY', None)
         self.aso_db_url = self.job_ad['CRAB_ASOURL']
         try:
@@ -403,6 +402,7 @@ class ASOServerJob(object):
         """
         Inject documents to ASO database if not done by cmscp from worker node.
         """
+        import WMCore.Database.CMSCouch as CMSCouch
         self.logger.info("====== Starting to check uploads to ASO database.")
         docs_in_transfer = []
         output_files = []
@@ -748,6 +748,7 @@ class ASOServerJob(object):
         """
         Wrapper to load a document from CouchDB, catching exceptions.
         """
+        import WMCore.Database.CMSCouch as CMSCouch
         doc = None
         try:
             doc = self.couch_database.document(doc_id)
@@ -996,7 +997,9 @@ class PostJob():
         except:
             self.logger.exception(retmsg)
         finally:
-            DashboardAPI.apmonFree()
+            ## Nothing to free if nothing was sent to Dashboard.
+            if 'DashboardAPI' in sys.modules:
+                sys.modules['DashboardAPI'].apmonFree()
 
         ## Add the post-job exit code and error message to the job report.
         job_report = {}
@@ -1235,6 +1238,7 @@ class PostJob():
                 self.logger.info(msg)
 
         ## Initialize the object we will use for making requests to the REST interface.
+        from RESTInteractions import HTTPRequests ## Why not to use from WMCore.Services.Requests import Requests
         self.server = HTTPRequests(self.rest_host, \
                                    os.environ['X509_USER_PROXY'], \
                                    os.environ['X509_USER_PROXY'], \
@@ -1963,6 +1967,7 @@ class PostJob():
         time.sleep(1)
         msg += " Dashboard parameters: %s" % (str(params))
         self.logger.info(msg)
+        import DashboardAPI
         DashboardAPI.apmonSend(params['MonitorID'], params['MonitorJobID'], params)
 
     ## = = = = = PostJob = = = = = = = = = = = = = = = = = = = = = = = = = = = = = =
@@ -2190,6 +2195,7 @@ class testServer(unittest.TestCase):
         return datetime.datetime.now().strftime("%d%p")
 
     def getUniqueFilename(self):
+        import uuid
         return "%s-postjob.txt" % (uuid.uuid4())
 
     def testNonexistent(self):
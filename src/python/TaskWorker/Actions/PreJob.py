@@ -6,15 +6,13 @@ import json
 import errno
 import classad
 import logging
-import htcondor
 from ast import literal_eval
 
-from ApmonIf import ApmonIf
-
 from ServerUtilities import getWebdirForDb
 from TaskWorker.Actions.RetryJob import JOB_RETURN_CODES
 
-import CMSGroupMapper
+## The pre-job runs in a new process for every job and retry, so the heavy modules
+## (htcondor, ApmonIf, CMSGroupMapper) are imported only where they are used.
 
 
 class PreJob:
@@ -144,6 +142,7 @@ class PreJob:
                   'bossId': str(self.job_id),
                   'localId' : '',
                  }
+        from ApmonIf import ApmonIf
         apmon = ApmonIf()
         self.logger.debug("Dashboard task info: %s" % str(params))
         apmon.sendToML(params)
@@ -310,6 +309,7 @@ class PreJob:
         ## run the job with the higher PostJobPrio1.
         new_submit_text += '+PostJobPrio1 = -%s\n' % str(self.task_ad.lookup('QDate'))
         ## This is used to send to dashbord the location of the logfiles
+        import htcondor
         try:
             storage_rules = htcondor.param['CRAB_StorageRules']
         except:
@@ -324,6 +324,7 @@ class PreJob:
         if 'CMSGroups' in self.task_ad:
             new_submit_text += '+CMSGroups = %s\n' % classad.quote(self.task_ad['CMSGroups'])
         elif username:
+            import CMSGroupMapper
             groups = CMSGroupMapper.map_user_to_groups(username)
             if groups:
                 new_submit_text += '+CMSGroups = %s\n' % classad.quote(groups)
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import urllib
 import logging
 from datetime import date
@@ -8,6 +9,32 @@ from httplib import HTTPException
 from RESTInteractions import HTTPRequests
 from TaskWorker.Actions.Recurring.BaseRecurringAction import BaseRecurringAction
 
+def deleteInBatches(deleteBatch, batchSize, pause=0, maxBatches=None, logger=None):
+    """Delete rows in batches, until a batch deletes less than batchSize rows or maxBatches batches are done.
+
+    Each batch is committed by deleteBatch, so that the locks and the undo of a
+    batch are bounded and the deletion can be interrupted at any time: the next
+    call continues with the rows left.
+
+    :arg deleteBatch: function deleting at most the given number of rows and returning the number of rows deleted;
+    :arg int batchSize: the maximum number of rows of a batch;
+    :arg float pause: the seconds to wait between two batches, to let the other writers go;
+    :arg int maxBatches: the maximum number of batches, or None to delete all the rows;
+    :return: (the number of rows deleted, True if all the rows are deleted)."""
+    logger = logger or logging.getLogger(__name__)
+    total = 0
+    batches = 0
+    while maxBatches is None or batches < maxBatches:
+        if batches and pause:
+            time.sleep(pause)
+        deleted = deleteBatch(batchSize)
+        batches += 1
+        total += deleted
+        logger.info("Batch %d: deleted %d rows, %d in total" % (batches, deleted, total))
+        if deleted < batchSize:
+            return total, True
+    return total, False
+
 class FMDCleaner(BaseRecurringAction):
     pollingTime = 60*24 #minutes
 
@@ -15,14 +42,23 @@ class FMDCleaner(BaseRecurringAction):
         self.logger.info('Cleaning filemetadata older than 30 days..')
         server = HTTPRequests(resthost, config.TaskWorker.cmscert, config.TaskWorker.cmskey, retry = 2)
         ONE_MONTH = 24 * 30
+        batchSize = getattr(config.TaskWorker, 'fmdCleanerBatchSize', 10000)
+        pause = getattr(config.TaskWorker, 'fmdCleanerPause', 2)
+        maxBatches = getattr(config.TaskWorker, 'fmdCleanerMaxBatches', None)
+        instance = resturi.split('/')[2]
+        url = '/crabserver/%s/filemetadata' % instance
+        def deleteBatch(limit):
+            result = server.delete(url, data=urllib.urlencode({'hours': ONE_MONTH, 'limit': limit}))[0]
+            return result['result'][0]['modified']
         try:
-            instance = resturi.split('/')[2]
-            server.delete('/crabserver/%s/filemetadata' % instance, data=urllib.urlencode({'hours': ONE_MONTH}))
-#TODO return fro the server a value (e.g.: ["ok"]) to see if everything is ok
-#            result = server.delete('/crabserver/dev/filemetadata', data=urllib.urlencode({'hours': ONE_MONTH}))[0]['result'][0]
-#            self.logger.info('FMDCleaner, got %s' % result)
+            deleted, done = deleteInBatches(deleteBatch, batchSize, pause, maxBatches, self.logger)
+            self.logger.info('Deleted %d files from filemetadata%s' % (deleted, '' if done else ', the others are left for the next run'))
         except HTTPException as hte:
-            self.logger.error(hte.headers)
+            ## The batches already done are committed, the next run continues from there.
+            ## The files are never deleted with a single unbounded statement: a REST older
+            ## than the deletion in batches rejects the limit, and nothing is deleted until it is updated.
+            self.logger.error('Deletion of the old files of filemetadata failed, skipping this run '
+                              '(the REST must accept the limit of the deletion): %s' % hte.headers)
 
 
 if __name__ == '__main__':
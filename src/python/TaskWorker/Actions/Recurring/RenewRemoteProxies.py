@@ -2,9 +2,12 @@ import os
 import sys
 import time
 import json
+import Queue
 import urllib
 import logging
+import threading
 import traceback
+import multiprocessing
 
 import classad
 import htcondor
@@ -24,6 +27,56 @@ class RenewRemoteProxies(BaseRecurringAction):
 MINPROXYLENGTH = 60 * 60 * 24
 QUERY_ATTRS = ['x509userproxyexpiration', 'CRAB_ReqName', 'ClusterId', 'ProcId', 'CRAB_UserDN', 'CRAB_UserVO', 'CRAB_UserGroup', 'CRAB_UserRole', 'JobStatus']
 
+
+def run_in_threads(func, items, nthreads):
+    """
+    Call func on every element of items using up to nthreads threads and wait
+    for all of them. func is expected to deal with its own exceptions.
+    """
+    work = Queue.Queue()
+    for item in items:
+        work.put(item)
+    def worker():
+        while True:
+            try:
+                item = work.get_nowait()
+            except Queue.Empty:
+                return
+            func(item)
+    threads = [threading.Thread(target=worker) for dummyCounter in range(max(1, min(nthreads, work.qsize())))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def renew_proxies_subprocess(schedd_ad, tasks, proxy):
+    """
+    Runs in the processes of the pool of CRAB3ProxyRenewer.execute: renew the proxy
+    of the tasks, a list of (ClusterId, ProcId, CRAB_ReqName) sharing the same
+    credentials, from a single authenticated subprocess, which renews all the tasks
+    it can and then reports the ones that failed. Returns the report ("OK" if all
+    the proxies were renewed).
+    """
+    schedd = htcondor.Schedd(classad.ClassAd(schedd_ad))
+    now = time.time()
+    with HTCondorUtils.AuthenticatedSubprocess(proxy) as (parent, rpipe):
+        if not parent:
+            failures = []
+            for clusterId, procId, reqname in tasks:
+                try:
+                    lifetime = schedd.refreshGSIProxy(clusterId, procId, proxy, -1)
+                    schedd.edit(['%s.%s' % (clusterId, procId)], 'x509userproxyexpiration', str(int(now+lifetime)))
+                except Exception as ex:
+                    failures.append("%s: %s" % (reqname, str(ex)))
+            if failures:
+                raise Exception("Failed to renew the proxy of %d task(s): %s" % (len(failures), "; ".join(failures)))
+        else:
+            ## Read before the subprocess is waited for, so that a long report can not fill the pipe.
+            results = rpipe.read()
+    return results
+
+
 class CRAB3ProxyRenewer(object):
 
     def __init__(self, config, resthost, resturi, logger=None):
@@ -42,6 +95,19 @@ class CRAB3ProxyRenewer(object):
         self.config = config
         self.pool = ''
         self.schedds = []
+        ## Schedds are processed concurrently, and within each schedd the credential
+        ## groups (i.e. the (DN, vo, group, role) keys) are processed concurrently too.
+        self.schedd_threads = getattr(config.TaskWorker, 'renewProxiesScheddThreads', 5)
+        self.group_threads = getattr(config.TaskWorker, 'renewProxiesGroupThreads', 10)
+        ## The authenticated subprocesses renewing the proxies are forked by a pool of
+        ## processes created before the threads, see execute.
+        self.renew_processes = getattr(config.TaskWorker, 'renewProxiesProcesses', 10)
+        self.process_pool = None
+        ## A proxy is retrieved from MyProxy only once per credential group and
+        ## execution, even if the user has tasks in several schedds.
+        self.proxies = {}
+        self.proxies_lock = threading.Lock()
+        self.proxy_locks = {}
 
         htcondor.param['TOOL_DEBUG'] = 'D_FULLDEBUG D_SECURITY'
         if 'CRAB3_DEBUG' in os.environ and hasattr(htcondor, 'enable_debug'):
@@ -55,8 +121,7 @@ class CRAB3ProxyRenewer(object):
         self.schedds = [str(i) for i in result['htcondorSchedds']]
         self.logger.info("Resulting pool %s; schedds %s" % (self.pool, ",".join(self.schedds)))
 
-    def get_proxy(self, ad):
-        result = None
+    def get_credential_key(self, ad):
         vo = 'cms'
         group = ''
         role = ''
@@ -66,7 +131,10 @@ class CRAB3ProxyRenewer(object):
             group = ad['CRAB_UserGroup']
         if 'CRAB_UserRole' in ad and ad['CRAB_UserRole'] and ad['CRAB_UserRole'] != classad.Value.Undefined:
             role = ad['CRAB_UserRole']
-        print vo, group, role
+        return (ad['CRAB_UserDN'], vo, group, role)
+
+    def get_proxy(self, ad):
+        dummyUser, vo, group, role = self.get_credential_key(ad)
         proxycfg = {'vo': vo,
                     'logger': self.logger,
                     'myProxySvr': self.config.Services.MyProxy,
@@ -91,28 +159,66 @@ class CRAB3ProxyRenewer(object):
             raise Exception("Failed to retrieve proxy.")
         return userproxy
 
-    def renew_proxy(self, schedd, ad, proxy):
-        now = time.time()
-        self.logger.info("Renewing proxy for task %s." % ad['CRAB_ReqName'])
-        if not hasattr(schedd, 'refreshGSIProxy'):
-            raise NotImplementedError()
-        with HTCondorUtils.AuthenticatedSubprocess(proxy) as (parent, rpipe):
-            if not parent:
-                lifetime = schedd.refreshGSIProxy(ad['ClusterId'], ad['ProcID'], proxy, -1)
-                schedd.edit(['%s.%s' % (ad['ClusterId'], ad['ProcId'])], 'x509userproxyexpiration', str(int(now+lifetime)))
-        results = rpipe.read()
+    def get_cached_proxy(self, key, ad):
+        """
+        Return the proxy of the credential group key, retrieving it from MyProxy
+        only the first time. Concurrent callers asking for the same key wait for
+        the first retrieval; a failed retrieval is not retried in this execution.
+        """
+        with self.proxies_lock:
+            lock = self.proxy_locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self.proxies:
+                self.logger.info("Retrieving proxy for %s" % str(key))
+                try:
+                    self.proxies[key] = (self.get_proxy(ad), None)
+                except Exception as ex:
+                    self.proxies[key] = (None, ex)
+            proxyfile, error = self.proxies[key]
+        if error:
+            raise error
+        return proxyfile
+
+    def renew_proxy(self, schedd_ad, ad, proxy):
+        self.renew_proxies(schedd_ad, [ad], proxy)
+
+    def renew_proxies(self, schedd_ad, ad_list, proxy):
+        """
+        Renew the proxy of all the tasks in ad_list, which share the same credentials,
+        from a single authenticated subprocess forked by a process of the pool.
+        """
+        self.logger.info("Renewing proxy for tasks %s." % ", ".join([ad['CRAB_ReqName'] for ad in ad_list]))
+        tasks = [(ad['ClusterId'], ad['ProcId'], ad['CRAB_ReqName']) for ad in ad_list]
+        results = self.process_pool.apply(renew_proxies_subprocess, (str(schedd_ad), tasks, proxy))
         if results != "OK":
             raise Exception("Failure when renewing HTCondor task proxy: '%s'" % results)
 
-    def execute_schedd(self, schedd_name, collector):
-        self.logger.info("Updating tasks in schedd %s" % schedd_name)
-        self.logger.info("Trying to locate schedd.")
+    def locate_schedd(self, schedd_name, collector):
+        self.logger.info("Trying to locate schedd %s." % schedd_name)
         schedd_ad = collector.locate(htcondor.DaemonTypes.Schedd, schedd_name)
         self.logger.info("Schedd found at %s" % schedd_ad['MyAddress'])
+        return schedd_ad
+
+    def execute_group(self, schedd_ad, key, ad_list):
+        try:
+            proxyfile = self.get_cached_proxy(key, ad_list[0])
+        except Exception:
+            self.logger.exception("Failed to retrieve proxy for %s.  Skipping user" % str(key))
+            return
+        try:
+            self.renew_proxies(schedd_ad, ad_list, proxyfile)
+        except Exception:
+            self.logger.exception("Failed to renew proxy for tasks of %s due to exception." % str(key))
+
+    def execute_schedd(self, schedd_name, collector):
+        self.logger.info("Updating tasks in schedd %s" % schedd_name)
+        schedd_ad = self.locate_schedd(schedd_name, collector)
         schedd = htcondor.Schedd(schedd_ad)
-        self.logger.info("Querying schedd for CRAB3 tasks.")
+        if not hasattr(schedd, 'refreshGSIProxy'):
+            raise NotImplementedError()
+        self.logger.info("Querying schedd %s for CRAB3 tasks." % schedd_name)
         task_ads = list(schedd.xquery('JobStatus =!= 4 && TaskType =?= "ROOT" && CRAB_HC =!= "True"', QUERY_ATTRS))
-        self.logger.info("There were %d tasks found." % len(task_ads))
+        self.logger.info("There were %d tasks found in schedd %s." % (len(task_ads), schedd_name))
         ads = {}
         now = time.time()
         for ad in task_ads:
@@ -121,46 +227,45 @@ class CRAB3ProxyRenewer(object):
                 if lifetime > MINPROXYLENGTH:
                     self.logger.info("Skipping refresh of proxy for task %s because it still has a lifetime of %.1f hours." % (ad['CRAB_ReqName'], lifetime/3600.0))
                     continue
-            user = ad['CRAB_UserDN']
-            vo = 'cms'
-            group = ''
-            role = ''
-            if 'CRAB_UserVO' in ad and ad['CRAB_UserVO']:
-                vo = ad['CRAB_UserVO']
-            if 'CRAB_UserGroup' in ad and ad['CRAB_UserGroup'] and ad['CRAB_UserGroup'] != classad.Value.Undefined:
-                group = ad['CRAB_UserGroup']
-            if 'CRAB_UserRole' in ad and ad['CRAB_UserRole'] and ad['CRAB_UserRole'] != classad.Value.Undefined:
-                role = ad['CRAB_UserRole']
-            key = (user, vo, group, role)
+            key = self.get_credential_key(ad)
             ad_list = ads.setdefault(key, [])
             ad_list.append(ad)
 
-        for key, ad_list in ads.items():
-            self.logger.info("Retrieving proxy for %s" % str(key))
-            try:
-                proxyfile = self.get_proxy(ad_list[0])
-            except Exception:
-                self.logger.exception("Failed to retrieve proxy.  Skipping user")
-                continue
-            for ad in ad_list:
-                try:
-                    self.renew_proxy(schedd, ad, proxyfile)
-                except NotImplementedError:
-                    raise
-                except Exception:
-                    self.logger.exception("Failed to renew proxy for task %s due to exception." % ad['CRAB_ReqName'])
-
-    def execute(self):
-        self.get_backendurls()
-        collector = htcondor.Collector(self.pool)
-        for schedd_name in self.schedds:
+        run_in_threads(lambda item: self.execute_group(schedd_ad, item[0], item[1]), ads.items(), self.group_threads)
+
+    def execute(self, collector=None):
+        if not self.schedds:
+            self.get_backendurls()
+        if collector is None:
+            collector = htcondor.Collector(self.pool)
+        self.proxies = {}
+        self.proxy_locks = {}
+        not_implemented = []
+        def execute_schedd(schedd_name):
             try:
                 self.execute_schedd(schedd_name, collector)
                 self.logger.info("Done updating proxies for schedd %s" % schedd_name)
             except NotImplementedError:
-                raise
+                not_implemented.append(schedd_name)
             except Exception:
                 self.logger.exception("Unable to update all proxies for schedd %s" % schedd_name)
+        start = time.time()
+        ## Forking from the threads would give every child the pipes the other threads
+        ## opened for their own children (delaying the end of file the parents wait for)
+        ## and the locks held by the other threads at the time of the fork. Hence the
+        ## processes forking the authenticated subprocesses are created here, while this
+        ## process has a single thread, and the threads only hand the renewals to them.
+        self.process_pool = multiprocessing.Pool(self.renew_processes)
+        try:
+            run_in_threads(execute_schedd, self.schedds, self.schedd_threads)
+        finally:
+            self.process_pool.close()
+            self.process_pool.join()
+            self.process_pool = None
+        self.logger.info("Proxy renewal of %d schedd(s) took %.1f seconds; %d MyProxy retrieval(s)." % \
+                         (len(self.schedds), time.time() - start, len(self.proxies)))
+        if not_implemented:
+            raise NotImplementedError("Schedd(s) %s do not support proxy refresh." % ", ".join(not_implemented))
 
 if __name__ == '__main__':
     """ Simple main to execute the action standalon. You just need to set the task worker environment.
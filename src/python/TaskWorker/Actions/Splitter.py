@@ -5,6 +5,7 @@ from httplib import HTTPException
 from WMCore.DataStructs.Workflow import Workflow
 from WMCore.DataStructs.Subscription import Subscription
 from WMCore.JobSplitting.SplitterFactory import SplitterFactory
+from WMCore.JobSplitting.Generators.GeneratorInterface import GeneratorInterface
 
 from RESTInteractions import HTTPRequests
 
@@ -14,6 +15,45 @@ from TaskWorker.Actions.TaskAction import TaskAction
 from TaskWorker.WorkerExceptions import TaskWorkerException
 
 
+def splitParameters(task):
+    """Return the arguments of the splitting algorithm of the task, i.e. its tm_split_args
+       completed with the algorithm name and the limit on the total units"""
+    splitparam = task['tm_split_args']
+    splitparam['algorithm'] = task['tm_split_algo']
+    if task['tm_job_type'] == 'Analysis':
+        if task['tm_split_algo'] == 'FileBased':
+            splitparam['total_files'] = task['tm_totalunits']
+        elif task['tm_split_algo'] == 'LumiBased':
+            splitparam['total_lumis'] = task['tm_totalunits']
+        elif task['tm_split_algo'] == 'EventAwareLumiBased':
+            splitparam['total_events'] = task['tm_totalunits']
+    elif task['tm_job_type'] == 'PrivateMC':
+        if 'tm_events_per_lumi' in task and task['tm_events_per_lumi']:
+            splitparam['events_per_lumi'] = task['tm_events_per_lumi']
+        if 'tm_generator' in task and task['tm_generator'] == 'lhe':
+            splitparam['lheInputFiles'] = True
+    splitparam['applyLumiCorrection'] = True
+    return splitparam
+
+
+class JobCounter(GeneratorInterface):
+    """Job generator counting the jobs while the splitting algorithm creates them, so that the
+       splitting is aborted as soon as the task has more jobs than allowed, instead of after
+       creating all of them."""
+
+    def __init__(self, maxJobs, **options):
+        GeneratorInterface.__init__(self, **options)
+        self.maxJobs = maxJobs
+        self.numJobs = 0
+
+    def __call__(self, wmbsJob):
+        self.numJobs += 1
+        if self.numJobs > self.maxJobs:
+            ## The splitting is aborted here, so the total number of jobs is not known.
+            raise TaskWorkerException("The splitting on your task generated more than %s jobs, the maximum number of jobs in each task" %
+                                        self.maxJobs)
+
+
 class Splitter(TaskAction):
     """Performing the split operation depending on the
        recevied input and arguments"""
@@ -24,26 +64,12 @@ class Splitter(TaskAction):
         wmsubs = Subscription(fileset=args[0], workflow=wmwork,
                                split_algo=kwargs['task']['tm_split_algo'],
                                type=self.jobtypeMapper[kwargs['task']['tm_job_type']])
+        maxJobs = getattr(self.config.TaskWorker, 'maxJobsPerTask', 10000)
+        counter = JobCounter(maxJobs)
         splitter = SplitterFactory()
-        jobfactory = splitter(subscription=wmsubs)
-        splitparam = kwargs['task']['tm_split_args']
-        splitparam['algorithm'] = kwargs['task']['tm_split_algo']
-        if kwargs['task']['tm_job_type'] == 'Analysis':
-            if kwargs['task']['tm_split_algo'] == 'FileBased':
-                splitparam['total_files'] = kwargs['task']['tm_totalunits']
-            elif kwargs['task']['tm_split_algo'] == 'LumiBased':
-                splitparam['total_lumis'] = kwargs['task']['tm_totalunits']
-            elif kwargs['task']['tm_split_algo'] == 'EventAwareLumiBased':
-                splitparam['total_events'] = kwargs['task']['tm_totalunits']
-        elif kwargs['task']['tm_job_type'] == 'PrivateMC':
-            if 'tm_events_per_lumi' in kwargs['task'] and kwargs['task']['tm_events_per_lumi']:
-                splitparam['events_per_lumi'] = kwargs['task']['tm_events_per_lumi']
-            if 'tm_generator' in kwargs['task'] and kwargs['task']['tm_generator'] == 'lhe':
-                splitparam['lheInputFiles'] = True
-        splitparam['applyLumiCorrection'] = True
-        factory = jobfactory(**splitparam)
+        jobfactory = splitter(subscription=wmsubs, generators=[counter])
+        factory = jobfactory(**splitParameters(kwargs['task']))
         numJobs = sum([len(jobgroup.getJobs()) for jobgroup in factory])
-        maxJobs = getattr(self.config.TaskWorker, 'maxJobsPerTask', 10000)
         if numJobs == 0:
             raise TaskWorkerException("The CRAB3 server backend could not submit any job to the Grid scheduler:\n"+\
                         "splitting task %s on dataset %s with %s method does not generate any job" %
@@ -0,0 +1,275 @@
+"""
+Estimate the result of the splitting of a task from the discovered input files,
+without running the WMCore splitting algorithm.
+
+The splitting algorithms build a Job object, with its input files and lumi mask,
+for every job of the task; the dry run only needs the number of lumis and events
+of each job. The estimator walks the files of the fileset as the FileBased,
+LumiBased and EventAwareLumiBased algorithms do (same grouping by location, file
+ordering, lumi mask, correction of the lumis split across files and limit on the
+total units) and keeps only these two numbers per job.
+"""
+
+import math
+from operator import itemgetter
+
+from WMCore.WMSpec.WMTask import buildLumiMask
+from WMCore.DataStructs.Fileset import Fileset
+from WMCore.JobSplitting.LumiBased import isGoodRun, isGoodLumi
+
+## The splitting algorithms that can be estimated.
+ALGORITHMS = ['FileBased', 'LumiBased', 'EventAwareLumiBased']
+
+
+def sortByLocation(fileset):
+    """Return the files of the fileset grouped by location set, as JobFactory.sortByLocation does
+
+    The dictionary is filled in the same order, so that its location sets are
+    iterated in the same order as in the splitting algorithms."""
+    fileDict = {}
+    ## The algorithms walk the set of the available files of the subscription, a copy of the fileset.
+    available = Fileset(name=fileset.name, files=fileset.getFiles())
+    for fileInfo in available.getFiles(type='set'):
+        locSet = frozenset(fileInfo['locations'])
+        if locSet in fileDict:
+            fileDict[locSet].append(fileInfo)
+        else:
+            fileDict[locSet] = [fileInfo]
+    return fileDict
+
+
+def fileLumis(fileInfo):
+    """Return the sorted runs of a file, its number of lumis and its average number of events per lumi"""
+    runs = sorted(fileInfo['runs'])
+    lumiCount = sum([len(run.lumis) for run in runs])
+    avgEvtsPerLumi = round(float(fileInfo['events']) / lumiCount) if lumiCount else 0
+    return runs, lumiCount, avgEvtsPerLumi
+
+
+def estimateSplitting(fileset, splitparam):
+    """Return the lists of the number of lumis and of events of each job of the splitting of fileset
+
+    :arg WMCore.DataStructs.Fileset fileset: the input files of the task
+    :arg dict splitparam: the arguments of the splitting algorithm, including 'algorithm'
+    :return: (lumisPerJob, eventsPerJob), computed as SplittingSummary does for the real jobs."""
+    algo = splitparam['algorithm']
+    if algo == 'FileBased':
+        return estimateFileBased(fileset, splitparam)
+    elif algo in ['LumiBased', 'EventAwareLumiBased']:
+        return LumiEstimator(splitparam).estimate(fileset, algo)
+    raise ValueError("The splitting algorithm %s cannot be estimated" % algo)
+
+
+def estimateFileBased(fileset, splitparam):
+    filesPerJob = int(splitparam.get('files_per_job', 10))
+    totalFiles = int(splitparam.get('total_files', 0))
+    runBoundaries = splitparam.get('respect_run_boundaries', False)
+    runs, lumis = splitparam.get('runs', None), splitparam.get('lumis', None)
+    goodRunList = buildLumiMask(runs, lumis) if runs and lumis else {}
+
+    ## The algorithm counts the lumis of the files (for the summary) only when there is a lumi mask.
+    locationDict = {}
+    for locSet, files in sortByLocation(fileset).items():
+        newlist = []
+        for fileInfo in files:
+            lumiCount = 0
+            if goodRunList:
+                if not fileInfo['runs']:
+                    continue
+                fileRuns, lumiCount, dummyAvg = fileLumis(fileInfo)
+                if not lumiCount:
+                    continue
+                if not any(isGoodLumi(goodRunList, run.run, lumi) for run in fileRuns
+                           if isGoodRun(goodRunList, run.run) for lumi in run):
+                    continue
+            newlist.append((fileInfo['lfn'], lumiCount, fileInfo['events'], fileInfo.get('minrun', None)))
+        locationDict[locSet] = sorted(newlist, key=itemgetter(0))
+
+    if totalFiles > 0:
+        kept = set(sorted([info[0] for infos in locationDict.values() for info in infos])[:totalFiles])
+        for locSet in locationDict.keys():
+            locationDict[locSet] = [info for info in locationDict[locSet] if info[0] in kept]
+
+    lumisPerJob, eventsPerJob = [], []
+    for locSet in locationDict.keys():
+        filesInJob = 0
+        jobRun = None
+        for dummyLfn, lumiCount, events, fileRun in locationDict[locSet]:
+            if filesInJob == 0 or filesInJob == filesPerJob or (runBoundaries and fileRun != jobRun):
+                lumisPerJob.append(0)
+                eventsPerJob.append(0)
+                filesInJob = 0
+                jobRun = fileRun
+            lumisPerJob[-1] += lumiCount
+            eventsPerJob[-1] += events
+            filesInJob += 1
+    return lumisPerJob, eventsPerJob
+
+
+class LumiEstimator(object):
+    """
+    Walk the lumis of the files as the LumiBased and EventAwareLumiBased algorithms
+    do, recording the lumis and the input files of each job.
+    """
+
+    def __init__(self, splitparam):
+        self.splitparam = splitparam
+        runs, lumis = splitparam.get('runs', None), splitparam.get('lumis', None)
+        self.goodRunList = buildLumiMask(runs, lumis) if runs and lumis else {}
+        self.runWhitelist = splitparam.get('runWhitelist', [])
+        self.splitOnRun = splitparam.get('splitOnRun', True)
+        self.splitOnFile = bool(splitparam.get('halt_job_on_file_boundaries', False))
+        ## (run, lumi) -> index of the job processing it, only to correct the lumis split across files.
+        self.lumiJobs = {} if splitparam.get('applyLumiCorrection', False) else None
+        self.splitLumiFiles = []
+        ## For each job: [number of lumis, lfns of the input files, sum of their average events per lumi]
+        self.jobs = []
+
+    def estimate(self, fileset, algo):
+        locationDict = {}
+        for locSet, files in sortByLocation(fileset).items():
+            newlist = []
+            for fileInfo in files:
+                if not fileInfo['runs']:
+                    continue
+                runs, lumiCount, avgEvtsPerLumi = fileLumis(fileInfo)
+                if lumiCount:
+                    newlist.append((runs[0], fileInfo['lfn'], runs, lumiCount, avgEvtsPerLumi))
+            locationDict[locSet] = sorted(newlist, key=itemgetter(0))
+
+        if algo == 'LumiBased':
+            self.walkLumiBased(locationDict)
+        else:
+            self.walkEventAwareLumiBased(locationDict)
+
+        ## As LumiChecker.fixInputFiles, add the files of the split lumis to the job processing the lumi.
+        for key, lfn, avgEvtsPerLumi in self.splitLumiFiles:
+            job = self.jobs[self.lumiJobs[key]]
+            job[1].append(lfn)
+            job[2] += avgEvtsPerLumi
+        lumisPerJob = [lumis for lumis, dummyFiles, dummyAvg in self.jobs]
+        eventsPerJob = [avgEvtsSum / float(len(lfns)) * lumis for lumis, lfns, avgEvtsSum in self.jobs]
+        return lumisPerJob, eventsPerJob
+
+    def runsToProcess(self, runs):
+        """Yield the runs of a file passing the lumi mask and the run whitelist"""
+        for run in runs:
+            if not isGoodRun(self.goodRunList, run.run):
+                continue
+            if self.runWhitelist and run.run not in self.runWhitelist:
+                continue
+            yield run
+
+    def acceptLumi(self, run, lumi, lfn, avgEvtsPerLumi):
+        """Return False for the lumis not in the lumi mask and for the lumis already processed"""
+        if not isGoodLumi(self.goodRunList, run, lumi):
+            return False
+        if self.lumiJobs is not None and (run, lumi) in self.lumiJobs:
+            self.splitLumiFiles.append(((run, lumi), lfn, avgEvtsPerLumi))
+            return False
+        return True
+
+    def newJob(self):
+        self.jobs.append([0, [], 0])
+
+    def addLumi(self, run, lumi, lfn, avgEvtsPerLumi):
+        job = self.jobs[-1]
+        job[0] += 1
+        if lfn not in job[1]:
+            job[1].append(lfn)
+            job[2] += avgEvtsPerLumi
+        if self.lumiJobs is not None:
+            self.lumiJobs[(run, lumi)] = len(self.jobs) - 1
+
+    def walkLumiBased(self, locationDict):
+        lumisPerJob = int(self.splitparam.get('lumis_per_job', 1))
+        totalLumis = int(self.splitparam.get('total_lumis', 0))
+        lumisInJob = 0
+        lumisInTask = 0
+        lastRun = None
+        for location in locationDict.keys():
+            stopJob = True
+            for dummyLowestRun, lfn, runs, dummyLumiCount, avgEvtsPerLumi in locationDict[location]:
+                if self.splitOnFile:
+                    stopJob = True
+                for run in self.runsToProcess(runs):
+                    if self.splitOnRun and run.run != lastRun:
+                        stopJob = True
+                    for lumi in run:
+                        if not self.acceptLumi(run.run, lumi, lfn, avgEvtsPerLumi):
+                            continue
+                        if lumisInJob == lumisPerJob:
+                            stopJob = True
+                        if stopJob:
+                            self.newJob()
+                            lumisInJob = 0
+                        self.addLumi(run.run, lumi, lfn, avgEvtsPerLumi)
+                        lumisInJob += 1
+                        lumisInTask += 1
+                        stopJob = False
+                        lastRun = run.run
+                        if totalLumis > 0 and lumisInTask >= totalLumis:
+                            return
+
+    def walkEventAwareLumiBased(self, locationDict):
+        avgEventsPerJob = int(self.splitparam.get('events_per_job', 5000))
+        totalEvents = int(self.splitparam.get('total_events', 0))
+        jobTimeLimit = int(self.splitparam.get('job_time_limit', 48 * 3600))
+        timePerEvent = self.splitparam.get('performance', {}).get('timePerEvent', 0) or 0
+
+        def lumisForEvents(avgEvtsPerLumi, lumiCount):
+            if avgEvtsPerLumi:
+                return max(int(math.floor(float(avgEventsPerJob) / avgEvtsPerLumi)), 1)
+            return lumiCount
+
+        lumisInJob = 0
+        lastRun = None
+        totalAvgEventCount = 0
+        currentJobAvgEventCount = 0
+        for location in locationDict:
+            stopJob = True
+            for dummyLowestRun, lfn, runs, lumiCount, avgEvtsPerLumi in locationDict[location]:
+                lumisInJobInFile = 0
+                updateSplitOnJobStop = False
+                if avgEvtsPerLumi * timePerEvent > jobTimeLimit and lumiCount == 1:
+                    stopJob = True
+                    lumisPerJob = 1
+                elif self.splitOnFile:
+                    stopJob = True
+                    lumisPerJob = lumisForEvents(avgEvtsPerLumi, lumiCount)
+                else:
+                    updateSplitOnJobStop = True
+                    eventsRemaining = max(avgEventsPerJob - currentJobAvgEventCount, 0)
+                    if avgEvtsPerLumi:
+                        lumisAllowed = int(math.floor(float(eventsRemaining) / avgEvtsPerLumi))
+                    else:
+                        lumisAllowed = lumiCount
+                    lumisPerJob = max(lumisInJob + lumisAllowed, 1)
+
+                for run in self.runsToProcess(runs):
+                    if self.splitOnRun and run.run != lastRun:
+                        stopJob = True
+                    for lumi in run:
+                        if not self.acceptLumi(run.run, lumi, lfn, avgEvtsPerLumi):
+                            continue
+                        if lumisInJob == lumisPerJob:
+                            stopJob = True
+                        if stopJob:
+                            self.newJob()
+                            lumisInJob = 0
+                            lumisInJobInFile = 0
+                            currentJobAvgEventCount = 0
+                            if updateSplitOnJobStop:
+                                updateSplitOnJobStop = False
+                                lumisPerJob = lumisForEvents(avgEvtsPerLumi, lumiCount)
+                        self.addLumi(run.run, lumi, lfn, avgEvtsPerLumi)
+                        lumisInJob += 1
+                        lumisInJobInFile += 1
+                        stopJob = False
+                        lastRun = run.run
+                        totalAvgEventCount += avgEvtsPerLumi
+                        if totalEvents > 0 and totalAvgEventCount >= totalEvents:
+                            return
+
+                if not self.splitOnFile:
+                    currentJobAvgEventCount += avgEvtsPerLumi * lumisInJobInFile
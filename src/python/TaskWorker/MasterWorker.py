@@ -22,7 +22,7 @@ from MultiProcessingLog import MultiProcessingLog
 from TaskWorker.Worker import Worker, setProcessLogger
 import TaskWorker.Actions.Recurring.BaseRecurringAction
 from TaskWorker.Actions.Recurring.BaseRecurringAction import handleRecurring
-from TaskWorker.Actions.Handler import handleResubmit, handleNewTask, handleKill
+from TaskWorker.Actions.Handler import handleResubmit, handleNewTask, handleKill, DEFAULT_BACKEND
 
 ## NOW placing this here, then to be verified if going into Action.Handler, or TSM
 ## This is a list because we want to preserve the order
@@ -91,11 +91,17 @@ class MasterWorker(object):
             createLogdir('logs/processes')
             createLogdir('logs/tasks')
 
+            self.logHandler = None
             if self.TEST:
                 #if we are testing log to the console is easier
                 logging.getLogger().addHandler(logging.StreamHandler())
             else:
-                logHandler = MultiProcessingLog('logs/twlog.txt', when='midnight')
+                logHandler = MultiProcessingLog('logs/twlog.txt', when='midnight',
+                                                queueSize=getattr(config.TaskWorker, 'logQueueSize', 10000),
+                                                overflow=getattr(config.TaskWorker, 'logQueueOverflow', 'block'),
+                                                batchSize=getattr(config.TaskWorker, 'logBatchSize', 500),
+                                                flushInterval=getattr(config.TaskWorker, 'logFlushInterval', 1.0))
+                self.logHandler = logHandler
                 logFormatter = \
                     logging.Formatter("%(asctime)s:%(levelname)s:%(module)s:%(message)s")
                 logHandler.setFormatter(logFormatter)
@@ -141,6 +147,8 @@ class MasterWorker(object):
         else:
             self.slaves = Worker(self.config, resthost, self.restURInoAPI + '/workflowdb')
         self.slaves.begin()
+        ## where the timing of the actions is written at every cycle
+        self.metricsFile = getattr(self.config.TaskWorker, 'metricsFile', 'logs/actionmetrics.json')
         recurringActionsNames = getattr(self.config.TaskWorker, 'recurringActions', [])
         self.recurringActions = [self.getRecurringActionInst(name) for name in recurringActionsNames]
 
@@ -179,8 +187,11 @@ class MasterWorker(object):
 
         return True
 
-    def _getWork(self, limit, getstatus):
+    def _getWork(self, limit, getstatus, projection=None):
         configreq = {'limit': limit, 'workername': self.config.TaskWorker.name, 'getstatus': getstatus}
+        if projection is not None:
+            ## Only the columns needed for this kind of work.
+            configreq['projection'] = projection
         pendingwork = []
         try:
             pendingwork = self.server.get(self.restURInoAPI + '/workflowdb', data = configreq)[0]['result']
@@ -241,7 +252,9 @@ class MasterWorker(object):
                 limit = self.slaves.queueableTasks()
                 if not self._lockWork(limit=limit, getstatus=status, setstatus='HOLDING'):
                     continue
-                pendingwork = self._getWork(limit=limit, getstatus='HOLDING')
+                ## The PanDA actions need the whole task, the HTCondor ones only the columns of their kind of work.
+                projection = status.lower() if getattr(self.config.TaskWorker, 'backend', DEFAULT_BACKEND).lower() == 'glidein' else None
+                pendingwork = self._getWork(limit=limit, getstatus='HOLDING', projection=projection)
                 self.logger.info("Retrieved a total of %d %s works" %(len(pendingwork), worktype))
                 self.logger.debug("Retrieved the following works: \n%s" %(str(pendingwork)))
                 self.slaves.injectWorks([(worktype, work, None) for work in pendingwork])
@@ -258,8 +271,15 @@ class MasterWorker(object):
             self.logger.info(' - free slaves: %d' % self.slaves.freeSlaves())
             self.logger.info(' - acquired tasks: %d' % self.slaves.queuedTasks())
             self.logger.info(' - tasks pending in queue: %d' % self.slaves.pendingTasks())
+            if self.logHandler:
+                self.logger.info(' - log records in queue: %(queue_depth)d, dropped: %(dropped)d' % self.logHandler.get_stats())
 
             finished = self.slaves.checkFinished()
+            if self.metricsFile:
+                try:
+                    self.slaves.metrics.write(self.metricsFile)
+                except (IOError, OSError) as ex:
+                    self.logger.warning("Cannot write the action metrics to %s: %s" % (self.metricsFile, str(ex)))
 
             time.sleep(self.config.TaskWorker.polling)
         self.logger.debug("Master Worker Exiting Main Cycle")
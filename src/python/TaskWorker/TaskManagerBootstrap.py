@@ -7,30 +7,31 @@ import types
 import pickle
 import pprint
 
-import classad
-
-import TaskWorker.Actions.DBSDataDiscovery as DBSDataDiscovery
-import TaskWorker.Actions.Splitter as Splitter
-import TaskWorker.Actions.DagmanCreator as DagmanCreator
-import TaskWorker.Actions.PostJob as PostJob
-import TaskWorker.Actions.PreJob as PreJob
-import TaskWorker.Actions.Final as Final
-import HTCondorUtils
-
-import WMCore.Configuration as Configuration
+## This runs in a new process for every pre-job and post-job of every task:
+## each command imports only the modules it needs.
 
 def bootstrap():
     print "Entering TaskManagerBootstrap with args: %s" % sys.argv
     command = sys.argv[1]
     if command == "POSTJOB":
+        import TaskWorker.Actions.PostJob as PostJob
         return PostJob.PostJob().execute(*sys.argv[2:])
     elif command == "PREJOB":
+        import TaskWorker.Actions.PreJob as PreJob
         return PreJob.PreJob().execute(*sys.argv[2:])
     elif command == "FINAL":
+        import TaskWorker.Actions.Final as Final
         return Final.Final().execute(*sys.argv[2:])
     elif command == "ASO":
         return ASO.async_stageout(*sys.argv[2:])
 
+    import classad
+    import HTCondorUtils
+    import WMCore.Configuration as Configuration
+    import TaskWorker.Actions.DBSDataDiscovery as DBSDataDiscovery
+    import TaskWorker.Actions.Splitter as Splitter
+    import TaskWorker.Actions.DagmanCreator as DagmanCreator
+
     infile, outfile = sys.argv[2:]
 
     adfile = os.environ["_CONDOR_JOB_AD"]
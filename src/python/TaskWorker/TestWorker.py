@@ -1,3 +1,5 @@
+from TaskWorker import ActionMetrics
+
 class TestWorker(object):
     """ TestWorker class providing a sequential execution of the work in the same thread of the caller
         This is useful for debugging purposes because because there are problems executing pdb with
@@ -8,6 +10,7 @@ class TestWorker(object):
         self.config = config
         self.resthost = resthost
         self.resturi = resturi
+        self.metrics = ActionMetrics.ActionMetrics()
 
     def pendingTasks(self):
         return 0
@@ -28,6 +31,7 @@ class TestWorker(object):
         if works:
             func, task, _ = works[0]
             func(self.resthost, self.resturi, self.config, task, 0)
+            self.metrics.add(ActionMetrics.popRecords())
 
     def checkFinished(self):
         return []
@@ -11,6 +11,7 @@ from httplib import HTTPException
 from logging.handlers import TimedRotatingFileHandler
 
 from RESTInteractions import HTTPRequests
+from TaskWorker import ActionMetrics
 from TaskWorker.DataObjects.Result import Result
 from TaskWorker.WorkerExceptions import WorkerHandlerException
 
@@ -91,7 +92,8 @@ def processWorker(inputs, results, resthost, resturi, procnum):
 
         results.put({
                      'workid': workid,
-                     'out' : outputs
+                     'out' : outputs,
+                     'metrics': ActionMetrics.popRecords()
                     })
     logger.debug("Slave %s exiting." % procnum)
     return 0
@@ -137,6 +139,8 @@ class Worker(object):
         self.working = {}
         self.resthost = resthost
         self.resturi = resturi
+        ## timing of the actions run by all the slaves
+        self.metrics = ActionMetrics.ActionMetrics()
 
     def __del__(self):
         """When deleted shutting down all slaves"""
@@ -202,6 +206,7 @@ class Worker(object):
                 pass
             if out is not None:
                 self.logger.debug('Retrieved work %s'% str(out))
+                self.metrics.add(out.get('metrics', []))
                 if isinstance(out['out'], list):
                     allout.extend(out['out'])
                 else:
@@ -51,6 +51,7 @@ import socket
 import struct
 import StringIO
 import threading
+import Queue
 import time
 import Logger
 import ProcInfo
@@ -186,6 +187,13 @@ class ApMon:
 		# don't touch these:
 		self.__freed = False
 		self.__udpSocket = None
+		self.__batchQueue = None            # queue of (cluster, node, timeStamp, params) when batch sending is enabled
+		self.__batchThread = None
+		self.__batchMaxSize = 1400
+		self.__batchFlushTimeout = None
+		self.__batchStop = threading.Event()  # set by free() when flushTimeout expires
+		self.sendStats = {'queued': 0, 'dropped': 0, 'datagrams': 0, 'params': 0}
+		self.__statsLock = threading.Lock()    # sendStats is updated by the callers and by the sender thread
 		self.__configUpdateLock = threading.Lock()
 		self.__configUpdateEvent = threading.Event()
 		self.__configUpdateFinished = threading.Event()
@@ -280,10 +288,69 @@ class ApMon:
 		if len(self.destinations) == 0:
 			self.logger.log(Logger.WARNING, "Not sending parameters since no destination is defined.");
 			return
+		if self.__batchQueue != None:
+			try:
+				self.__batchQueue.put_nowait((clusterName, nodeName, timeStamp, params))
+				self.__countStats(queued = 1)
+			except Queue.Full:
+				self.__countStats(dropped = 1)
+				self.logger.log(Logger.WARNING, "Dropping parameters for ["+str(clusterName)+"/"+str(nodeName)+"] since the send queue is full.");
+			return
 		self.__configUpdateLock.acquire();
 		for dest in self.destinations.keys():
 			self.__directSendParams(dest, clusterName, nodeName, timeStamp, params);
 		self.__configUpdateLock.release();
+
+	def enableBatchSend (self, queueSize = 10000, maxDatagramSize = 1400, flushTimeout = None):
+		"""
+		Send the parameters from a background thread instead of from the caller.
+		sendParameters & co. only put the parameters in a queue of at most queueSize
+		entries and return immediately; when the queue is full the parameters are
+		dropped and counted in sendStats['dropped'].
+		The background thread takes all the queued parameter sets at once and packs
+		those for the same cluster, node and time in as few datagrams as possible,
+		each of at most maxDatagramSize bytes (a parameter set is never split, unless
+		it is bigger than a datagram). A new datagram is started when a parameter name
+		repeats, so that consecutive values of the same parameter are not merged.
+		A datagram carries a single cluster/node pair, so the parameter sets of
+		different nodes (e.g. one set for each job of a task) still take a datagram
+		each, and the maxMsgRate pauses still apply, in the background thread.
+		free() waits for all the queued parameters to be sent. If flushTimeout is
+		given, free() waits at most flushTimeout seconds; the parameter sets still
+		queued then are dropped (and counted in sendStats['dropped']) and the thread
+		is stopped before the socket is closed.
+		If the background thread is already running, the queue is only enlarged to
+		queueSize entries, if smaller, and flushTimeout is updated.
+		"""
+		if self.__batchThread != None:
+			self.__batchFlushTimeout = flushTimeout
+			self.__batchQueue.mutex.acquire()
+			try:
+				self.__batchQueue.maxsize = max(self.__batchQueue.maxsize, queueSize)
+			finally:
+				self.__batchQueue.mutex.release()
+			return
+		self.__batchMaxSize = maxDatagramSize
+		self.__batchFlushTimeout = flushTimeout
+		self.__batchStop.clear()
+		self.__batchQueue = Queue.Queue(queueSize)
+		self.__batchThread = threading.Thread(target=self.__batchSender)
+		self.__batchThread.setDaemon(True)
+		self.__batchThread.start()
+
+	def batchSendEnabled (self):
+		"""
+		Returns true if the parameters are sent from the background thread.
+		"""
+		return self.__batchQueue != None
+
+	def getQueueDepth (self):
+		"""
+		Returns the number of parameter sets waiting to be sent by the background thread.
+		"""
+		if self.__batchQueue == None:
+			return 0
+		return self.__batchQueue.qsize()
 	
 	def addJobToMonitor (self, pid, workDir, clusterName, nodeName):
 		"""
@@ -436,6 +503,17 @@ class ApMon:
 		#self.__bgMonitorEvent.set()
 		#self.__bgMonitorFinished.wait()
 		
+		if self.__batchThread != None:
+			# the None sentinel stops the sender thread once the queued parameters are sent
+			self.__batchQueue.put(None)
+			self.__batchThread.join(self.__batchFlushTimeout)
+			if self.__batchThread.isAlive():
+				# the thread drops what is left after the datagram being sent; it has to
+				# be finished before the socket is closed
+				self.logger.log(Logger.WARNING, "Closing ApMon with "+str(self.getQueueDepth())+" parameter sets not sent.");
+				self.__batchStop.set()
+				self.__batchThread.join()
+			self.__batchThread = None
 		if self.__udpSocket != None:
 			self.logger.log(Logger.DEBUG, "Closing UDP socket on ApMon object destroy.");
 			self.__udpSocket.close();
@@ -692,6 +770,26 @@ class ApMon:
 	
 	def __directSendParams (self, destination, clusterName, nodeName, timeStamp, params):
 		
+		sent_params_nr = 0
+		paramsPacker = xdrlib.Packer ()
+		
+		if type(params) == type( {} ):
+			for name, value in params.iteritems():
+				if self.__packParameter(paramsPacker, name, value):
+					sent_params_nr += 1
+		elif type(params) == type( [] ):
+			for name, value in params:
+				self.logger.log(Logger.DEBUG, "Adding parameter "+name+" = "+str(value));
+				if self.__packParameter(paramsPacker, name, value):
+					sent_params_nr += 1
+		else:
+			self.logger.log(Logger.WARNING, "Unsupported params type in sendParameters: " + str(type(params)));
+		
+		self.__sendDatagram(destination, clusterName, nodeName, timeStamp, paramsPacker.get_buffer(), sent_params_nr)
+		paramsPacker.reset()
+	
+	def __sendDatagram (self, destination, clusterName, nodeName, timeStamp, paramsBuffer, sent_params_nr):
+		
 		if self.__shouldSend() == False:
 #			self.logger.log(Logger.ERROR, "Dropping packet since rate is too fast!");
 			self.logger.log(Logger.INFO, "Pausing 1sec since rate is too fast!");
@@ -716,36 +814,127 @@ class ApMon:
 		xdrPacker.pack_string (clusterName)
 		xdrPacker.pack_string (nodeName)
 
-		sent_params_nr = 0
-		paramsPacker = xdrlib.Packer ()
-		
-		if type(params) == type( {} ):
-			for name, value in params.iteritems():
-				if self.__packParameter(paramsPacker, name, value):
-					sent_params_nr += 1
-		elif type(params) == type( [] ):
-			for name, value in params:
-				self.logger.log(Logger.DEBUG, "Adding parameter "+name+" = "+str(value));
-				if self.__packParameter(paramsPacker, name, value):
-					sent_params_nr += 1
-		else:
-			self.logger.log(Logger.WARNING, "Unsupported params type in sendParameters: " + str(type(params)));
-		
 		xdrPacker.pack_int (sent_params_nr)
 		
+		buffer = xdrPacker.get_buffer() + paramsBuffer
 		if (timeStamp != None) and (timeStamp > 0):
-			paramsPacker.pack_int(timeStamp);
-		
-		buffer = xdrPacker.get_buffer() + paramsPacker.get_buffer()
+			timePacker = xdrlib.Packer ()
+			timePacker.pack_int(timeStamp);
+			buffer += timePacker.get_buffer()
 		self.logger.log(Logger.NOTICE, "Building XDR packet ["+str(clusterName)+"/"+str(nodeName)+"] <"+str(crtSenderRef['SEQ_NR'])+"/"+str(crtSenderRef['INSTANCE_ID'])+"> "+str(sent_params_nr)+" params, "+str(len(buffer))+" bytes.");
 		# send this buffer to the destination, using udp datagrams
 		try:
 			self.__udpSocket.sendto(buffer, (host, port))
+			self.__countStats(datagrams = 1, params = sent_params_nr)
 			self.logger.log(Logger.NOTICE, "Packet sent to "+host+":"+str(port)+" "+passwd)
 		except socket.error as msg:
 			self.logger.log(Logger.ERROR, "Cannot send packet to "+host+":"+str(port)+" "+passwd+": "+str(msg[1]))
 		xdrPacker.reset()
-		paramsPacker.reset()
+	
+	#########################################################################################
+	# Internal functions - Batch sender thread
+	#########################################################################################
+
+	def __batchSender (self):
+		stop = False
+		while not stop:
+			item = self.__batchQueue.get()
+			if item == None:
+				break
+			items = [item]
+			# take whatever else is already waiting, so that it can share the datagrams
+			while True:
+				try:
+					item = self.__batchQueue.get_nowait()
+				except Queue.Empty:
+					break
+				if item == None:
+					stop = True
+					break
+				items.append(item)
+			try:
+				self.__sendBatch(items)
+			except Exception as ex:
+				self.logger.log(Logger.ERROR, "Error sending a batch of "+str(len(items))+" parameter sets: "+str(ex));
+			if self.__batchStop.isSet():
+				break
+		if self.__batchStop.isSet():
+			# free() gave up waiting: drop what is left, the socket is about to be closed
+			dropped = 0
+			while True:
+				try:
+					item = self.__batchQueue.get_nowait()
+				except Queue.Empty:
+					break
+				if item != None:
+					dropped += 1
+			self.__countStats(dropped = dropped)
+
+	def __sendBatch (self, items):
+		# group the parameter sets by (cluster, node, time), keeping the order
+		groups = {}
+		order = []
+		for clusterName, nodeName, timeStamp, params in items:
+			key = (clusterName, nodeName, timeStamp)
+			if key not in groups:
+				groups[key] = []
+				order.append(key)
+			if type(params) == type( {} ):
+				groups[key].append(params.items())
+			elif type(params) == type( [] ):
+				groups[key].append(params)
+			else:
+				self.logger.log(Logger.WARNING, "Unsupported params type in sendParameters: " + str(type(params)));
+		self.__configUpdateLock.acquire();
+		try:
+			for num, key in enumerate(order):
+				if self.__batchStop.isSet():
+					self.__countStats(dropped = sum([len(groups[other]) for other in order[num:]]))
+					break
+				clusterName, nodeName, timeStamp = key
+				for dest in self.destinations.keys():
+					self.__sendPacked(dest, clusterName, nodeName, timeStamp, groups[key])
+		finally:
+			self.__configUpdateLock.release();
+
+	def __countStats (self, **counts):
+		self.__statsLock.acquire()
+		try:
+			for name, count in counts.iteritems():
+				self.sendStats[name] += count
+		finally:
+			self.__statsLock.release()
+
+	def __sendPacked (self, destination, clusterName, nodeName, timeStamp, paramSets):
+		# size of everything but the parameters: password, instance id, sequence number,
+		# cluster, node, number of parameters and time
+		headerPacker = xdrlib.Packer ()
+		headerPacker.pack_string ("v:"+self.__version+"p:"+destination[2])
+		headerPacker.pack_string (clusterName)
+		headerPacker.pack_string (nodeName)
+		headerSize = len(headerPacker.get_buffer()) + 4 * 4
+		buffer = ""
+		names = set()
+		sent_params_nr = 0
+		for params in paramSets:
+			setPacker = xdrlib.Packer ()
+			setNames = set()
+			setParamsNr = 0
+			for name, value in params:
+				if self.__packParameter(setPacker, name, value):
+					setNames.add(name)
+					setParamsNr += 1
+			setBuffer = setPacker.get_buffer()
+			if sent_params_nr and ((names & setNames) or headerSize + len(buffer) + len(setBuffer) > self.__batchMaxSize):
+				self.__sendDatagram(destination, clusterName, nodeName, timeStamp, buffer, sent_params_nr)
+				buffer = ""
+				names = set()
+				sent_params_nr = 0
+			buffer += setBuffer
+			names |= setNames
+			sent_params_nr += setParamsNr
+		if sent_params_nr:
+			self.__sendDatagram(destination, clusterName, nodeName, timeStamp, buffer, sent_params_nr)
 	
 	def __packParameter(self, xdrPacker, name, value):
 		if (name is None) or (name is ""):
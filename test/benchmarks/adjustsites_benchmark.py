@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+"""
+Benchmark of the DAG file rewrites done by AdjustSites.py when a task is resubmitted.
+
+Synthetic RunJobs.dag.nodes.log and RunJobs.dag files are generated for an
+increasing number of jobs, and the adjustPostScriptExitStatus/adjustMaxRetries
+functions of AdjustSites.py are compared with the previous implementation,
+which built the whole output in memory (and wrote the node log twice).
+Every measurement runs in a forked child so that the reported peak RSS
+belongs to that measurement only. The files produced by the two
+implementations are checked to be identical, except for the indentation of
+the patched return values: the previous implementation rewrote those lines
+with 8 spaces, the new one only changes the return value and keeps the tab
+written by HTCondor.
+
+The htcondor and classad python bindings must be importable.
+
+Usage: python adjustsites_benchmark.py [--jobs 1000,10000,50000]
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import resource
+import tempfile
+from optparse import OptionParser
+
+import classad
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../scripts')
+
+NODE_EVENT = """000 (%(cluster)d.000.000) 11/11 17:%(minute)02d:46 Job submitted from host: <127.0.0.1:4080>
+    DAG Node: Job%(job)d
+...
+005 (%(cluster)d.000.000) 11/11 17:%(minute)02d:46 Job terminated.
+	(1) Normal termination (return value %(retval)d)
+...
+016 (%(cluster)d.000.000) 11/11 17:%(minute)02d:46 POST Script terminated.
+	(1) Normal termination (return value %(retval)d)
+    DAG Node: Job%(job)d
+...
+"""
+
+DAG_NODE = """JOB Job%(job)d Job.submit
+SCRIPT PRE  Job%(job)d dag_bootstrap.sh PREJOB $RETRY %(job)d 1416417231 crab3test-5@vocms021.cern.ch
+SCRIPT POST Job%(job)d dag_bootstrap.sh POSTJOB $JOBID $RETURN $RETRY $MAX_RETRIES 150212_123623:user_crab_test %(job)d /store/temp/user/user.1234/test/0000 /store/user/user/test/0000 cmsRun_%(job)d.log.tar.gz output_%(job)d.root
+#PRE_SKIP Job%(job)d 3
+RETRY Job%(job)d 2 UNLESS-EXIT 2
+VARS Job%(job)d count="%(job)d" runAndLumiMask="job_lumis_%(job)d.json" lheInputFiles="False" firstEvent="None" firstLumi="None" lastEvent="None" firstRun="None" seeding="AutomaticSeeding" inputFiles="job_input_file_list_%(job)d.txt" +CRAB_localOutputFiles="\\"output.root=output_%(job)d.root\\"" +CRAB_DataBlock="\\"/Primary/Processed-v1/AOD#1234\\""
+ABORT-DAG-ON Job%(job)d 3
+
+"""
+
+
+def generateFiles(directory, numJobs):
+    with open(os.path.join(directory, "RunJobs.dag.nodes.log"), 'w') as fd:
+        for job in range(1, numJobs + 1):
+            fd.write(NODE_EVENT % {'cluster': 100000 + job, 'minute': job % 60, 'job': job, 'retval': (job % 3) and 2})
+    with open(os.path.join(directory, "RunJobs.dag"), 'w') as fd:
+        for job in range(1, numJobs + 1):
+            fd.write(DAG_NODE % {'job': job})
+
+
+## The implementation of AdjustSites.py before the streaming rewrite, verbatim.
+
+def legacyAdjustPostScriptExitStatus(resubmitJobIds):
+    """
+    Edit the DAG .nodes.log file changing the POST script exit code from 0|2 to 1
+    (i.e., in RetryJob terminology, from OK|FATAL_ERROR to RECOVERABLE_ERROR) for
+    the job ids passed in the resubmitJobIds argument. This way DAGMan will retry
+    these nodes when the DAG is resubmitted. In practice, search for this kind of
+    sequence in the DAG .nodes.log file:
+    ...
+    016 (146493.000.000) 11/11 17:45:46 POST Script terminated.
+        (1) Normal termination (return value [0|2])
+        DAG Node: Job105
+    ...
+    for the job ids in resubmitJobIds and replace the return value to 1.
+    If resubmitJobIds = True, only replace return values 2 (not 0) to 1.
+
+    Note:
+          When DAGMan runs in recovery mode, the DAG .nodes.log file is used to
+    identify the nodes that have completed and should not be resubmitted.
+          When DAGMan runs in rescue mode (assuming a rescue DAG file is present,
+    which is not the case when a DAG is aborted, for example), all failed nodes
+    are resubmitted. Nodes can be labeled as DONE in the rescue DAG file and
+    DAGMan will not be rerun them, but then the node state would be set to DONE.
+    """
+    if not resubmitJobIds:
+        return []
+    resubmitAllFailed = (resubmitJobIds == True)
+    terminator_re = re.compile(r"^\.\.\.$")
+    event_re = re.compile(r"016 \(-?\d+\.\d+\.\d+\) \d+/\d+ \d+:\d+:\d+ POST Script terminated.")
+    if resubmitAllFailed:
+        retvalue_re = re.compile(r"Normal termination \(return value 2\)")
+    else:
+        retvalue_re = re.compile(r"Normal termination \(return value [0|2]\)")
+    node_re = re.compile(r"DAG Node: Job(\d+)")
+    ra_buffer = []
+    alt = None
+    output = ''
+    adjustedJobIds = []
+    for line in open("RunJobs.dag.nodes.log").readlines():
+        if len(ra_buffer) == 0:
+            m = terminator_re.search(line)
+            if m:
+                ra_buffer.append(line)
+            else:
+                output += line
+        elif len(ra_buffer) == 1:
+            m = event_re.search(line)
+            if m:
+                ra_buffer.append(line)
+            else:
+                for l in ra_buffer:
+                    output += l
+                output += line
+                ra_buffer = []
+        elif len(ra_buffer) == 2:
+            m = retvalue_re.search(line)
+            if m:
+                ra_buffer.append("        (1) Normal termination (return value 1)\n")
+                alt = line
+            else:
+                for l in ra_buffer:
+                    output += l
+                output += line
+                ra_buffer = []
+        elif len(ra_buffer) == 3:
+            m = node_re.search(line)
+            print line, m, m.groups(), resubmitJobIds
+            if m and (resubmitAllFailed or (m.groups()[0] in resubmitJobIds)):
+                print m.groups()[0], resubmitJobIds
+                adjustedJobIds.append(m.groups()[0])
+                for l in ra_buffer:
+                    output += l
+            else:
+                for l in ra_buffer[:-1]:
+                    output += l
+                output += alt
+            output += line
+            ra_buffer = []
+        else:
+            output += line
+    if ra_buffer:
+        for l in ra_buffer:
+            output += l
+    # This is a curious dance!  If the user is out of quota, we don't want
+    # to fail halfway into writing the file.  OTOH, we can't write into a temp
+    # file and an atomic rename because the running shadows keep their event log
+    # file descriptors open.  Accordingly, we write the file once (to see if we)
+    # have enough quota space, then rewrite "the real file" after deleting the
+    # temporary one.  There's a huge race condition here, but it seems to be the
+    # best we can do given the constraints.  Note that we don't race with the
+    # shadow as we have a write lock on the file itself.
+    output_fd = open("RunJobs.dag.nodes.log.tmp", "w")
+    output_fd.write(output)
+    output_fd.close()
+    os.unlink("RunJobs.dag.nodes.log.tmp")
+    output_fd = open("RunJobs.dag.nodes.log", "w")
+    output_fd.write(output)
+    output_fd.close()
+    return adjustedJobIds
+
+
+def legacyAdjustMaxRetries(adjustJobIds, ad):
+    """
+    Edit the DAG file adjusting the maximum allowed number of retries to the current
+    retry + CRAB_NumAutomJobRetries for the jobs specified in the jobIds argument
+    (or for all jobs if jobIds = True). Incrementing the maximum allowed number of
+    retries is a necessary condition for a job to be resubmitted.
+    """
+    if not adjustJobIds:
+        return
+    if not os.path.exists("RunJobs.dag"):
+        return
+    ## Get the latest retry count of each DAG node from the node status file.
+    retriesDict = {}
+    if os.path.exists("node_state"):
+        with open("node_state", 'r') as fd:
+            for nodeStatusAd in classad.parseAds(fd):
+                if nodeStatusAd['Type'] != "NodeStatus":
+                    continue
+                node = nodeStatusAd.get('Node', '')
+                if not node.startswith("Job"):
+                    continue
+                jobId = node[3:]
+                retriesDict[jobId] = int(nodeStatusAd.get('RetryCount', -1))
+    ## Search for the RETRY directives in the DAG file for the job ids passed in the
+    ## resubmitJobIds argument and change the maximum retries to the current retry
+    ## count + CRAB_NumAutomJobRetries.
+    retry_re = re.compile(r'RETRY Job([0-9]+) ([0-9]+) ')
+    output = ""
+    adjustAll = (adjustJobIds == True)
+    numAutomJobRetries = int(ad.get('CRAB_NumAutomJobRetries', 2))
+    with open("RunJobs.dag", 'r') as fd:
+        for line in fd.readlines():
+            match_retry_re = retry_re.search(line)
+            if match_retry_re:
+                jobId = match_retry_re.groups()[0]
+                if adjustAll or (jobId in adjustJobIds):
+                    if jobId in retriesDict and retriesDict[jobId] != -1:
+                        lastRetry = retriesDict[jobId]
+                        ## The 1 is to account for the resubmission itself; then, if the job fails, we
+                        ## allow up to numAutomJobRetries automatic retries from DAGMan.
+                        maxRetries = lastRetry + (1 + numAutomJobRetries)
+                    else:
+                        try:
+                            maxRetries = int(match_retry_re.groups()[1]) + (1 + numAutomJobRetries)
+                        except ValueError:
+                            maxRetries = numAutomJobRetries
+                    line = retry_re.sub(r'RETRY Job%s %d ' % (jobId, maxRetries), line)
+            output += line
+    with open("RunJobs.dag", 'w') as fd:
+        fd.write(output)
+
+
+def readNormalized(filename):
+    """
+    The lines of a file with the leading whitespace of the patched POST script
+    return values removed (see the module docstring).
+    """
+    with open(filename) as fd:
+        return [line.lstrip() if 'Normal termination (return value 1)' in line else line for line in fd]
+
+
+def loadAdjustSites(directory):
+    """
+    AdjustSites.py is a script: it needs a job ad to be importable and it
+    redirects stdout unless told otherwise.
+    """
+    adfile = os.path.join(directory, ".job.ad")
+    with open(adfile, 'w') as fd:
+        fd.write("CRAB_NumAutomJobRetries = 2\n")
+    os.environ['_CONDOR_JOB_AD'] = adfile
+    os.environ['TEST_DONT_REDIRECT_STDOUT'] = '1'
+    sys.path.insert(0, SCRIPTS_DIR)
+    ## Importing the script creates adjust_out.txt in the working directory.
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        import AdjustSites
+    finally:
+        os.chdir(cwd)
+    return AdjustSites
+
+
+def runInChild(directory, func):
+    """
+    Run func in a forked child inside directory, return (wall time, peak RSS in MB).
+    """
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        os.chdir(directory)
+        ## The previous implementation prints every adjusted node.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.close(devnull)
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+        os.write(wfd, "%f %f" % (elapsed, maxrss))
+        os._exit(0)
+    os.close(wfd)
+    result = os.read(rfd, 1024)
+    os.close(rfd)
+    os.waitpid(pid, 0)
+    return [float(value) for value in result.split()]
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--jobs", dest="jobs", default="1000,10000,50000", help="Comma separated number of DAG nodes")
+    opts, dummyArgs = parser.parse_args()
+
+    basedir = tempfile.mkdtemp()
+    try:
+        AdjustSites = loadAdjustSites(basedir)
+        ad = {'CRAB_NumAutomJobRetries': 2}
+        print "%8s %10s | %12s %12s | %12s %12s" % ("jobs", "size [MB]", "legacy [s]", "legacy [MB]", "stream [s]", "stream [MB]")
+        for numJobs in [int(jobs) for jobs in opts.jobs.split(",")]:
+            resubmit = [str(job) for job in range(1, numJobs + 1, 2)]
+            dirs = {}
+            for kind in ['legacy', 'stream']:
+                dirs[kind] = os.path.join(basedir, "%s_%d" % (kind, numJobs))
+                os.makedirs(dirs[kind])
+                generateFiles(dirs[kind], numJobs)
+            size = sum([os.path.getsize(os.path.join(dirs['legacy'], name)) for name in ["RunJobs.dag", "RunJobs.dag.nodes.log"]])
+            def legacy():
+                legacyAdjustMaxRetries(legacyAdjustPostScriptExitStatus(resubmit), ad)
+            def stream():
+                AdjustSites.adjustMaxRetries(AdjustSites.adjustPostScriptExitStatus(resubmit), ad)
+            legacyTime, legacyRSS = runInChild(dirs['legacy'], legacy)
+            streamTime, streamRSS = runInChild(dirs['stream'], stream)
+            print "%8d %10.1f | %12.3f %12.1f | %12.3f %12.1f" % (numJobs, size / 1048576., legacyTime, legacyRSS, streamTime, streamRSS)
+            for name in ["RunJobs.dag", "RunJobs.dag.nodes.log"]:
+                if readNormalized(os.path.join(dirs['legacy'], name)) != readNormalized(os.path.join(dirs['stream'], name)):
+                    print "ERROR: %s differs between the two implementations" % name
+                    return 1
+    finally:
+        shutil.rmtree(basedir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark of the ASO code paths against the local CouchDB stand-in
+(test/python/Fakes/FakeCouchDB.py) filled with --docs transfer documents
+spread over --tasks tasks:
+ - inject: cmscp/PostJob injection of one document (GET of the document, then _bulk_docs);
+ - status: PostJob ASOServerJob.get_transfers_statuses of one job, from the
+   JobsIdsStatesByWorkflow view and with the fallback loading each document;
+ - publication: HTCondorDataWorkflow.publicationStatus of one task;
+ - kill: DagmanKiller.killTransfers of one task.
+Reports the wall time and the requests done to CouchDB by each path.
+
+Usage: python aso_couch_benchmark.py [--docs 100000] [--tasks 100] [--delay 0]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+from optparse import OptionParser
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, os.path.join(BASE_DIR, 'src/python'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'test/python/Fakes'))
+import WMCore.Database.CMSCouch as CMSCouch
+from TaskWorker.Actions.PostJob import ASOServerJob
+from TaskWorker.Actions.DagmanKiller import DagmanKiller
+from CRABInterface.HTCondorDataWorkflow import HTCondorDataWorkflow
+from FakeCouchDB import FakeCouchServer, transferDocument
+
+
+class NullApmon(object):
+
+    def sendToML(self, params):
+        pass
+
+
+def measure(server, name, function, *args):
+    before = dict(server.counters)
+    start = time.time()
+    result = function(*args)
+    elapsed = time.time() - start
+    requests = dict((key, value - before.get(key, 0)) for key, value in server.counters.items() if value != before.get(key, 0))
+    requests.pop('connections', None)
+    print "%-20s %10.1f  %s" % (name, 1000 * elapsed, ", ".join("%s=%d" % item for item in sorted(requests.items())))
+    return result
+
+
+def inject(database, doc):
+    try:
+        database.document(doc['_id'])
+    except CMSCouch.CouchNotFoundError:
+        pass
+    return database.commitOne(doc)[0]
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--docs", type="int", default=100000)
+    parser.add_option("--tasks", type="int", default=100)
+    parser.add_option("--delay", type="float", default=0, help="seconds the server takes to answer")
+    opts, args = parser.parse_args()
+
+    logger = logging.getLogger('aso_couch_benchmark')
+    logger.addHandler(logging.NullHandler())
+    tmpdir = tempfile.mkdtemp(prefix="aso_couch_benchmark.")
+    cwd = os.getcwd()
+    server = FakeCouchServer(opts.delay)
+    try:
+        os.chdir(tmpdir)
+        perTask = opts.docs // opts.tasks
+        workflows = ['160101_%06d:bench_crab_aso%d' % (task, task) for task in range(opts.tasks)]
+        start = time.time()
+        for workflow in workflows:
+            server.addDocuments([transferDocument(workflow, jobid, state=['new', 'acquired', 'done'][jobid % 3]) for jobid in range(1, perTask + 1)])
+        print "%d documents in %d tasks loaded in %.1f s" % (perTask * opts.tasks, opts.tasks, time.time() - start)
+        server.start()
+        workflow = workflows[0]
+        database = CMSCouch.CouchServer(dburl=server.url).connectDatabase('asynctransfer', create=False)
+
+        print "%-20s %10s  %s" % ("path", "ms", "requests")
+        measure(server, "inject", inject, database, transferDocument(workflow, perTask + 1))
+
+        job = ASOServerJob(logger, None, None, None, None, 1, [], workflow, 0, False, {},
+                           {'CRAB_ASOURL': server.url}, 0, 0, False, True, True)
+        job.aso_start_timestamp = 0
+        job.docs_in_transfer = [{'doc_id': transferDocument(workflow, 1)['_id'], 'start_time': None}]
+        measure(server, "status (view)", job.get_transfers_statuses)
+        measure(server, "status (fallback)", job.get_transfers_statuses_fallback)
+
+        dataWorkflow = HTCondorDataWorkflow.__new__(HTCondorDataWorkflow)
+        dataWorkflow.logger = logger
+        dataWorkflow.serverKey = dataWorkflow.serverCert = None
+        measure(server, "publication", dataWorkflow.publicationStatus, workflow, server.url)
+
+        killer = DagmanKiller.__new__(DagmanKiller)
+        killer.logger = logger
+        killer.workflow = workflow
+        killer.proxy = None
+        killer.task = {'tm_asourl': server.url, 'kill_all': True, 'kill_ids': []}
+        measure(server, "kill", killer.killTransfers, NullApmon())
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Benchmark of the job wrapper output file checksumming.
+
+Generates a set of files of increasing size (100 MB up to 2 GB by default)
+and checksums them with:
+ - the current path: WMCore.Algorithms.BasicAlgos.calculateChecksums called
+   once per file plus an os.stat for the size (if WMCore is not in the
+   PYTHONPATH the same serial algorithm with 4 KB reads is used instead);
+ - ServerUtilities.calculateChecksums, concurrent and with large buffers.
+Wall time and CPU time (including the cksum child processes) are reported
+for both, and the results are checked to be identical.
+
+Usage: python checksum_benchmark.py [--dir DIR] [--sizes 100,500,1000,2000] [--workers 4]
+"""
+
+import os
+import sys
+import time
+import zlib
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src/python'))
+from ServerUtilities import calculateChecksums
+
+try:
+    from WMCore.Algorithms.BasicAlgos import calculateChecksums as wmcoreChecksums
+except ImportError:
+    wmcoreChecksums = None
+
+
+def serialChecksums(filename):
+    """
+    Same algorithm as WMCore calculateChecksums: 4 KB reads, one file at a time.
+    """
+    adler32Checksum = 1
+    cksumProcess = subprocess.Popen("cksum", stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    with open(filename, 'rb') as fd:
+        for chunk in iter((lambda: fd.read(4096)), ''):
+            adler32Checksum = zlib.adler32(chunk, adler32Checksum)
+            cksumProcess.stdin.write(chunk)
+    cksumProcess.stdin.close()
+    cksumProcess.wait()
+    cksumStdout = cksumProcess.stdout.read().split()
+    cksumProcess.stdout.close()
+    return ("%08x" % (adler32Checksum & 0xffffffff), cksumStdout[0])
+
+
+def generateFiles(directory, sizesMB):
+    filenames = []
+    block = os.urandom(1024*1024)
+    for i, sizeMB in enumerate(sizesMB):
+        filename = os.path.join(directory, "output_%d_%dMB.root" % (i, sizeMB))
+        with open(filename, 'wb') as fd:
+            for dummyCounter in range(sizeMB):
+                fd.write(block)
+        filenames.append(filename)
+    return filenames
+
+
+def measure(func):
+    startTimes = os.times()
+    startWall = time.time()
+    result = func()
+    wall = time.time() - startWall
+    endTimes = os.times()
+    cpu = sum(endTimes[:4]) - sum(startTimes[:4])
+    return result, wall, cpu
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--dir", dest="directory", default=None, help="Where to create the test files")
+    parser.add_option("--sizes", dest="sizes", default="100,500,1000,2000", help="Comma separated file sizes in MB")
+    parser.add_option("--workers", dest="workers", default=4, type="int", help="Concurrent checksum threads")
+    parser.add_option("--buffer", dest="buffer", default=4, type="int", help="Read buffer size in MB")
+    opts, dummyArgs = parser.parse_args()
+
+    directory = tempfile.mkdtemp(dir=opts.directory)
+    try:
+        sizesMB = [int(size) for size in opts.sizes.split(",")]
+        print "Generating %d files (%s MB) in %s" % (len(sizesMB), opts.sizes, directory)
+        filenames = generateFiles(directory, sizesMB)
+
+        currentFunc = wmcoreChecksums or serialChecksums
+        def current():
+            results = {}
+            for filename in filenames:
+                adler32, cksum = currentFunc(filename)
+                results[filename] = (adler32, cksum, os.stat(filename).st_size)
+            return results
+        def concurrent():
+            return calculateChecksums(filenames, maxWorkers=opts.workers, bufferSize=opts.buffer*1024*1024)
+
+        print "Current path: %s" % ("WMCore calculateChecksums" if wmcoreChecksums else "serial 4 KB reads (WMCore not found)")
+        old, oldWall, oldCpu = measure(current)
+        new, newWall, newCpu = measure(concurrent)
+
+        totalMB = sum(sizesMB)
+        print "%-12s %10s %10s %10s" % ("", "wall [s]", "cpu [s]", "MB/s")
+        print "%-12s %10.2f %10.2f %10.1f" % ("current", oldWall, oldCpu, totalMB / oldWall)
+        print "%-12s %10.2f %10.2f %10.1f" % ("concurrent", newWall, newCpu, totalMB / newWall)
+        if old != new:
+            print "ERROR: checksums differ!"
+            for filename in filenames:
+                print "  %s: %s vs %s" % (filename, old[filename], new[filename])
+            return 1
+        print "Checksums are identical."
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
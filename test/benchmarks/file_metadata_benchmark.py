@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Benchmark of the selection of the files of some types and jobs of a task
+(getoutput, getlog and report of the REST) on a local SQLite database seeded
+with a task of --jobs jobs, each with an EDM, a TFILE, a LOG and a POOLIN file,
+with the statements of Databases/FileMetaDataDB/Oracle:
+ - before: all the files of the types are read and filtered on the job ids in the REST;
+ - after: the job ids and the limit are in the statement (FileMetaData.getFromTaskAndType),
+   served by the (tm_taskname, fmd_type, panda_job_id) index.
+Reports the latency and the rows read from the database for each request.
+
+Usage: python file_metadata_benchmark.py [--jobs 20000] [--tasks 20] [--runlumi 2000]
+           [--repeat 5] [--dbdir /tmp]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+from optparse import OptionParser
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, os.path.join(BASE_DIR, 'src/python'))
+from Databases.FileMetaDataDB.Oracle.FileMetaData.FileMetaData import FileMetaData, GetFromTaskAndType
+
+TYPES = ['EDM', 'TFILE', 'LOG', 'POOLIN']
+
+
+class SQLiteFileMetaData(FileMetaData):
+    LimitRows_sql = "SELECT * FROM (%s) LIMIT :limit"
+
+
+def seed(conn, opts):
+    conn.execute("CREATE TABLE filemetadata(tm_taskname VARCHAR(255) NOT NULL, panda_job_id INTEGER NOT NULL, "
+                 "fmd_outdataset, fmd_acq_era, fmd_sw_ver, fmd_in_events, fmd_global_tag, fmd_publish_name, "
+                 "fmd_location, fmd_tmp_location, fmd_runlumi, fmd_adler32, fmd_cksum, fmd_md5, fmd_lfn VARCHAR(500) NOT NULL, "
+                 "fmd_size, fmd_type VARCHAR(50) NOT NULL, fmd_parent, fmd_creation_time, fmd_filestate, "
+                 "fmd_direct_stageout, fmd_tmplfn, PRIMARY KEY(tm_taskname, fmd_lfn))")
+    runlumi = 'x' * opts.runlumi
+    def rows():
+        for task in range(opts.tasks):
+            taskname = '160101_%06d:user_crab_%d' % (task, task)
+            for jobid in range(1, opts.jobs + 1):
+                for num, filetype in enumerate(TYPES):
+                    lfn = '/store/user/test/%s/%d/%d.root' % (filetype, task, jobid)
+                    yield (taskname, jobid, 'dataset', 'era', 'CMSSW_7_4_0', 100, 'tag', 'name', 'T2_XX_A', 'T2_XX_B',
+                           runlumi, 'adler', 1, 'md5', lfn, 1000, filetype, '[]', jobid * len(TYPES) + num, 'state', 'F', lfn)
+    conn.executemany("INSERT INTO filemetadata VALUES (%s)" % ', '.join(['?'] * 22), rows())
+    conn.execute("CREATE INDEX filemetadata_type_job_idx ON filemetadata(tm_taskname, fmd_type, panda_job_id)")
+    conn.commit()
+    return '160101_%06d:user_crab_%d' % (opts.tasks / 2, opts.tasks / 2)
+
+
+def before(conn, taskname, filetypes, jobids, limit):
+    sql = FileMetaData.GetFromTaskAndType_sql + " AND fmd_type IN (%s) ORDER BY fmd_creation_time DESC" % \
+          ', '.join(["'%s'" % filetype for filetype in filetypes])
+    read = 0
+    rows = []
+    for row in conn.execute(sql, {'taskname': taskname}):
+        read += 1
+        if row[GetFromTaskAndType.PANDAID] in jobids:
+            rows.append(row)
+    return (rows[:limit] if limit is not None else rows), read
+
+
+def after(conn, taskname, filetypes, jobids, limit):
+    sql, binds = SQLiteFileMetaData.getFromTaskAndType(taskname, filetypes, jobids, limit)
+    rows = conn.execute(sql, binds).fetchall()
+    return rows, len(rows)
+
+
+def measure(conn, opts, name, method, taskname, filetypes, jobids, limit=None):
+    timings = []
+    for dummy in range(opts.repeat):
+        start = time.time()
+        rows, read = method(conn, taskname, filetypes, jobids, limit)
+        timings.append(time.time() - start)
+    print "%-22s %-7s %10.2f %8d %8d" % (name, method.__name__, 1000 * sorted(timings)[len(timings) / 2], read, len(rows))
+    return rows
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--jobs", type="int", default=20000, help="jobs of each task")
+    parser.add_option("--tasks", type="int", default=20)
+    parser.add_option("--runlumi", type="int", default=2000, help="bytes of the runs and lumis of a file")
+    parser.add_option("--repeat", type="int", default=5)
+    parser.add_option("--dbdir", default=None, help="directory of the database file")
+    opts, args = parser.parse_args()
+
+    rand = random.Random(1)
+    requests = [('getoutput 10 jobs', ['EDM', 'TFILE'], rand.sample(range(1, opts.jobs + 1), 10), None),
+                ('getlog 1 job', ['LOG'], [opts.jobs / 2], None),
+                ('getoutput 500 jobs', ['EDM', 'TFILE'], range(1, opts.jobs + 1, opts.jobs / 500), 100),
+                ('report 1000 jobs', ['EDM', 'TFILE', 'POOLIN'], range(1, 1001), None)]
+    workdir = tempfile.mkdtemp(prefix='file_metadata_benchmark.', dir=opts.dbdir)
+    try:
+        conn = sqlite3.connect(os.path.join(workdir, 'files.db'))
+        start = time.time()
+        taskname = seed(conn, opts)
+        print "Seeded %d files in %.1f s" % (opts.tasks * opts.jobs * len(TYPES), time.time() - start)
+        print "%-22s %-7s %10s %8s %8s" % ("request", "query", "ms", "read", "rows")
+        for name, filetypes, jobids, limit in requests:
+            expected = measure(conn, opts, name, before, taskname, filetypes, set(jobids), limit)
+            rows = measure(conn, opts, name, after, taskname, filetypes, jobids, limit)
+            assert sorted(rows) == sorted(expected), "different files for %s" % name
+        conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
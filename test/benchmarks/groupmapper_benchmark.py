@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Benchmark of the CMSGroupMapper lookups from short lived processes, like the
+PreJob run for every job.
+
+Creates a synthetic SITECONF tree (500 sites by default, each with a
+GlideinConfig/local-users.txt listing --users-per-site users out of --users)
+and runs --processes fresh Python processes, each one importing
+CMSGroupMapper and looking up one user:
+ - scan: the in-memory cache only, as before the index file (every process
+   reads all the local-users.txt files);
+ - index: the shared index file (the first process builds it, the others
+   read it).
+Reports the wall time per process and per lookup (the process time minus
+the time of a process which only imports the module), and checks that
+both return the same groups.
+
+Usage: python groupmapper_benchmark.py [--sites 500] [--users 5000] [--users-per-site 200] [--processes 50]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src/python')
+
+CHILD = """
+import sys
+sys.path.insert(0, %(src)r)
+import CMSGroupMapper
+CMSGroupMapper.base_dir = %(siteconf)r
+CMSGroupMapper.index_file = %(index)r
+if %(scan)r:
+    CMSGroupMapper.g_expire_time = 1 # skip the index, use the in-memory cache
+if %(user)r:
+    print CMSGroupMapper.map_user_to_groups(%(user)r)
+"""
+
+
+def makeSiteconf(siteconf, sites, users, usersPerSite):
+    for i in range(sites):
+        site_dir = os.path.join(siteconf, 'T2_XX_Site%03d' % i, 'GlideinConfig')
+        os.makedirs(site_dir)
+        fd = open(os.path.join(site_dir, 'local-users.txt'), 'w')
+        for user in random.sample(xrange(users), usersPerSite):
+            fd.write("user%05d\n" % user)
+        fd.close()
+
+
+def runProcesses(siteconf, index, scan, users):
+    """
+    Run one fresh process per user; return the total wall time and the groups found.
+    """
+    results = []
+    start = time.time()
+    for user in users:
+        code = CHILD % {'src': SRC_DIR, 'siteconf': siteconf, 'index': index, 'scan': scan, 'user': user}
+        proc = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE)
+        results.append(proc.communicate()[0].strip())
+    return time.time() - start, results
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--sites", type="int", default=500)
+    parser.add_option("--users", type="int", default=5000)
+    parser.add_option("--users-per-site", dest="usersPerSite", type="int", default=200)
+    parser.add_option("--processes", type="int", default=50)
+    opts, args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="groupmapper_benchmark.")
+    try:
+        siteconf = os.path.join(tmpdir, 'SITECONF')
+        index = os.path.join(tmpdir, 'index')
+        makeSiteconf(siteconf, opts.sites, opts.users, opts.usersPerSite)
+        users = ["user%05d" % random.randrange(opts.users) for i in range(opts.processes)]
+        print "%d sites, %d users, %d users per site, %d processes" % \
+              (opts.sites, opts.users, opts.usersPerSite, opts.processes)
+
+        baseline, _ = runProcesses(siteconf, index, False, [''] * opts.processes)
+        baseline /= opts.processes
+        print "%-6s %10.1f ms/process" % ("import", 1000 * baseline)
+        groups = {}
+        for name, scan in [('scan', True), ('index', False)]:
+            wall, groups[name] = runProcesses(siteconf, index, scan, users)
+            print "%-6s %10.1f ms/process %10.2f ms/lookup" % \
+                  (name, 1000 * wall / opts.processes, 1000 * (wall / opts.processes - baseline))
+        if groups['scan'] != groups['index']:
+            print "ERROR: the index and the scan returned different groups"
+            sys.exit(1)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
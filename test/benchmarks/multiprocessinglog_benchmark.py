@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Stress benchmark of the MultiProcessingLog handler used by the TaskWorker.
+
+Starts --producers processes which log --records DEBUG records each, as fast
+as they can, through:
+ - legacy: the previous handler (unbounded queue, one write per record);
+ - block, drop-debug, count: the current handler with each overflow policy.
+Reports the records per second (until all the records are in the file), the
+records written and dropped, and the peak RSS of the writing process and of
+the producers. Each configuration runs in a fresh process.
+
+Usage: python multiprocessinglog_benchmark.py [--producers 8] [--records 20000] [--queue-size 10000]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import resource
+import tempfile
+import traceback
+import threading
+import multiprocessing
+from optparse import OptionParser
+from logging.handlers import TimedRotatingFileHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src/python'))
+from MultiProcessingLog import MultiProcessingLog
+
+
+class LegacyMultiProcessingLog(logging.Handler):
+    """The handler before the batching and the bounded queue."""
+
+    def __init__(self, filename, when='h', interval=1, backupCount=0, encoding=None, delay=False, utc=False):
+        logging.Handler.__init__(self)
+        self._handler = TimedRotatingFileHandler(filename, when, interval, backupCount, encoding, delay, utc)
+        self.queue = multiprocessing.Queue(-1)
+        self.written = 0
+        t = threading.Thread(target=self.receive)
+        t.daemon = True
+        t.start()
+
+    def setFormatter(self, fmt):
+        logging.Handler.setFormatter(self, fmt)
+        self._handler.setFormatter(fmt)
+
+    def receive(self):
+        while True:
+            try:
+                record = self.queue.get()
+                self._handler.emit(record)
+                self.written += 1
+            except EOFError:
+                break
+            except:
+                traceback.print_exc(file=sys.stderr)
+
+    def emit(self, record):
+        if record.args:
+            record.msg = record.msg % record.args
+            record.args = None
+        self.queue.put_nowait(record)
+
+    def get_stats(self):
+        return {'written': self.written, 'dropped': 0}
+
+
+def produce(logger, records):
+    for i in range(records):
+        logger.debug("record %d from process %d with some padding to look like a real message", i, os.getpid())
+
+
+def run(policy, opts, filename):
+    """Run one configuration; called in a fresh process, writes the results on stdout."""
+    if policy == 'legacy':
+        handler = LegacyMultiProcessingLog(filename)
+    else:
+        handler = MultiProcessingLog(filename, queueSize=opts.queueSize, overflow=policy)
+    handler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s:%(module)s:%(message)s"))
+    logger = logging.getLogger()
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+
+    start = time.time()
+    producers = [multiprocessing.Process(target=produce, args=(logger, opts.records)) for i in range(opts.producers)]
+    for producer in producers:
+        producer.start()
+    for producer in producers:
+        producer.join()
+    expected = opts.producers * opts.records
+    while True:
+        stats = handler.get_stats()
+        if stats['written'] + stats['dropped'] >= expected:
+            break
+        time.sleep(0.01)
+    elapsed = time.time() - start
+    print "%-10s %12.0f %10d %10d %12.1f %12.1f" % (policy, stats['written'] / elapsed, stats['written'], stats['dropped'],
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0)
+    sys.stdout.flush()
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--producers", type="int", default=8)
+    parser.add_option("--records", type="int", default=20000, help="records per producer")
+    parser.add_option("--queue-size", dest="queueSize", type="int", default=10000)
+    opts, args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="multiprocessinglog_benchmark.")
+    try:
+        print "%d producers, %d records each, queue size %d" % (opts.producers, opts.records, opts.queueSize)
+        print "%-10s %12s %10s %10s %12s %12s" % ("policy", "records/s", "written", "dropped", "writer MB", "producer MB")
+        for policy in ['legacy'] + MultiProcessingLog.OVERFLOW_POLICIES:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    run(policy, opts, os.path.join(tmpdir, policy + '.log'))
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
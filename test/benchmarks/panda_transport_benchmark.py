@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Benchmark of the PandaServerInterface transports against a local fake PanDA
+server (test/python/PandaServerInterface_t/FakePanDAServer.py):
+ - curl: one curl process and one temporary file per call;
+ - httplib: in process, reusing the connection.
+Calls getFullJobStatus --calls times with each transport, optionally over
+HTTPS with a self-signed certificate (needs the openssl command), and
+reports the calls per second and the mean and maximum latency.
+
+Usage: python panda_transport_benchmark.py [--calls 200] [--https] [--delay 0]
+"""
+
+import os
+import sys
+import ssl
+import time
+import shutil
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, os.path.join(BASE_DIR, 'src/python'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'test/python/PandaServerInterface_t'))
+import PandaServerInterface as pserver
+from FakePanDAServer import FakePanDAServer
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--calls", type="int", default=200)
+    parser.add_option("--https", action="store_true", default=False)
+    parser.add_option("--delay", type="float", default=0, help="seconds the server takes to answer")
+    opts, args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="panda_transport_benchmark.")
+    server = FakePanDAServer(opts.delay)
+    try:
+        proxy = os.path.join(tmpdir, 'proxy.pem')
+        url = server.url
+        if opts.https:
+            subprocess.check_call(['openssl', 'req', '-x509', '-nodes', '-newkey', 'rsa:2048', '-days', '1',
+                                   '-subj', '/CN=127.0.0.1', '-keyout', proxy, '-out', proxy],
+                                  stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+            server.socket = ssl.wrap_socket(server.socket, certfile=proxy, server_side=True)
+            url = url.replace('http://', 'https://')
+        else:
+            open(proxy, 'w').close()
+            proxy = ''
+        server.start()
+        print "%d getFullJobStatus calls over %s" % (opts.calls, 'HTTPS' if opts.https else 'HTTP')
+        print "%-8s %10s %12s %12s %12s" % ("transport", "calls/s", "mean ms", "max ms", "connections")
+        for transport in ['curl', 'httplib']:
+            pserver.transport = transport
+            pserver.resetTransportStats()
+            connections = server.counters.get('connections', 0)
+            start = time.time()
+            for i in range(opts.calls):
+                status, output = pserver.getFullJobStatus(url, [i], proxy)
+                if status != 0 or output[0]['PandaID'] != i:
+                    print "ERROR: call %d with %s returned %s %s" % (i, transport, status, output)
+                    sys.exit(1)
+            elapsed = time.time() - start
+            stats = pserver.getTransportStats()['apis']['getFullJobStatus']
+            print "%-8s %10.1f %12.2f %12.2f %12d" % (transport, opts.calls / elapsed, 1000 * stats['time'] / stats['requests'],
+                1000 * stats['maxTime'], server.counters['connections'] - connections)
+    finally:
+        server.stop()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Benchmark of the ProcInfo sampling backends used by ApMon in the job wrapper.
+
+Starts a synthetic process tree (a root process with --children children,
+each with --grandchildren children of its own, some of them burning CPU),
+monitors the root of the tree and samples it with:
+ - the 'ps' backend: ps, netstat, ifconfig, du and df subprocesses;
+ - the 'proc' backend: /proc and os.statvfs, without subprocesses.
+Reports for each backend the samples per second and the CPU time used per
+sample (including the subprocesses), and prints the job parameters of the
+last sample side by side.
+
+Usage: python procinfo_benchmark.py [--children 20] [--grandchildren 5] [--samples 20]
+"""
+
+import os
+import sys
+import time
+import signal
+import shutil
+import tempfile
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src/python'))
+import Logger
+from ProcInfo import ProcInfo
+
+JOB_PARAMS = ['run_time', 'cpu_time', 'cpu_usage', 'mem_usage', 'rss', 'virtualmem', 'open_files',
+              'workdir_size', 'disk_total', 'disk_used', 'disk_free', 'disk_usage']
+SYSTEM_PARAMS = ['processes', 'processes_R', 'processes_S', 'sockets_tcp', 'sockets_udp', 'sockets_unix',
+                 'sockets_tcp_LISTEN', 'sockets_tcp_ESTABLISHED']
+
+
+def spawnTree(children, grandchildren):
+    """
+    Fork the synthetic process tree and return the pid of its root.
+    One child in four burns CPU, the others sleep.
+    """
+    root = os.fork()
+    if root:
+        return root
+    os.setpgid(0, 0)
+    for i in range(children):
+        if os.fork() == 0:
+            for j in range(grandchildren):
+                if os.fork() == 0:
+                    while True:
+                        time.sleep(1)
+            busy = (i % 4 == 0)
+            while True:
+                if busy:
+                    sum(xrange(100000))
+                else:
+                    time.sleep(1)
+    while True:
+        time.sleep(1)
+
+
+def sample(backend, pid, workDir, samples):
+    """
+    Take the given number of samples with one backend; return the wall time,
+    the CPU time (this process and its subprocesses) and the ProcInfo instance.
+    """
+    procInfo = ProcInfo(Logger.Logger(Logger.ERROR), backend)
+    procInfo.addJobToMonitor(pid, workDir)
+    startWall = time.time()
+    startCpu = os.times()
+    for i in range(samples):
+        procInfo.LAST_UPDATE_TIME = 0 # update() refuses to run twice in the same second
+        procInfo.update()
+    endCpu = os.times()
+    wall = time.time() - startWall
+    cpu = sum(endCpu[:4]) - sum(startCpu[:4])
+    return wall, cpu, procInfo
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--children", type="int", default=20)
+    parser.add_option("--grandchildren", type="int", default=5)
+    parser.add_option("--samples", type="int", default=20)
+    parser.add_option("--files", type="int", default=2000, help="files in the synthetic work directory")
+    opts, args = parser.parse_args()
+
+    workDir = tempfile.mkdtemp(prefix="procinfo_benchmark.")
+    for i in range(opts.files):
+        fd = open(os.path.join(workDir, "file%d" % i), "w")
+        fd.write("x" * 4096)
+        fd.close()
+    root = spawnTree(opts.children, opts.grandchildren)
+    try:
+        time.sleep(2) # let the tree start
+        print "Process tree of %d processes, %d files in the work directory, %d samples" % \
+              (1 + opts.children * (1 + opts.grandchildren), opts.files, opts.samples)
+        results = {}
+        for backend in ['ps', 'proc']:
+            wall, cpu, procInfo = sample(backend, root, workDir, opts.samples)
+            results[backend] = procInfo
+            print "%-5s backend: %8.1f samples/s, %8.2f ms CPU/sample" % \
+                  (backend, opts.samples / wall, 1000.0 * cpu / opts.samples)
+        print
+        print "%-26s %15s %15s" % ("parameter", "ps", "proc")
+        for params, getter in [(JOB_PARAMS, lambda p: p.JOBS.get(root, {}).get('DATA', {})),
+                               (SYSTEM_PARAMS, lambda p: p.DATA)]:
+            for param in params:
+                print "%-26s %15s %15s" % (param, getter(results['ps']).get(param), getter(results['proc']).get(param))
+    finally:
+        os.killpg(root, signal.SIGKILL)
+        os.waitpid(root, 0)
+        shutil.rmtree(workDir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Benchmark of the schedd-facing paths against the fake htcondor bindings
+(test/python/Fakes/condor/htcondor.py), with a queue of --jobs jobs spread
+over --tasks tasks:
+ - submit: DagmanSubmitter.duplicateCheck and submitDirect of a new task;
+ - status: HTCondorDataWorkflow.getRootTasks of one task;
+ - kill: DagmanKiller.killJobs of --kill jobs of one task, then killAll.
+Reports the wall time and the calls done to the schedd and the collector
+by each path; --latency adds a delay to every call.
+
+Usage: python schedd_benchmark.py [--jobs 10000] [--tasks 10] [--kill 100] [--latency 0]
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+from optparse import OptionParser
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, os.path.join(BASE_DIR, 'src/python'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'test/python/Fakes/condor'))
+import htcondor
+import HTCondorLocator
+from TaskWorker.Actions.DagmanKiller import DagmanKiller
+from TaskWorker.Actions.DagmanSubmitter import DagmanSubmitter
+from CRABInterface.HTCondorDataWorkflow import HTCondorDataWorkflow
+
+SCHEDD = 'crab3@vocms0100.example.org'
+
+
+def measure(pool, name, function, *args):
+    before = dict(pool.calls)
+    start = time.time()
+    result = function(*args)
+    elapsed = time.time() - start
+    calls = dict((key, value - before.get(key, 0)) for key, value in pool.calls.items() if value != before.get(key, 0))
+    print "%-20s %10.1f  %s" % (name, 1000 * elapsed, ", ".join("%s=%d" % item for item in sorted(calls.items())))
+    return result
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--jobs", type="int", default=10000)
+    parser.add_option("--tasks", type="int", default=10)
+    parser.add_option("--kill", type="int", default=100)
+    parser.add_option("--latency", type="float", default=0, help="seconds each schedd or collector call takes")
+    opts, args = parser.parse_args()
+
+    logger = logging.getLogger('schedd_benchmark')
+    logger.addHandler(logging.NullHandler())
+    tmpdir = tempfile.mkdtemp(prefix="schedd_benchmark.")
+    pool = htcondor.FakePool(opts.latency)
+    pool.addSchedd(SCHEDD)
+    workflows = ['160101_%06d:bench_crab_condor%d' % (task, task) for task in range(opts.tasks)]
+    start = time.time()
+    for workflow in workflows:
+        pool.addJobs(SCHEDD, [{'TaskType': 'ROOT', 'CRAB_ReqName': workflow, 'JobStatus': 2, 'CRAB_Attempt': 0}])
+        pool.addJobs(SCHEDD, [{'TaskType': 'Job', 'CRAB_ReqName': workflow, 'CRAB_Id': jobid, 'CRAB_Retry': 0, 'JobStatus': 2} \
+                              for jobid in range(1, opts.jobs // opts.tasks + 1)])
+    print "%d jobs in %d tasks queued in %.1f s" % (opts.jobs, opts.tasks, time.time() - start)
+    pool.start()
+    try:
+        print "%-20s %10s  %s" % ("path", "ms", "calls")
+        submitter = DagmanSubmitter.__new__(DagmanSubmitter)
+        submitter.logger = logger
+        submitter.backendurls = {}
+        task = {'tm_taskname': '160101_999999:bench_crab_new', 'tm_collector': None, 'tm_schedd': SCHEDD}
+        measure(pool, "submit (duplicate)", submitter.duplicateCheck, task)
+        schedd, dummyAddress = HTCondorLocator.HTCondorLocator({}).getScheddObjNew(SCHEDD)
+        info = {'scratch': tmpdir, 'inputFilesString': '', 'outputFilesString': '', 'additional_environment_options': '',
+                'remote_condor_setup': '', 'user_proxy': '/dev/null', 'userhn': '"bench"',
+                'workflow': '"%s"' % task['tm_taskname']}
+        measure(pool, "submit (direct)", submitter.submitDirect, schedd, 'dag_bootstrap_startup.sh', '', info)
+
+        dataWorkflow = HTCondorDataWorkflow.__new__(HTCondorDataWorkflow)
+        dataWorkflow.logger = logger
+        measure(pool, "status (root)", dataWorkflow.getRootTasks, workflows[0], schedd)
+
+        killer = DagmanKiller.__new__(DagmanKiller)
+        killer.logger = logger
+        killer.workflow = workflows[0]
+        killer.proxy = '/dev/null'
+        killer.schedd = schedd
+        measure(pool, "kill (jobs)", killer.killJobs, range(1, opts.kill + 1))
+        measure(pool, "kill (all)", killer.killAll)
+    finally:
+        pool.stop()
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Startup benchmark of the scripts run on the schedd for every DAG node:
+PreJob, PostJob and RetryJob, and the TaskManagerBootstrap that dispatches
+them (dag_bootstrap.sh runs "python -m TaskWorker.TaskManagerBootstrap").
+
+Each module is imported --repeat times, each time in a fresh interpreter as
+on the schedd. Reports the median wall time of the whole process, the median
+time of the import itself, the peak RSS, and which of the heavy dependencies
+(HTCondor bindings, CouchDB, Dashboard/ApMon, REST client, ...) the import
+loaded. The environment must allow importing the modules (WMCore, classad,
+...), as on the schedd.
+
+Usage: python schedd_scripts_startup_benchmark.py [--repeat 10] [--module TaskWorker.Actions.PreJob]
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+from optparse import OptionParser
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+
+MODULES = ['TaskWorker.Actions.PreJob', 'TaskWorker.Actions.PostJob', 'TaskWorker.Actions.RetryJob',
+           'TaskWorker.TaskManagerBootstrap']
+HEAVY = ['classad', 'htcondor', 'WMCore.Database.CMSCouch', 'DashboardAPI', 'apmon', 'RESTInteractions',
+         'pycurl', 'WMCore.Services.Requests', 'CMSGroupMapper', 'unittest', 'WMCore.Configuration',
+         'TaskWorker.Actions.Splitter', 'TaskWorker.Actions.DagmanCreator', 'TaskWorker.Actions.DBSDataDiscovery']
+
+## Run in the child: import the module and print the import time, the peak RSS and the heavy modules loaded.
+CHILD = """
+import sys, time, json, resource
+start = time.time()
+__import__(sys.argv[1])
+elapsed = time.time() - start
+heavy = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+print json.dumps({'import': elapsed, 'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'heavy': heavy})
+"""
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def measure(module, repeat, env):
+    runs = []
+    for dummy in range(repeat):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-c', CHILD, module, json.dumps(HEAVY)], env=env)
+        result = json.loads(output.strip().splitlines()[-1])
+        result['wall'] = time.time() - start
+        runs.append(result)
+    return {'wall': median([run['wall'] for run in runs]), 'import': median([run['import'] for run in runs]),
+            'maxrss': max(run['maxrss'] for run in runs), 'heavy': runs[-1]['heavy']}
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--repeat", type="int", default=10)
+    parser.add_option("--module", action="append", dest="modules", help="module to import (default: all the scripts)")
+    opts, args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(BASE_DIR, 'src/python')] + \
+                                        [path for path in env.get('PYTHONPATH', '').split(os.pathsep) if path])
+    baseline = measure('os', opts.repeat, env)
+    print "%-35s %9s %9s %9s  %s" % ("module", "wall ms", "import ms", "RSS MB", "heavy modules loaded")
+    print "%-35s %9.1f %9.1f %9.1f" % ("(interpreter only)", 1000 * baseline['wall'], 1000 * baseline['import'], baseline['maxrss'] / 1024.)
+    for module in opts.modules or MODULES:
+        result = measure(module, opts.repeat, env)
+        print "%-35s %9.1f %9.1f %9.1f  %s" % (module, 1000 * result['wall'], 1000 * result['import'],
+                                                result['maxrss'] / 1024., ", ".join(result['heavy']))
+
+
+if __name__ == '__main__':
+    main()
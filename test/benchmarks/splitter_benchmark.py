@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Benchmark of the rejection by the Splitter of the tasks with too many jobs.
+
+For each dataset size the synthetic dataset of test/python/Fakes/FakeServices.py
+goes through DBSDataDiscovery, then the Splitter runs in a fresh process:
+ - with maxJobsPerTask = --max-jobs, where the splitting stops as soon as the
+   limit is crossed;
+ - with no limit, i.e. the full splitting, which is what the task costed
+   before being rejected when the jobs were counted only at the end.
+Reports the wall time of the splitting, the number of jobs (or the rejection),
+the peak RSS after the data discovery and after the splitting.
+
+Usage: python splitter_benchmark.py [--files 10000,50000] [--lumis-per-file 10]
+           [--lumis-per-job 1] [--max-jobs 10000]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import resource
+import tempfile
+from optparse import OptionParser
+
+## Sets up sys.path for the TaskWorker and the fakes.
+from taskworker_pipeline_benchmark import makeConfig, makeTask
+
+from TaskWorker.Actions.Splitter import Splitter
+from TaskWorker.WorkerExceptions import TaskWorkerException
+from TaskWorker.Actions.DBSDataDiscovery import DBSDataDiscovery
+
+from FakeServices import FakeServices, SyntheticDataset
+
+
+def peakRSS():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def runSplitting(files, opts):
+    workdir = tempfile.mkdtemp(prefix='splitter_benchmark.')
+    cwd = os.getcwd()
+    try:
+        os.makedirs(os.path.join(workdir, 'logs', 'tasks'))
+        open(os.path.join(workdir, 'proxy'), 'w').close()
+        os.chdir(workdir)
+        blocks = max(1, files / opts.filesPerBlock)
+        dataset = SyntheticDataset(blocks=blocks, filesPerBlock=files / blocks, lumisPerFile=opts.lumisPerFile)
+        services = FakeServices(dataset)
+        services.patch()
+        config = makeConfig(workdir)
+        config.TaskWorker.maxJobsPerTask = opts.maxJobs
+        task = makeTask(workdir, dataset, opts)
+        server = services.server()
+        resturi = '/crabserver/dev/workflowdb'
+        fileset = DBSDataDiscovery(config=config, server=server, resturi=resturi, procnum=0).execute(task=task).result
+        result = {'files': files, 'limit': opts.maxJobs, 'rss_before_mb': peakRSS()}
+        splitter = Splitter(config=config, server=server, resturi=resturi, procnum=0)
+        start = time.time()
+        try:
+            jobgroups = splitter.execute(fileset, task=task).result
+            result['jobs'] = sum([len(jobgroup.getJobs()) for jobgroup in jobgroups])
+        except TaskWorkerException as twe:
+            result['rejected'] = str(twe)
+        result['wall'] = time.time() - start
+        result['peak_rss_mb'] = peakRSS()
+        return result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def runInChild(files, opts):
+    """Run the splitting in a forked process, so that the peak RSS is the one of this run only."""
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        try:
+            result = runSplitting(files, opts)
+        except Exception as ex:
+            logging.exception("The splitting failed for %d files" % files)
+            result = {'files': files, 'error': str(ex)}
+        os.write(wfd, json.dumps(result))
+        os._exit(0)
+    os.close(wfd)
+    output = ''
+    data = os.read(rfd, 65536)
+    while data:
+        output += data
+        data = os.read(rfd, 65536)
+    os.close(rfd)
+    os.waitpid(pid, 0)
+    return json.loads(output)
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--files", default="10000,50000", help="comma separated dataset sizes, in files")
+    parser.add_option("--files-per-block", dest="filesPerBlock", type="int", default=500)
+    parser.add_option("--lumis-per-file", dest="lumisPerFile", type="int", default=10)
+    parser.add_option("--lumis-per-job", dest="unitsPerJob", type="int", default=1)
+    parser.add_option("--max-jobs", dest="maxJobs", type="int", default=10000)
+    opts, args = parser.parse_args()
+    opts.splitAlgo = 'LumiBased'
+
+    print "%8s %9s %9s %9s %12s %12s" % ("files", "limit", "jobs", "wall s", "RSS before", "RSS peak MB")
+    for files in [int(files) for files in opts.files.split(',')]:
+        for limit in [opts.maxJobs, sys.maxint]:
+            opts.maxJobs, maxJobs = limit, opts.maxJobs
+            result = runInChild(files, opts)
+            opts.maxJobs = maxJobs
+            if 'error' in result:
+                print "%8d failed: %s" % (files, result['error'])
+                continue
+            print "%8d %9s %9s %9.2f %12.1f %12.1f" % (files, limit if limit != sys.maxint else 'none',
+                                                       result.get('jobs', 'rejected'), result['wall'],
+                                                       result['rss_before_mb'], result['peak_rss_mb'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Benchmark of the deserialisation of the task rows sent by the REST to the
+TaskWorker (RESTWorkerWorkflow.Task.deserialize), on fixture rows with large
+site whitelists, lumi masks and arguments of the kill requests:
+ - with the structured columns in their Python representation (the rows written
+   before the JSON encoding) and in JSON;
+ - with all the columns and with the projections of the new tasks and of the kills.
+Reports the deserialised rows per second and the size of the JSON document of
+the rows, as sent to the TaskWorker.
+
+Usage: python task_rows_benchmark.py [--rows 2000] [--sites 200] [--lumis 5000]
+           [--kill-ids 5000]
+"""
+
+import os
+import sys
+import json
+import time
+from optparse import OptionParser
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..')
+sys.path.insert(0, os.path.join(BASE_DIR, 'src/python'))
+from CRABInterface.Utils import dbSerializer
+from CRABInterface.RESTWorkerWorkflow import Task, TASK_COLUMNS, PROJECTIONS
+
+
+class FakeLOB(object):
+    """A CLOB column, as returned by cx_Oracle."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def read(self):
+        return self.value
+
+
+def makeRows(opts, serializer, columns):
+    sites = ['T2_XX_Site%03d' % num for num in range(opts.sites)]
+    splitArgs = {'halt_job_on_file_boundaries': False, 'splitOnRun': False, 'lumis_per_job': 10,
+                 'runs': [str(run) for run in range(opts.lumis / 100 + 1)],
+                 'lumis': [','.join('%d,%d' % (lumi, lumi + 5) for lumi in range(1, 1000, 10))
+                           for dummyRun in range(opts.lumis / 100 + 1)]}
+    arguments = {'killList': range(1, opts.killIds + 1), 'killAll': False, 'ASOURL': 'https://couch.example.org'}
+    values = {'tm_site_whitelist': serializer(sites), 'tm_site_blacklist': serializer(sites[:10]),
+              'tm_split_args': serializer(splitArgs), 'tm_outfiles': serializer([]),
+              'tm_tfile_outfiles': serializer(['histo.root']), 'tm_edm_outfiles': serializer(['output.root']),
+              'tm_user_infiles': serializer(['input.txt']), 'tm_scriptargs': serializer(['a=1', 'b=2']),
+              'tm_user_files': serializer([]), 'tm_extrajdl': serializer([]),
+              'panda_resubmitted_jobs': serializer([]), 'tm_arguments': serializer(arguments),
+              'tm_task_failure': 'failure message ' * 100}
+    clobs = ['tm_split_args', 'tm_outfiles', 'tm_tfile_outfiles', 'tm_edm_outfiles', 'tm_scriptargs',
+             'tm_user_files', 'panda_resubmitted_jobs', 'tm_arguments', 'tm_task_failure']
+    rows = []
+    for num in range(opts.rows):
+        row = []
+        for column in columns:
+            value = values.get(column, '%s_%d' % (column, num))
+            row.append(FakeLOB(value) if column in clobs else value)
+        rows.append(row)
+    return rows
+
+
+def measure(opts, encoding, serializer, projection):
+    columns = PROJECTIONS[projection] if projection != 'all' else TASK_COLUMNS
+    rows = makeRows(opts, serializer, columns)
+    start = time.time()
+    tasks = []
+    for row in rows:
+        task = Task()
+        task.deserialize(row, columns)
+        tasks.append(dict(task))
+    elapsed = time.time() - start
+    size = len(json.dumps(tasks))
+    print "%-8s %-10s %12.0f %14.1f" % (encoding, projection, len(rows) / elapsed, size / 1024.0 / len(rows))
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--rows", type="int", default=2000)
+    parser.add_option("--sites", type="int", default=200, help="sites in the whitelist")
+    parser.add_option("--lumis", type="int", default=5000, help="lumi ranges in the lumi mask")
+    parser.add_option("--kill-ids", dest="killIds", type="int", default=5000, help="job ids of the kill request")
+    opts, args = parser.parse_args()
+
+    print "%-8s %-10s %12s %14s" % ("encoding", "columns", "rows/s", "KB per row")
+    for encoding, serializer in [('repr', str), ('json', dbSerializer)]:
+        for projection in ['all', 'new', 'kill']:
+            measure(opts, encoding, serializer, projection)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+Benchmark of the summary and search APIs of RESTTask (summary, allusers,
+taskbystatus, counttasksbystatus, lastfailures) on a local SQLite database
+seeded with --tasks task rows, with the schema of Databases/TaskDB/*/Create.py
+translated to SQLite:
+ - scan: the tasks table with only its primary key, as before;
+ - indexed: with the composite indexes on the user, status and start time;
+ - counts: also with the task_counts table maintained by a trigger, read by
+   summary and allusers instead of grouping the tasks table.
+Reports the latency of each API, the query plan chosen by SQLite, and the
+throughput of the changes of status of the tasks (the cost of the indexes and
+of the trigger for the TaskWorker and the REST).
+
+Usage: python task_summary_benchmark.py [--tasks 2000000] [--users 3000]
+           [--padding 100] [--repeat 5] [--updates 20000] [--dbdir /tmp]
+"""
+
+import os
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+from optparse import OptionParser
+
+STATUSES = [('SUBMITTED', 55), ('COMPLETED', 15), ('FAILED', 10), ('KILLED', 10), ('SUBMITFAILED', 4),
+            ('NEW', 2), ('HOLDING', 1), ('QUEUED', 1), ('RESUBMIT', 1), ('KILL', 1)]
+
+INDEXES = ["CREATE INDEX tasks_user_status_idx ON tasks(tm_username, tm_task_status, tm_taskname)",
+           "CREATE INDEX tasks_status_start_idx ON tasks(tm_task_status, tm_start_time)",
+           "CREATE INDEX tasks_start_status_idx ON tasks(tm_start_time, tm_task_status)"]
+
+COUNTS = ["CREATE TABLE task_counts(tm_username VARCHAR(255) NOT NULL, tm_task_status VARCHAR(255) NOT NULL, "
+          "tm_count INTEGER NOT NULL, PRIMARY KEY(tm_username, tm_task_status))",
+          "INSERT INTO task_counts SELECT tm_username, tm_task_status, count(*) FROM tasks GROUP BY tm_username, tm_task_status",
+          """CREATE TRIGGER task_counts_ins_trg AFTER INSERT ON tasks BEGIN
+             INSERT INTO task_counts VALUES (NEW.tm_username, NEW.tm_task_status, 1)
+                 ON CONFLICT(tm_username, tm_task_status) DO UPDATE SET tm_count = tm_count + 1; END""",
+          """CREATE TRIGGER task_counts_del_trg AFTER DELETE ON tasks BEGIN
+             UPDATE task_counts SET tm_count = tm_count - 1
+                 WHERE tm_username = OLD.tm_username AND tm_task_status = OLD.tm_task_status; END""",
+          """CREATE TRIGGER task_counts_upd_trg AFTER UPDATE OF tm_username, tm_task_status ON tasks
+             WHEN NEW.tm_username <> OLD.tm_username OR NEW.tm_task_status <> OLD.tm_task_status BEGIN
+             UPDATE task_counts SET tm_count = tm_count - 1
+                 WHERE tm_username = OLD.tm_username AND tm_task_status = OLD.tm_task_status;
+             INSERT INTO task_counts VALUES (NEW.tm_username, NEW.tm_task_status, 1)
+                 ON CONFLICT(tm_username, tm_task_status) DO UPDATE SET tm_count = tm_count + 1; END"""]
+
+## The statements of Databases.TaskDB.Oracle.Task, with the time in seconds since the epoch.
+SCAN_QUERIES = [('summary', "SELECT tm_username, tm_task_status, count(*) FROM tasks GROUP BY tm_username, tm_task_status ORDER BY tm_username"),
+                ('allusers', "SELECT DISTINCT(tm_username) FROM tasks"),
+                ('taskbystatus', "SELECT tm_task_status, tm_taskname FROM tasks WHERE tm_task_status = :taskstatus AND tm_username = :username_"),
+                ('counttasksbystatus', "SELECT tm_task_status, count(*) FROM tasks WHERE tm_start_time > :now - :minutes * 60 GROUP BY tm_task_status"),
+                ('lastfailures', "SELECT tm_username, tm_taskname, tm_task_failure FROM tasks WHERE tm_start_time > :now - :minutes * 60 "
+                                 "AND tm_task_status = 'FAILED' AND tm_task_failure IS NOT NULL ORDER BY tm_username")]
+COUNTS_QUERIES = dict(summary="SELECT tm_username, tm_task_status, tm_count FROM task_counts WHERE tm_count > 0 ORDER BY tm_username",
+                      allusers="SELECT DISTINCT(tm_username) FROM task_counts WHERE tm_count > 0")
+
+
+def seed(conn, opts):
+    rand = random.Random(1)
+    statuses = [status for status, weight in STATUSES for dummy in range(weight)]
+    conn.execute("CREATE TABLE tasks(tm_taskname VARCHAR(255) PRIMARY KEY, tm_username VARCHAR(255) NOT NULL, "
+                 "tm_task_status VARCHAR(255) NOT NULL, tm_start_time REAL, tm_task_failure TEXT, tm_split_args TEXT)")
+    now = time.time()
+    padding = 'x' * opts.padding
+    def rows():
+        for num in range(opts.tasks):
+            ## A few users submit most of the tasks.
+            user = 'user%04d' % int(opts.users * rand.random() ** 3)
+            status = rand.choice(statuses)
+            start = now - (opts.tasks - num) * (2 * 365 * 86400.0 / opts.tasks)
+            failure = 'failure of task %d' % num if status in ['FAILED', 'SUBMITFAILED'] else None
+            yield ('%d_%06d:%s_crab_%d' % (start, num % 1000000, user, num), user, status, start, failure, padding)
+    conn.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)", rows())
+    conn.commit()
+    return now
+
+
+def plan(conn, sql, binds):
+    return '; '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, binds))
+
+
+def measure(conn, opts, mode, now):
+    binds = {'taskstatus': 'SUBMITTED', 'username_': 'user0000', 'now': now, 'minutes': 60 * 24}
+    for name, sql in SCAN_QUERIES:
+        if mode == 'counts':
+            sql = COUNTS_QUERIES.get(name, sql)
+        timings = []
+        for dummy in range(opts.repeat):
+            start = time.time()
+            rows = conn.execute(sql, binds).fetchall()
+            timings.append(time.time() - start)
+        print "%-8s %-20s %10.2f %8d  %s" % (mode, name, 1000 * sorted(timings)[len(timings) / 2], len(rows), plan(conn, sql, binds))
+
+
+def measureUpdates(conn, opts, mode):
+    rand = random.Random(2)
+    names = [row[0] for row in conn.execute("SELECT tm_taskname FROM tasks ORDER BY random() LIMIT ?", (opts.updates,))]
+    start = time.time()
+    for name in names:
+        conn.execute("UPDATE tasks SET tm_task_status = ? WHERE tm_taskname = ?", (rand.choice(['QUEUED', 'SUBMITTED', 'KILLED']), name))
+    conn.commit()
+    print "%-8s %-20s %10.0f status changes/s" % (mode, 'update', len(names) / (time.time() - start))
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--tasks", type="int", default=2000000)
+    parser.add_option("--users", type="int", default=3000)
+    parser.add_option("--padding", type="int", default=100, help="bytes of the other columns of a task")
+    parser.add_option("--repeat", type="int", default=5)
+    parser.add_option("--updates", type="int", default=20000)
+    parser.add_option("--dbdir", default=None, help="directory of the database file")
+    opts, args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='task_summary_benchmark.', dir=opts.dbdir)
+    try:
+        conn = sqlite3.connect(os.path.join(workdir, 'tasks.db'))
+        start = time.time()
+        now = seed(conn, opts)
+        print "Seeded %d tasks in %.1f s" % (opts.tasks, time.time() - start)
+        print "%-8s %-20s %10s %8s  %s" % ("schema", "api", "ms", "rows", "plan")
+        measure(conn, opts, 'scan', now)
+        measureUpdates(conn, opts, 'scan')
+        for sql in INDEXES:
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+        measure(conn, opts, 'indexed', now)
+        measureUpdates(conn, opts, 'indexed')
+        for sql in COUNTS:
+            conn.execute(sql)
+        conn.commit()
+        measure(conn, opts, 'counts', now)
+        measureUpdates(conn, opts, 'counts')
+        ## The counts maintained by the trigger are the ones of the tasks table.
+        expected = conn.execute(SCAN_QUERIES[0][1]).fetchall()
+        counts = conn.execute(COUNTS_QUERIES['summary']).fetchall()
+        print "task_counts consistent with the tasks table:", sorted(expected) == sorted(counts)
+        conn.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
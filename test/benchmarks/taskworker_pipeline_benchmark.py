@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+"""
+Offline benchmark of the TaskWorker new task chain: DBSDataDiscovery ->
+Splitter -> DagmanCreator, run through TaskHandler.actionWork as
+handleNewTask does, without the proxy retrieval and the schedd submission.
+
+DBS, PhEDEx, SiteDB, the crabcache, the REST interface and the Dashboard
+are replaced by the fakes of test/python/Fakes/FakeServices.py, which answer
+from a synthetic dataset. WMCore is needed, as for the TaskWorker itself.
+
+For each dataset size (number of files, split in blocks of --files-per-block)
+the chain runs in a fresh process and the results are written as JSON:
+the wall time and the peak RSS after each stage, the number of jobs and the
+calls made to each external service.
+
+Usage: python taskworker_pipeline_benchmark.py [--files 1000,10000] [--files-per-block 100]
+           [--lumis-per-file 10] [--split-algo LumiBased] [--units-per-job 50] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import resource
+import tempfile
+import subprocess
+from optparse import OptionParser
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'src/python'))
+sys.path.insert(0, os.path.join(BASE_DIR, 'test/python/Fakes'))
+
+from WMCore.Configuration import Configuration
+
+from TaskWorker.Actions.Handler import TaskHandler
+from TaskWorker.Actions.Splitter import Splitter
+from TaskWorker.Actions.DagmanCreator import DagmanCreator
+from TaskWorker.Actions.DBSDataDiscovery import DBSDataDiscovery
+
+from FakeServices import FakeServices, SyntheticDataset
+
+SPLIT_PARAMS = {'FileBased': 'files_per_job', 'LumiBased': 'lumis_per_job', 'EventAwareLumiBased': 'events_per_job'}
+
+
+class TimedAction(object):
+    """Record the wall time and the peak RSS of the process after an action."""
+
+    def __init__(self, action, stages):
+        self.action = action
+        self.stages = stages
+
+    def __str__(self):
+        return str(self.action)
+
+    def execute(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return self.action.execute(*args, **kwargs)
+        finally:
+            self.stages.append({'stage': self.action.__class__.__name__,
+                                'wall': time.time() - start,
+                                'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0})
+
+
+def makeConfig(workdir):
+    config = Configuration()
+    config.section_('TaskWorker')
+    config.TaskWorker.name = 'benchmark'
+    config.TaskWorker.cmscert = os.path.join(workdir, 'proxy')
+    config.TaskWorker.cmskey = os.path.join(workdir, 'proxy')
+    config.TaskWorker.scratchDir = os.path.join(workdir, 'scratch')
+    config.TaskWorker.maxJobsPerTask = 1000000
+    config.section_('Services')
+    config.Services.DBSUrl = 'https://cmsweb.example.org/dbs/prod/global/DBSReader'
+    return config
+
+
+def makeTask(workdir, dataset, opts):
+    return {'tm_taskname': '160101_000000:benchmark_crab_synthetic',
+            'tm_username': 'benchmark',
+            'tm_user_dn': '/DC=org/DC=example/CN=Benchmark User',
+            'tm_user_vo': 'cms', 'tm_user_group': '', 'tm_user_role': '',
+            'tm_job_type': 'Analysis',
+            'tm_input_dataset': dataset.name,
+            'tm_dbs_url': '',
+            'tm_nonvalid_input_dataset': 'F',
+            'tm_use_parent': 0,
+            'tm_user_files': [],
+            'tm_split_algo': opts.splitAlgo,
+            'tm_split_args': {SPLIT_PARAMS[opts.splitAlgo]: opts.unitsPerJob,
+                              'halt_job_on_file_boundaries': False, 'splitOnRun': False},
+            'tm_totalunits': 0,
+            'tm_events_per_lumi': None,
+            'tm_job_sw': 'CMSSW_7_4_0', 'tm_job_arch': 'slc6_amd64_gcc491',
+            'tm_cache_url': 'https://cmsweb.example.org/crabcache',
+            'tm_user_sandbox': '0123456789abcdef.tar.gz',
+            'tm_publish_name': 'benchmark-0123456789abcdef', 'tm_publish_groupname': 'F',
+            'tm_publish_dbs_url': '', 'tm_publication': 'F',
+            'tm_asyncdest': 'T2_XX_Dest', 'tm_output_lfn': '/store/user/benchmark',
+            'tm_asourl': '', 'tm_transfer_outputs': 'T', 'tm_save_logs': 'F',
+            'tm_outfiles': [], 'tm_tfile_outfiles': [], 'tm_edm_outfiles': ['output.root'],
+            'tm_site_whitelist': [], 'tm_site_blacklist': [], 'tm_ignore_locality': 'F',
+            'tm_one_event_mode': 'F', 'tm_fail_limit': None, 'tm_extrajdl': '[]',
+            'tm_activity': '', 'tm_dry_run': 'F', 'tm_scriptexe': '', 'tm_scriptargs': [],
+            'tm_transformation': 'CMSRunAnalysis.sh', 'tm_generator': '',
+            'user_proxy': os.path.join(workdir, 'proxy'),
+           }
+
+
+def makeCheckout(workdir):
+    """
+    A CRAB3_CHECKOUT with the scripts of this repository and empty runtime
+    tarballs, where DagmanCreator looks for the files it copies.
+    """
+    checkout = os.path.join(workdir, 'checkout', 'CRABServer')
+    os.makedirs(checkout)
+    os.symlink(os.path.join(BASE_DIR, 'scripts'), os.path.join(checkout, 'scripts'))
+    for name in ['CMSRunAnalysis.tar.gz', 'TaskManagerRun.tar.gz']:
+        subprocess.check_call(['tar', 'czf', os.path.join(checkout, name), '-T', '/dev/null'])
+    return os.path.dirname(checkout)
+
+
+def runChain(files, opts):
+    """Run the chain on a dataset of the given number of files; return the results."""
+    workdir = tempfile.mkdtemp(prefix='taskworker_pipeline_benchmark.')
+    cwd = os.getcwd()
+    try:
+        os.environ['CRAB3_CHECKOUT'] = makeCheckout(workdir)
+        os.makedirs(os.path.join(workdir, 'scratch'))
+        os.makedirs(os.path.join(workdir, 'logs', 'tasks'))
+        open(os.path.join(workdir, 'proxy'), 'w').close()
+        os.chdir(workdir)
+
+        blocks = max(1, files / opts.filesPerBlock)
+        dataset = SyntheticDataset(blocks=blocks, filesPerBlock=files / blocks, lumisPerFile=opts.lumisPerFile,
+                                   eventsPerLumi=opts.eventsPerLumi)
+        services = FakeServices(dataset)
+        services.patch()
+        config = makeConfig(workdir)
+        task = makeTask(workdir, dataset, opts)
+        server = services.server()
+        resturi = '/crabserver/dev/workflowdb'
+
+        stages = []
+        handler = TaskHandler(task, 0)
+        handler.addWork(TimedAction(DBSDataDiscovery(config=config, server=server, resturi=resturi, procnum=0), stages))
+        handler.addWork(TimedAction(Splitter(config=config, server=server, resturi=resturi, procnum=0), stages))
+        handler.addWork(TimedAction(DagmanCreator(config=config, server=server, resturi=resturi, procnum=0), stages))
+        start = time.time()
+        result = handler.actionWork()
+        total = time.time() - start
+        info = result[1]
+        return {'files': blocks * (files / blocks), 'blocks': blocks,
+                'lumis': blocks * (files / blocks) * opts.lumisPerFile,
+                'jobs': info['jobcount'],
+                'wall': total,
+                'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                'stages': stages,
+                'external_calls': services.calls}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def runInChild(files, opts):
+    """Run the chain in a forked process, so that the peak RSS is the one of this run only."""
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        try:
+            result = runChain(files, opts)
+        except Exception as ex:
+            logging.exception("The chain failed for %d files" % files)
+            result = {'files': files, 'error': str(ex)}
+        os.write(wfd, json.dumps(result))
+        os._exit(0)
+    os.close(wfd)
+    output = ''
+    data = os.read(rfd, 65536)
+    while data:
+        output += data
+        data = os.read(rfd, 65536)
+    os.close(rfd)
+    os.waitpid(pid, 0)
+    return json.loads(output)
+
+
+def gitRevision():
+    try:
+        return subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, stdout=subprocess.PIPE).communicate()[0].strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = OptionParser(usage=__doc__)
+    parser.add_option("--files", default="1000,10000", help="comma separated dataset sizes, in files")
+    parser.add_option("--files-per-block", dest="filesPerBlock", type="int", default=100)
+    parser.add_option("--lumis-per-file", dest="lumisPerFile", type="int", default=10)
+    parser.add_option("--events-per-lumi", dest="eventsPerLumi", type="int", default=100)
+    parser.add_option("--split-algo", dest="splitAlgo", default="LumiBased", choices=SPLIT_PARAMS.keys())
+    parser.add_option("--units-per-job", dest="unitsPerJob", type="int", default=50)
+    parser.add_option("--output", help="write the results to this file instead of stdout")
+    opts, args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    results = {'revision': gitRevision(),
+               'time': int(time.time()),
+               'parameters': {'filesPerBlock': opts.filesPerBlock, 'lumisPerFile': opts.lumisPerFile,
+                              'eventsPerLumi': opts.eventsPerLumi, 'splitAlgo': opts.splitAlgo,
+                              'unitsPerJob': opts.unitsPerJob},
+               'runs': [runInChild(int(files), opts) for files in opts.files.split(',')]}
+    if opts.output:
+        with open(opts.output, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+    else:
+        print json.dumps(results, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Tests of the per-action timing and outcome records of the TaskHandler and of
+their aggregation by the master (TaskWorker.ActionMetrics).
+"""
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+from TaskWorker import ActionMetrics
+from TaskWorker.DataObjects.Result import Result
+from TaskWorker.Actions.Handler import TaskHandler
+from TaskWorker.WorkerExceptions import WorkerHandlerException, TaskWorkerException, StopHandler
+
+
+class FakeJobGroup(object):
+
+    def __init__(self, jobs):
+        self.jobs = range(jobs)
+
+    def getJobs(self):
+        return self.jobs
+
+
+class StubDiscovery(object):
+
+    def execute(self, *args, **kwargs):
+        return Result(task=kwargs['task'], result='fileset')
+
+
+class StubSplitter(object):
+
+    def execute(self, *args, **kwargs):
+        time.sleep(0.01)
+        return Result(task=kwargs['task'], result=[FakeJobGroup(300), FakeJobGroup(200)])
+
+
+class StubSubmitter(object):
+
+    def execute(self, *args, **kwargs):
+        return Result(task=kwargs['task'], result=-1)
+
+
+class StubFailure(object):
+
+    def execute(self, *args, **kwargs):
+        raise TaskWorkerException("The scheduler is not available")
+
+
+class StubStop(object):
+
+    def execute(self, *args, **kwargs):
+        raise StopHandler("Nothing to do")
+
+
+class TestActionMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        os.makedirs('logs/tasks')
+        ActionMetrics.popRecords()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def runChain(self, taskname, actions):
+        handler = TaskHandler({'tm_taskname': taskname, 'tm_username': 'bench'}, 1)
+        for action in actions:
+            handler.addWork(action)
+        return handler.actionWork()
+
+    def testChainRecords(self):
+        start = time.time()
+        self.runChain('task1', [StubDiscovery(), StubSplitter(), StubSubmitter()])
+        records = ActionMetrics.popRecords()
+        self.assertEqual([record['action'] for record in records], ['StubDiscovery', 'StubSplitter', 'StubSubmitter'])
+        self.assertEqual(set(record['outcome'] for record in records), set(['success']))
+        ## The size is known only after the splitting, but it is given to all the actions.
+        self.assertEqual(set(record['size'] for record in records), set([500]))
+        self.assertTrue(start <= records[0]['start'] <= records[0]['end'] <= records[1]['start'])
+        self.assertTrue(records[1]['end'] - records[1]['start'] >= 0.01)
+        self.assertEqual(ActionMetrics.popRecords(), [])
+
+    def testFailureAndStop(self):
+        self.assertRaises(WorkerHandlerException, self.runChain, 'task2', [StubDiscovery(), StubFailure(), StubSubmitter()])
+        records = ActionMetrics.popRecords()
+        self.assertEqual([(record['action'], record['outcome'], record['size']) for record in records],
+                         [('StubDiscovery', 'success', None), ('StubFailure', 'failure', None)])
+        self.runChain('task3', [StubStop(), StubSubmitter()])
+        records = ActionMetrics.popRecords()
+        self.assertEqual([(record['action'], record['outcome']) for record in records], [('StubStop', 'stop')])
+
+    def testAggregation(self):
+        ## The master aggregates the records of two slaves.
+        self.runChain('task1', [StubDiscovery(), StubSplitter(), StubSubmitter()])
+        slave1 = ActionMetrics.popRecords()
+        self.assertRaises(WorkerHandlerException, self.runChain, 'task2', [StubDiscovery(), StubFailure()])
+        slave2 = ActionMetrics.popRecords()
+        slave2.append({'action': 'StubSplitter', 'task': 'task4', 'start': 0, 'end': 45, 'outcome': 'success', 'size': 20000})
+        metrics = ActionMetrics.ActionMetrics(keepRecent=3)
+        metrics.add(slave1)
+        metrics.add(slave2)
+        self.assertEqual(metrics.actions['StubDiscovery']['count'], 2)
+        self.assertEqual(metrics.actions['StubDiscovery']['success'], 2)
+        self.assertEqual(metrics.actions['StubFailure']['failure'], 1)
+        splitter = metrics.actions['StubSplitter']
+        self.assertEqual(splitter['count'], 2)
+        self.assertEqual(splitter['max_time'], 45)
+        self.assertEqual(splitter['histogram']['<=1'], 1)
+        self.assertEqual(splitter['histogram']['<=60'], 1)
+        self.assertEqual(sum(splitter['histogram'].values()), 2)
+        self.assertEqual(sorted(splitter['by_size'].keys()), ['<=1000', '>10000'])
+        self.assertEqual(metrics.actions['StubFailure']['by_size'].keys(), ['unknown'])
+        self.assertEqual(len(metrics.recent), 3)
+
+        metrics.write('logs/actionmetrics.json')
+        with open('logs/actionmetrics.json') as fd:
+            summary = json.load(fd)
+        self.assertEqual(summary['actions']['StubSplitter']['count'], 2)
+        self.assertEqual(summary['recent'][-1]['task'], 'task4')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Tests of the ASO code paths of DagmanKiller and PostJob against the local
+CouchDB stand-in of test/python/Fakes.
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes'))
+
+import WMCore.Database.CMSCouch as CMSCouch
+
+from TaskWorker.Actions.PostJob import ASOServerJob
+from TaskWorker.Actions.DagmanKiller import DagmanKiller
+
+from FakeCouchDB import FakeCouchServer, transferDocument
+
+WORKFLOW = '160101_000000:bench_crab_aso'
+
+
+class FakeApmon(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def sendToML(self, params):
+        self.sent.append(params)
+
+
+class TestASOCouch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeCouchServer()
+        self.docs = [transferDocument(WORKFLOW, jobid, state='new' if jobid <= 40 else 'done') for jobid in range(1, 51)]
+        self.docs.append(transferDocument('160101_000000:other_task', 1))
+        self.server.addDocuments(self.docs)
+        self.server.start()
+        self.logger = logging.getLogger('test_aso_couch')
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+        self.server.stop()
+
+    def testKillTransfers(self):
+        killer = DagmanKiller.__new__(DagmanKiller)
+        killer.logger = self.logger
+        killer.workflow = WORKFLOW
+        killer.proxy = None
+        killer.task = {'tm_asourl': self.server.url, 'kill_all': True, 'kill_ids': []}
+        self.assertTrue(killer.killTransfers(FakeApmon()))
+        self.assertEqual(self.server.counters['view:forKill'], 1)
+        self.assertEqual(self.server.counters['update:updateJobs'], 40)
+        states = [doc['state'] for doc in self.server.documents().values() if doc['workflow'] == WORKFLOW]
+        self.assertEqual(states.count('killed'), 40)
+        self.assertEqual(states.count('done'), 10)
+        killed = self.server.documents()[self.docs[0]['_id']]
+        self.assertEqual(len(killed['retry_count']), 1)
+        self.assertEqual(killed['_rev'][:2], '2-')
+        ## Nothing is left to kill.
+        killer.killTransfers(FakeApmon())
+        self.assertEqual(self.server.counters['update:updateJobs'], 40)
+
+    def testTransfersStatuses(self):
+        job = ASOServerJob(self.logger, None, None, None, None, 1, [], WORKFLOW, 0, False, {}, \
+                           {'CRAB_ASOURL': self.server.url}, 0, 0, False, True, True)
+        job.aso_start_timestamp = 0
+        job.docs_in_transfer = [{'doc_id': doc['_id'], 'start_time': doc['start_time']} for doc in self.docs[38:42]]
+        self.assertEqual(job.get_transfers_statuses(), ['new', 'new', 'done', 'done'])
+        self.assertEqual(self.server.counters['view:JobsIdsStatesByWorkflow'], 1)
+        ## A recent answer of the view is reused.
+        self.assertEqual(job.get_transfers_statuses(), ['new', 'new', 'done', 'done'])
+        self.assertEqual(self.server.counters['view:JobsIdsStatesByWorkflow'], 1)
+        self.assertFalse('get_doc' in self.server.counters)
+
+    def testCommitAndConflict(self):
+        database = CMSCouch.CouchServer(dburl=self.server.url).connectDatabase('asynctransfer', create=False)
+        doc = database.document(self.docs[0]['_id'])
+        self.assertEqual(doc['state'], 'new')
+        doc['state'] = 'acquired'
+        self.assertFalse('error' in database.commitOne(doc)[0])
+        ## The revision of doc is not the current one anymore.
+        self.assertEqual(database.commitOne(doc)[0]['error'], 'conflict')
+        self.assertRaises(CMSCouch.CouchNotFoundError, database.document, 'missing')
+        self.assertEqual(self.server.counters['_bulk_docs'], 2)
+        self.assertEqual(self.server.counters['get_doc'], 2)
+
+    def testPublicationState(self):
+        database = CMSCouch.CouchServer(dburl=self.server.url).connectDatabase('asynctransfer', create=False)
+        query = {'reduce': True, 'key': WORKFLOW, 'stale': 'update_after'}
+        rows = database.loadView('AsyncTransfer', 'PublicationStateByWorkflow', query)['rows']
+        self.assertEqual(rows[0]['value'], {'not_published': 50})
+        rows = database.loadView('AsyncTransfer', 'PublicationStateByWorkflow', {'reduce': True, 'group': True})['rows']
+        self.assertEqual(len(rows), 2)
+
+    def testDelay(self):
+        self.server.delay = 0.05
+        database = CMSCouch.CouchServer(dburl=self.server.url).connectDatabase('asynctransfer', create=False)
+        rows = database.loadView('AsyncTransfer', 'JobsIdsStatesByWorkflow', {'reduce': False, 'key': WORKFLOW, 'limit': 5})['rows']
+        self.assertEqual(len(rows), 5)
+        start = time.time()
+        database.document(rows[0]['id'])
+        self.assertTrue(time.time() - start >= 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Tests of the schedd-facing code of HTCondorLocator and DagmanKiller against
+the fake htcondor bindings of test/python/Fakes/condor.
+"""
+
+import os
+import sys
+import time
+import logging
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes', 'condor'))
+
+import classad
+import htcondor
+
+import HTCondorLocator
+from TaskWorker.Actions.DagmanKiller import DagmanKiller
+
+SCHEDD = 'crab3@vocms0100.example.org'
+WORKFLOW = '160101_000000:bench_crab_condor'
+
+
+class TestFakeCondor(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = htcondor.FakePool()
+        self.pool.addSchedd(SCHEDD)
+        self.pool.addSchedd('crab3@vocms0200.example.org', DetectedMemory=1024)
+        self.pool.addJobs(SCHEDD, [{'TaskType': 'ROOT', 'CRAB_ReqName': WORKFLOW, 'JobStatus': 2}])
+        self.pool.addJobs(SCHEDD, [{'TaskType': 'Job', 'CRAB_ReqName': WORKFLOW, 'CRAB_Id': i, 'CRAB_Retry': 0, 'JobStatus': 2} \
+                                   for i in range(1, 101)])
+        self.pool.addJobs(SCHEDD, [{'TaskType': 'Job', 'CRAB_ReqName': 'other', 'CRAB_Id': 1, 'JobStatus': 2}])
+        self.pool.start()
+        HTCondorLocator.CollectorCache.clear()
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def getKiller(self):
+        schedd, dummyAddress = HTCondorLocator.HTCondorLocator({}).getScheddObjNew(SCHEDD)
+        killer = DagmanKiller.__new__(DagmanKiller)
+        killer.logger = logging.getLogger('test_fake_condor')
+        killer.workflow = WORKFLOW
+        killer.proxy = '/dev/null'
+        killer.schedd = schedd
+        return killer
+
+    def statuses(self, constraint):
+        return [ad['JobStatus'] for ad in self.pool.schedds[SCHEDD].select(constraint)]
+
+    def testLocator(self):
+        schedd, address = HTCondorLocator.HTCondorLocator({}).getScheddObjNew(SCHEDD)
+        self.assertEqual(schedd.name, SCHEDD)
+        self.assertEqual(address, '<127.0.0.1:9618?sock=crab3_vocms0100.example.org>')
+        self.assertRaises(Exception, HTCondorLocator.HTCondorLocator({}).getScheddObjNew, 'crab3@missing')
+        locator = HTCondorLocator.HTCondorLocator({'htcondorSchedds': [SCHEDD]})
+        self.assertEqual(locator.getSchedd(), '%s:localhost' % SCHEDD)
+        self.assertEqual(self.pool.calls['Collector.query'], 3)
+
+    def testKillJobs(self):
+        ## The jobs are removed from a forked process.
+        self.getKiller().killJobs(range(1, 11))
+        self.assertEqual(self.statuses('JobStatus == 3'), [3] * 10)
+        self.assertEqual(len(self.statuses('CRAB_ReqName =?= "other" && JobStatus == 2')), 1)
+        self.getKiller().killAll()
+        self.assertEqual(self.statuses('TaskType =?= "ROOT"'), [5])
+        self.assertEqual(self.pool.calls['Schedd.act'], 2)
+        pids = set(entry[1] for entry in self.pool.trace if entry[3] == 'act')
+        self.assertFalse(os.getpid() in pids)
+
+    def testQueryEditSubmit(self):
+        schedd = htcondor.Schedd(self.pool.scheddAds[SCHEDD])
+        ads = list(schedd.xquery('CRAB_ReqName =?= %s && CRAB_Id <= 5' % classad.quote(WORKFLOW), ['CRAB_Id', 'Missing']))
+        self.assertEqual(sorted(ad['CRAB_Id'] for ad in ads), [1, 2, 3, 4, 5])
+        self.assertEqual(list(ads[0].keys()), ['CRAB_Id'])
+        self.assertEqual(len(schedd.query('true', [], limit=7)), 7)
+        self.assertEqual(schedd.edit('TaskType =?= "ROOT"', 'HoldKillSig', '"SIGKILL"'), 1)
+        self.assertEqual(list(schedd.xquery('TaskType =?= "ROOT"', ['HoldKillSig']))[0]['HoldKillSig'], 'SIGKILL')
+        ad = classad.ClassAd()
+        ad['TaskType'] = 'ROOT'
+        ad['CRAB_ReqName'] = 'new_task'
+        results = []
+        cluster = schedd.submit(ad, 1, True, results)
+        self.assertEqual(results[0]['ClusterId'], cluster)
+        self.assertEqual(results[0]['JobStatus'], 5)
+        schedd.spool(results)
+        self.assertEqual(self.statuses('CRAB_ReqName =?= "new_task"'), [1])
+        self.assertTrue(schedd.refreshGSIProxy(cluster, 0, '/dev/null', -1) > 0)
+
+    def testLatency(self):
+        self.pool.latencies['xquery'] = 0.1
+        schedd = htcondor.Schedd(self.pool.scheddAds[SCHEDD])
+        start = time.time()
+        list(schedd.xquery('true', ['ClusterId']))
+        self.assertTrue(time.time() - start >= 0.1)
+        self.assertEqual(self.pool.trace[-1][5], 102)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Tests of the deletion of the old files of the filemetadata in batches
+(FMDCleaner.deleteInBatches and DataFileMetadata.delete with a limit) against a
+local SQLite database, with files injected between the batches as the PostJobs do,
+and of FMDCleaner with a REST rejecting the limit.
+
+SQLite deletes with a LIMIT as MySQL does, so the MySQL statement is run with
+only its dates replaced; the Oracle statement is checked against the statement
+deleting all the old files.
+"""
+
+import os
+import sys
+import urlparse
+import shutil
+import logging
+import tempfile
+import unittest
+from httplib import HTTPException
+
+from WMCore.Configuration import ConfigSection
+
+from CRABInterface.DataFileMetadata import DataFileMetadata
+from Databases.FileMetaDataDB.Oracle.FileMetaData.FileMetaData import FileMetaData
+from Databases.FileMetaDataDB.MySQL.FileMetaData.FileMetaData import FileMetaData as MySQLFileMetaData
+from TaskWorker.Actions.Recurring import FMDCleaner as FMDCleanerModule
+from TaskWorker.Actions.Recurring.FMDCleaner import FMDCleaner, deleteInBatches
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes'))
+from FakeDatabase import SQLiteApi
+
+OLD_FILES = 1050
+NEW_FILES = 300
+ONE_MONTH = 24 * 30
+
+
+MYSQL_HOURS = "UTC_TIMESTAMP() - INTERVAL %(hours)s HOUR"
+SQLITE_HOURS = "datetime('now', '-' || :hours || ' hours')"
+
+
+class SQLiteFileMetaData(FileMetaData):
+    """The MySQL statement, with the dates and the binds of SQLite."""
+    DeleteFilesByTimeBatch_sql = MySQLFileMetaData.DeleteFilesByTimeBatch_sql.replace(MYSQL_HOURS, SQLITE_HOURS) \
+                                                                             .replace('%(limit)s', ':limit')
+    DeleteFilesByTime_sql = "DELETE FROM filemetadata WHERE fmd_creation_time < " + SQLITE_HOURS
+
+
+class TestFMDCleaner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.api = SQLiteApi(os.path.join(self.tmpdir, 'files.db'))
+        self.conn = self.api.connection()
+        self.conn.execute("CREATE TABLE filemetadata(tm_taskname VARCHAR(255) NOT NULL, fmd_lfn VARCHAR(500) NOT NULL, "
+                          "fmd_creation_time TIMESTAMP NOT NULL, PRIMARY KEY(tm_taskname, fmd_lfn))")
+        self.conn.execute("CREATE INDEX filemetadata_creation_time_idx ON filemetadata(fmd_creation_time)")
+        self.injected = 0
+        for num in range(OLD_FILES):
+            self.inject('old', "datetime('now', '-%d hours')" % (ONE_MONTH + 1 + num % 100))
+        for num in range(NEW_FILES):
+            self.inject('new', "datetime('now', '-%d hours')" % (num % ONE_MONTH))
+        self.conn.commit()
+        config = ConfigSection('crabserver')
+        config.backend = 'oracle'
+        self.fmd = DataFileMetadata(config)
+        self.fmd.api = self.api
+        self.fmd.FileMetaData = SQLiteFileMetaData()
+
+    def tearDown(self):
+        self.api.close()
+        shutil.rmtree(self.tmpdir)
+
+    def inject(self, kind, creation):
+        self.injected += 1
+        self.conn.execute("INSERT INTO filemetadata VALUES ('160101_000000:test_crab_%s', '/store/%d.root', %s)"
+                          % (kind, self.injected, creation))
+
+    def count(self, kind):
+        return self.conn.execute("SELECT count(*) FROM filemetadata WHERE tm_taskname = ?",
+                                 ('160101_000000:test_crab_%s' % kind,)).fetchone()[0]
+
+    def deleteBatch(self, limit):
+        """A call of the REST, while the PostJobs inject new files."""
+        deleted = self.fmd.delete(None, str(ONE_MONTH), limit).next()['modified']
+        self.inject('new', "datetime('now')")
+        self.conn.commit()
+        return deleted
+
+    def testBatches(self):
+        deleted, done = deleteInBatches(self.deleteBatch, 100)
+        self.assertTrue(done)
+        self.assertEqual(deleted, OLD_FILES)
+        ## Each statement deletes at most a batch, the last one less.
+        self.assertEqual(self.fmd.api.modified, [100] * 10 + [50])
+        self.assertEqual(self.count('old'), 0)
+        self.assertEqual(self.count('new'), NEW_FILES + 11)
+        ## The rows of a batch are found with the index, not with a scan of the table.
+        plan = ' '.join(row[-1] for row in self.conn.execute("EXPLAIN QUERY PLAN " + SQLiteFileMetaData.DeleteFilesByTimeBatch_sql,
+                                                             {'hours': ONE_MONTH, 'limit': 100}))
+        self.assertTrue('filemetadata_creation_time_idx' in plan, plan)
+
+    def testResume(self):
+        deleted, done = deleteInBatches(self.deleteBatch, 200, maxBatches=3)
+        self.assertFalse(done)
+        self.assertEqual(deleted, 600)
+        self.assertEqual(self.count('old'), OLD_FILES - 600)
+        ## The next run continues with the files left.
+        deleted, done = deleteInBatches(self.deleteBatch, 200, maxBatches=3)
+        self.assertTrue(done)
+        self.assertEqual(deleted, OLD_FILES - 600)
+        self.assertEqual(self.count('old'), 0)
+        self.assertEqual(self.count('new'), NEW_FILES + 6)
+        deleted, done = deleteInBatches(self.deleteBatch, 200)
+        self.assertEqual((deleted, done), (0, True))
+
+    def testStatements(self):
+        ## The batch statements delete the same files as the single statement, at most :limit of them.
+        self.assertEqual(FileMetaData.DeleteFilesByTimeBatch_sql, FileMetaData.DeleteFilesByTime_sql + " AND ROWNUM <= :limit")
+        self.assertEqual(MySQLFileMetaData.DeleteFilesByTimeBatch_sql,
+                         "DELETE FROM filemetadata WHERE fmd_creation_time < %s LIMIT %%(limit)s" % MYSQL_HOURS)
+        self.assertEqual(SQLiteFileMetaData.DeleteFilesByTimeBatch_sql, SQLiteFileMetaData.DeleteFilesByTime_sql + " LIMIT :limit")
+
+    def testWholeDeletion(self):
+        ## Without a limit, the files are deleted by the single statement, as before.
+        self.assertEqual(self.fmd.delete(None, str(ONE_MONTH), None), None)
+        self.assertEqual(self.fmd.api.modified, [OLD_FILES])
+        self.assertEqual(self.count('new'), NEW_FILES)
+
+
+class FakeServer(object):
+    """The DELETE of the filemetadata REST API, rejecting the limit as the REST before the deletion in batches."""
+
+    acceptLimit = True
+    rejectAfter = None
+
+    def __init__(self, host, cert, key, retry=0):
+        self.calls = []
+        FakeServer.instance = self
+
+    def delete(self, uri, data):
+        params = dict(urlparse.parse_qsl(data))
+        self.calls.append(params)
+        if 'limit' in params and (not self.acceptLimit or (self.rejectAfter is not None and len(self.calls) > self.rejectAfter)):
+            ex = HTTPException()
+            ex.status, ex.headers = 400, {'X-Error-Detail': 'Invalid input parameter'}
+            raise ex
+        return {'result': [{'modified': int(params['limit'])}] if 'limit' in params else []}, 200, 'OK'
+
+
+class TestFMDCleanerREST(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger('TaskWorker.Actions.Recurring.BaseRecurringAction').addHandler(logging.NullHandler())
+        self.config = ConfigSection('config')
+        self.config.section_('TaskWorker')
+        self.config.TaskWorker.cmscert = self.config.TaskWorker.cmskey = '/tmp/proxy'
+        self.config.TaskWorker.fmdCleanerBatchSize = 100
+        self.config.TaskWorker.fmdCleanerPause = 0
+        self.config.TaskWorker.fmdCleanerMaxBatches = 3
+        self.httpRequests = FMDCleanerModule.HTTPRequests
+        FMDCleanerModule.HTTPRequests = FakeServer
+        FakeServer.acceptLimit, FakeServer.rejectAfter = True, None
+
+    def tearDown(self):
+        FMDCleanerModule.HTTPRequests = self.httpRequests
+
+    def testOldREST(self):
+        ## With a REST rejecting the limit the run is skipped, the old files are never deleted all at once.
+        FakeServer.acceptLimit = False
+        FMDCleaner()._execute('localhost', '/crabserver/dev/filemetadata', self.config, None)
+        self.assertEqual(FakeServer.instance.calls, [{'hours': str(ONE_MONTH), 'limit': '100'}])
+
+    def testRejectedBatch(self):
+        ## A batch rejected after the first one is left for the next run.
+        FakeServer.rejectAfter = 2
+        FMDCleaner()._execute('localhost', '/crabserver/dev/filemetadata', self.config, None)
+        self.assertEqual(FakeServer.instance.calls, [{'hours': str(ONE_MONTH), 'limit': '100'}] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
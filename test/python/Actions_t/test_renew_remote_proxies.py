@@ -0,0 +1,142 @@
+"""
+Tests of the proxy renewal of the tasks in the schedds (RenewRemoteProxies)
+against the fake htcondor bindings of test/python/Fakes/condor, with a fake
+MyProxy retrieval.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+import unittest
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes', 'condor'))
+
+import htcondor
+
+import TaskWorker.Actions.Recurring.RenewRemoteProxies as RenewRemoteProxies
+
+PROXY_LIFETIME = 144 * 3600
+
+
+class FakeSection(object):
+    pass
+
+
+class FakeProxyRenewer(RenewRemoteProxies.CRAB3ProxyRenewer):
+    """Renewer of the tasks of the fake pool, with a fake MyProxy server."""
+
+    def __init__(self, config, schedds, logger):
+        RenewRemoteProxies.CRAB3ProxyRenewer.__init__(self, config, 'localhost', '/crabserver/dev/info', logger)
+        self.schedds = schedds
+        self.myproxy_calls = []
+        self.myproxy_failures = set()
+        self.counter_lock = threading.Lock()
+
+    def get_proxy(self, ad):
+        key = self.get_credential_key(ad)
+        with self.counter_lock:
+            self.myproxy_calls.append(key)
+        if key[0] in self.myproxy_failures:
+            raise Exception("Failed to retrieve proxy.")
+        return '/tmp/fake_proxy_%s' % abs(hash(key))
+
+
+class TestRenewRemoteProxies(unittest.TestCase):
+
+    numSchedds, numUsers, tasksPerUser = 4, 6, 3
+
+    def setUp(self):
+        self.config = FakeSection()
+        self.config.TaskWorker = FakeSection()
+        self.config.TaskWorker.renewProxiesScheddThreads = 5
+        self.config.TaskWorker.renewProxiesGroupThreads = 10
+        self.config.TaskWorker.renewProxiesProcesses = 3
+        self.logger = logging.getLogger("test_renew_remote_proxies")
+        self.pool = htcondor.FakePool(latency=0.001, proxyLifetime=PROXY_LIFETIME)
+        self.scheddNames = ['crab3@vocms%04d.example.org' % num for num in range(self.numSchedds)]
+        for num, name in enumerate(self.scheddNames):
+            self.pool.addSchedd(name)
+            tasks = []
+            for user in range(self.numUsers):
+                for task in range(self.tasksPerUser):
+                    tasks.append({'TaskType': 'ROOT', 'CRAB_ReqName': 'task_%d_%d_%d' % (num, user, task), 'JobStatus': 2,
+                                  'CRAB_UserDN': '/DC=ch/CN=user%d' % user, 'CRAB_UserVO': 'cms', 'x509userproxyexpiration': 0})
+            ## Tasks which do not need a renewal, or which are not renewed.
+            tasks.append({'TaskType': 'ROOT', 'CRAB_ReqName': 'task_%d_fresh' % num, 'JobStatus': 2, 'CRAB_UserDN': '/DC=ch/CN=user0',
+                          'x509userproxyexpiration': int(time.time()) + 2 * RenewRemoteProxies.MINPROXYLENGTH})
+            tasks.append({'TaskType': 'ROOT', 'CRAB_ReqName': 'task_%d_removed' % num, 'JobStatus': 4, 'CRAB_UserDN': '/DC=ch/CN=user0',
+                          'x509userproxyexpiration': 0})
+            tasks.append({'TaskType': 'Job', 'CRAB_ReqName': 'task_%d_0_0' % num, 'JobStatus': 2, 'CRAB_UserDN': '/DC=ch/CN=user0',
+                          'x509userproxyexpiration': 0})
+            self.pool.addJobs(name, tasks)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def expirations(self):
+        """The proxy expiration of each task ad in the pool."""
+        result = {}
+        for name in self.scheddNames:
+            for ad in self.pool.schedds[name].jobs.values():
+                if ad['TaskType'] == 'ROOT':
+                    result[ad['CRAB_ReqName']] = ad['x509userproxyexpiration']
+        return result
+
+    def renewals(self):
+        """The pids of the processes which called refreshGSIProxy and edit."""
+        return [(method, pid) for dummyStart, pid, dummyName, method, dummySeconds, dummySize in self.pool.trace \
+                if method in ['refreshGSIProxy', 'edit']]
+
+    def testRenewal(self):
+        before = time.time()
+        renewer = FakeProxyRenewer(self.config, self.scheddNames, self.logger)
+        renewer.execute()
+        expirations = self.expirations()
+        renewed = [task for task, expiration in expirations.items() if expiration >= before + PROXY_LIFETIME - 1]
+        self.assertEqual(sorted(renewed), sorted(['task_%d_%d_%d' % (num, user, task) for num in range(self.numSchedds) \
+                                                  for user in range(self.numUsers) for task in range(self.tasksPerUser)]))
+        self.assertEqual(expirations['task_0_removed'], 0)
+        self.assertTrue(expirations['task_0_fresh'] < before + PROXY_LIFETIME - 1)
+        ## One MyProxy retrieval per user, even if the user has tasks in all the schedds.
+        self.assertEqual(sorted(renewer.myproxy_calls), sorted(set(renewer.myproxy_calls)))
+        self.assertEqual(len(renewer.myproxy_calls), self.numUsers)
+        ## One authenticated subprocess per credential group and schedd, not one per task,
+        ## and the schedds are never called with a proxy from this process.
+        renewals = self.renewals()
+        self.assertEqual(len(renewals), 2 * self.numSchedds * self.numUsers * self.tasksPerUser)
+        pids = set(pid for dummyMethod, pid in renewals)
+        self.assertEqual(len(pids), self.numSchedds * self.numUsers)
+        self.assertFalse(os.getpid() in pids)
+        ## The processes of the pool are gone.
+        self.assertEqual(multiprocessing.active_children(), [])
+        self.assertEqual(renewer.process_pool, None)
+
+    def testFailures(self):
+        renewer = FakeProxyRenewer(self.config, self.scheddNames + ['crab3@unknown.example.org'], self.logger)
+        renewer.myproxy_failures.add('/DC=ch/CN=user1')
+        ## A task the schedd can not find fails, the other tasks of its group are renewed.
+        schedd = self.pool.schedds[self.scheddNames[0]]
+        for key, ad in schedd.jobs.items():
+            if ad['CRAB_ReqName'] == 'task_0_2_0':
+                del schedd.jobs[key]
+                schedd.jobs[key[0] + 1000, 0] = ad
+        renewer.execute()
+        expirations = self.expirations()
+        self.assertEqual(expirations['task_0_2_0'], 0)
+        self.assertTrue(expirations['task_0_2_1'] > 0)
+        self.assertTrue(expirations['task_1_2_0'] > 0)
+        for num in range(self.numSchedds):
+            for task in range(self.tasksPerUser):
+                self.assertEqual(expirations['task_%d_1_%d' % (num, task)], 0)
+                self.assertTrue(expirations['task_%d_3_%d' % (num, task)] > 0)
+        ## The failed MyProxy retrieval is not retried for the other schedds.
+        self.assertEqual(renewer.myproxy_calls.count(('/DC=ch/CN=user1', 'cms', '', '')), 1)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests of the limit on the number of jobs per task applied by the Splitter, with
+the input files of a synthetic dataset discovered through the fake DBS of
+test/python/Fakes/FakeServices.py.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes'))
+
+from WMCore.Configuration import Configuration
+
+from TaskWorker.Actions import Splitter as SplitterModule
+from TaskWorker.Actions.Splitter import Splitter, JobCounter
+from TaskWorker.WorkerExceptions import TaskWorkerException
+from TaskWorker.Actions.DBSDataDiscovery import DBSDataDiscovery
+
+from FakeServices import FakeServices, SyntheticDataset
+
+
+class TestSplitterLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        open('proxy', 'w').close()
+        self.dataset = SyntheticDataset(blocks=2, filesPerBlock=10, lumisPerFile=5)
+        self.services = FakeServices(self.dataset)
+        self.services.patch()
+        self.config = Configuration()
+        self.config.section_('TaskWorker')
+        self.config.TaskWorker.cmscert = os.path.join(self.tmpdir, 'proxy')
+        self.config.TaskWorker.cmskey = os.path.join(self.tmpdir, 'proxy')
+        self.config.section_('Services')
+        self.config.Services.DBSUrl = 'https://cmsweb.example.org/dbs/prod/global/DBSReader'
+        self.task = {'tm_taskname': '160101_000000:test_crab_limit', 'tm_username': 'test',
+                     'tm_user_dn': '/DC=org/DC=example/CN=Test User', 'tm_user_vo': 'cms',
+                     'tm_user_group': '', 'tm_user_role': '', 'tm_job_type': 'Analysis', 'tm_input_dataset': self.dataset.name,
+                     'tm_dbs_url': '', 'tm_nonvalid_input_dataset': 'F', 'tm_use_parent': 0,
+                     'tm_split_algo': 'LumiBased', 'tm_totalunits': 0,
+                     'tm_split_args': {'lumis_per_job': 1, 'halt_job_on_file_boundaries': False, 'splitOnRun': False},
+                     'tm_site_whitelist': [], 'tm_site_blacklist': [], 'tm_ignore_locality': 'F',
+                     'tm_events_per_lumi': None, 'user_proxy': os.path.join(self.tmpdir, 'proxy')}
+
+    def tearDown(self):
+        self.services.unpatch()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def split(self, maxJobs):
+        self.config.TaskWorker.maxJobsPerTask = maxJobs
+        server = self.services.server()
+        resturi = '/crabserver/dev/workflowdb'
+        fileset = DBSDataDiscovery(config=self.config, server=server, resturi=resturi, procnum=0).execute(task=self.task).result
+        return Splitter(config=self.config, server=server, resturi=resturi, procnum=0).execute(fileset, task=self.task).result
+
+    def testUnderLimit(self):
+        jobgroups = self.split(100)
+        self.assertEqual(sum([len(jobgroup.getJobs()) for jobgroup in jobgroups]), 100)
+
+    def testEarlyAbort(self):
+        counters = []
+        class RecordingCounter(JobCounter):
+            def __init__(self, maxJobs, **options):
+                JobCounter.__init__(self, maxJobs, **options)
+                counters.append(self)
+        SplitterModule.JobCounter = RecordingCounter
+        try:
+            self.assertRaisesRegexp(TaskWorkerException, "more than 10 jobs, the maximum number of jobs in each task$", self.split, 10)
+        finally:
+            SplitterModule.JobCounter = JobCounter
+        ## The splitting stopped at the first job over the limit.
+        self.assertEqual(counters[0].numJobs, 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
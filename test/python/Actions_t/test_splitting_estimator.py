@@ -0,0 +1,101 @@
+"""
+Tests of the estimation of the splitting for the dry run (TaskWorker.Actions.SplittingEstimator),
+comparing it with the summary of the real WMCore splitting on fixture datasets.
+"""
+
+import copy
+import random
+import unittest
+
+from WMCore.DataStructs.Run import Run
+from WMCore.DataStructs.File import File
+from WMCore.DataStructs.Fileset import Fileset
+from WMCore.DataStructs.Workflow import Workflow
+from WMCore.DataStructs.Subscription import Subscription
+from WMCore.JobSplitting.SplitterFactory import SplitterFactory
+
+from TaskWorker.Actions.DryRunUploader import SplittingSummary
+from TaskWorker.Actions.SplittingEstimator import estimateSplitting
+
+
+def makeFileset(seed, files=60, runs=(1, 2, 3), sites=(['T2_XX_A'], ['T2_XX_B'], ['T2_XX_A', 'T2_XX_B']),
+                duplicates=0):
+    """A fileset of files with a random number of lumis and events, spread over a few
+       runs and locations; duplicates is the number of lumis also present in another file."""
+    rand = random.Random(seed)
+    fileset = Fileset(name='fixture')
+    nextLumi = dict((run, 1) for run in runs)
+    allLumis = []
+    for num in range(files):
+        run = rand.choice(runs)
+        nLumis = rand.randint(1, 12)
+        lumis = range(nextLumi[run], nextLumi[run] + nLumis)
+        nextLumi[run] += nLumis + rand.choice([0, 0, 0, 3])
+        fileInfo = File(lfn='/store/data/fixture/%s/file_%04d.root' % (seed, num),
+                        events=nLumis * rand.randint(50, 400), locations=set(rand.choice(sites)))
+        fileInfo.addRun(Run(run, *lumis))
+        allLumis.extend([(run, lumi) for lumi in lumis])
+        fileset.addFile(fileInfo)
+    for num in range(duplicates):
+        run, lumi = rand.choice(allLumis)
+        fileInfo = File(lfn='/store/data/fixture/%s/dup_%04d.root' % (seed, num), events=rand.randint(50, 400),
+                        locations=set(rand.choice(sites)))
+        fileInfo.addRun(Run(run, lumi))
+        fileset.addFile(fileInfo)
+    fileset.commit()
+    return fileset
+
+
+def realSummary(fileset, splitparam):
+    """The lumis and events per job of the real splitting, as in the dry run tarball."""
+    subscription = Subscription(fileset=fileset, workflow=Workflow(name='fixture'), split_algo=splitparam['algorithm'],
+                                type='Analysis')
+    jobfactory = SplitterFactory()(subscription=subscription)
+    summary = SplittingSummary(splitparam['algorithm'])
+    for jobgroup in jobfactory(**copy.deepcopy(splitparam)):
+        summary.addJobs(jobgroup.getJobs())
+    return summary.lumisPerJob, summary.eventsPerJob
+
+
+class TestSplittingEstimator(unittest.TestCase):
+
+    def compare(self, splitparam, **fixture):
+        for seed in range(5):
+            fileset = makeFileset(seed, **fixture)
+            splitparam = dict(splitparam, splitOnRun=False, halt_job_on_file_boundaries=False, applyLumiCorrection=True)
+            estimate = estimateSplitting(copy.deepcopy(fileset), splitparam)
+            real = realSummary(copy.deepcopy(fileset), splitparam)
+            self.assertTrue(real[0])
+            self.assertEqual(estimate, real, "%s on fileset %d: %s != %s" % (splitparam, seed, estimate, real))
+
+    def testFileBased(self):
+        for filesPerJob in [1, 3, 7, 100]:
+            self.compare({'algorithm': 'FileBased', 'files_per_job': filesPerJob})
+        self.compare({'algorithm': 'FileBased', 'files_per_job': 4, 'total_files': 25})
+
+    def testLumiBased(self):
+        for lumisPerJob in [1, 5, 13, 1000]:
+            self.compare({'algorithm': 'LumiBased', 'lumis_per_job': lumisPerJob})
+        self.compare({'algorithm': 'LumiBased', 'lumis_per_job': 7, 'total_lumis': 150})
+
+    def testEventAwareLumiBased(self):
+        for eventsPerJob in [100, 1000, 2500, 100000]:
+            self.compare({'algorithm': 'EventAwareLumiBased', 'events_per_job': eventsPerJob})
+        self.compare({'algorithm': 'EventAwareLumiBased', 'events_per_job': 2000, 'total_events': 20000})
+
+    def testLumiMask(self):
+        mask = {'runs': ['1', '3'], 'lumis': ['1,20,40,80', '5,300']}
+        self.compare(dict(mask, algorithm='FileBased', files_per_job=3))
+        self.compare(dict(mask, algorithm='LumiBased', lumis_per_job=6))
+        self.compare(dict(mask, algorithm='EventAwareLumiBased', events_per_job=1500))
+
+    def testSplitLumis(self):
+        self.compare({'algorithm': 'LumiBased', 'lumis_per_job': 5}, duplicates=10)
+        self.compare({'algorithm': 'EventAwareLumiBased', 'events_per_job': 1200}, duplicates=10)
+
+    def testUnsupported(self):
+        self.assertRaises(ValueError, estimateSplitting, makeFileset(0), {'algorithm': 'EventBased'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Tests of the upload of the task log file to the crabcache by the TaskHandler,
+counting the requests and the bytes received by the fake UserFileCache of
+test/python/Fakes/FakeServices.py.
+"""
+
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes'))
+
+from TaskWorker.DataObjects.Result import Result
+from TaskWorker.Actions.Handler import TaskHandler
+from TaskWorker.WorkerExceptions import WorkerHandlerException, TaskWorkerException, StopHandler
+
+from FakeServices import FakeServices, SyntheticDataset
+
+
+class LoggingAction(object):
+    """An action writing some lines to the task log."""
+
+    def __init__(self, procnum, lines=100):
+        self.logger = logging.getLogger(str(procnum))
+        self.lines = lines
+
+    def execute(self, *args, **kwargs):
+        for line in range(self.lines):
+            self.logger.info("%s: line %d of the task log" % (self.__class__.__name__, line))
+        return Result(task=kwargs['task'], result='done')
+
+
+class FailingAction(LoggingAction):
+
+    def execute(self, *args, **kwargs):
+        LoggingAction.execute(self, *args, **kwargs)
+        raise TaskWorkerException("The action failed")
+
+
+class StoppingAction(LoggingAction):
+
+    def execute(self, *args, **kwargs):
+        LoggingAction.execute(self, *args, **kwargs)
+        raise StopHandler("Nothing else to do")
+
+
+class TestTaskLogUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+        os.makedirs('logs/tasks')
+        logging.getLogger('1').setLevel(logging.DEBUG)
+        self.services = FakeServices(SyntheticDataset(blocks=1, filesPerBlock=1))
+        self.services.patch()
+
+    def tearDown(self):
+        self.services.unpatch()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def runChain(self, actions, task=None):
+        task = task or {'tm_taskname': '160101_000000:bench_crab_log', 'tm_username': 'bench',
+                        'tm_cache_url': 'https://cmsweb.example.org/crabcache', 'user_proxy': '/dev/null'}
+        handler = TaskHandler(task, 1)
+        for action in actions:
+            handler.addWork(action)
+        return handler.actionWork()
+
+    def logSize(self):
+        return os.path.getsize('logs/tasks/bench/160101_000000:bench_crab_log.log')
+
+    def testChainUploadsOnce(self):
+        self.runChain([LoggingAction(1) for dummy in range(5)])
+        calls = self.services.calls
+        self.assertEqual(calls['UFC.uploadLog'], 1)
+        ## The whole log is uploaded, including the end of the last action.
+        self.assertEqual(calls['UFC.uploadBytes'], self.logSize())
+
+    def testFailureUploadsOnce(self):
+        self.assertRaises(WorkerHandlerException, self.runChain,
+                          [LoggingAction(1), LoggingAction(1), FailingAction(1), LoggingAction(1)])
+        calls = self.services.calls
+        self.assertEqual(calls['UFC.uploadLog'], 1)
+        self.assertEqual(calls['UFC.uploadBytes'], self.logSize())
+
+    def testStopUploadsOnce(self):
+        self.runChain([LoggingAction(1), StoppingAction(1), LoggingAction(1)])
+        calls = self.services.calls
+        self.assertEqual(calls['UFC.uploadLog'], 1)
+        self.assertEqual(calls['UFC.uploadBytes'], self.logSize())
+
+    def testNoProxyNoUpload(self):
+        self.runChain([LoggingAction(1)], task={'tm_taskname': '160101_000000:bench_crab_log', 'tm_username': 'bench'})
+        self.assertFalse('UFC.uploadLog' in self.services.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+"""
+Tests of the ApMon batch sending mode against a local UDP listener which
+decodes the XDR datagrams and counts datagrams and parameters.
+"""
+
+import time
+import socket
+import xdrlib
+import unittest
+import threading
+
+import apmon
+import ApmonIf
+import DashboardAPI
+
+
+class UDPListener(threading.Thread):
+    """Receive and decode ApMon datagrams sent to a local port."""
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self.datagrams = []
+        self.stopped = False
+
+    def run(self):
+        while not self.stopped:
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            self.datagrams.append(self.decode(data))
+
+    def decode(self, data):
+        unpacker = xdrlib.Unpacker(data)
+        unpacker.unpack_string() # version and password
+        unpacker.unpack_int() # instance id
+        unpacker.unpack_int() # sequence number
+        cluster = unpacker.unpack_string()
+        node = unpacker.unpack_string()
+        params = []
+        for dummyCounter in range(unpacker.unpack_int()):
+            name = unpacker.unpack_string()
+            valueType = unpacker.unpack_int()
+            if valueType == 0:
+                value = unpacker.unpack_string()
+            elif valueType == 2:
+                value = unpacker.unpack_int()
+            else:
+                value = unpacker.unpack_double()
+            params.append((name, value))
+        return {'cluster': cluster, 'node': node, 'params': params, 'size': len(data)}
+
+    def waitFor(self, numParams, timeout=10):
+        end = time.time() + timeout
+        while time.time() < end and self.numParams() < numParams:
+            time.sleep(0.05)
+
+    def numParams(self):
+        return sum([len(datagram['params']) for datagram in self.datagrams])
+
+    def stop(self):
+        self.stopped = True
+        self.join()
+        self.sock.close()
+
+
+class TestApMonBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = UDPListener()
+        self.listener.start()
+        self.apm = apmon.ApMon(("127.0.0.1:%d" % self.listener.port, ), apmon.Logger.ERROR)
+        self.apm.setMaxMsgRate(100000)
+
+    def tearDown(self):
+        self.apm.free()
+        self.listener.stop()
+
+    def testDirectSend(self):
+        for job in range(10):
+            self.apm.sendParameters('task', 'job%d' % job, {'StatusValue': 'killed', 'JobExitCode': 0})
+        self.listener.waitFor(20)
+        self.assertEqual(len(self.listener.datagrams), 10)
+        self.assertEqual(self.apm.sendStats['datagrams'], 10)
+
+    def testBatchPacking(self):
+        self.apm.enableBatchSend(maxDatagramSize=1400)
+        ## Many parameter sets for the same node, each one with different parameters.
+        for i in range(500):
+            self.apm.sendParameters('task', 'job1', {'param%d' % i: i, 'value%d' % i: float(i)})
+        self.apm.free()
+        self.listener.waitFor(1000)
+        self.assertEqual(self.listener.numParams(), 1000)
+        self.assertEqual(self.apm.sendStats['params'], 1000)
+        self.assertEqual(self.apm.sendStats['dropped'], 0)
+        self.assertTrue(len(self.listener.datagrams) < 100)
+        for datagram in self.listener.datagrams:
+            self.assertTrue(datagram['size'] <= 1400)
+            self.assertEqual((datagram['cluster'], datagram['node']), ('task', 'job1'))
+        values = dict(sum([datagram['params'] for datagram in self.listener.datagrams], []))
+        self.assertEqual(values['param499'], 499)
+        self.assertEqual(values['value7'], 7.0)
+
+    def testBatchKeepsRepeatedParameters(self):
+        self.apm.enableBatchSend()
+        for status in ['running', 'transferring', 'finished']:
+            self.apm.sendParameters('task', 'job1', {'StatusValue': status})
+        for job in range(10):
+            self.apm.sendParameters('task', 'job%d' % job, {'JobExitCode': 0})
+        self.apm.free()
+        self.listener.waitFor(13)
+        statuses = [dict(datagram['params'])['StatusValue'] for datagram in self.listener.datagrams if datagram['node'] == 'job1' and 'StatusValue' in dict(datagram['params'])]
+        self.assertEqual(statuses, ['running', 'transferring', 'finished'])
+        self.assertEqual(self.listener.numParams(), 13)
+
+    def testBatchDrops(self):
+        self.apm.enableBatchSend(queueSize=10)
+        ## Block the sender thread, so that the queue fills up.
+        self.apm._ApMon__configUpdateLock.acquire()
+        try:
+            start = time.time()
+            for job in range(100):
+                self.apm.sendParameters('task', 'job%d' % job, {'JobExitCode': 0})
+            ## The callers are never blocked.
+            self.assertTrue(time.time() - start < 1)
+        finally:
+            self.apm._ApMon__configUpdateLock.release()
+        self.apm.free()
+        stats = self.apm.sendStats
+        self.assertTrue(stats['dropped'] > 0)
+        self.assertEqual(stats['queued'] + stats['dropped'], 100)
+        self.listener.waitFor(stats['queued'])
+        self.assertEqual(self.listener.numParams(), stats['queued'])
+
+    def testFreeSendsEverything(self):
+        ## One parameter set for each job of a task: every job is a different node, hence a datagram
+        ## each. free() returns only when all of them are sent.
+        numJobs = 500
+        self.apm.enableBatchSend()
+        for job in range(numJobs):
+            self.apm.sendParameters('task', 'job%d' % job, {'StatusValue': 'killed', 'bossId': str(job)})
+        self.apm.free()
+        stats = self.apm.sendStats
+        self.assertEqual(stats, {'queued': numJobs, 'dropped': 0, 'datagrams': numJobs, 'params': 2 * numJobs})
+        self.assertEqual(self.apm.getQueueDepth(), 0)
+        self.listener.waitFor(2 * numJobs)
+        self.assertEqual(sorted(datagram['node'] for datagram in self.listener.datagrams), sorted('job%d' % job for job in range(numJobs)))
+
+    def testFreeWaitsForTheRatePauses(self):
+        ## Over the maximum rate the sender thread pauses instead of dropping, and free() waits for it.
+        numJobs = 45
+        self.apm.setMaxMsgRate(2)
+        self.apm.enableBatchSend()
+        start = time.time()
+        for job in range(numJobs):
+            self.apm.sendParameters('task', 'job%d' % job, {'JobExitCode': 0})
+        self.assertTrue(time.time() - start < 1)
+        self.apm.free()
+        self.assertTrue(time.time() - start >= 1)
+        self.assertEqual(self.apm.sendStats['datagrams'], numJobs)
+        self.listener.waitFor(numJobs)
+        self.assertEqual(self.listener.numParams(), numJobs)
+
+    def testGrowQueue(self):
+        ## Enabling the batch mode again only enlarges the queue.
+        self.apm.enableBatchSend(queueSize=10)
+        self.apm.enableBatchSend(queueSize=100, flushTimeout=5)
+        self.apm._ApMon__configUpdateLock.acquire()
+        try:
+            for job in range(100):
+                self.apm.sendParameters('task', 'job%d' % job, {'JobExitCode': 0})
+        finally:
+            self.apm._ApMon__configUpdateLock.release()
+        self.apm.free()
+        self.assertEqual(self.apm.sendStats['dropped'], 0)
+        self.assertEqual(self.apm.sendStats['datagrams'], 100)
+
+    def testFreeTimeout(self):
+        self.apm.enableBatchSend(flushTimeout=0.5)
+        ## Block the sender thread until free() gives up waiting.
+        self.apm._ApMon__configUpdateLock.acquire()
+        try:
+            for job in range(50):
+                self.apm.sendParameters('task', 'job%d' % job, {'JobExitCode': 0})
+            freer = threading.Thread(target=self.apm.free)
+            freer.start()
+            freer.join(2)
+            ## free() waits for the sender thread to stop before closing the socket.
+            self.assertTrue(freer.isAlive())
+        finally:
+            self.apm._ApMon__configUpdateLock.release()
+        freer.join(10)
+        self.assertFalse(freer.isAlive())
+        stats = self.apm.sendStats
+        self.assertEqual(stats['queued'], 50)
+        self.assertEqual(stats['dropped'] + stats['datagrams'], 50)
+        self.assertTrue(stats['dropped'] > 0)
+
+
+class TestApmonIfBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = UDPListener()
+        self.listener.start()
+        self.apmonConf = DashboardAPI.apmonConf
+        DashboardAPI.apmonConf = {"127.0.0.1:%d" % self.listener.port: {'sys_monitoring': 0, 'general_info': 0, 'job_monitoring': 0}}
+
+    def tearDown(self):
+        DashboardAPI.apmonFree()
+        DashboardAPI.apmonConf = self.apmonConf
+        self.listener.stop()
+
+    def testSharedSender(self):
+        ## The actions do not wait for the datagrams: the sender of the process keeps sending after free().
+        for task in range(2):
+            apmon = ApmonIf.ApmonIf(batch=True, batchSize=150)
+            DashboardAPI.getApmonInstance().setMaxMsgRate(100000)
+            for job in range(150):
+                apmon.sendToML({'taskId': 'task%d' % task, 'jobId': 'job%d' % job, 'StatusValue': 'killed'})
+            apmon.free()
+            self.assertTrue(DashboardAPI.apmonInstance.batchSendEnabled())
+        instance = DashboardAPI.apmonInstance
+        DashboardAPI.apmonFree()
+        self.assertEqual(instance.sendStats['dropped'], 0)
+        self.listener.waitFor(300 * 3)
+        self.assertEqual(len(self.listener.datagrams), 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Tests of the CMSGroupMapper index file, with a synthetic SITECONF tree.
+"""
+
+import os
+import stat
+import time
+import shutil
+import tempfile
+import unittest
+
+import CMSGroupMapper
+
+
+class CMSGroupMapperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.siteconf = os.path.join(self.tmpdir, 'SITECONF')
+        self.writeSite('T2_US_Nebraska', ['bbockelm', 'alice'])
+        self.writeSite('T2_CH_CERN', ['alice', 'zoe'])
+        self.writeSite('local', ['bbockelm'])
+        CMSGroupMapper.base_dir = self.siteconf
+        CMSGroupMapper.index_file = os.path.join(self.tmpdir, 'index')
+        CMSGroupMapper.private_index_dir = os.path.join(self.tmpdir, 'private')
+        ## The new private directories are created here too.
+        self.tempdir = tempfile.tempdir
+        tempfile.tempdir = self.tmpdir
+        CMSGroupMapper.g_cache = {}
+        CMSGroupMapper.g_expire_time = 0
+        CMSGroupMapper.g_index = None
+        CMSGroupMapper.g_index_id = None
+
+    def tearDown(self):
+        tempfile.tempdir = self.tempdir
+        shutil.rmtree(self.tmpdir)
+
+    def writeSite(self, site, users):
+        site_dir = os.path.join(self.siteconf, site, 'GlideinConfig')
+        if not os.path.isdir(site_dir):
+            os.makedirs(site_dir)
+        fd = open(os.path.join(site_dir, 'local-users.txt'), 'w')
+        fd.write("\n".join(users) + "\n")
+        fd.close()
+
+    def test_lookup(self):
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('alice'), 'T2_CH_CERN,T2_US_Nebraska')
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('bbockelm'), 'T2_US_Nebraska')
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('zoe'), 'T2_CH_CERN')
+        for user in ['aaa', 'bob', 'zzz', '']:
+            self.assertEqual(CMSGroupMapper.map_user_to_groups(user), '')
+        self.assertTrue(os.path.exists(CMSGroupMapper.index_file))
+        ## The index was used, not the in-memory cache.
+        self.assertEqual(CMSGroupMapper.g_cache, {})
+
+    def test_fresh_index_is_not_rebuilt(self):
+        CMSGroupMapper.map_user_to_groups('alice')
+        self.writeSite('T2_DE_DESY', ['alice'])
+        CMSGroupMapper.g_index_id = None
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('alice'), 'T2_CH_CERN,T2_US_Nebraska')
+
+    def test_stale_index_is_rebuilt(self):
+        CMSGroupMapper.map_user_to_groups('alice')
+        self.writeSite('T2_DE_DESY', ['alice'])
+        old = time.time() - CMSGroupMapper.index_lifetime - 1
+        os.utime(CMSGroupMapper.index_file, (old, old))
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('alice'), 'T2_CH_CERN,T2_DE_DESY,T2_US_Nebraska')
+
+    def test_unwritable_index(self):
+        CMSGroupMapper.index_file = os.path.join(self.tmpdir, 'missing', 'index')
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('alice'), 'T2_CH_CERN,T2_US_Nebraska')
+        self.assertTrue('alice' in CMSGroupMapper.g_cache)
+
+    def test_private_files(self):
+        CMSGroupMapper.map_user_to_groups('alice')
+        for path in [CMSGroupMapper.index_file, CMSGroupMapper.index_file + '.lock']:
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0600)
+        ## The index of previous versions is restricted and kept.
+        os.chmod(CMSGroupMapper.index_file, 0644)
+        CMSGroupMapper.g_index_id = None
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('zoe'), 'T2_CH_CERN')
+        self.assertEqual(CMSGroupMapper.index_file, os.path.join(self.tmpdir, 'index'))
+        self.assertEqual(stat.S_IMODE(os.stat(CMSGroupMapper.index_file).st_mode), 0600)
+
+    def assertPrivateIndex(self, shared):
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('alice'), 'T2_CH_CERN,T2_US_Nebraska')
+        private_dir = os.path.dirname(CMSGroupMapper.index_file)
+        try:
+            self.assertNotEqual(CMSGroupMapper.index_file, shared)
+            self.assertEqual(stat.S_IMODE(os.stat(private_dir).st_mode), 0700)
+            self.assertEqual(CMSGroupMapper.g_cache, {})
+        finally:
+            shutil.rmtree(private_dir)
+
+    def test_index_of_another_user(self):
+        if os.getuid() != 0:
+            self.skipTest("files of another user can only be created by root")
+        shared = CMSGroupMapper.index_file
+        fd = open(shared, 'w')
+        fd.write("alice T2_XX_Fake\n")
+        fd.close()
+        os.chmod(shared, 0600)
+        os.chown(shared, 65534, 65534)
+        self.assertPrivateIndex(shared)
+        self.assertEqual(open(shared).read(), "alice T2_XX_Fake\n")
+
+    def test_writable_by_others(self):
+        shared = CMSGroupMapper.index_file
+        fd = open(shared + '.lock', 'w')
+        fd.close()
+        os.chmod(shared + '.lock', 0666)
+        self.assertPrivateIndex(shared)
+
+    def test_private_index_is_reused(self):
+        shared = CMSGroupMapper.index_file
+        os.symlink(os.path.join(self.tmpdir, 'target'), shared)
+        CMSGroupMapper.map_user_to_groups('alice')
+        self.assertEqual(CMSGroupMapper.index_file, os.path.join(CMSGroupMapper.private_index_dir, 'index'))
+        ## The next processes use the index of the same directory, no new directory is left behind.
+        CMSGroupMapper.index_file = shared
+        CMSGroupMapper.g_index_id = None
+        self.assertEqual(CMSGroupMapper.map_user_to_groups('zoe'), 'T2_CH_CERN')
+        self.assertEqual(CMSGroupMapper.index_file, os.path.join(CMSGroupMapper.private_index_dir, 'index'))
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['SITECONF', 'index', 'index.lock', 'private'])
+
+    def test_untrusted_private_dir(self):
+        ## A private directory that others can write is not used, a new one is.
+        shared = CMSGroupMapper.index_file
+        os.symlink(os.path.join(self.tmpdir, 'target'), shared)
+        os.mkdir(CMSGroupMapper.private_index_dir)
+        os.chmod(CMSGroupMapper.private_index_dir, 0777)
+        private_dir = CMSGroupMapper.private_index_dir
+        self.assertPrivateIndex(shared)
+        self.assertNotEqual(os.path.dirname(CMSGroupMapper.index_file), private_dir)
+        self.assertEqual(os.listdir(private_dir), [])
+
+    def test_symbolic_link(self):
+        shared = CMSGroupMapper.index_file
+        target = os.path.join(self.tmpdir, 'target')
+        fd = open(target, 'w')
+        fd.write("alice T2_XX_Fake\n")
+        fd.close()
+        os.chmod(target, 0600)
+        os.symlink(target, shared)
+        self.assertPrivateIndex(shared)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+"""
+Tests of the caches of the external services refreshed in the background
+(CRABInterface.Utils.BackgroundCache and conn_handler), with stub fetchers
+counting their calls, concurrent requests and a fake clock.
+"""
+
+import threading
+import unittest
+
+from WMCore.REST.Error import ExecutionError
+
+from CRABInterface import Metrics, Utils
+from CRABInterface.Utils import BackgroundCache, CMSSitesCache, ConfigCache, conn_handler
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class StubFetcher(object):
+    """Return 'value N' at the Nth call, once released by the test, or fail."""
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        self.started.set()
+        self.release.wait(10)
+        if self.fail:
+            raise IOError("Service unavailable")
+        return 'value %d' % calls
+
+
+def concurrentGets(cache, requests):
+    """Call cache.get from concurrent threads, returning the values, or the exceptions, in order."""
+    results = [None] * requests
+    start = threading.Event()
+    def request(num):
+        start.wait()
+        try:
+            results[num] = cache.get()
+        except Exception as ex:
+            results[num] = ex
+    threads = [threading.Thread(target=request, args=(num,)) for num in range(requests)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+class TestBackgroundCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        Metrics.registry.clear()
+
+    def makeCache(self, fetcher):
+        return BackgroundCache('test', fetcher, refresh=1800, maxAge=3600, timeout=5, retry=60, clock=self.clock)
+
+    def waitRefresh(self, cache):
+        running = cache.running
+        if running:
+            running.done.wait(10)
+
+    def testFirstFetch(self):
+        ## Without a value all the requests wait for the same fetch.
+        fetcher = StubFetcher()
+        cache = self.makeCache(fetcher)
+        self.assertEqual(concurrentGets(cache, 20), ['value 1'] * 20)
+        self.assertEqual(fetcher.calls, 1)
+
+    def testStaleWhileRevalidate(self):
+        fetcher = StubFetcher()
+        cache = self.makeCache(fetcher)
+        self.assertEqual(cache.get(), 'value 1')
+        self.clock.sleep(1000)
+        self.assertEqual(concurrentGets(cache, 20), ['value 1'] * 20)
+        self.assertEqual(fetcher.calls, 1)
+        ## An old value is returned at once, while a single fetch runs in the background.
+        fetcher.release.clear()
+        fetcher.started.clear()
+        self.clock.sleep(1000)
+        self.assertEqual(concurrentGets(cache, 20), ['value 1'] * 20)
+        self.assertTrue(fetcher.started.wait(10))
+        self.assertEqual(concurrentGets(cache, 20), ['value 1'] * 20)
+        self.assertEqual(fetcher.calls, 2)
+        fetcher.release.set()
+        self.waitRefresh(cache)
+        self.assertEqual(cache.get(), 'value 2')
+        self.assertEqual(fetcher.calls, 2)
+        self.assertEqual(Metrics.cacheRequests.get('test', 'hit'), 61)
+        self.assertEqual(Metrics.cacheRequests.get('test', 'miss'), 1)
+
+    def testFailures(self):
+        fetcher = StubFetcher()
+        cache = self.makeCache(fetcher)
+        self.assertEqual(cache.get(), 'value 1')
+        fetcher.fail = True
+        self.clock.sleep(2000)
+        self.assertEqual(cache.get(), 'value 1')
+        self.waitRefresh(cache)
+        ## After a failure the service is not called again for a while.
+        self.assertEqual(concurrentGets(cache, 20), ['value 1'] * 20)
+        self.assertEqual(fetcher.calls, 2)
+        self.clock.sleep(60)
+        self.assertEqual(cache.get(), 'value 1')
+        self.waitRefresh(cache)
+        self.assertEqual(fetcher.calls, 3)
+        ## A value older than maxAge is not returned.
+        self.clock.sleep(2000)
+        results = concurrentGets(cache, 20)
+        self.assertTrue(all(isinstance(result, ExecutionError) for result in results))
+        self.assertEqual(fetcher.calls, 4)
+        fetcher.fail = False
+        self.clock.sleep(60)
+        self.assertEqual(concurrentGets(cache, 20), ['value 5'] * 20)
+        self.assertEqual(fetcher.calls, 5)
+
+    def testHangingFetch(self):
+        fetcher = StubFetcher()
+        cache = self.makeCache(fetcher)
+        self.assertEqual(cache.get(), 'value 1')
+        fetcher.release.clear()
+        fetcher.started.clear()
+        self.clock.sleep(2000)
+        self.assertEqual(cache.get(), 'value 1')
+        self.assertTrue(fetcher.started.wait(10))
+        self.assertEqual(cache.get(), 'value 1')
+        self.assertEqual(fetcher.calls, 2)
+        ## A fetch running for more than timeout is abandoned and a new one starts.
+        hanging = cache.running
+        self.clock.sleep(10)
+        self.assertEqual(cache.get(), 'value 1')
+        self.assertFalse(cache.running is hanging)
+        self.assertEqual(fetcher.calls, 3)
+        fetcher.release.set()
+        hanging.done.wait(10)
+        self.waitRefresh(cache)
+        ## The value of the later fetch is kept.
+        self.assertEqual(cache.get(), 'value 3')
+
+
+class Entity(object):
+
+    def __init__(self, config):
+        self.config = config
+        self.allCMSNames = CMSSitesCache(cachetime=0, sites={})
+
+    @conn_handler(services=['sitedb', 'centralconfig'])
+    def validate(self):
+        return self.allCMSNames.sites, self.allPNNNames.sites, self.centralcfg.centralconfig
+
+
+class Config(object):
+    extconfigurl = 'https://example.org/crabserverconfig'
+    mode = 'test'
+
+
+class TestConnHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sites = StubFetcher()
+        self.config = StubFetcher()
+        self.cmsSitesCache = Utils.cmsSitesCache
+        Utils.cmsSitesCache = BackgroundCache('sitedb', lambda: (CMSSitesCache(sites=['T2_XX_A', self.sites()], cachetime=0),
+                                                                 CMSSitesCache(sites=['T2_XX_A_Disk'], cachetime=0)), clock=self.clock)
+        Utils.centralConfigCaches[(Config.extconfigurl, Config.mode)] = BackgroundCache('centralconfig',
+            lambda: ConfigCache(centralconfig={'version': self.config()}, cachetime=0), clock=self.clock)
+
+    def tearDown(self):
+        Utils.cmsSitesCache = self.cmsSitesCache
+        Utils.centralConfigCaches.clear()
+
+    def testSharedCaches(self):
+        ## The entities share the caches, and the concurrent requests fetch each service once.
+        entities = [Entity(Config()) for dummy in range(5)]
+        class Requests(object):
+            def get(self):
+                return entities[0].validate()
+        results = concurrentGets(Requests(), 20) + [entity.validate() for entity in entities]
+        self.assertEqual(results, [(['T2_XX_A', 'value 1'], ['T2_XX_A_Disk'], {'version': 'value 1'})] * 25)
+        self.assertEqual((self.sites.calls, self.config.calls), (1, 1))
+        ## The refresh started by a request is seen by all the entities.
+        self.clock.sleep(1801)
+        self.assertEqual(entities[0].validate()[0], ['T2_XX_A', 'value 1'])
+        for cache in [Utils.cmsSitesCache, Utils.centralConfigCache(Config.extconfigurl, Config.mode)]:
+            running = cache.running
+            if running:
+                running.done.wait(10)
+        self.assertEqual(entities[1].validate(), (['T2_XX_A', 'value 2'], ['T2_XX_A_Disk'], {'version': 'value 2'}))
+        self.assertEqual((self.sites.calls, self.config.calls), (2, 2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Tests of the selection of the files of some types and jobs of a task
+(FileMetaData.getFromTaskAndType and DataWorkflow.filesOfJobs) against a local
+SQLite database with the filemetadata table, compared with the filtering of all
+the files of the task done before in the REST.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from WMCore.Configuration import ConfigSection
+
+from CRABInterface.DataWorkflow import DataWorkflow
+from Databases.FileMetaDataDB.Oracle.FileMetaData.FileMetaData import FileMetaData, GetFromTaskAndType
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes'))
+from FakeDatabase import SQLiteApi
+
+TASKNAME = '160101_000000:test_crab_files'
+TYPES = ['EDM', 'TFILE', 'LOG', 'POOLIN']
+JOBS = 1500
+
+
+class SQLiteFileMetaData(FileMetaData):
+    """The Oracle statements, with the limit of SQLite instead of ROWNUM."""
+    LimitRows_sql = "SELECT * FROM (%s) LIMIT :limit"
+
+
+class TestFileMetaDataQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.api = SQLiteApi(os.path.join(self.tmpdir, 'files.db'))
+        conn = self.api.connection()
+        conn.execute("CREATE TABLE filemetadata(tm_taskname VARCHAR(255) NOT NULL, panda_job_id INTEGER NOT NULL, "
+                     "fmd_outdataset, fmd_acq_era, fmd_sw_ver, fmd_in_events, fmd_global_tag, fmd_publish_name, "
+                     "fmd_location, fmd_tmp_location, fmd_runlumi, fmd_adler32, fmd_cksum, fmd_md5, fmd_lfn VARCHAR(500) NOT NULL, "
+                     "fmd_size, fmd_type VARCHAR(50) NOT NULL, fmd_parent, fmd_creation_time, fmd_filestate, "
+                     "fmd_direct_stageout, fmd_tmplfn, PRIMARY KEY(tm_taskname, fmd_lfn))")
+        conn.execute("CREATE INDEX filemetadata_type_job_idx ON filemetadata(tm_taskname, fmd_type, panda_job_id)")
+        rows = []
+        for jobid in range(1, JOBS + 1):
+            for num, filetype in enumerate(TYPES):
+                lfn = '/store/user/test/%s/%d.root' % (filetype, jobid)
+                rows.append((TASKNAME, jobid, 'dataset', 'era', 'CMSSW_7_4_0', 100, 'tag', 'name', 'T2_XX_A', 'T2_XX_B',
+                             '{}', 'adler', 1, 'md5', lfn, 1000, filetype, '[]', jobid * len(TYPES) + num, 'state', 'F', lfn))
+        ## The files of another task are never selected.
+        rows.append(('160101_000000:other', 1) + rows[0][2:])
+        conn.executemany("INSERT INTO filemetadata VALUES (%s)" % ', '.join(['?'] * 22), rows)
+        conn.commit()
+        config = ConfigSection('crabserver')
+        config.backend = 'oracle'
+        self.workflow = DataWorkflow(config)
+        self.workflow.api = self.api
+        self.workflow.FileMetaData = SQLiteFileMetaData()
+
+    def tearDown(self):
+        self.api.close()
+        shutil.rmtree(self.tmpdir)
+
+    def expected(self, filetypes, jobids, limit=None):
+        """The files of the jobs, selected as the REST did before: all the files of the types, filtered here."""
+        sql = FileMetaData.GetFromTaskAndType_sql + " AND fmd_type IN (%s) ORDER BY fmd_creation_time DESC" % \
+              ', '.join(["'%s'" % filetype for filetype in filetypes])
+        rows = [row for row in self.api.connection().execute(sql, {'taskname': TASKNAME}) if row[GetFromTaskAndType.PANDAID] in jobids]
+        return rows[:limit] if limit is not None else rows
+
+    def testStatement(self):
+        sql, binds = FileMetaData.getFromTaskAndType(TASKNAME, ['EDM', 'TFILE', 'POOLIN'], [1, 2, 3, 4, 5], 10)
+        ## The lists are padded to a power of two, so that only a few statements are parsed.
+        self.assertEqual(sorted(name for name in binds if name.startswith('filetype')), ['filetype%d' % num for num in range(4)])
+        self.assertEqual(sorted(name for name in binds if name.startswith('jobid')), ['jobid%d' % num for num in range(8)])
+        self.assertEqual(binds['filetype3'], 'POOLIN')
+        self.assertEqual(binds['jobid7'], 5)
+        self.assertEqual(binds['limit'], 10)
+        self.assertTrue('ROWNUM <= :limit' in sql)
+        sql, binds = FileMetaData.getFromTaskAndType(TASKNAME, ['LOG'])
+        self.assertEqual(sorted(binds), ['filetype0', 'taskname'])
+        self.assertFalse('panda_job_id IN' in sql)
+
+    def testJobs(self):
+        for filetypes, jobids, limit in [(['EDM', 'TFILE', 'POOLIN'], [3, 1, 700], None), (['LOG'], range(1, 100, 3), None),
+                                         (['EDM'], range(10, 20), 4), (['EDM', 'LOG'], [JOBS + 1], None)]:
+            self.api.rows = 0
+            rows = list(self.workflow.filesOfJobs(TASKNAME, filetypes, jobids, limit))
+            self.assertEqual(rows, self.expected(filetypes, jobids, limit))
+            ## Only the rows of the jobs are read from the database.
+            self.assertEqual(self.api.rows, len(rows))
+
+    def testManyJobs(self):
+        ## More jobs than the values of an IN list: the files of the types are read and filtered.
+        jobids = range(2, JOBS + 1)
+        self.assertTrue(len(jobids) > FileMetaData.MAX_BIND_LIST)
+        rows = list(self.workflow.filesOfJobs(TASKNAME, ['EDM', 'TFILE'], jobids))
+        self.assertEqual(rows, self.expected(['EDM', 'TFILE'], jobids))
+        rows = list(self.workflow.filesOfJobs(TASKNAME, ['EDM', 'TFILE'], jobids, 25))
+        self.assertEqual(rows, self.expected(['EDM', 'TFILE'], jobids, 25))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+"""
+Tests of the rate limits of the requests of the users (CRABInterface.Utils.RateLimiter
+and UserThrottle.make_throttled), with a fake clock.
+"""
+
+import unittest
+
+import cherrypy
+from cherrypy._cprequest import Request
+from WMCore.REST.Error import ExecutionError, report_rest_error
+
+from CRABInterface import Metrics
+from CRABInterface.Utils import RateLimiter, UserThrottle, TooManyRequests, DEFAULT_RATE_LIMITS
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter({'cheap': (1, 5), 'expensive': (0.1, 2)}, clock=self.clock)
+        Metrics.registry.clear()
+        cherrypy.response.headers.pop('Retry-After', None)
+        cherrypy.request.hooks = Request.hooks.copy()
+        cherrypy.log.screen = False
+
+    def takeAll(self, user, api, cost, count):
+        return [self.limiter.take(user, api, cost) for dummy in range(count)]
+
+    def testBurstAndRefill(self):
+        waits = self.takeAll('alice', 'status', 'cheap', 6)
+        self.assertEqual(waits[:5], [0] * 5)
+        self.assertAlmostEqual(waits[5], 1.0)
+        self.clock.sleep(0.5)
+        self.assertAlmostEqual(self.limiter.take('alice', 'status'), 0.5)
+        self.clock.sleep(0.5)
+        self.assertEqual(self.limiter.take('alice', 'status'), 0)
+        ## The bucket does not refill above the burst.
+        self.clock.sleep(3600)
+        self.assertEqual(self.takeAll('alice', 'status', 'cheap', 5), [0] * 5)
+        self.assertTrue(self.limiter.take('alice', 'status') > 0)
+
+    def testBudgets(self):
+        self.takeAll('alice', 'status', 'cheap', 5)
+        self.assertTrue(self.limiter.take('alice', 'status') > 0)
+        ## The other users and the other APIs have their own buckets.
+        self.assertEqual(self.limiter.take('bob', 'status'), 0)
+        self.assertEqual(self.takeAll('alice', 'logs', 'expensive', 2), [0, 0])
+        self.assertAlmostEqual(self.limiter.take('alice', 'logs', 'expensive'), 10.0)
+        self.assertEqual(self.takeAll('alice', 'report', 'expensive', 2), [0, 0])
+
+    def testLimits(self):
+        self.limiter.setLimits({'cheap': (0, 0)})
+        self.assertEqual(self.takeAll('alice', 'status', 'cheap', 100), [0] * 100)
+        self.assertEqual(RateLimiter().limits, DEFAULT_RATE_LIMITS)
+
+    def testPrune(self):
+        self.limiter.maxBuckets = 10
+        for num in range(10):
+            self.limiter.take('user%d' % num, 'status')
+        self.clock.sleep(1)
+        self.limiter.take('user0', 'status')
+        self.limiter.take('other', 'status')
+        ## The buckets refilled to the burst are dropped, the others are kept.
+        self.assertEqual(sorted(self.limiter.buckets), [('other', 'status'), ('user0', 'status')])
+
+    def testThrottled(self):
+        throttle = UserThrottle(limit=3, rateLimiter=self.limiter)
+        cherrypy.request.user = {'login': 'alice'}
+        calls = []
+
+        @throttle.make_throttled(cost='expensive')
+        def logs(workflow):
+            calls.append(workflow)
+            return status(workflow)
+
+        @throttle.make_throttled()
+        def status(workflow):
+            return 'status of %s' % workflow
+
+        self.assertEqual(logs('task1'), 'status of task1')
+        self.assertEqual(logs('task2'), 'status of task2')
+        try:
+            logs('task3')
+            self.fail("The third request was not rejected")
+        except TooManyRequests as ex:
+            self.assertEqual(ex.http_code, 429)
+            self.assertEqual(ex.retryafter, 10)
+            ## The error is reported as by the REST server, which removes Retry-After from the error responses.
+            try:
+                report_rest_error(ex, '', True)
+            except cherrypy.HTTPError as err:
+                self.assertEqual(err.code, 429)
+                err.set_response()
+        self.assertFalse('Retry-After' in cherrypy.response.headers)
+        cherrypy.request.hooks.run('before_finalize')
+        self.assertEqual(cherrypy.response.headers['Retry-After'], '10')
+        self.assertEqual(cherrypy.response.headers['X-REST-Status'], '307')
+        self.assertEqual(calls, ['task1', 'task2'])
+        self.assertEqual(Metrics.rateLimitRejections.get('logs', 'expensive'), 1)
+        ## The nested calls take no token and no active operation.
+        self.assertEqual(self.takeAll('alice', 'status', 'cheap', 5), [0] * 5)
+        self.assertEqual(throttle.users['alice'], 0)
+        self.clock.sleep(10)
+        self.assertEqual(logs('task3'), 'status of task3')
+
+    def testGenerators(self):
+        ## The body of a generator runs after the throttled call returned, while the response is streamed out.
+        throttle = UserThrottle(limit=1, rateLimiter=self.limiter)
+        cherrypy.request.user = {'login': 'alice'}
+
+        @throttle.make_throttled(cost='expensive')
+        def report(workflow):
+            yield status(workflow)
+
+        @throttle.make_throttled()
+        def status(workflow):
+            return 'status of %s' % workflow
+
+        reply = report('task1')
+        ## The operation is active until the end of the iteration, and the nested call takes no token and no operation.
+        self.assertEqual(throttle.users['alice'], 1)
+        self.assertRaises(ExecutionError, status, 'task2')
+        self.assertEqual(list(reply), ['status of task1'])
+        self.assertEqual(throttle.users['alice'], 0)
+        ## Only the rejected status call took a token.
+        self.assertEqual(self.takeAll('alice', 'status', 'cheap', 4), [0] * 4)
+        ## An interrupted response ends the operation too.
+        reply = report('task2')
+        reply.next()
+        reply.close()
+        self.assertEqual(throttle.users['alice'], 0)
+        ## Also if it was never started, or if it is dropped.
+        self.clock.sleep(100)
+        report('task3').close()
+        self.assertEqual(throttle.users['alice'], 0)
+        reply = report('task4')
+        self.assertEqual(throttle.users['alice'], 1)
+        del reply
+        self.assertEqual(throttle.users['alice'], 0)
+
+    def testRateLimited(self):
+        ## The rate limited functions are not active operations, their nested calls take no token.
+        throttle = UserThrottle(limit=1, rateLimiter=self.limiter)
+        cherrypy.request.user = {'login': 'alice'}
+
+        @throttle.make_rate_limited(cost='expensive')
+        def output(workflow):
+            status(workflow)
+            for num in range(2):
+                yield status(workflow)
+
+        @throttle.make_throttled()
+        def status(workflow):
+            return 'status of %s' % workflow
+
+        replies = [output('task1'), output('task2')]
+        self.assertEqual([list(reply) for reply in replies], [['status of task1'] * 2, ['status of task2'] * 2])
+        self.assertEqual(throttle.users['alice'], 0)
+        self.assertEqual(self.takeAll('alice', 'status', 'cheap', 5), [0] * 5)
+        self.assertRaises(TooManyRequests, output, 'task3')
+        ## The nested calls still take an active operation.
+        self.clock.sleep(10)
+        throttle.users['alice'] = 1
+        self.assertRaises(ExecutionError, list, output('task3'))
+
+    def testActiveOperations(self):
+        ## Without a rate limiter only the active operations are limited, as before.
+        throttle = UserThrottle(limit=2)
+        cherrypy.request.user = {'login': 'alice'}
+
+        @throttle.make_throttled()
+        def status(workflow):
+            return workflow
+
+        @throttle.make_throttled()
+        def output(workflow):
+            return status(workflow)
+
+        for dummy in range(100):
+            self.assertEqual(output('task'), 'task')
+        ## The last allowed operation is not rejected by its nested calls.
+        throttle.users['alice'] = 1
+        self.assertEqual(output('task'), 'task')
+        self.assertEqual(throttle.users['alice'], 1)
+        throttle.users['alice'] = 2
+        self.assertRaises(ExecutionError, output, 'task')
+        self.assertEqual(Metrics.throttleRejections.get(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
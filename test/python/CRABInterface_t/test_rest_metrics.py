@@ -0,0 +1,201 @@
+"""
+Tests of the runtime metrics of the REST interface (CRABInterface.Metrics) with
+a locally started server, serving a test API instrumented like RESTBaseAPI,
+and synthetic traffic.
+"""
+
+import re
+import time
+import socket
+import urllib2
+import threading
+import unittest
+
+import cherrypy
+from WMCore.REST.Server import RESTApi, RESTEntity, restcall
+from WMCore.REST.Error import ExecutionError
+from WMCore.REST.Validation import validate_str
+from WMCore.REST.Test import setup_dummy_server, fake_authz_headers
+
+from CRABInterface import Metrics, Utils
+from CRABInterface.RESTMetrics import RESTMetrics
+from CRABInterface.RESTExtensions import authz_login_valid
+
+## The throttled action holds its slot until released by the test.
+release = threading.Event()
+throttle = Utils.UserThrottle(limit=1)
+## A request each 100 seconds.
+rateLimited = Utils.UserThrottle(rateLimiter=Utils.RateLimiter({'cheap': (0.01, 1)}))
+
+
+@rateLimited.make_throttled(api='limited')
+def limited():
+    return 'limited'
+
+
+class RESTWork(RESTEntity):
+
+    def validate(self, apiobj, method, api, param, safe):
+        authz_login_valid()
+        validate_str('action', param, safe, re.compile(r"^[a-z]+$"), optional=False)
+
+    @restcall
+    def get(self, action):
+        if action == 'fail':
+            raise ExecutionError("Synthetic failure")
+        if action == 'throttled':
+            with throttle.throttleContext(cherrypy.request.user['login']):
+                release.wait(10)
+        if action == 'limited':
+            return [limited()]
+        return self.stream(action)
+
+    def stream(self, action):
+        ## The queries happen while the response is streamed out, as for the database cursors.
+        for dummyRow in range(2):
+            self.api.execute("select 1 from dual")
+            yield {'action': action}
+
+
+class MetricsTestApi(RESTApi):
+    """A REST API instrumented as CRABInterface.RESTBaseAPI"""
+
+    _call = Metrics.timeRequest(RESTApi._call)
+
+    def __init__(self, app, config, mount):
+        RESTApi.__init__(self, app, config, mount)
+        self._add({'metrics': RESTMetrics(app, self, config, mount), 'work': RESTWork(app, self, config, mount)})
+
+    @Metrics.timeStatement
+    def execute(self, sql):
+        time.sleep(0.02)
+
+
+class TestRESTMetrics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        cls.port = sock.getsockname()[1]
+        sock.close()
+        cls.server, cls.authzKey = setup_dummy_server(__name__, 'MetricsTestApi', port=cls.port)
+        cherrypy.config.update({'log.screen': False})
+        cherrypy.engine.start()
+        cherrypy.engine.wait(cherrypy.engine.states.STARTED)
+
+    @classmethod
+    def tearDownClass(cls):
+        cherrypy.engine.exit()
+
+    def setUp(self):
+        Metrics.registry.clear()
+        release.clear()
+
+    def get(self, path, accept='application/json'):
+        """Return the status and the body of a request to the test server."""
+        headers = dict(fake_authz_headers(self.authzKey.data) + [('Accept', accept)])
+        req = urllib2.Request('http://127.0.0.1:%d/test/%s' % (self.port, path), headers=headers)
+        try:
+            reply = urllib2.urlopen(req)
+            self.headers = reply.info()
+            return reply.getcode(), reply.info().gettype(), reply.read()
+        except urllib2.HTTPError as ex:
+            self.headers = ex.info()
+            return ex.code, None, ex.read()
+
+    def testRequestsAndQueries(self):
+        for dummy in range(5):
+            self.assertEqual(self.get('work?action=list')[0], 200)
+        self.assertEqual(self.get('work?action=fail')[0], 500)
+        self.assertEqual(self.get('work')[0], 400)
+        self.assertEqual(self.get('nowhere')[0], 405)
+
+        count, total = Metrics.requestDuration.get('work', 'GET', 200)
+        self.assertEqual(count, 5)
+        ## The time of the queries done while streaming is included.
+        self.assertTrue(total >= 5 * 2 * 0.02)
+        self.assertEqual(Metrics.requestDuration.get('work', 'GET', 500)[0], 1)
+        self.assertEqual(Metrics.requestDuration.get('work', 'GET', 400)[0], 1)
+        self.assertEqual(Metrics.requestDuration.get('unknown', 'GET', 405)[0], 1)
+        count, total = Metrics.statementDuration.get('work', 'GET')
+        self.assertEqual(count, 10)
+        self.assertTrue(total >= 10 * 0.02)
+        self.assertEqual(Metrics.requestsInProgress.get('work', 'GET'), 0)
+
+    def testThrottleRejections(self):
+        results = []
+        holder = threading.Thread(target=lambda: results.append(self.get('work?action=throttled')[0]))
+        holder.start()
+        deadline = time.time() + 10
+        while Metrics.requestsInProgress.get('work', 'GET') < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        for dummy in range(3):
+            self.assertEqual(self.get('work?action=throttled')[0], 500)
+        release.set()
+        holder.join()
+        self.assertEqual(results, [200])
+        self.assertEqual(Metrics.throttleRejections.get(), 3)
+        self.assertEqual(Metrics.requestDuration.get('work', 'GET', 500)[0], 3)
+
+    def testRateLimitRejections(self):
+        self.assertEqual(self.get('work?action=limited')[0], 200)
+        self.assertEqual(self.get('work?action=limited')[0], 429)
+        ## The Retry-After header is in the error response.
+        self.assertTrue(99 <= int(self.headers['Retry-After']) <= 100, self.headers['Retry-After'])
+        self.assertEqual(self.headers['X-REST-Status'], '307')
+        self.assertEqual(Metrics.rateLimitRejections.get('limited', 'cheap'), 1)
+        self.assertEqual(Metrics.requestDuration.get('work', 'GET', 429)[0], 1)
+
+    def testCache(self):
+        class Entity(object):
+            config = type('Config', (object,), {'extconfigurl': 'http://localhost', 'mode': 'test'})
+
+            @Utils.conn_handler(services=['centralconfig'])
+            def backendurls(self):
+                return self.centralcfg.centralconfig['backend-urls']
+
+        entity = Entity()
+        getCentralConfig = Utils.getCentralConfig
+        Utils.getCentralConfig = lambda extconfigurl, mode, **kwargs: {'backend-urls': {'mode': mode}}
+        try:
+            for dummy in range(3):
+                self.assertEqual(entity.backendurls(), {'mode': 'test'})
+        finally:
+            Utils.getCentralConfig = getCentralConfig
+            Utils.centralConfigCaches.clear()
+        self.assertEqual(Metrics.cacheRequests.get('centralconfig', 'hit'), 2)
+        self.assertEqual(Metrics.cacheRequests.get('centralconfig', 'miss'), 1)
+
+    def testExposition(self):
+        for action in ['list', 'list', 'fail']:
+            self.get('work?action=%s' % action)
+        Metrics.throttleRejections.inc()
+        status, ctype, body = self.get('metrics', accept='text/plain')
+        self.assertEqual(status, 200)
+        self.assertEqual(ctype, 'text/plain')
+        self.assertEqual(self.get('metrics?action=list', accept='text/plain')[0], 400)
+
+        sample = re.compile(r'^[a-z_]+(\{([a-z]+="[^"]*",?)+\})? [-+0-9.eInf]+$')
+        samples = {}
+        for line in body.splitlines():
+            if line.startswith('#'):
+                self.assertTrue(re.match(r'^# (HELP|TYPE) [a-z_]+ .+$', line), line)
+                continue
+            self.assertTrue(sample.match(line), line)
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+        self.assertTrue('# TYPE crab_rest_request_duration_seconds histogram' in body)
+        self.assertEqual(samples['crab_rest_request_duration_seconds_count{api="work",method="GET",status="200"}'], 2)
+        self.assertEqual(samples['crab_rest_request_duration_seconds_bucket{api="work",method="GET",status="200",le="+Inf"}'], 2)
+        self.assertEqual(samples['crab_rest_request_duration_seconds_bucket{api="work",method="GET",status="200",le="0.005"}'], 0)
+        self.assertEqual(samples['crab_rest_request_duration_seconds_count{api="work",method="GET",status="500"}'], 1)
+        self.assertEqual(samples['crab_rest_db_statement_duration_seconds_count{api="work",method="GET"}'], 4)
+        self.assertEqual(samples['crab_rest_throttle_rejections_total'], 1)
+        ## The request reading the metrics is still in progress.
+        self.assertEqual(samples['crab_rest_requests_in_progress{api="metrics",method="GET"}'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
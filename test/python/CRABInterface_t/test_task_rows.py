@@ -0,0 +1,87 @@
+"""
+Tests of the encoding of the structured columns of the tasks table
+(CRABInterface.Utils.dbSerializer/dbDeserializer) and of the task rows sent to
+the TaskWorker, with all the columns or only the ones of a kind of work.
+"""
+
+import unittest
+
+from CRABInterface.Utils import dbSerializer, dbDeserializer
+from CRABInterface.RESTWorkerWorkflow import Task, TASK_COLUMNS, PROJECTIONS
+
+
+class FakeLOB(object):
+    """A CLOB column, as returned by cx_Oracle."""
+
+    def __init__(self, value):
+        self.value = value
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        return self.value
+
+
+def makeRow(serializer, columns=TASK_COLUMNS):
+    """A row of the tasks table, with the values of columns."""
+    values = {'tm_taskname': '160101_000000:test_crab_rows', 'tm_task_status': 'NEW', 'tm_job_type': 'Analysis',
+              'tm_site_whitelist': serializer(['T2_XX_A', 'T2_XX_B']), 'tm_site_blacklist': serializer([]),
+              'tm_split_args': FakeLOB(serializer({'halt_job_on_file_boundaries': False, 'splitOnRun': False,
+                                                   'lumis_per_job': 10, 'runs': ['1', '2'], 'lumis': ['1,10', '3,7']})),
+              'tm_outfiles': FakeLOB(serializer([])), 'tm_tfile_outfiles': FakeLOB(serializer(['histo.root'])),
+              'tm_edm_outfiles': FakeLOB(serializer(['output.root'])), 'tm_user_infiles': serializer([]),
+              'tm_scriptargs': FakeLOB(serializer(['a=1'])), 'tm_user_files': FakeLOB(serializer([])),
+              'tm_extrajdl': serializer(['+Extra = 1']), 'panda_resubmitted_jobs': FakeLOB(serializer([])),
+              'tm_arguments': FakeLOB(serializer({'killList': [1, 2], 'killAll': False, 'ASOURL': ''})),
+              'tm_task_failure': FakeLOB('failure'), 'tw_name': 'worker', 'tm_start_time': None}
+    return [values.get(column, column) for column in columns]
+
+
+class TestTaskRows(unittest.TestCase):
+
+    def testRoundTrip(self):
+        for value in [[], ['T2_XX_A'], {'runs': ['1'], 'lumis': ['1,10'], 'lumis_per_job': 10}, {'killAll': True}]:
+            self.assertEqual(dbDeserializer(dbSerializer(value)), value)
+            self.assertEqual(dbDeserializer(FakeLOB(dbSerializer(value))), value)
+
+    def testLegacyValues(self):
+        ## The rows written before the JSON encoding contain the Python representation.
+        for value in [[], ['T2_XX_A'], {'runs': ['1'], 'lumis': ['1,10'], 'halt_job_on_file_boundaries': False}]:
+            self.assertEqual(dbDeserializer(str(value)), value)
+            self.assertEqual(dbDeserializer(FakeLOB(str(value))), value)
+
+    def testAllColumns(self):
+        for serializer in [str, dbSerializer]:
+            task = Task()
+            task.deserialize(makeRow(serializer))
+            self.assertEqual(task['tm_site_whitelist'], ['T2_XX_A', 'T2_XX_B'])
+            self.assertEqual(task['tm_split_args']['lumis'], ['1,10', '3,7'])
+            self.assertEqual(task['tm_task_failure'], 'failure')
+            self.assertEqual(task['tm_start_time'], 'None')
+            self.assertEqual(task['worker_name'], 'worker')
+            self.assertEqual(task['kill_ids'], [1, 2])
+            self.assertFalse(task['kill_all'])
+            self.assertEqual(task['tm_extrajdl'], serializer(['+Extra = 1']))
+
+    def testProjections(self):
+        for projection, columns in PROJECTIONS.items():
+            row = makeRow(dbSerializer, columns)
+            task = Task()
+            task.deserialize(row, columns)
+            self.assertEqual(task['tm_taskname'], '160101_000000:test_crab_rows')
+            ## Only the projected columns are read.
+            for column, value in zip(TASK_COLUMNS, makeRow(dbSerializer)):
+                if isinstance(value, FakeLOB) and column not in columns:
+                    self.assertFalse(column in task, "%s in the %s projection" % (column, projection))
+            ## Each CLOB is read once.
+            for value in row:
+                if isinstance(value, FakeLOB):
+                    self.assertEqual(value.reads, 1)
+        task = Task()
+        task.deserialize(makeRow(dbSerializer, PROJECTIONS['kill']), PROJECTIONS['kill'])
+        self.assertEqual(task['kill_ids'], [1, 2])
+        self.assertFalse('tm_split_args' in task)
+
+
+if __name__ == '__main__':
+    unittest.main()
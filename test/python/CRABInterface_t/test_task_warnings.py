@@ -0,0 +1,107 @@
+"""
+Tests of the warnings of the tasks (RESTTask.addwarning) with parallel writers,
+against a local SQLite database with the tasks and task_warnings tables and the
+statements of Databases.TaskDB.Oracle.Task (SQLite accepts the same named binds).
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+from WMCore.Configuration import ConfigSection
+from WMCore.REST.Error import ExecutionError, InvalidParameter
+
+from CRABInterface import RESTTask as RESTTaskModule
+from CRABInterface.RESTTask import RESTTask, MAX_WARNINGS
+from Databases.TaskDB.Oracle.Task.Task import Task
+from Databases.TaskDB.MySQL.Task.Task import Task as MySQLTask
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes'))
+from FakeDatabase import SQLiteApi
+
+TASKNAME = '160101_000000:test_crab_warnings'
+
+
+class TestTaskWarnings(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.api = SQLiteApi(os.path.join(self.tmpdir, 'tasks.db'))
+        conn = self.api.connection()
+        conn.execute("CREATE TABLE tasks(tm_taskname VARCHAR(255) PRIMARY KEY, tm_task_warnings TEXT DEFAULT '[]')")
+        conn.execute("CREATE TABLE task_warnings(tm_warning_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "tm_taskname VARCHAR(255) NOT NULL REFERENCES tasks(tm_taskname), tm_warning TEXT NOT NULL)")
+        conn.execute("INSERT INTO tasks (tm_taskname) VALUES (?)", (TASKNAME,))
+        conn.commit()
+        config = ConfigSection('crabserver')
+        config.backend = 'oracle'
+        self.rest = RESTTask(None, self.api, config, '/crabserver/dev')
+        self.authz = RESTTaskModule.authz_owner_match
+        RESTTaskModule.authz_owner_match = lambda api, workflows, task: None
+
+    def tearDown(self):
+        RESTTaskModule.authz_owner_match = self.authz
+        self.api.close()
+        shutil.rmtree(self.tmpdir)
+
+    def warnings(self):
+        return [row[0] for row in self.api.query(None, None, Task.GetWarnings_sql, workflow=TASKNAME)]
+
+    def addWarnings(self, writers, warningsPerWriter):
+        """Add the warnings from parallel writers, returning the number of rejected warnings."""
+        rejected = []
+        start = threading.Event()
+        def writer(num):
+            start.wait()
+            for count in range(warningsPerWriter):
+                try:
+                    self.rest.addwarning(workflow=TASKNAME, warning=('writer %d warning %d' % (num, count)).encode('base64'))
+                except ExecutionError:
+                    rejected.append((num, count))
+        threads = [threading.Thread(target=writer, args=(num,)) for num in range(writers)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        return len(rejected)
+
+    def testNoLostWarnings(self):
+        self.assertEqual(self.addWarnings(writers=5, warningsPerWriter=2), 0)
+        warnings = self.warnings()
+        self.assertEqual(len(warnings), 10)
+        self.assertEqual(sorted(warnings), sorted(['writer %d warning %d' % (num, count)
+                                                   for num in range(5) for count in range(2)]))
+        ## The warnings of each writer are kept in order.
+        for num in range(5):
+            self.assertEqual([warning for warning in warnings if warning.startswith('writer %d ' % num)],
+                             ['writer %d warning %d' % (num, count) for count in range(2)])
+
+    def testCap(self):
+        rejected = self.addWarnings(writers=8, warningsPerWriter=5)
+        self.assertEqual(len(self.warnings()), MAX_WARNINGS)
+        self.assertEqual(rejected, 8 * 5 - MAX_WARNINGS)
+
+    def testLegacyWarnings(self):
+        ## The warnings stored in the tm_task_warnings column count in the limit.
+        conn = self.api.connection()
+        conn.execute("UPDATE tasks SET tm_task_warnings = ? WHERE tm_taskname = ?", (str(['old 1', 'old 2', 'old 3']), TASKNAME))
+        conn.commit()
+        rejected = self.addWarnings(writers=4, warningsPerWriter=3)
+        self.assertEqual(len(self.warnings()), MAX_WARNINGS - 3)
+        self.assertEqual(rejected, 4 * 3 - MAX_WARNINGS + 3)
+
+    def testStatements(self):
+        ## The task is locked before its warnings are counted, so that the cap holds with concurrent writers.
+        self.assertTrue(Task.GetLegacyWarnings_sql.endswith('FOR UPDATE'))
+        self.assertTrue(MySQLTask.GetLegacyWarnings_sql.endswith('FOR UPDATE'))
+
+    def testUnknownTask(self):
+        self.assertRaises(InvalidParameter, self.rest.addwarning, workflow='160101_000000:unknown', warning='d2FybmluZw==')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,360 @@
+"""
+Local HTTP server answering like the asynctransfer CouchDB to the CMSCouch
+calls of the ASO code paths: document GET/PUT/HEAD, _bulk_docs, the
+AsyncTransfer views JobsIdsStatesByWorkflow, forKill and
+PublicationStateByWorkflow, and the updateJobs update handler.
+
+The views are kept indexed by key as the documents are written, as CouchDB
+does, so the queries cost the number of rows returned and not the number of
+documents in the database. The requests are counted by kind and an optional
+delay is added to every answer.
+
+    server = FakeCouchServer(delay=0.005)
+    server.addDocuments([transferDocument('mytask', jobid) for jobid in range(1, 1001)])
+    server.start()
+    couch = CMSCouch.CouchServer(dburl=server.url)
+    ...
+    server.stop()
+    print server.counters
+"""
+
+import json
+import time
+import socket
+import urllib
+import hashlib
+import urlparse
+import datetime
+import threading
+import BaseHTTPServer
+import SocketServer
+
+TERMINAL_STATES = ['done', 'failed', 'killed']
+
+
+def jobsIdsStatesByWorkflow(doc):
+    if 'workflow' in doc and 'state' in doc:
+        yield doc['workflow'], {'jobid': doc.get('jobid'), 'state': doc['state'], 'start_time': doc.get('start_time')}
+
+
+def forKill(doc):
+    if doc.get('lfn') and doc.get('state') not in TERMINAL_STATES:
+        yield doc.get('workflow'), doc['_id']
+
+
+def publicationStateByWorkflow(doc):
+    if doc.get('publish') == 1 and 'publication_state' in doc:
+        yield doc.get('workflow'), doc['publication_state']
+
+
+def countStates(values):
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+
+## view name: (map function, reduce function or None)
+VIEWS = {'JobsIdsStatesByWorkflow': (jobsIdsStatesByWorkflow, None),
+         'forKill': (forKill, None),
+         'PublicationStateByWorkflow': (publicationStateByWorkflow, countStates),
+        }
+
+
+def updateJobs(doc, fields):
+    """The AsyncTransfer updateJobs handler: set the fields, append the retries."""
+    for key, value in fields.items():
+        if key == 'retry':
+            doc.setdefault('retry_count', []).append(value)
+        elif key == 'last_update':
+            doc[key] = float(value)
+        else:
+            doc[key] = value
+    return doc
+
+
+UPDATES = {'updateJobs': updateJobs}
+
+
+def transferDocument(workflow, jobid, filename='output_%(jobid)d.root', state='new', publish=1,
+                     publicationState='not_published', startTime=None):
+    """A document as injected by cmscp or PostJob for the output file of a job."""
+    now = startTime or str(datetime.datetime.now())
+    lfn = '/store/temp/user/bench.0123456789/%s/%s' % (workflow, filename % {'jobid': jobid})
+    return {'_id': hashlib.sha224(lfn).hexdigest(),
+            'workflow': workflow,
+            'jobid': jobid,
+            'lfn': lfn,
+            'source_lfn': lfn,
+            'destination_lfn': lfn.replace('/store/temp', '/store', 1),
+            'type': 'output',
+            'state': state,
+            'source': 'T2_XX_Source',
+            'destination': 'T2_XX_Destination',
+            'size': 1000000,
+            'checksums': {'adler32': 'abc'},
+            'start_time': now,
+            'end_time': '',
+            'last_update': int(time.time()),
+            'retry_count': [],
+            'failure_reason': [],
+            'job_retry_count': 0,
+            'publish': publish,
+            'publication_state': publicationState,
+            'publication_retry_count': [],
+           }
+
+
+class FakeCouchDatabase(object):
+    """The documents of a database and the indexes of its views."""
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        ## view -> key -> {doc id: value}
+        self.index = dict((view, {}) for view in VIEWS)
+        ## view -> doc id -> keys emitted
+        self.emitted = dict((view, {}) for view in VIEWS)
+        self.seq = 0
+
+    def write(self, doc):
+        """Store the document if its revision is the current one; return the answer of CouchDB."""
+        docid = doc.get('_id') or hashlib.md5(str(time.time()) + str(self.seq)).hexdigest()
+        old = self.docs.get(docid)
+        if old is not None and doc.get('_rev') != old['_rev']:
+            return {'id': docid, 'error': 'conflict', 'reason': 'Document update conflict.'}
+        if old is None and doc.get('_rev'):
+            return {'id': docid, 'error': 'conflict', 'reason': 'Document update conflict.'}
+        revnum = int(old['_rev'].split('-')[0]) + 1 if old else 1
+        doc = dict(doc)
+        doc['_id'] = docid
+        doc['_rev'] = '%d-%s' % (revnum, hashlib.md5(json.dumps(doc, sort_keys=True)).hexdigest())
+        self.docs[docid] = doc
+        self.seq += 1
+        self.reindex(doc)
+        return {'id': docid, 'rev': doc['_rev']}
+
+    def reindex(self, doc):
+        docid = doc['_id']
+        for view, (mapper, dummyReducer) in VIEWS.items():
+            index = self.index[view]
+            for key in self.emitted[view].pop(docid, []):
+                rows = index.get(key, {})
+                rows.pop(docid, None)
+                if not rows:
+                    index.pop(key, None)
+            keys = []
+            for key, value in mapper(doc):
+                index.setdefault(key, {})[docid] = value
+                keys.append(key)
+            if keys:
+                self.emitted[view][docid] = keys
+
+    def query(self, view, options, keys=None):
+        mapper, reducer = VIEWS[view]
+        index = self.index[view]
+        if keys is None:
+            if 'key' in options:
+                keys = [options['key']]
+            else:
+                keys = sorted(index)
+        rows = []
+        for key in keys:
+            for docid in sorted(index.get(key, {})):
+                rows.append((key, docid, index[key][docid]))
+        if reducer and options.get('reduce', True):
+            if options.get('group'):
+                result = []
+                for key in keys:
+                    values = [value for rkey, dummyId, value in rows if rkey == key]
+                    if values:
+                        result.append({'key': key, 'value': reducer(values)})
+                return {'rows': result}
+            if not rows:
+                return {'rows': []}
+            return {'rows': [{'key': None, 'value': reducer([value for dummyKey, dummyId, value in rows])}]}
+        skip = int(options.get('skip', 0))
+        limit = options.get('limit')
+        rows = rows[skip:skip + int(limit) if limit is not None else None]
+        result = []
+        for key, docid, value in rows:
+            row = {'id': docid, 'key': key, 'value': value}
+            if options.get('include_docs'):
+                row['doc'] = self.docs[docid]
+            result.append(row)
+        return {'total_rows': sum(len(docs) for docs in index.values()), 'offset': skip, 'rows': result}
+
+
+class FakeCouchHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # send the answer with a single write, as a real server does
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.count('connections')
+        self.server.sockets.append(self.connection)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.answer('GET')
+
+    def do_HEAD(self):
+        self.answer('HEAD')
+
+    def do_PUT(self):
+        self.answer('PUT')
+
+    def do_POST(self):
+        self.answer('POST')
+
+    def readBody(self):
+        length = int(self.headers.getheader('Content-Length', 0))
+        body = self.rfile.read(length) if length else ''
+        ctype = self.headers.getheader('Content-Type', '')
+        if not body:
+            return {}
+        if ctype.startswith('application/x-www-form-urlencoded'):
+            return dict(urlparse.parse_qsl(body))
+        return json.loads(body)
+
+    def answer(self, method):
+        parsed = urlparse.urlparse(self.path)
+        parts = [urllib.unquote_plus(part) for part in parsed.path.strip('/').split('/') if part]
+        options = {}
+        for key, value in urlparse.parse_qsl(parsed.query):
+            try:
+                options[key] = json.loads(value)
+            except ValueError:
+                options[key] = value
+        body = self.readBody()
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        try:
+            status, result = self.server.dispatch(method, parts, options, body)
+        except KeyError:
+            status, result = 404, {'error': 'not_found', 'reason': 'missing'}
+        if isinstance(result, basestring):
+            data, ctype = result, 'text/plain'
+        else:
+            data, ctype = json.dumps(result), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(data)
+
+
+class FakeCouchServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, delay=0, port=0, databases=('asynctransfer', )):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), FakeCouchHandler)
+        self.delay = delay
+        self.counters = {}
+        self.sockets = []
+        self.lock = threading.Lock()
+        self.databases = dict((name, FakeCouchDatabase(name)) for name in databases)
+        self.url = 'http://127.0.0.1:%d' % self.server_port
+
+    def handle_error(self, request, client_address):
+        # the clients closing their connections
+        pass
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def addDocuments(self, docs, dbname='asynctransfer'):
+        """Store the documents directly, without going through HTTP or the counters."""
+        with self.lock:
+            return [self.databases[dbname].write(doc) for doc in docs]
+
+    def documents(self, dbname='asynctransfer'):
+        return self.databases[dbname].docs
+
+    def dispatch(self, method, parts, options, body):
+        """Return the HTTP status and the answer (a string or a JSON object) of a request."""
+        if not parts:
+            self.count('welcome')
+            return 200, {'couchdb': 'Welcome', 'version': '1.6.1'}
+        if parts == ['_all_dbs']:
+            self.count('_all_dbs')
+            return 200, sorted(self.databases)
+        dbname, rest = parts[0], parts[1:]
+        if not rest:
+            if method == 'PUT':
+                self.count('create_db')
+                with self.lock:
+                    if dbname in self.databases:
+                        return 412, {'error': 'file_exists', 'reason': 'The database could not be created, the file already exists.'}
+                    self.databases[dbname] = FakeCouchDatabase(dbname)
+                return 201, {'ok': True}
+            self.count('db_info')
+            db = self.databases[dbname]
+            return 200, {'db_name': dbname, 'doc_count': len(db.docs), 'update_seq': db.seq}
+        db = self.databases[dbname]
+        if rest[0] == '_bulk_docs' and method == 'POST':
+            self.count('_bulk_docs')
+            self.count('docs_written', len(body['docs']))
+            with self.lock:
+                return 201, [db.write(doc) for doc in body['docs']]
+        if rest[0] == '_design' and len(rest) >= 4 and rest[2] == '_view':
+            view = rest[3]
+            self.count('view:%s' % view)
+            with self.lock:
+                return 200, db.query(view, options, body.get('keys') if method == 'POST' else None)
+        if rest[0] == '_design' and len(rest) >= 5 and rest[2] == '_update' and method in ['PUT', 'POST']:
+            update, docid = rest[3], '/'.join(rest[4:])
+            self.count('update:%s' % update)
+            fields = dict((key, str(value)) for key, value in options.items())
+            if isinstance(body, dict):
+                fields.update(body)
+            with self.lock:
+                doc = db.docs.get(docid)
+                if doc is None:
+                    return 404, {'error': 'not_found', 'reason': 'missing'}
+                result = db.write(UPDATES[update](dict(doc), fields))
+            if 'error' in result:
+                return 409, result
+            return 201, 'OK'
+        docid = '/'.join(rest)
+        if method in ['GET', 'HEAD']:
+            self.count('get_doc')
+            with self.lock:
+                doc = db.docs.get(docid)
+            if doc is None:
+                return 404, {'error': 'not_found', 'reason': 'missing'}
+            return 200, doc
+        if method == 'PUT':
+            self.count('put_doc')
+            body['_id'] = docid
+            if 'rev' in options:
+                body['_rev'] = options['rev']
+            with self.lock:
+                result = db.write(body)
+            if 'error' in result:
+                return 409, result
+            result['ok'] = True
+            return 201, result
+        return 405, {'error': 'method_not_allowed', 'reason': 'Only GET,HEAD,PUT,POST allowed'}
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def stop(self):
+        """Stop the server and close the connections of the clients."""
+        self.shutdown()
+        self.server_close()
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
@@ -0,0 +1,72 @@
+"""
+Stand-in of the REST DatabaseRESTApi (query, modify and modifynocheck) on a
+local SQLite database, so that the REST statements of the Databases package can
+be run in the tests without an Oracle instance. SQLite accepts the same named
+binds as Oracle; the statements SQLite does not know (ROWNUM, the Oracle and
+MySQL dates) are overridden in the tests. A SELECT ... FOR UPDATE takes the
+write lock of the whole database until the next commit or rollback, as SQLite
+does not lock rows.
+
+There is one connection per thread, as the REST server has one per request.
+The rows returned by query and the rows changed by modifynocheck are counted.
+
+    api = SQLiteApi(os.path.join(tmpdir, 'crab.db'))
+    api.connection().execute("CREATE TABLE ...")
+    rest = RESTTask(None, api, config, '/crabserver/dev')
+    ...
+    print api.rows, api.modified
+    api.close()
+"""
+
+import sqlite3
+import threading
+
+from WMCore.REST.Error import MissingObject
+
+
+class SQLiteApi(object):
+    """The query, modify and modifynocheck methods of the REST api on a SQLite database."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.rows = 0
+        self.modified = []
+
+    def connection(self):
+        """The connection of the current thread, opened at the first call."""
+        if not hasattr(self.local, 'conn'):
+            self.local.conn = sqlite3.connect(self.path, timeout=60)
+        return self.local.conn
+
+    def close(self):
+        """Close the connection of the current thread."""
+        if hasattr(self.local, 'conn'):
+            self.local.conn.close()
+            del self.local.conn
+
+    def query(self, match, select, sql, **binds):
+        if sql.rstrip().endswith('FOR UPDATE'):
+            sql = sql.rstrip()[:-len('FOR UPDATE')]
+            self.connection().execute("BEGIN IMMEDIATE")
+        rows = self.connection().execute(sql, binds).fetchall()
+        self.rows += len(rows)
+        return iter(rows)
+
+    def execute(self, sql, kwbinds):
+        binds = [dict(zip(kwbinds.keys(), values)) for values in zip(*kwbinds.values())]
+        return self.connection().executemany(sql, binds), len(binds)
+
+    def modify(self, sql, **kwbinds):
+        cursor, expected = self.execute(sql, kwbinds)
+        if cursor.rowcount < expected:
+            self.connection().rollback()
+            raise MissingObject(info="%d vs. %d expected" % (cursor.rowcount, expected))
+        self.connection().commit()
+        return [{'modified': cursor.rowcount}]
+
+    def modifynocheck(self, sql, **kwbinds):
+        cursor, _ = self.execute(sql, kwbinds)
+        self.connection().commit()
+        self.modified.append(cursor.rowcount)
+        return iter([{'modified': cursor.rowcount}])
@@ -0,0 +1,251 @@
+"""
+Offline stand-ins for the external services used by the TaskWorker actions:
+DBS, PhEDEx, SiteDB, the UserFileCache, the CRAB REST interface and the
+Dashboard. They answer from a synthetic dataset and count the calls, so the
+actions can be run and measured without any network access.
+
+    services = FakeServices(SyntheticDataset(blocks=10, filesPerBlock=100))
+    services.patch()
+    ... run the actions ...
+    services.unpatch()
+    print services.calls
+"""
+
+import os
+import tarfile
+import threading
+
+import TaskWorker.Actions.Handler
+import TaskWorker.Actions.Splitter
+import TaskWorker.Actions.TaskAction
+import TaskWorker.Actions.DataDiscovery
+import TaskWorker.Actions.DagmanCreator
+import TaskWorker.Actions.DBSDataDiscovery
+
+
+class CallCounter(object):
+    """Count the calls to the fake services, by 'Service.method'."""
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + amount
+
+
+class SyntheticDataset(object):
+    """
+    A dataset of blocks x filesPerBlock files, each file with lumisPerFile
+    consecutive lumis of eventsPerLumi events, stored at the given PhEDEx nodes.
+    """
+
+    def __init__(self, name='/Synthetic/Benchmark-v1/AOD', blocks=10, filesPerBlock=100, lumisPerFile=10,
+                 eventsPerLumi=100, nodes=('T2_XX_Disk1', 'T2_XX_Disk2'), accessType='VALID'):
+        self.name = name
+        self.blocks = blocks
+        self.filesPerBlock = filesPerBlock
+        self.lumisPerFile = lumisPerFile
+        self.eventsPerLumi = eventsPerLumi
+        self.nodes = list(nodes)
+        self.accessType = accessType
+
+    def blockNames(self):
+        return ['%s#%08d' % (self.name, block) for block in range(self.blocks)]
+
+    def fileDetails(self):
+        """The answer of DBS3Reader.listDatasetFileDetails."""
+        details = {}
+        lumi = 1
+        for block, blockName in enumerate(self.blockNames()):
+            for i in range(self.filesPerBlock):
+                lfn = '/store/data/Synthetic/AOD/v1/%06d/%08d.root' % (block, i)
+                details[lfn] = {'BlockName': blockName,
+                                'NumberOfEvents': self.lumisPerFile * self.eventsPerLumi,
+                                'FileSize': 2500000000,
+                                'Checksum': '1234567890', 'Adler32': 'abcdef01', 'Md5': 'NOTSET',
+                                'Parents': [],
+                                'ValidFile': True,
+                                'Lumis': {1: range(lumi, lumi + self.lumisPerFile)}}
+                lumi += self.lumisPerFile
+        return details
+
+
+class FakeDBSApi(object):
+
+    def __init__(self, services):
+        self.services = services
+
+    def listDatasets(self, dataset, detail=0, dataset_access_type='VALID'):
+        self.services.counter.count('DBS.listDatasets')
+        return [{'dataset': dataset, 'dataset_access_type': self.services.dataset.accessType}]
+
+
+class FakeDBSReader(object):
+    """The DBS3Reader methods used by DBSDataDiscovery."""
+
+    def __init__(self, services):
+        self.services = services
+        self.dbs = FakeDBSApi(services)
+
+    def getFileBlocksInfo(self, dataset, locations=True):
+        self.services.counter.count('DBS.getFileBlocksInfo')
+        return [{'Name': name} for name in self.services.dataset.blockNames()]
+
+    def listFileBlockLocation(self, blocks, phedexNodes=False):
+        self.services.counter.count('DBS.listFileBlockLocation')
+        return dict((block, list(self.services.dataset.nodes)) for block in blocks)
+
+    def listDatasetFileDetails(self, dataset, getParents=False):
+        self.services.counter.count('DBS.listDatasetFileDetails')
+        return self.services.dataset.fileDetails()
+
+
+class FakePhEDEx(object):
+
+    services = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def getNodeMap(self):
+        self.services.counter.count('PhEDEx.getNodeMap')
+        return {'phedex': {'node': [{'name': node, 'kind': 'Disk'} for node in self.services.dataset.nodes] +
+                                   [{'name': 'T1_XX_MSS', 'kind': 'MSS'}]}}
+
+    def getPFN(self, nodes, lfns, protocol='srmv2'):
+        self.services.counter.count('PhEDEx.getPFN')
+        return dict(((node, lfn), 'srm://se.%s.example.org:8443/srm/v2/server?SFN=%s' % (node.lower(), lfn))
+                    for node in nodes for lfn in lfns)
+
+
+class FakeSiteDBJSON(object):
+
+    services = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def PNNtoPSN(self, pnn):
+        self.services.counter.count('SiteDB.PNNtoPSN')
+        return [pnn.replace('_Disk', '_Site')]
+
+    def getAllCMSNames(self):
+        self.services.counter.count('SiteDB.getAllCMSNames')
+        return [node.replace('_Disk', '_Site') for node in self.services.dataset.nodes]
+
+
+class FakeUserFileCache(object):
+    """Counts the requests and the bytes uploaded to and downloaded from the crabcache."""
+
+    services = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def download(self, hashkey, output):
+        self.services.counter.count('UFC.download')
+        tar = tarfile.open(output, 'w:gz')
+        tar.close()
+        self.services.counter.count('UFC.downloadBytes', os.path.getsize(output))
+        return output
+
+    def uploadLog(self, logfile, logfilename=None):
+        self.services.counter.count('UFC.uploadLog')
+        self.services.counter.count('UFC.uploadBytes', os.path.getsize(logfile))
+        return {}
+
+
+class FakeRESTServer(dict):
+    """
+    Replaces RESTInteractions.HTTPRequests: answers the backendurls info
+    request and accepts any other request.
+    """
+
+    services = None
+
+    def __init__(self, url='fake-rest.example.org', localcert=None, localkey=None, version=None, retry=0, logger=None):
+        dict.__init__(self, host=url)
+
+    def get(self, uri=None, data={}):
+        self.services.counter.count('REST.get')
+        if data.get('subresource') == 'backendurls':
+            return {'result': [{'htcondorSchedds': [], 'htcondorPool': 'collector.example.org',
+                                'ASOURL': 'https://aso.example.org/couchdb'}]}, 200, ''
+        return {'result': []}, 200, ''
+
+    def post(self, uri=None, data={}):
+        self.services.counter.count('REST.post')
+        return {'result': []}, 200, ''
+
+    def put(self, uri=None, data={}):
+        self.services.counter.count('REST.put')
+        return {'result': []}, 200, ''
+
+    def delete(self, uri=None, data={}):
+        self.services.counter.count('REST.delete')
+        return {'result': []}, 200, ''
+
+
+class FakeApmonIf(object):
+
+    services = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def sendToML(self, params):
+        self.services.counter.count('Dashboard.sendToML')
+
+    def free(self):
+        pass
+
+
+class _Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeServices(object):
+    """Patch the TaskWorker action modules to use the fake services."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.counter = CallCounter()
+        self.dbs = FakeDBSReader(self)
+        self.saved = []
+        ## Each instance gets its own subclasses pointing back to it.
+        for cls in FakePhEDEx, FakeSiteDBJSON, FakeUserFileCache, FakeRESTServer, FakeApmonIf:
+            setattr(self, cls.__name__, type(cls.__name__, (cls,), {'services': self}))
+
+    @property
+    def calls(self):
+        return dict(self.counter.calls)
+
+    def server(self):
+        """The server object to give to the actions."""
+        return self.FakeRESTServer()
+
+    def _set(self, obj, name, value):
+        self.saved.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    def patch(self):
+        dbsDiscovery = TaskWorker.Actions.DBSDataDiscovery
+        self._set(dbsDiscovery, 'get_dbs', lambda url: self.dbs)
+        self._set(dbsDiscovery, 'PhEDEx', self.FakePhEDEx)
+        self._set(TaskWorker.Actions.DataDiscovery, 'SiteDBJSON', self.FakeSiteDBJSON)
+        creator = TaskWorker.Actions.DagmanCreator
+        self._set(creator, 'PhEDEx', _Namespace(PhEDEx=self.FakePhEDEx))
+        self._set(creator, 'SiteDB', _Namespace(SiteDBJSON=self.FakeSiteDBJSON))
+        self._set(creator, 'UserFileCache', self.FakeUserFileCache)
+        self._set(creator, 'ApmonIf', self.FakeApmonIf)
+        self._set(TaskWorker.Actions.Handler, 'UserFileCache', self.FakeUserFileCache)
+        self._set(TaskWorker.Actions.TaskAction, 'HTTPRequests', self.FakeRESTServer)
+        self._set(TaskWorker.Actions.Splitter, 'HTTPRequests', self.FakeRESTServer)
+
+    def unpatch(self):
+        while self.saved:
+            obj, name, value = self.saved.pop()
+            setattr(obj, name, value)
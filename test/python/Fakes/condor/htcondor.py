@@ -0,0 +1,396 @@
+"""
+Fake htcondor bindings: a pool of in-memory schedds and a collector, so the
+code talking to HTCondor (DagmanSubmitter, DagmanKiller, DagmanResubmitter,
+HTCondorLocator, RenewRemoteProxies, HTCondorDataWorkflow) can be run and
+measured offline with large job queues. The directory of this module has to
+be put in front of sys.path before anything imports htcondor; the real
+classad module is still used, to build the ads and evaluate the constraints.
+
+The queues are kept by a FakePool, which serves the Schedd and Collector
+objects from a thread of the process which started it, through a unix
+socket: as with a real schedd, the changes done by the forked processes
+(see HTCondorUtils.AuthenticatedSubprocess) are seen by everybody. Every
+call is traced and counted, and can be delayed by a configurable latency.
+
+    pool = htcondor.FakePool(latency=0.001, latencies={'xquery': 0.05})
+    pool.addSchedd('crab3@vocms0001.example.org')
+    pool.addJobs('crab3@vocms0001.example.org', [{'CRAB_ReqName': 'mytask', 'CRAB_Id': i} for i in range(1, 10001)])
+    pool.start()
+    ... run the code under test ...
+    pool.stop()
+    print pool.calls
+"""
+
+import os
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import SocketServer
+import cPickle as pickle
+
+import classad
+
+## The pool the Schedd and Collector objects talk to; set by FakePool.start().
+pool_address = None
+
+
+class Param(dict):
+    """htcondor.param: the configuration, empty but for what the code sets."""
+
+    def __init__(self):
+        dict.__init__(self, COLLECTOR_HOST='localhost', SCHEDD_HOST='localhost')
+
+
+param = Param()
+
+
+class JobAction(object):
+    Hold = 'Hold'
+    Release = 'Release'
+    Remove = 'Remove'
+    RemoveX = 'RemoveX'
+    Vacate = 'Vacate'
+    VacateFast = 'VacateFast'
+    Suspend = 'Suspend'
+    Continue = 'Continue'
+
+
+class AdTypes(object):
+    Any = 'Any'
+    Collector = 'Collector'
+    Generic = 'Generic'
+    Master = 'Master'
+    Negotiator = 'Negotiator'
+    Schedd = 'Scheduler'
+    Startd = 'Machine'
+    Submitter = 'Submitter'
+
+
+class DaemonTypes(object):
+    Any = 'Any'
+    Collector = 'Collector'
+    Master = 'Master'
+    Negotiator = 'Negotiator'
+    Schedd = 'Scheduler'
+    Startd = 'Machine'
+
+
+class SecMan(object):
+
+    def invalidateAllSessions(self):
+        pass
+
+
+def enable_debug():
+    pass
+
+
+def read_events(fp, is_xml=False):
+    raise NotImplementedError("The fake htcondor module does not parse job event logs.")
+
+
+def _call(target, method, *args):
+    """Send a call to the pool and return its result, or raise its exception."""
+    if pool_address is None:
+        raise RuntimeError("Failed to connect to the HTCondor pool: no FakePool started.")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(pool_address)
+        fp = sock.makefile('rwb', -1)
+        pickle.dump((os.getpid(), target, method, args), fp, pickle.HIGHEST_PROTOCOL)
+        fp.flush()
+        ok, result = pickle.load(fp)
+        fp.close()
+    finally:
+        sock.close()
+    if not ok:
+        raise result
+    return result
+
+
+class Collector(object):
+
+    def __init__(self, pool=None):
+        self.pool = pool or param.get('COLLECTOR_HOST')
+
+    def query(self, ad_type=AdTypes.Any, constraint='true', projection=[], statistics=''):
+        return _call(('collector', self.pool), 'query', ad_type, str(constraint), list(projection))
+
+    def locate(self, daemon_type, name=None):
+        return _call(('collector', self.pool), 'locate', daemon_type, name)
+
+    def locateAll(self, daemon_type):
+        return _call(('collector', self.pool), 'query', daemon_type, 'true', [])
+
+
+class Schedd(object):
+
+    def __init__(self, location_ad=None):
+        if location_ad is None:
+            self.name = param.get('SCHEDD_NAME', 'local')
+        else:
+            self.name = location_ad['Name']
+
+    def _call(self, method, *args):
+        return _call(('schedd', self.name), method, *args)
+
+    def xquery(self, requirements='true', projection=[], limit=-1, opts=None, name=None):
+        return iter(self._call('xquery', str(requirements), list(projection), limit))
+
+    def query(self, constraint='true', attr_list=[], callback=None, limit=-1, opts=None):
+        return self._call('query', str(constraint), list(attr_list), limit)
+
+    def act(self, action, job_spec):
+        return self._call('act', action, job_spec)
+
+    def edit(self, job_spec, attr, value):
+        return self._call('edit', job_spec, attr, value)
+
+    def submit(self, ad, count=1, spool=False, ad_results=None):
+        cluster, ads = self._call('submit', ad, count, spool)
+        if ad_results is not None:
+            ad_results.extend(ads)
+        return cluster
+
+    def spool(self, ad_list):
+        return self._call('spool', list(ad_list))
+
+    def refreshGSIProxy(self, cluster, proc, filename, lifetime=-1):
+        return self._call('refreshGSIProxy', cluster, proc, filename, lifetime)
+
+
+def copyAd(ad):
+    copy = classad.ClassAd()
+    copy.update(ad)
+    return copy
+
+
+def matching(ads, constraint):
+    """The ads for which the constraint evaluates to true."""
+    constraint = classad.ExprTree(str(constraint))
+    result = []
+    for ad in ads:
+        ad['FakeConstraint'] = constraint
+        try:
+            if ad.eval('FakeConstraint') is True:
+                result.append(ad)
+        finally:
+            del ad['FakeConstraint']
+    return result
+
+
+def project(ads, projection):
+    """Copies of the ads with only the attributes in projection, or all of them."""
+    result = []
+    for ad in ads:
+        if not projection:
+            result.append(copyAd(ad))
+            continue
+        projected = classad.ClassAd()
+        for attr in projection:
+            if attr in ad:
+                projected[attr] = ad.lookup(attr)
+        result.append(projected)
+    return result
+
+
+class FakeSchedd(object):
+    """The queue of a schedd: {(cluster, proc): ClassAd}."""
+
+    STATUS = {JobAction.Hold: 5, JobAction.Release: 1, JobAction.Remove: 3, JobAction.RemoveX: 3,
+              JobAction.Vacate: 1, JobAction.VacateFast: 1, JobAction.Suspend: 7, JobAction.Continue: 2}
+
+    def __init__(self, name, proxyLifetime):
+        self.name = name
+        self.jobs = {}
+        self.nextCluster = 1
+        self.proxyLifetime = proxyLifetime
+
+    def addJob(self, attrs, cluster=None, proc=0, status=1):
+        """Put a job in the queue; attrs is a ClassAd or a dictionary."""
+        if cluster is None:
+            cluster = self.nextCluster
+        self.nextCluster = max(self.nextCluster, cluster + 1)
+        ad = classad.ClassAd()
+        ad.update({'JobStatus': status, 'QDate': int(time.time()), 'EnteredCurrentStatus': int(time.time())})
+        ad.update(attrs)
+        ad['ClusterId'] = cluster
+        ad['ProcId'] = proc
+        self.jobs[cluster, proc] = ad
+        return ad
+
+    def select(self, job_spec):
+        """The ads of the jobs given as a constraint or a list of 'cluster.proc'."""
+        if isinstance(job_spec, (list, tuple)):
+            ads = []
+            for jobid in job_spec:
+                cluster, proc = str(jobid).split('.')
+                if (int(cluster), int(proc)) in self.jobs:
+                    ads.append(self.jobs[int(cluster), int(proc)])
+            return ads
+        return matching([self.jobs[key] for key in sorted(self.jobs)], job_spec)
+
+    def query(self, constraint, projection, limit):
+        ads = self.select(constraint)
+        if limit is not None and limit >= 0:
+            ads = ads[:limit]
+        return project(ads, projection)
+
+    xquery = query
+
+    def act(self, action, job_spec):
+        ads = self.select(job_spec)
+        now = int(time.time())
+        for ad in ads:
+            status = self.STATUS[action]
+            if action == JobAction.Release and ad['JobStatus'] != 5:
+                continue
+            ad['JobStatus'] = status
+            ad['EnteredCurrentStatus'] = now
+            if action == JobAction.Hold:
+                ad['HoldReason'] = 'via condor_hold (by user fake)'
+                ad['HoldReasonCode'] = 1
+        result = classad.ClassAd()
+        result.update({'TotalJobAds': len(ads), 'TotalSuccess': len(ads), 'TotalError': 0, 'TotalNotFound': 0,
+                       'TotalBadStatus': 0, 'TotalAlreadyDone': 0, 'TotalPermissionDenied': 0})
+        return result
+
+    def edit(self, job_spec, attr, value):
+        if isinstance(value, basestring):
+            value = classad.ExprTree(value)
+        ads = self.select(job_spec)
+        for ad in ads:
+            ad[attr] = value
+        return len(ads)
+
+    def submit(self, ad, count, spool):
+        cluster = self.nextCluster
+        ads = []
+        for proc in range(count):
+            ## Spooled jobs are held until their input is spooled.
+            job = self.addJob(ad, cluster, proc, 5 if spool else 1)
+            if spool:
+                job['HoldReasonCode'] = 16
+                job['HoldReason'] = 'Spooling input data files'
+            ads.append(copyAd(job))
+        return cluster, ads
+
+    def spool(self, ad_list):
+        for ad in ad_list:
+            job = self.jobs.get((ad['ClusterId'], ad['ProcId']))
+            if job is not None and job.get('HoldReasonCode') == 16:
+                job['JobStatus'] = 1
+                del job['HoldReasonCode']
+                del job['HoldReason']
+
+    def refreshGSIProxy(self, cluster, proc, filename, lifetime):
+        if (int(cluster), int(proc)) not in self.jobs:
+            raise RuntimeError("Failed to refresh the proxy of job %s.%s: no such job" % (cluster, proc))
+        return self.proxyLifetime
+
+
+class FakePoolHandler(SocketServer.StreamRequestHandler):
+
+    def handle(self):
+        pid, target, method, args = pickle.load(self.rfile)
+        result = self.server.pool.dispatch(pid, target, method, args)
+        pickle.dump(result, self.wfile, pickle.HIGHEST_PROTOCOL)
+
+
+class FakePoolServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the clients exiting before reading the answer
+        pass
+
+
+class FakePool(object):
+    """
+    The schedds and the collector, shared by the processes forked after start().
+    latency is added to every call, latencies overrides it by method name.
+    """
+
+    def __init__(self, latency=0, latencies=None, proxyLifetime=7*24*3600, collector='localhost'):
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.proxyLifetime = proxyLifetime
+        self.collector = collector
+        self.schedds = {}
+        self.scheddAds = {}
+        self.calls = {}
+        ## (start time, pid, target, method, seconds, number of ads returned)
+        self.trace = []
+        self.lock = threading.Lock()
+        self.tmpdir = None
+        self.server = None
+
+    def addSchedd(self, name, **attrs):
+        """Add a schedd to the pool, with its ad in the collector."""
+        self.schedds[name] = FakeSchedd(name, self.proxyLifetime)
+        ad = classad.ClassAd()
+        ad.update({'MyType': 'Scheduler', 'Name': name, 'Machine': name.split('@')[-1],
+                   'MyAddress': '<127.0.0.1:9618?sock=%s>' % name.replace('@', '_'),
+                   'StartSchedulerUniverse': True, 'DetectedMemory': 24*1024})
+        ad.update(attrs)
+        self.scheddAds[name] = ad
+        return self.schedds[name]
+
+    def addJobs(self, name, jobs, cluster=None):
+        """Add jobs (dictionaries or ClassAds) to the queue of a schedd, one cluster each unless given."""
+        schedd = self.schedds[name]
+        return [schedd.addJob(job, cluster) for job in jobs]
+
+    def dispatch(self, pid, target, method, args):
+        kind, name = target
+        start = time.time()
+        delay = self.latencies.get(method, self.latency)
+        if delay:
+            time.sleep(delay)
+        try:
+            with self.lock:
+                if kind == 'collector':
+                    result = getattr(self, 'collector_' + method)(*args)
+                else:
+                    if name not in self.schedds:
+                        raise RuntimeError("Failed to connect to schedd %s" % name)
+                    result = getattr(self.schedds[name], method)(*args)
+            answer = (True, result)
+        except Exception as ex:
+            answer = (False, ex)
+        size = len(answer[1]) if answer[0] and isinstance(answer[1], list) else None
+        with self.lock:
+            key = '%s.%s' % ('Collector' if kind == 'collector' else 'Schedd', method)
+            self.calls[key] = self.calls.get(key, 0) + 1
+            self.trace.append((start, pid, name, method, time.time() - start, size))
+        return answer
+
+    def collector_query(self, ad_type, constraint, projection):
+        ads = [ad for ad in self.scheddAds.values() if ad_type in [AdTypes.Any, ad['MyType']]]
+        return project(matching(ads, constraint), projection)
+
+    def collector_locate(self, daemon_type, name):
+        for ad in self.scheddAds.values():
+            if daemon_type in [DaemonTypes.Any, ad['MyType']] and name in [None, ad['Name']]:
+                return copyAd(ad)
+        raise ValueError("Unable to find daemon.")
+
+    def start(self):
+        global pool_address
+        self.tmpdir = tempfile.mkdtemp(prefix='fake_condor.')
+        self.server = FakePoolServer(os.path.join(self.tmpdir, 'pool.sock'), FakePoolHandler)
+        self.server.pool = self
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        pool_address = self.server.server_address
+
+    def stop(self):
+        global pool_address
+        pool_address = None
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
@@ -0,0 +1,113 @@
+"""
+Tests of the MultiProcessingLog handler: records from forked processes,
+batching and the overflow policies of the bounded queue.
+"""
+
+import os
+import shutil
+import logging
+import multiprocessing
+import tempfile
+import unittest
+import threading
+
+from MultiProcessingLog import MultiProcessingLog
+
+
+class MultiProcessingLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'log.txt')
+        self.logger = logging.getLogger('MultiProcessingLogTest')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        for handler in self.logger.handlers[:]:
+            self.logger.removeHandler(handler)
+        shutil.rmtree(self.tmpdir)
+
+    def makeHandler(self, **kwargs):
+        handler = MultiProcessingLog(self.filename, **kwargs)
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(message)s"))
+        self.logger.addHandler(handler)
+        return handler
+
+    def stall(self, handler):
+        """Make the writing thread wait until the returned event is set."""
+        release = threading.Event()
+        write = handler._write
+        def stalledWrite(records):
+            release.wait()
+            write(records)
+        handler._write = stalledWrite
+        return release
+
+    def readLines(self):
+        return open(self.filename).read().splitlines()
+
+    def test_forked_processes(self):
+        handler = self.makeHandler(batchSize=50)
+        def produce(child):
+            for i in range(250):
+                self.logger.info("child %d record %d", child, i)
+        processes = [multiprocessing.Process(target=produce, args=(child,)) for child in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        handler.close()
+        lines = self.readLines()
+        self.assertEqual(len(lines), 1000)
+        self.assertTrue("INFO:child 3 record 249" in lines)
+        stats = handler.get_stats()
+        self.assertEqual(stats['written'], 1000)
+        self.assertEqual(stats['dropped'], 0)
+        ## The records were written in batches.
+        self.assertTrue(stats['batches'] < 1000)
+
+    def test_exception(self):
+        handler = self.makeHandler()
+        try:
+            raise ValueError("bad value")
+        except ValueError:
+            self.logger.exception("failed")
+        handler.close()
+        text = open(self.filename).read()
+        self.assertTrue("ERROR:failed" in text)
+        self.assertTrue("ValueError: bad value" in text)
+
+    def test_count_policy(self):
+        handler = self.makeHandler(queueSize=5, overflow='count')
+        release = self.stall(handler)
+        for i in range(100):
+            self.logger.info("record %d", i)
+        dropped = handler.get_stats()['dropped']
+        self.assertTrue(dropped > 0)
+        release.set()
+        handler.close()
+        lines = self.readLines()
+        records = [line for line in lines if line.startswith("INFO:record")]
+        self.assertEqual(len(records), 100 - dropped)
+        self.assertTrue("WARNING:%d log records dropped because the log queue was full" % dropped in lines)
+
+    def test_drop_debug_policy(self):
+        handler = self.makeHandler(queueSize=5, overflow='drop-debug')
+        release = self.stall(handler)
+        for i in range(20):
+            self.logger.debug("debug %d", i)
+        self.assertTrue(handler.get_stats()['dropped'] > 0)
+        release.set()
+        for i in range(100):
+            self.logger.info("info %d", i)
+        handler.close()
+        lines = self.readLines()
+        self.assertEqual(len([line for line in lines if line.startswith("INFO:info")]), 100)
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, MultiProcessingLog, self.filename, overflow='wait')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Local HTTP server answering like PanDA to the calls of PandaServerInterface,
+with keep-alive connections, per API request counters, the number of
+connections accepted and an optional delay added to every answer.
+"""
+
+import cgi
+import socket
+import time
+import urlparse
+import threading
+import cPickle as pickle
+import BaseHTTPServer
+import SocketServer
+
+
+class FakePanDAHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # send the answer with a single write, as a real server does
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.count('connections')
+        self.server.sockets.append(self.connection)
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse.urlparse(self.path)
+        self.answer(parsed.path, dict(urlparse.parse_qsl(parsed.query)))
+
+    def do_POST(self):
+        ctype = self.headers.getheader('Content-Type', '')
+        if ctype.startswith('multipart/form-data'):
+            form = cgi.FieldStorage(fp=self.rfile, headers=self.headers, environ={'REQUEST_METHOD': 'POST'})
+            data = dict((key, form[key].value) for key in form.keys())
+        else:
+            length = int(self.headers.getheader('Content-Length', 0))
+            data = dict(urlparse.parse_qsl(self.rfile.read(length)))
+        self.answer(self.path, data)
+
+    def answer(self, path, data):
+        api = path.rstrip('/').split('/')[-1]
+        self.server.count(api)
+        self.server.requests.append((api, data))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if api == 'getFullJobStatus':
+            body = pickle.dumps([{'PandaID': pandaID, 'jobStatus': 'running'} for pandaID in pickle.loads(data['ids'])])
+        elif api == 'submitJobs':
+            body = pickle.dumps([(1000 + i, None, {'jobsetID': 1}) for i in range(len(pickle.loads(data['jobs'])))])
+        elif api == 'killJobs':
+            body = pickle.dumps([True] * len(pickle.loads(data['ids'])))
+        elif api == 'runBrokerage':
+            body = pickle.loads(data['sites'])[0]
+        elif api == 'getServer':
+            body = '127.0.0.1:%d' % self.server.server_port
+        elif api == 'putFile':
+            self.server.files.append(data['file'])
+            body = 'True'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakePanDAServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, delay=0, port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), FakePanDAHandler)
+        self.delay = delay
+        self.counters = {}
+        self.requests = []
+        self.files = []
+        self.sockets = []
+        self.lock = threading.Lock()
+        self.url = 'http://127.0.0.1:%d/server/panda' % self.server_port
+
+    def handle_error(self, request, client_address):
+        # the clients closing their connections
+        pass
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def stop(self):
+        """Stop the server and close the connections of the clients."""
+        self.shutdown()
+        self.server_close()
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
@@ -0,0 +1,106 @@
+"""
+Tests of the PandaServerInterface transports against a local fake PanDA server.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import PandaServerInterface as pserver
+from FakePanDAServer import FakePanDAServer
+
+
+class FakeJob(object):
+    pass
+
+
+class PandaTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakePanDAServer()
+        self.server.start()
+        self.tmpdir = tempfile.mkdtemp()
+        self.proxy = os.path.join(self.tmpdir, 'proxy')
+        open(self.proxy, 'w').close()
+        os.environ['X509_USER_PROXY'] = self.proxy
+        pserver.resetTransportStats()
+        self.transport = pserver.transport
+
+    def tearDown(self):
+        pserver.transport = self.transport
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def callAll(self):
+        status, output = pserver.getFullJobStatus(self.server.url, [1, 2, 3], self.proxy)
+        self.assertEqual(status, 0)
+        self.assertEqual([job['PandaID'] for job in output], [1, 2, 3])
+        status, output = pserver.submitJobs(self.server.url, [FakeJob(), FakeJob()], self.proxy)
+        self.assertEqual(status, 0)
+        self.assertEqual([ret[0] for ret in output], [1000, 1001])
+        status, output = pserver.killJobs(self.server.url, [1, 2], self.proxy)
+        self.assertEqual((status, output), (0, [True, True]))
+        status, output = pserver.runBrokerage(self.server.url, ['T2_XX_Site'], self.proxy)
+        self.assertEqual((status, output), (0, 'T2_XX_Site'))
+        sandbox = os.path.join(self.tmpdir, 'sandbox.tgz')
+        with open(sandbox, 'wb') as fd:
+            fd.write(os.urandom(300000))
+        status, output = pserver.putFile(self.server.url, self.server.url, sandbox, 0)
+        self.assertEqual(status, 0)
+        self.assertEqual(output, 'True:http://127.0.0.1:%d:sandbox.tgz' % self.server.server_port)
+        self.assertEqual(self.server.files[-1], open(sandbox, 'rb').read())
+
+    def test_httplib_transport(self):
+        pserver.transport = 'httplib'
+        for i in range(3):
+            self.callAll()
+        ## All the calls went through the same connection.
+        self.assertEqual(self.server.counters['connections'], 1)
+        stats = pserver.getTransportStats()
+        self.assertEqual(stats['connections'], {'opened': 1, 'reused': 14})
+        self.assertEqual(stats['apis']['getFullJobStatus']['requests'], 3)
+        self.assertEqual(stats['apis']['putFile']['requests'], 3)
+
+    def test_server_closes_connection(self):
+        pserver.transport = 'httplib'
+        self.callAll()
+        ## A new server on the same port: the pooled connection is dead and is replaced.
+        self.server.stop()
+        self.server = FakePanDAServer(port=self.server.server_port)
+        self.server.start()
+        status, output = pserver.getFullJobStatus(self.server.url, [4], self.proxy)
+        self.assertEqual(status, 0)
+        self.assertEqual(output[0]['PandaID'], 4)
+        self.assertEqual(pserver.getTransportStats()['connections']['opened'], 2)
+
+    def test_connection_refused(self):
+        pserver.transport = 'httplib'
+        port = self.server.server_port
+        self.server.stop()
+        self.server = FakePanDAServer()
+        self.server.start()
+        status, output = pserver.killJobs('http://127.0.0.1:%d/server/panda' % port, [1], self.proxy)
+        self.assertEqual(status, pserver.EC_Failed)
+        self.assertEqual(pserver.getTransportStats()['apis']['killJobs']['errors'], 1)
+
+    @unittest.skipIf(os.system('which curl >/dev/null 2>&1') != 0, "curl is not available")
+    def test_curl_transport(self):
+        pserver.transport = 'curl'
+        self.callAll()
+        self.assertEqual(pserver.getTransportStats()['apis']['submitJobs']['requests'], 1)
+
+    def test_old_python(self):
+        ## Without ssl.create_default_context (python < 2.7.9) the curl transport is kept.
+        pserver.transport = 'httplib'
+        self.assertEqual(pserver._getCurl().__class__, pserver._HTTPTransport)
+        create_default_context = pserver.ssl.create_default_context
+        del pserver.ssl.create_default_context
+        try:
+            self.assertEqual(pserver._getCurl().__class__, pserver._Curl)
+        finally:
+            pserver.ssl.create_default_context = create_default_context
+
+
+if __name__ == '__main__':
+    unittest.main()
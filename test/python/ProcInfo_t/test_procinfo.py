@@ -0,0 +1,97 @@
+"""
+Tests of the ProcInfo sampling backends: the /proc based one reports the same
+parameters as the legacy one running ps, netstat, ifconfig, du and df, and its
+process tree walk is not fooled by reused pids.
+"""
+
+import os
+import re
+import time
+import shutil
+import tempfile
+import unittest
+
+import Logger
+from ProcInfo import ProcInfo
+
+
+class FakeProcInfo(ProcInfo):
+    """The 'proc' backend on a process table set by the test: pid -> (start time, parent pid)."""
+
+    def __init__(self, table):
+        ProcInfo.__init__(self, Logger.Logger(Logger.ERROR), 'proc')
+        self.table = table
+        self.reads = 0
+
+    def listPids(self):
+        return sorted(self.table)
+
+    def readPidStat(self, pid):
+        if pid not in self.table:
+            return None
+        self.reads += 1
+        starttime, ppid = self.table[pid]
+        return {'comm': 'proc%d' % pid, 'state': 'S', 'ppid': ppid, 'utime': 100, 'stime': 0,
+                'starttime': starttime, 'vsize': 4096 * pid, 'rss': pid}
+
+
+class TestProcInfo(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp()
+        with open(os.path.join(self.workDir, 'output.root'), 'w') as fd:
+            fd.write('x' * 10000)
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir)
+
+    def sample(self, backend):
+        procInfo = ProcInfo(Logger.Logger(Logger.ERROR), backend)
+        procInfo.addJobToMonitor(os.getpid(), self.workDir)
+        procInfo.update()
+        time.sleep(1.1)
+        procInfo.update()
+        return procInfo
+
+    def testSameParameters(self):
+        legacy = self.sample('ps')
+        proc = self.sample('proc')
+        ## The legacy backend parses only the old ifconfig output format, which recent net-tools do not print.
+        names = lambda data: set(name for name in data if not re.match(r"eth\d+_ip$", name))
+        self.assertEqual(names(proc.DATA), names(legacy.DATA))
+        self.assertEqual(sorted(proc.JOBS[os.getpid()]['DATA']), sorted(legacy.JOBS[os.getpid()]['DATA']))
+        for name in ['processes', 'sockets_tcp', 'run_time', 'workdir_size', 'rss']:
+            self.assertTrue(name in proc.DATA or name in proc.JOBS[os.getpid()]['DATA'], name)
+
+    def testTreeWalk(self):
+        procInfo = FakeProcInfo({1: (0, 0), 100: (1000, 1), 101: (1010, 100), 102: (1020, 101), 200: (500, 1)})
+        procInfo.proc_countProcesses()
+        reads = procInfo.reads
+        self.assertEqual(sorted(procInfo.proc_getChildren(100)), [100, 101, 102])
+        ## The table read to count the processes is reused in the same update.
+        self.assertEqual(procInfo.reads, reads)
+        ## A later walk reads the table again: pid 101 exited and was reused by
+        ## another process, and the old child 102 was not reparented yet.
+        procInfo.PPIDS_TIME -= 10
+        procInfo.table[101] = (3000, 200)
+        self.assertEqual(sorted(procInfo.proc_getChildren(100)), [100])
+        self.assertEqual(sorted(procInfo.proc_getChildren(200)), [101, 200])
+        self.assertEqual(procInfo.proc_getChildren(300), [])
+
+    def testReusedPidNotCounted(self):
+        procInfo = FakeProcInfo({1: (0, 0), 100: (1000, 1), 101: (1010, 100), 102: (1020, 100)})
+        procInfo.addJobToMonitor(100, self.workDir)
+        procInfo.proc_countProcesses()
+        ## Pid 102 is reused by an unrelated process between the tree walk and the sampling of the job.
+        getChildren = procInfo.proc_getChildren
+        def walkAndReuse(parent):
+            children = getChildren(parent)
+            procInfo.table[102] = (5000, 1)
+            return children
+        procInfo.proc_getChildren = walkAndReuse
+        procInfo.proc_readJobInfo(100)
+        self.assertEqual(procInfo.JOBS[100]['DATA']['rss'], (100 + 101) * procInfo.PAGE_SIZE / 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Tests of the DAG file rewrites of scripts/AdjustSites.py done when a task is
+resubmitted: the in-place patching of the POST script return values in
+RunJobs.dag.nodes.log and the streaming of RunJobs.dag in adjustMaxRetries.
+"""
+
+import os
+import imp
+import sys
+import stat
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Fakes', 'condor'))
+
+test_base = os.environ.get("CRAB3_TEST_BASE", ".")
+
+NODE_EVENT = """000 (%(cluster)d.000.000) 11/11 17:45:46 Job submitted from host: <127.0.0.1:4080>
+    DAG Node: Job%(job)d
+...
+005 (%(cluster)d.000.000) 11/11 17:45:46 Job terminated.
+\t(1) Normal termination (return value %(retval)d)
+...
+016 (%(cluster)d.000.000) 11/11 17:45:46 POST Script terminated.
+\t(1) Normal termination (return value %(retval)d)
+    DAG Node: Job%(job)d
+...
+"""
+
+DAG_NODE = """JOB Job%(job)d Job.submit
+SCRIPT POST Job%(job)d dag_bootstrap.sh POSTJOB $JOBID $RETURN $RETRY $MAX_RETRIES 150212_123623:user_crab_test %(job)d
+RETRY Job%(job)d 2 UNLESS-EXIT 2
+VARS Job%(job)d count="%(job)d"   inputFiles="job_input_file_list_%(job)d.txt"\t
+
+"""
+
+## The POST script return value of each job: 0 (OK), 2 (FATAL_ERROR) or 1 (RECOVERABLE_ERROR).
+RETVALS = {1: 0, 2: 2, 3: 2, 4: 1, 5: 0, 10: 2}
+
+
+class TestAdjustSites(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        adfile = os.path.join(self.tmpdir, '.job.ad')
+        with open(adfile, 'w') as fd:
+            fd.write("CRAB_NumAutomJobRetries = 2\n")
+        os.environ['_CONDOR_JOB_AD'] = adfile
+        os.environ['TEST_DONT_REDIRECT_STDOUT'] = '1'
+        os.chdir(self.tmpdir)
+        self.AdjustSites = imp.load_source('AdjustSites', os.path.join(self.cwd, test_base, 'scripts/AdjustSites.py'))
+        self.nodesLog = ''.join([NODE_EVENT % {'cluster': 1000 + job, 'job': job, 'retval': retval} for job, retval in sorted(RETVALS.items())])
+        with open('RunJobs.dag.nodes.log', 'w') as fd:
+            fd.write(self.nodesLog)
+        self.dag = ''.join([DAG_NODE % {'job': job} for job in sorted(RETVALS)])
+        with open('RunJobs.dag', 'w') as fd:
+            fd.write(self.dag)
+        os.chmod('RunJobs.dag', 0640)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+        del os.environ['_CONDOR_JOB_AD']
+
+    def postRetvals(self):
+        """The POST script return value of each job in the node log, with the line it was read from."""
+        retvals = {}
+        lines = open('RunJobs.dag.nodes.log').readlines()
+        for num, line in enumerate(lines):
+            if 'POST Script terminated.' in line:
+                job = int(lines[num + 2].split('Job')[-1])
+                retvals[job] = (int(lines[num + 1][-3]), lines[num + 1])
+        return retvals
+
+    def testPatchListedJobs(self):
+        adjusted = self.AdjustSites.adjustPostScriptExitStatus(['1', '2', '4', '10', '7'])
+        self.assertEqual(adjusted, ['1', '2', '10'])
+        retvals = self.postRetvals()
+        self.assertEqual(dict([(job, retval) for job, (retval, dummyLine) in retvals.items()]),
+                         {1: 1, 2: 1, 3: 2, 4: 1, 5: 0, 10: 1})
+        ## Only the return value bytes are changed: the tab of HTCondor is kept
+        ## and the file keeps its size, so it can be patched in place.
+        self.assertEqual(retvals[1][1], "\t(1) Normal termination (return value 1)\n")
+        content = open('RunJobs.dag.nodes.log').read()
+        self.assertEqual(len(content), len(self.nodesLog))
+        differences = [offset for offset in range(len(content)) if content[offset] != self.nodesLog[offset]]
+        self.assertEqual(len(differences), 3)
+        self.assertEqual(set(self.nodesLog[offset] for offset in differences), set(['0', '2']))
+        ## The return values of the jobs themselves are never changed.
+        self.assertEqual(content.count("Job terminated.\n\t(1) Normal termination (return value 1)"), 1)
+
+    def testPatchAllFailed(self):
+        adjusted = self.AdjustSites.adjustPostScriptExitStatus(True)
+        self.assertEqual(adjusted, ['2', '3', '10'])
+        retvals = self.postRetvals()
+        self.assertEqual(dict([(job, retval) for job, (retval, dummyLine) in retvals.items()]),
+                         {1: 0, 2: 1, 3: 1, 4: 1, 5: 0, 10: 1})
+
+    def testNothingToPatch(self):
+        self.assertEqual(self.AdjustSites.adjustPostScriptExitStatus([]), [])
+        self.assertEqual(self.AdjustSites.adjustPostScriptExitStatus(['4', '8']), [])
+        self.assertEqual(open('RunJobs.dag.nodes.log').read(), self.nodesLog)
+
+    def testMaxRetries(self):
+        with open('node_state', 'w') as fd:
+            fd.write('[ Type = "NodeStatus"; Node = "Job3"; RetryCount = 4; ]\n'
+                     '[ Type = "NodeStatus"; Node = "Job10"; RetryCount = -1; ]\n'
+                     '[ Type = "DagStatus"; ]\n')
+        self.AdjustSites.adjustMaxRetries(['3', '10'], {'CRAB_NumAutomJobRetries': 2})
+        expected = self.dag.replace('RETRY Job3 2 ', 'RETRY Job3 7 ').replace('RETRY Job10 2 ', 'RETRY Job10 5 ')
+        ## All the other lines, whitespace included, are copied as they are.
+        self.assertEqual(open('RunJobs.dag').read(), expected)
+        self.assertEqual(stat.S_IMODE(os.stat('RunJobs.dag').st_mode), 0640)
+        self.assertEqual(sorted(os.listdir('.')), ['.job.ad', 'RunJobs.dag', 'RunJobs.dag.nodes.log', 'adjust_out.txt', 'node_state'])
+        self.AdjustSites.adjustMaxRetries(True, {})
+        self.assertEqual(open('RunJobs.dag').read().count('RETRY Job1 5 '), 1)
+        self.assertEqual(open('RunJobs.dag').read().count('RETRY Job3 7 '), 1)
+
+    def testMaxRetriesFailure(self):
+        copymode = self.AdjustSites.shutil.copymode
+        def failingCopymode(src, dst):
+            raise OSError("Permission denied")
+        self.AdjustSites.shutil.copymode = failingCopymode
+        try:
+            self.assertRaises(OSError, self.AdjustSites.adjustMaxRetries, ['1'], {})
+        finally:
+            self.AdjustSites.shutil.copymode = copymode
+        ## The original file is left untouched and the temporary file is removed.
+        self.assertEqual(open('RunJobs.dag').read(), self.dag)
+        self.assertEqual(sorted(os.listdir('.')), ['.job.ad', 'RunJobs.dag', 'RunJobs.dag.nodes.log', 'adjust_out.txt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""
+Tests of scripts/get_pool_status.py against a fake htcondor module: a
+collector with a few slots and schedds, and schedds answering with
+injected latencies (or not answering at all).
+"""
+
+import os
+import sys
+import imp
+import time
+import types
+import unittest
+
+test_base = os.environ.get("CRAB3_TEST_BASE", ".")
+
+SLOW_SCHEDD_LATENCY = 30
+
+
+class FakeSchedd(object):
+    latencies = {}
+    jobs = {}
+    def __init__(self, schedd_ad):
+        self.name = schedd_ad['Name']
+    def query(self, constraint, attrs):
+        latency = self.latencies.get(self.name, 0)
+        if latency < 0:
+            raise IOError("Failed to fetch ads from schedd.")
+        time.sleep(latency)
+        return [dict([(attr, job[attr]) for attr in attrs if attr in job]) for job in self.jobs[self.name]]
+
+
+class FakeNegotiator(object):
+    def __init__(self, ad):
+        pass
+    def getPriorities(self):
+        return [{'Name': 'user0@cern.ch', 'Priority': 10.0}]
+
+
+class FakeCollector(object):
+    def __init__(self, pool):
+        self.pool = pool
+    def query(self, adType, constraint, attrs):
+        if adType == 'Startd':
+            return [{'GLIDEIN_CMSSite': 'T2_CH_CERN', 'GLIDEIN_SEs': 'srm-eoscms.cern.ch', 'AccountingGroup': 'user0@cern.ch'}]
+        return [{'GLIDEIN_CMSSite': 'T2_CH_CERN', 'GlideFactoryMonitorStatusIdle': 3, 'GlideFactoryName': 'factory'}]
+    def locateAll(self, daemonType):
+        return [{'Name': name} for name in sorted(FakeSchedd.jobs)]
+    def locate(self, daemonType, name):
+        return {'Name': name}
+
+
+def makeFakeHTCondor():
+    htcondor = types.ModuleType('htcondor')
+    htcondor.Collector = FakeCollector
+    htcondor.Schedd = FakeSchedd
+    htcondor.Negotiator = FakeNegotiator
+    htcondor.AdTypes = type('AdTypes', (), {'Startd': 'Startd', 'Any': 'Any'})
+    htcondor.DaemonTypes = type('DaemonTypes', (), {'Schedd': 'Schedd', 'Negotiator': 'Negotiator'})
+    return htcondor
+
+
+class TestGetPoolStatus(unittest.TestCase):
+
+    def setUp(self):
+        self.oldModules = dict([(name, sys.modules.get(name)) for name in ['htcondor', 'classad']])
+        sys.modules['htcondor'] = makeFakeHTCondor()
+        sys.modules['classad'] = types.ModuleType('classad')
+        self.get_pool_status = imp.load_source('get_pool_status', os.path.join(test_base, 'scripts/get_pool_status.py'))
+        FakeSchedd.jobs = {}
+        FakeSchedd.latencies = {}
+        for i in range(10):
+            name = 'crab3@schedd%d.cern.ch' % i
+            FakeSchedd.jobs[name] = [{'CRAB_ReqName': 'task%d' % i, 'CRAB_UserHN': 'user0', 'JobPrio': 10, 'JobStatus': 1,
+                                      'DESIRED_SEs': 'srm-eoscms.cern.ch'}] * (i + 1)
+            FakeSchedd.latencies[name] = 1
+
+    def tearDown(self):
+        for name, module in self.oldModules.items():
+            if module is None:
+                del sys.modules[name]
+            else:
+                sys.modules[name] = module
+
+    def testConcurrentQueries(self):
+        pool = self.get_pool_status.PoolStatus('cmsgwms-collector-global.cern.ch', timeout=10)
+        start = time.time()
+        pool.execute()
+        elapsed = time.time() - start
+        ## Ten schedds answering in one second each are queried at the same time.
+        self.assertTrue(elapsed < 5)
+        self.assertFalse(pool.is_partial())
+        tasks = pool.pool_status['T2_CH_CERN']['user0']['tasks']
+        self.assertEqual(len(tasks), 10)
+        self.assertEqual(tasks['task9']['IdleJobs'], 10)
+        self.assertEqual(pool.pool_status['T2_CH_CERN']['user0']['Priority'], 10.0)
+        self.assertEqual(pool.pool_status['T2_CH_CERN']['IdleGlideins'], 3)
+
+    def testPartialResult(self):
+        FakeSchedd.latencies['crab3@schedd3.cern.ch'] = SLOW_SCHEDD_LATENCY
+        FakeSchedd.latencies['crab3@schedd5.cern.ch'] = -1
+        pool = self.get_pool_status.PoolStatus('cmsgwms-collector-global.cern.ch', timeout=3)
+        start = time.time()
+        pool.execute()
+        self.assertTrue(time.time() - start < SLOW_SCHEDD_LATENCY)
+        self.assertTrue(pool.is_partial())
+        self.assertEqual(pool.timedout_schedds, ['crab3@schedd3.cern.ch'])
+        self.assertEqual(pool.failed_schedds, ['crab3@schedd5.cern.ch'])
+        tasks = pool.pool_status['T2_CH_CERN']['user0']['tasks']
+        self.assertEqual(sorted(tasks.keys()), sorted(['task%d' % i for i in range(10) if i not in [3, 5]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Tests of ServerUtilities.calculateChecksums against the per-file checksums
+used before by the job wrapper (WMCore calculateChecksums: adler32 of 4 KB
+chunks, cksum of the same data, size from os.stat) and against the cksum tool.
+"""
+
+import os
+import stat
+import zlib
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from ServerUtilities import calculateChecksums
+
+
+def serialChecksums(filename):
+    """The per-file algorithm of WMCore calculateChecksums."""
+    adler32Checksum = 1
+    cksumProcess = subprocess.Popen("cksum", stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    with open(filename, 'rb') as fd:
+        for chunk in iter((lambda: fd.read(4096)), ''):
+            adler32Checksum = zlib.adler32(chunk, adler32Checksum)
+            cksumProcess.stdin.write(chunk)
+    cksumProcess.stdin.close()
+    cksumProcess.wait()
+    cksumStdout = cksumProcess.stdout.read().split()
+    cksumProcess.stdout.close()
+    return ("%08x" % (adler32Checksum & 0xffffffff), cksumStdout[0], os.stat(filename)[stat.ST_SIZE])
+
+
+class CalculateChecksumsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filenames = []
+        ## Empty, smaller than a chunk, not a multiple of the chunks, and with a leading zero in the adler32.
+        for num, data in enumerate(['', 'a', os.urandom(3 * 65536 + 17), os.urandom(1024 * 1024), '\x00' * 10]):
+            filename = os.path.join(self.tmpdir, 'output_%d.root' % num)
+            with open(filename, 'wb') as fd:
+                fd.write(data)
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testSameAsSerial(self):
+        for bufferSize in [4096, 65536, 4 * 1024 * 1024]:
+            for maxWorkers in [1, 3, 10]:
+                results = calculateChecksums(self.filenames, maxWorkers=maxWorkers, bufferSize=bufferSize)
+                self.assertEqual(sorted(results), sorted(self.filenames))
+                for filename in self.filenames:
+                    self.assertEqual(results[filename], serialChecksums(filename))
+
+    def testCksumTool(self):
+        results = calculateChecksums(self.filenames)
+        for filename in self.filenames:
+            cksum, size = subprocess.Popen(["cksum", filename], stdout=subprocess.PIPE).communicate()[0].split()[:2]
+            self.assertEqual(results[filename][1:], (cksum, int(size)))
+        self.assertEqual(results[self.filenames[0]][0], '00000001')
+        self.assertEqual(results[self.filenames[4]][0], '000a0001')
+
+    def testMissingFile(self):
+        self.assertRaises(IOError, calculateChecksums, self.filenames + [os.path.join(self.tmpdir, 'missing.root')])
+
+
+if __name__ == '__main__':
+    unittest.main()